@@ -0,0 +1,91 @@
+"""
+Benchmark of the compact usage_events schema against usage_logs.
+
+Writes the same rows into two fresh SQLite databases, one per schema, in
+batches the size a usage logger flushes, then scans a day of provider
+history the way hydration does:
+
+    insert    one transaction per batch into usage_logs or usage_events
+              (save_usage_rows() without the minute rollups, which are
+              the same for both schemas)
+    scan      load_provider_history() over every row, streamed in chunks
+    size      database file size after the inserts
+
+Usage:
+    python -m benchmarks.compact_schema [--rows 200000] [--batch 100] [--keys 8] [--models 4]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from keycycle.config.constants import HISTORY_CHUNK_ROWS, HISTORY_LOOKBACK_SECONDS
+from keycycle.core.utils import get_key_suffix
+from keycycle.usage.db_logic import UsageDatabase
+
+PROVIDER = "bench"
+
+
+def _rows(keys, models, rows: int):
+    rng = random.Random(1)
+    now = time.time()
+    suffixes = [get_key_suffix(k) for k in keys]
+    return sorted((
+        {
+            "provider": PROVIDER,
+            "model": rng.choice(models),
+            "api_key_suffix": rng.choice(suffixes),
+            "timestamp": now - rng.uniform(0, HISTORY_LOOKBACK_SECONDS),
+            "tokens": rng.randint(50, 2000),
+            "writer_id": uuid.uuid4().hex,
+            "record_id": uuid.uuid4().hex,
+        }
+        for _ in range(rows)
+    ), key=lambda row: row["timestamp"])
+
+
+def _run(path: str, compact: bool, rows, batch: int):
+    db = UsageDatabase(db_url="sqlite:///" + path, compact=compact)
+    started = time.perf_counter()
+    for start in range(0, len(rows), batch):
+        # The usage rows alone: both schemas add the same minute rollups on top
+        stored = db._encode_rows(rows[start:start + batch])
+        with db.engine.begin() as conn:
+            conn.execute(db.log_table.insert(), stored)
+    inserted = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scanned = sum(1 for _ in db.load_provider_history(PROVIDER, 2 * HISTORY_LOOKBACK_SECONDS, HISTORY_CHUNK_ROWS))
+    scan = time.perf_counter() - started
+    db.engine.dispose()
+    assert scanned == len(rows)
+    return inserted, scan, os.path.getsize(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--keys", type=int, default=8)
+    parser.add_argument("--models", type=int, default=4)
+    args = parser.parse_args()
+
+    keys = [f"sk-bench-key-{i:04d}-{i:08d}" for i in range(args.keys)]
+    models = [f"vendor/model-{i}-instruct" for i in range(args.models)]
+    rows = _rows(keys, models, args.rows)
+    directory = tempfile.mkdtemp()
+    print(f"{args.rows} rows in batches of {args.batch}, {args.keys} keys, {args.models} models\n")
+
+    print(f"{'schema':<10}{'insert s':>10}{'rows/s':>10}{'scan s':>10}{'rows/s':>10}{'size MB':>10}")
+    for label, compact in (("legacy", False), ("compact", True)):
+        inserted, scan, size = _run(os.path.join(directory, f"{label}.db"), compact, rows, args.batch)
+        print(
+            f"{label:<10}{inserted:>10.2f}{args.rows / inserted:>10.0f}"
+            f"{scan:>10.2f}{args.rows / scan:>10.0f}{size / 1e6:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
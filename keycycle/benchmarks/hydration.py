@@ -0,0 +1,142 @@
+"""
+Benchmark of restart hydration over a large usage history.
+
+Fills a SQLite database with rows spread over the last 24 hours, then times
+three ways of rebuilding the rate-limit windows from it:
+
+    per-row   every raw row, unordered, one record_usage() and seed() each
+              (how _hydrate worked before rollups and bulk loading)
+    bulk      every raw row, time-ordered, grouped per key and model and
+              loaded with record_history() / seed_many()
+    startup   RotatingKeyManager construction: minute rollups for the hour
+              and day windows plus the last minutes of raw rows, loaded in bulk
+
+Usage:
+    python -m benchmarks.hydration [--rows 1000000] [--keys 8] [--models 4] [--db PATH]
+"""
+import argparse
+import atexit
+import os
+import random
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from unittest.mock import patch
+
+from sqlalchemy import func, select
+
+from keycycle.config.constants import HISTORY_LOOKBACK_SECONDS
+from keycycle.config.dataclasses import KeyUsage
+from keycycle.config.enums import RateLimitStrategy
+from keycycle.core.utils import get_key_suffix
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+from keycycle.usage.db_logic import UsageDatabase
+from keycycle.usage.token_estimator import ReservationEstimator
+
+PROVIDER = "bench"
+CHUNK = 50_000
+
+
+def _fill(db: UsageDatabase, keys, models, rows: int) -> None:
+    rng = random.Random(1)
+    now = time.time()
+    suffixes = [get_key_suffix(k) for k in keys]
+    for start in range(0, rows, CHUNK):
+        db.save_usage_rows([
+            {
+                "provider": PROVIDER,
+                "model": rng.choice(models),
+                "api_key_suffix": rng.choice(suffixes),
+                "timestamp": now - rng.uniform(0, HISTORY_LOOKBACK_SECONDS),
+                "tokens": rng.randint(50, 2000),
+                "writer_id": "bench",
+                "record_id": uuid.uuid4().hex,
+            }
+            for _ in range(min(CHUNK, rows - start))
+        ])
+
+
+def _unordered_history(db: UsageDatabase):
+    logs = db.usage_logs
+    stmt = select(logs.c.api_key_suffix, logs.c.model, logs.c.timestamp, logs.c.tokens).where(
+        logs.c.provider == PROVIDER, logs.c.timestamp > time.time() - HISTORY_LOOKBACK_SECONDS
+    )
+    with db.engine.connect() as conn:
+        return conn.execute(stmt).all()
+
+
+def _per_row(db: UsageDatabase, keys):
+    started = time.perf_counter()
+    rows = _unordered_history(db)
+    fetched = time.perf_counter()
+    key_map = {get_key_suffix(k): KeyUsage(api_key=k, strategy=RateLimitStrategy.PER_MODEL) for k in keys}
+    estimator = ReservationEstimator()
+    for suffix, model_id, ts, tokens in rows:
+        key_map[suffix].record_usage(model_id, tokens=tokens, timestamp=ts)
+        estimator.seed(model_id, tokens)
+    return fetched - started, time.perf_counter() - fetched
+
+
+def _bulk(db: UsageDatabase, keys):
+    started = time.perf_counter()
+    rows = db.load_provider_history(PROVIDER, HISTORY_LOOKBACK_SECONDS)
+    fetched = time.perf_counter()
+    key_map = {get_key_suffix(k): KeyUsage(api_key=k, strategy=RateLimitStrategy.PER_MODEL) for k in keys}
+    history = {suffix: defaultdict(list) for suffix in key_map}
+    seeds = defaultdict(list)
+    for suffix, model_id, ts, tokens in rows:
+        history[suffix][model_id].append((ts, tokens, 1))
+        seeds[model_id].append(tokens)
+    for suffix, models in history.items():
+        key_map[suffix].record_history(models)
+    estimator = ReservationEstimator()
+    for model_id, values in seeds.items():
+        estimator.seed_many(model_id, values)
+    return fetched - started, time.perf_counter() - fetched
+
+
+def _startup(db: UsageDatabase, keys):
+    # Keep the manager's background threads from outliving the measurement
+    with patch.object(atexit, "register"):
+        started = time.perf_counter()
+        manager = RotatingKeyManager(
+            api_keys=keys, provider_name=PROVIDER, strategy=RateLimitStrategy.PER_MODEL, db=db,
+        )
+        elapsed = time.perf_counter() - started
+    manager._stop_event.set()
+    manager.usage_logger.stop()
+    return None, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--keys", type=int, default=8)
+    parser.add_argument("--models", type=int, default=4)
+    parser.add_argument("--db", help="SQLite file to reuse between runs (filled when empty)")
+    args = parser.parse_args()
+
+    keys = [f"sk-bench-key-{i:04d}-{i:08d}" for i in range(args.keys)]
+    models = [f"model-{i}" for i in range(args.models)]
+    path = args.db or os.path.join(tempfile.mkdtemp(), "hydration.db")
+    db = UsageDatabase(db_url="sqlite:///" + path)
+    with db.engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(db.usage_logs)).scalar()
+    if existing == 0:
+        started = time.perf_counter()
+        _fill(db, keys, models, args.rows)
+        print(f"filled {args.rows} rows in {time.perf_counter() - started:.1f}s ({path})")
+        existing = args.rows
+    print(f"{existing} rows, {args.keys} keys, {args.models} models\n")
+
+    print(f"{'path':<10}{'fetch s':>10}{'replay s':>10}{'total s':>10}")
+    for label, run in (("per-row", _per_row), ("bulk", _bulk), ("startup", _startup)):
+        fetch, replay = run(db, keys)
+        total = replay + (fetch or 0)
+        fetch_text = f"{fetch:>10.2f}" if fetch is not None else f"{'-':>10}"
+        print(f"{label:<10}{fetch_text}{replay:>10.2f}{total:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
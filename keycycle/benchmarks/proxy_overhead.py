@@ -0,0 +1,125 @@
+"""
+Microbenchmark of keycycle's per-call overhead.
+
+Calls a do-nothing in-process SDK directly and through the generic rotating
+clients, so the difference is the adapter's own cost per call (proxy chain,
+client and target lookup, usage extraction) with no network involved. The key
+manager is replaced by a round-robin stub so its rate-limit bookkeeping, which
+grows with the number of requests in the window, does not swamp the numbers.
+
+Usage:
+    python -m benchmarks.proxy_overhead [--calls 20000]
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from unittest.mock import MagicMock
+
+from keycycle.adapters.generic_adapter import create_rotating_client
+from keycycle.config.dataclasses import KeyUsage, RateLimits
+from keycycle.config.enums import RateLimitStrategy
+
+RESPONSE = {"label": "positive", "usage": {"total_tokens": 12}}
+LIMITS = RateLimits(10**9, 10**9, 10**12)
+
+
+class _Completions:
+    def create(self, **kwargs):
+        return RESPONSE
+
+
+class _AsyncCompletions:
+    async def create(self, **kwargs):
+        return RESPONSE
+
+
+class FakeClient:
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.chat = MagicMock()
+        self.chat.completions = _Completions()
+
+
+class AsyncFakeClient:
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.chat = MagicMock()
+        self.chat.completions = _AsyncCompletions()
+
+
+class _RoundRobinManager:
+    """Key manager stand-in that hands out keys in order and records nothing."""
+    provider_name = "bench"
+
+    def __init__(self, num_keys: int = 4):
+        keys = [
+            KeyUsage(api_key=f"sk-bench-key-{i:04d}-xxxxxxxx", strategy=RateLimitStrategy.PER_MODEL)
+            for i in range(num_keys)
+        ]
+        self._keys = itertools.cycle(keys)
+
+    def get_key(self, model_id, limits, estimated_tokens=1000):
+        return next(self._keys)
+
+    def record_usage(self, **kwargs):
+        pass
+
+
+def _make_client(client_class, is_async: bool, **kwargs):
+    return create_rotating_client(
+        client_class,
+        manager=_RoundRobinManager(),
+        limit_resolver=lambda m, k: LIMITS,
+        default_model="bench-model",
+        is_async=is_async,
+        estimated_tokens=1,
+        **kwargs,
+    )
+
+
+def _time_sync(call, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        call()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+async def _time_async(call, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        await call()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000)
+    calls = parser.parse_args().calls
+
+    results = []
+
+    raw = FakeClient("sk-raw")
+    results.append(("sync raw SDK", _time_sync(lambda: raw.chat.completions.create(prompt="hi"), calls)))
+    for label, cache_size in (("sync keycycle", 64), ("sync keycycle, no client cache", 0)):
+        client = _make_client(FakeClient, False, client_cache_size=cache_size)
+        results.append((label, _time_sync(lambda: client.chat.completions.create(prompt="hi"), calls)))
+
+    async def run_async():
+        raw_async = AsyncFakeClient("sk-raw")
+        results.append(("async raw SDK", await _time_async(
+            lambda: raw_async.chat.completions.create(prompt="hi"), calls)))
+        for label, cache_size in (("async keycycle", 64), ("async keycycle, no client cache", 0)):
+            client = _make_client(AsyncFakeClient, True, client_cache_size=cache_size)
+            results.append((label, await _time_async(
+                lambda: client.chat.completions.create(prompt="hi"), calls)))
+
+    asyncio.run(run_async())
+
+    print(f"{'path':<34}{'us/call':>10}")
+    for label, micros in results:
+        print(f"{label:<34}{micros:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
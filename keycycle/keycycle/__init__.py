@@ -19,6 +19,17 @@ from .adapters.generic_adapter import (
     SyncGenericRotatingClient,
     AsyncGenericRotatingClient,
 )
+from .adapters.http_pool import HttpPoolConfig
+from .adapters.offload import OffloadConfig
+from .backends.base import StateBackend, InMemoryStateBackend
+from .backends.mmap_state import MmapStateBackend
+from .backends.sql_lease import SqlLeaseBackend
+from .backends.redis_state import RedisStateBackend
+from .core.hedging import HedgeConfig
+from .cache.response_cache import ResponseCache
+from .config.dataclasses import CacheStats, UsageLogStats
+from .config.enums import KeyStatus, QueueOverflow, UsageWriter
+from .usage.usage_logger import UsageLogConfig
 
 __all__ = [
     # New primary wrapper (multi-provider support)
@@ -38,6 +49,21 @@ __all__ = [
     "GenericClientConfig",
     "SyncGenericRotatingClient",
     "AsyncGenericRotatingClient",
+    "HttpPoolConfig",
+    "OffloadConfig",
+    "StateBackend",
+    "InMemoryStateBackend",
+    "MmapStateBackend",
+    "SqlLeaseBackend",
+    "RedisStateBackend",
+    "HedgeConfig",
+    "ResponseCache",
+    "CacheStats",
+    "UsageLogConfig",
+    "UsageLogStats",
+    "QueueOverflow",
+    "KeyStatus",
+    "UsageWriter",
     # Exceptions
     "KeycycleError",
     "NoAvailableKeyError",
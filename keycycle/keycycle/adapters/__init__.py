@@ -5,9 +5,13 @@ from .generic_adapter import (
     GenericClientConfig,
     SyncGenericRotatingClient,
     AsyncGenericRotatingClient,
+    OffloadedAsyncRotatingClient,
     SyncGenericProxyHelper,
     AsyncGenericProxyHelper,
 )
+from .client_cache import ClientCache
+from .http_pool import HttpPoolConfig, SharedHttpPool, get_shared_http_pool
+from .offload import OffloadConfig
 
 __all__ = [
     # Generic adapter
@@ -17,6 +21,14 @@ __all__ = [
     "GenericClientConfig",
     "SyncGenericRotatingClient",
     "AsyncGenericRotatingClient",
+    "OffloadedAsyncRotatingClient",
     "SyncGenericProxyHelper",
     "AsyncGenericProxyHelper",
+    # Client reuse
+    "ClientCache",
+    "HttpPoolConfig",
+    "SharedHttpPool",
+    "get_shared_http_pool",
+    # Sync clients for asyncio callers
+    "OffloadConfig",
 ]
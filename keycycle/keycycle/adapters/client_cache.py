@@ -0,0 +1,209 @@
+"""
+Bounded cache of live SDK client instances for the rotating adapters.
+
+Building a new SDK client per call throws away its HTTP connection pool, so every
+request pays for a fresh TCP/TLS handshake. The rotating clients keep one live client
+per key in a ClientCache instead and only build a new one on a miss.
+"""
+
+import asyncio
+import inspect
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Coroutine, Dict, Hashable, List, Set, Tuple, cast
+
+from ..config.constants import DEFAULT_CLIENT_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Keeps scheduled async close() tasks alive until they finish
+_pending_closes: Set["asyncio.Task[Any]"] = set()
+
+
+def freeze_kwargs(value: Any) -> Hashable:
+    """
+    Build a hashable fingerprint of constructor kwargs.
+
+    Unhashable values (e.g. a shared httpx client) are fingerprinted by identity.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), freeze_kwargs(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_kwargs(v) for v in value)
+    try:
+        hash(value)
+        return cast(Hashable, value)
+    except TypeError:
+        return ("__id__", id(value))
+
+
+def _get_close_method(client: Any) -> Any:
+    """Prefer an async aclose(), fall back to close()."""
+    aclose = getattr(client, "aclose", None)
+    if callable(aclose) and asyncio.iscoroutinefunction(aclose):
+        return aclose
+    close = getattr(client, "close", None)
+    return close if callable(close) else None
+
+
+async def _await_close(result: Awaitable[Any]) -> None:
+    await result
+
+
+def close_client(client: Any) -> None:
+    """
+    Close an SDK client.
+
+    Coroutine close methods are scheduled on the running event loop. Without a
+    running loop the coroutine is discarded and the client is left to the GC.
+    """
+    close = _get_close_method(client)
+    if close is None:
+        return
+    try:
+        result = close()
+    except Exception as e:
+        logger.debug("Error closing %s: %s", type(client).__name__, e)
+        return
+
+    if not inspect.isawaitable(result):
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        if inspect.iscoroutine(result):
+            result.close()
+        return
+    close_coro: Coroutine[Any, Any, None] = _await_close(result)
+    task: "asyncio.Task[None]" = loop.create_task(close_coro)
+    _pending_closes.add(task)
+    task.add_done_callback(_pending_closes.discard)
+
+
+async def aclose_client(client: Any) -> None:
+    """Close an SDK client, awaiting async close methods."""
+    close = _get_close_method(client)
+    if close is None:
+        return
+    try:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+    except Exception as e:
+        logger.debug("Error closing %s: %s", type(client).__name__, e)
+
+
+class _CachedClient:
+    """A live client plus the bound methods already resolved on it."""
+    __slots__ = ("client", "targets")
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.targets: Dict[Tuple[str, ...], Any] = {}
+
+
+class ClientCache:
+    """
+    Thread-safe LRU cache of live client instances.
+
+    Entries are keyed by a hashable fingerprint of the key identity and the merged
+    constructor kwargs. Evicted clients are closed unless close_clients is False
+    (e.g. when they share an HTTP transport that closing would tear down).
+
+    Each entry also remembers the bound methods resolved on its client, so a call
+    path like ("chat", "completions", "create") is walked once per client.
+
+    Example:
+        cache = ClientCache(max_size=16)
+        client = cache.get_or_create(("sk-...", frozen_kwargs), lambda: OpenAI(api_key="sk-..."))
+        create = cache.get_target(("sk-...", frozen_kwargs), factory, ("chat", "completions", "create"))
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CLIENT_CACHE_SIZE, close_clients: bool = True):
+        if max_size < 1:
+            raise ValueError(f"max_size must be at least 1, got: {max_size}")
+        self.max_size = max_size
+        self.close_clients = close_clients
+        self._clients: "OrderedDict[Hashable, _CachedClient]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get_entry(self, cache_key: Hashable, factory: Callable[[], Any]) -> _CachedClient:
+        with self._lock:
+            entry = self._clients.get(cache_key)
+            if entry is not None:
+                self._clients.move_to_end(cache_key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Built outside the lock, so a slow constructor never blocks lookups of other keys
+        client = factory()
+        evicted: List[Any] = []
+        with self._lock:
+            entry = self._clients.get(cache_key)
+            if entry is not None:
+                # Another thread built one first; keep that one
+                self._clients.move_to_end(cache_key)
+                evicted.append(client)
+            else:
+                entry = _CachedClient(client)
+                self._clients[cache_key] = entry
+                while len(self._clients) > self.max_size:
+                    _, old = self._clients.popitem(last=False)
+                    evicted.append(old.client)
+                    self.evictions += 1
+
+        if self.close_clients:
+            for old_client in evicted:
+                close_client(old_client)
+        return entry
+
+    def get_or_create(self, cache_key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Return the cached client for cache_key, building it with factory on a miss."""
+        return self._get_entry(cache_key, factory).client
+
+    def get_target(
+        self, cache_key: Hashable, factory: Callable[[], Any], path: Tuple[str, ...]
+    ) -> Any:
+        """Return the attribute at path on the cached client, resolving it once per client."""
+        entry = self._get_entry(cache_key, factory)
+        target = entry.targets.get(path)
+        if target is None:
+            target = entry.client
+            for name in path:
+                target = getattr(target, name)
+            entry.targets[path] = target
+        return target
+
+    def _drain(self) -> List[Any]:
+        with self._lock:
+            clients = [entry.client for entry in self._clients.values()]
+            self._clients.clear()
+        return clients if self.close_clients else []
+
+    def close(self) -> None:
+        """Close and drop every cached client."""
+        for client in self._drain():
+            close_client(client)
+
+    async def aclose(self) -> None:
+        """Close and drop every cached client, awaiting async close methods."""
+        for client in self._drain():
+            await aclose_client(client)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters and the current size."""
+        with self._lock:
+            return {
+                "size": len(self._clients),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._clients)
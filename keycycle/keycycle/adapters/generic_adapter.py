@@ -6,19 +6,27 @@ on rate limit errors for any compatible client library (Anthropic, TwelveLabs, C
 """
 
 import asyncio
+import functools
 import inspect
 import logging
 import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from typing import (
     Any,
     AsyncGenerator,
     Callable,
+    Collection,
+    Dict,
     FrozenSet,
     Generator,
     Generic,
+    Hashable,
     List,
     Optional,
+    Set,
+    Tuple,
     Type,
     TypeVar,
     Union,
@@ -31,10 +39,26 @@ from ..config.constants import (
     TEMP_RATE_LIMIT_MAX_DELAY,
     TEMP_RATE_LIMIT_MULTIPLIER,
     KEY_ROTATION_DELAY_SECONDS,
+    DEFAULT_CLIENT_CACHE_SIZE,
+    OFFLOAD_SLOT_POLL_INITIAL,
+    OFFLOAD_SLOT_POLL_MAX,
 )
 from ..core.utils import is_rate_limit_error, is_temporary_rate_limit_error, get_key_suffix
 from ..core.backoff import ExponentialBackoff, BackoffConfig
+from ..core.hedging import HedgeConfig, Hedger
+from ..core.single_flight import AsyncSingleFlight, SingleFlight, applies_to, request_key
+from ..cache.response_cache import ResponseCache
 from ..key_rotation.rotation_manager import RotatingKeyManager
+from .client_cache import ClientCache, freeze_kwargs
+from .settlement import UsageSettlement
+from ..usage.token_estimator import TokenEstimate
+from ..usage.stream_usage import (
+    StreamUsageAccumulator,
+    estimate_request_tokens,
+    estimate_tokens_from_text,
+)
+from .http_pool import HttpPoolConfig, SharedHttpPool, get_shared_http_pool
+from .offload import KeySlots, OffloadConfig, iterate_in_thread
 
 logger = logging.getLogger(__name__)
 
@@ -212,6 +236,69 @@ class GenericClientConfig:
     valid_kwargs: Optional[FrozenSet[str]] = None
     """Valid constructor kwargs from introspection. None means accept all (client uses **kwargs)."""
 
+    client_cache_size: int = DEFAULT_CLIENT_CACHE_SIZE
+    """Maximum number of live client instances reused across calls. 0 disables caching."""
+
+    http_pool: Optional[HttpPoolConfig] = None
+    """If set, one shared httpx client (per provider) is injected into every constructed client."""
+
+    http_client_param: str = "http_client"
+    """Name of the constructor parameter that accepts an httpx client"""
+
+    hedge: Optional[HedgeConfig] = None
+    """If set, slow non-streaming async calls are raced against a second key"""
+
+    token_estimator: Optional[Callable[[str], int]] = None
+    """Estimates tokens in a piece of text for streams without usage (default: chars / 4)"""
+
+    chunk_text_extractor: Optional[Callable[[Any], str]] = None
+    """Pulls generated text out of a stream chunk (default handles common SDK shapes)"""
+
+    single_flight: Union[bool, Collection[str]] = False
+    """Coalesce concurrent identical non-streaming calls: True for every path, or dotted paths like {"embeddings.create"}"""
+
+    response_cache: Optional[ResponseCache] = None
+    """If set, deterministic calls are answered from this cache without acquiring a key"""
+
+    adaptive_estimates: bool = False
+    """Size each reservation from the request and learned usage instead of estimated_tokens"""
+
+    offload: Optional[OffloadConfig] = None
+    """If set, a sync client's calls run on a thread pool and are awaited (per-key in-flight caps)"""
+
+
+def _is_sync_stream(result: Any) -> bool:
+    """Whether a sync SDK call returned a stream (a generator or iterator of chunks)."""
+    if not hasattr(result, "__iter__") or isinstance(result, (str, bytes, dict, list)):
+        return False
+    return hasattr(result, "__next__") or inspect.isgenerator(result)
+
+
+def _release_unless_stream(release: Callable[[], None], future: "Future[Any]") -> None:
+    """Free an offloaded call's slot when it finishes, unless a stream still needs it."""
+    if future.cancelled() or future.exception() is not None or not _is_sync_stream(future.result()):
+        release()
+
+
+def _discard_stream(release: Callable[[], None], future: "Future[Any]") -> None:
+    """Close a stream returned to a cancelled caller and free its slot."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    result = future.result()
+    if _is_sync_stream(result):
+        close = getattr(result, "close", None)
+        if callable(close):
+            close()
+        release()
+
+
+def _new_temp_backoff() -> ExponentialBackoff:
+    return ExponentialBackoff(BackoffConfig(
+        initial_interval=TEMP_RATE_LIMIT_INITIAL_DELAY,
+        max_interval=TEMP_RATE_LIMIT_MAX_DELAY,
+        multiplier=TEMP_RATE_LIMIT_MULTIPLIER,
+    ))
+
 
 class BaseGenericRotatingClient(Generic[T]):
     """Base class for generic rotating clients."""
@@ -237,9 +324,23 @@ class BaseGenericRotatingClient(Generic[T]):
         self.default_model = default_model
         self.config = config
         self._usage_extractor = config.usage_extractor or default_usage_extractor
+        self._kwargs_cache: Dict[str, Tuple[dict, Hashable]] = {}
+        self._http_pool: Optional[SharedHttpPool] = None
+        if config.http_pool is not None:
+            self._http_pool = get_shared_http_pool(
+                manager.provider_name, bool(config.is_async), config.http_pool
+            )
+        self._client_cache: Optional[ClientCache] = self._new_client_cache()
+        # Async clients keep one cache per event loop instead (see _active_client_cache)
+        self._loop_caches: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ClientCache]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._proxies: Dict[str, Any] = {}
+        if config.response_cache is not None:
+            manager.register_response_cache(config.response_cache)
 
-    def _get_fresh_client(self, key_usage: KeyUsage) -> T:
-        """Create a fresh client instance with the key's params."""
+    def _build_client_kwargs(self, key_usage: KeyUsage) -> dict:
+        """Merge and filter constructor kwargs for a key."""
         key_params = key_usage.get_client_params()
 
         # Merge client_kwargs with key_params (key_params take precedence)
@@ -268,21 +369,143 @@ class BaseGenericRotatingClient(Generic[T]):
         else:
             final_kwargs = merged_kwargs
 
+        return final_kwargs
+
+    def _get_client_kwargs(self, key_usage: KeyUsage) -> Tuple[dict, Hashable]:
+        """
+        Return (constructor kwargs, cache key) for a key.
+
+        Filtering runs once per key; later calls are a dict lookup.
+        """
+        cached = self._kwargs_cache.get(key_usage.api_key)
+        if cached is None:
+            final_kwargs = self._build_client_kwargs(key_usage)
+            cached = (final_kwargs, (key_usage.api_key, freeze_kwargs(final_kwargs)))
+            self._kwargs_cache[key_usage.api_key] = cached
+        return cached
+
+    def _construct_client(self, final_kwargs: dict) -> T:
+        if self._http_pool is not None:
+            final_kwargs = {**final_kwargs, self.config.http_client_param: self._http_pool.get_client()}
         return self.config.client_class(**final_kwargs)
 
-    def _record_usage(self, key_usage: KeyUsage, model_id: str, actual_tokens: int) -> None:
-        """Record usage for a key."""
+    def _get_fresh_client(self, key_usage: KeyUsage) -> T:
+        """Create a fresh client instance with the key's params."""
+        final_kwargs, _ = self._get_client_kwargs(key_usage)
+        return self._construct_client(final_kwargs)
+
+    def _new_client_cache(self) -> Optional[ClientCache]:
+        if self.config.client_cache_size <= 0:
+            return None
+        # Clients on a shared transport must not close it when evicted
+        return ClientCache(self.config.client_cache_size, close_clients=self._http_pool is None)
+
+    def _active_client_cache(self) -> Optional[ClientCache]:
+        return self._client_cache
+
+    def _get_client(self, key_usage: KeyUsage) -> T:
+        """Return a live client for the key, reusing a cached instance when possible."""
+        cache = self._active_client_cache()
+        if cache is None:
+            return self._get_fresh_client(key_usage)
+        final_kwargs, cache_key = self._get_client_kwargs(key_usage)
+        return cache.get_or_create(cache_key, lambda: self._construct_client(final_kwargs))
+
+    def _get_target(self, key_usage: KeyUsage, path: Tuple[str, ...]) -> Callable[..., Any]:
+        """Return the bound method at path on a live client for the key."""
+        cache = self._active_client_cache()
+        if cache is None:
+            target = self._get_fresh_client(key_usage)
+            for p in path:
+                target = getattr(target, p)
+            return target
+        final_kwargs, cache_key = self._get_client_kwargs(key_usage)
+        return cache.get_target(cache_key, lambda: self._construct_client(final_kwargs), path)
+
+    def _get_proxy(self, name: str, proxy_class: Type) -> Any:
+        # Proxy chains are immutable, so each root attribute is built once and reused
+        proxy = self._proxies.get(name)
+        if proxy is None:
+            proxy = proxy_class(self, (name,))
+            self._proxies[name] = proxy
+        return proxy
+
+    def _estimate_tokens(self, model_id: str, args: tuple, kwargs: dict) -> TokenEstimate:
+        """Reservation for one call: learned per model if adaptive, else estimated_tokens."""
+        if not self.config.adaptive_estimates:
+            return TokenEstimate(self.config.estimated_tokens)
+        return self.manager.estimator.estimate(
+            model_id, args, kwargs, default_tokens=self.config.estimated_tokens
+        )
+
+    def _reserved(self, estimate: Optional[TokenEstimate]) -> int:
+        return self.config.estimated_tokens if estimate is None else estimate.tokens
+
+    def _record_usage(
+        self,
+        key_usage: KeyUsage,
+        model_id: str,
+        actual_tokens: int,
+        estimate: Optional[TokenEstimate] = None,
+        reserved_tokens: Optional[int] = None,
+    ) -> None:
+        """Record usage for a key, committing reserved_tokens (default: the call's estimate)."""
         self.manager.record_usage(
             key_obj=key_usage,
             model_id=model_id,
             actual_tokens=actual_tokens,
-            estimated_tokens=self.config.estimated_tokens,
+            estimated_tokens=self._reserved(estimate) if reserved_tokens is None else reserved_tokens,
+            estimate=estimate,
+        )
+
+    def _release_reservation(
+        self, key_usage: KeyUsage, model_id: str, estimate: Optional[TokenEstimate] = None
+    ) -> None:
+        """Hand back a key's reservation without recording a request."""
+        self.manager.release(
+            key_obj=key_usage,
+            model_id=model_id,
+            estimated_tokens=self._reserved(estimate),
+        )
+
+    def _new_stream_accounting(
+        self, key_usage: KeyUsage, model_id: str, args: tuple, kwargs: dict,
+        estimate: Optional[TokenEstimate] = None,
+    ) -> Tuple[StreamUsageAccumulator, UsageSettlement]:
+        """Build the running usage count for a stream and its exactly-once settlement."""
+        estimator = self.config.token_estimator or estimate_tokens_from_text
+        accumulator = StreamUsageAccumulator(
+            reserved_tokens=self._reserved(estimate),
+            top_up=lambda extra: self.manager.reserve(key_usage, model_id, extra),
+            prompt_tokens=estimate_request_tokens(args, kwargs, estimator),
+            estimator=estimator,
+            text_extractor=self.config.chunk_text_extractor,
         )
+        settle = UsageSettlement(lambda: self._record_usage(
+            key_usage, model_id, accumulator.total_tokens, estimate,
+            reserved_tokens=accumulator.reserved_tokens,
+        ))
+        return accumulator, settle
 
     def _extract_usage(self, response: Any) -> int:
         """Extract token usage from a response."""
         return self._usage_extractor(response)
 
+    def _coalesces(self, path: Tuple[str, ...], kwargs: dict) -> bool:
+        """Whether identical in-flight calls on this path share one request."""
+        return not kwargs.get("stream") and applies_to(self.config.single_flight, path)
+
+    def _cache_for(self, path: Tuple[str, ...], kwargs: dict) -> Optional[ResponseCache]:
+        """The response cache, if this call may be served from it."""
+        cache = self.config.response_cache
+        if cache is None or kwargs.get("stream") or not cache.is_cacheable(path, kwargs):
+            return None
+        return cache
+
+    def _request_key(self, path: Tuple[str, ...], args: tuple, kwargs: dict) -> Optional[str]:
+        # Provider and default model are part of the identity: a cache may be shared
+        return request_key((self.manager.provider_name, self.default_model) + path, args, kwargs)
+
     def _get_model_id(self, kwargs: dict) -> str:
         """Extract model ID from kwargs or use default."""
         return kwargs.get(self.config.model_param, self.default_model)
@@ -292,95 +515,154 @@ class SyncGenericRotatingClient(BaseGenericRotatingClient[T]):
     """Synchronous generic rotating client."""
 
     def __getattr__(self, name: str) -> "SyncGenericProxyHelper":
-        return SyncGenericProxyHelper(self, [name])
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self._get_proxy(name, SyncGenericProxyHelper)
+
+    def __init__(
+        self,
+        manager: RotatingKeyManager,
+        limit_resolver: Callable[[str, Optional[str]], RateLimits],
+        default_model: str,
+        config: GenericClientConfig,
+    ):
+        super().__init__(manager, limit_resolver, default_model, config)
+        self._single_flight = SingleFlight()
 
-    def _execute(self, path: List[str], args: tuple, kwargs: dict) -> Any:
+    def close(self) -> None:
+        """Close all cached client instances."""
+        if self._client_cache is not None:
+            self._client_cache.close()
+
+    def _execute(self, path: Tuple[str, ...], args: tuple, kwargs: dict) -> Any:
+        """
+        Execute a method call, answering it from the response cache or sharing it
+        with identical in-flight calls if configured.
+        """
+        cache = self._cache_for(path, kwargs)
+        coalesce = self._coalesces(path, kwargs)
+        if cache is None and not coalesce:
+            return self._execute_call(path, args, kwargs)
+
+        request = self._request_key(path, args, kwargs)
+        if request is None:
+            # Arguments without a JSON form cannot be told apart reliably
+            return self._execute_call(path, args, kwargs)
+        if cache is not None:
+            hit, response = cache.get(request)
+            if hit:
+                return response
+
+        def call() -> Any:
+            result = self._execute_call(path, args, kwargs)
+            if cache is not None:
+                cache.set(request, result)
+            return result
+
+        return self._single_flight.do(request, call) if coalesce else call()
+
+    def _execute_call(self, path: Tuple[str, ...], args: tuple, kwargs: dict) -> Any:
         """Execute a method call with key rotation."""
         model_id = self._get_model_id(kwargs)
         limits = self.limit_resolver(model_id, None)
+        estimate = self._estimate_tokens(model_id, args, kwargs)
 
         for attempt in range(self.config.max_retries + 1):
-            key_usage = self.manager.get_key(model_id, limits, self.config.estimated_tokens)
+            key_usage = self.manager.get_key(model_id, limits, estimate.tokens)
             if not key_usage:
                 raise RuntimeError(f"No available keys for {model_id}")
 
-            # Create backoff for temporary rate limits
-            temp_backoff = ExponentialBackoff(BackoffConfig(
-                initial_interval=TEMP_RATE_LIMIT_INITIAL_DELAY,
-                max_interval=TEMP_RATE_LIMIT_MAX_DELAY,
-                multiplier=TEMP_RATE_LIMIT_MULTIPLIER,
-            ))
-
-            for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
-                try:
-                    real_client = self._get_fresh_client(key_usage)
-
-                    # Navigate to the target method
-                    target = real_client
-                    for p in path:
-                        target = getattr(target, p)
-
-                    result = target(*args, **kwargs)
-
-                    # Handle streaming responses
-                    if hasattr(result, "__iter__") and not isinstance(result, (str, bytes, dict, list)):
-                        # Check if it looks like a generator/iterator
-                        if hasattr(result, "__next__") or inspect.isgenerator(result):
-                            return self._wrap_stream(result, key_usage, model_id)
-
-                    self._record_usage(key_usage, model_id, self._extract_usage(result))
-                    return result
-
-                except Exception as e:
-                    # Check for temporary rate limit first - retry with SAME key
-                    if is_temporary_rate_limit_error(e) and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES:
-                        delay = temp_backoff.get_next_interval()
-                        logger.info(
-                            "Temporary rate limit on key ...%s for %s. Waiting %.1fs (%d/%d).",
-                            get_key_suffix(key_usage.api_key), model_id, delay,
-                            temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
-                        )
-                        time.sleep(delay)
-                        continue  # Retry with SAME key
-
-                    # Hard rate limit - rotate to next key
-                    if is_rate_limit_error(e) and attempt < self.config.max_retries:
+            # Until usage is recorded, leaving this key (rotation, cancellation,
+            # KeyboardInterrupt) must hand its reservation back
+            settled = False
+            try:
+                # Backoff for temporary rate limits, created on first use
+                temp_backoff: Optional[ExponentialBackoff] = None
+
+                for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
+                    try:
+                        target = self._get_target(key_usage, path)
+                        result = target(*args, **kwargs)
+
+                        # Handle streaming responses
+                        if _is_sync_stream(result):
+                            settled = True
+                            return self._wrap_stream(
+                                result, key_usage, model_id, args, kwargs, estimate
+                            )
+
+                        self._record_usage(key_usage, model_id, self._extract_usage(result), estimate)
+                        settled = True
+                        return result
+
+                    except Exception as e:
+                        # Check for temporary rate limit first - retry with SAME key
+                        if is_temporary_rate_limit_error(e) and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES:
+                            if temp_backoff is None:
+                                temp_backoff = _new_temp_backoff()
+                            delay = temp_backoff.get_next_interval()
+                            logger.info(
+                                "Temporary rate limit on key ...%s for %s. Waiting %.1fs (%d/%d).",
+                                get_key_suffix(key_usage.api_key), model_id, delay,
+                                temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
+                            )
+                            time.sleep(delay)
+                            continue  # Retry with SAME key
+
+                        # Hard rate limit - rotate to next key
+                        if is_rate_limit_error(e) and attempt < self.config.max_retries:
+                            logger.warning(
+                                "429/RateLimit hit for %s on key ...%s. Rotating. (Attempt %d/%d)",
+                                model_id, get_key_suffix(key_usage.api_key),
+                                attempt + 1, self.config.max_retries + 1
+                            )
+                            self.manager.trigger_cooldown(key_usage, e)
+                            self.manager.force_rotate_index()
+                            time.sleep(KEY_ROTATION_DELAY_SECONDS)
+                            break  # Break inner loop, continue outer loop with new key
+
+                        self.manager.disable_if_invalid(key_usage, e)
+                        self._record_usage(key_usage, model_id, 0, estimate)
+                        settled = True
+                        raise
+                else:
+                    # Inner loop exhausted without success - continue to next key
+                    if attempt < self.config.max_retries:
                         logger.warning(
-                            "429/RateLimit hit for %s on key ...%s. Rotating. (Attempt %d/%d)",
-                            model_id, get_key_suffix(key_usage.api_key),
-                            attempt + 1, self.config.max_retries + 1
+                            "Temporary rate limit retries exhausted for key ...%s. Rotating.",
+                            get_key_suffix(key_usage.api_key)
                         )
-                        key_usage.trigger_cooldown()
+                        self.manager.trigger_cooldown(key_usage)
                         self.manager.force_rotate_index()
-                        time.sleep(KEY_ROTATION_DELAY_SECONDS)
-                        break  # Break inner loop, continue outer loop with new key
-
-                    self._record_usage(key_usage, model_id, 0)
-                    raise
-            else:
-                # Inner loop exhausted without success - continue to next key
-                if attempt < self.config.max_retries:
-                    logger.warning(
-                        "Temporary rate limit retries exhausted for key ...%s. Rotating.",
-                        get_key_suffix(key_usage.api_key)
-                    )
-                    key_usage.trigger_cooldown()
-                    self.manager.force_rotate_index()
-                    continue
+                        continue
+            finally:
+                if not settled:
+                    self._release_reservation(key_usage, model_id, estimate)
 
         raise RuntimeError(f"All retry attempts exhausted for {model_id}")
 
     def _wrap_stream(
-        self, generator: Generator, key_usage: KeyUsage, model_id: str
+        self, generator: Generator, key_usage: KeyUsage, model_id: str,
+        args: tuple = (), kwargs: Optional[dict] = None, estimate: Optional[TokenEstimate] = None,
+    ) -> Generator:
+        """
+        Wrap a streaming response to track usage and handle errors.
+
+        Reported usage is used when a chunk carries it; otherwise tokens are
+        estimated from the chunks' text as they arrive.
+        """
+        accumulator, settle = self._new_stream_accounting(
+            key_usage, model_id, args, kwargs or {}, estimate
+        )
+        return settle.guard(self._stream_chunks(generator, key_usage, model_id, accumulator, settle))
+
+    def _stream_chunks(
+        self, generator: Generator, key_usage: KeyUsage, model_id: str,
+        accumulator: StreamUsageAccumulator, settle: UsageSettlement,
     ) -> Generator:
-        """Wrap a streaming response to track usage and handle errors."""
-        final_tokens = 0
         try:
             for chunk in generator:
-                # Try to extract usage from streaming chunks
-                chunk_tokens = self._extract_usage(chunk)
-                if chunk_tokens:
-                    final_tokens = chunk_tokens
+                accumulator.add(chunk, self._extract_usage(chunk))
                 yield chunk
         except Exception as e:
             if is_rate_limit_error(e):
@@ -388,22 +670,33 @@ class SyncGenericRotatingClient(BaseGenericRotatingClient[T]):
                     "Rate limit hit during streaming for %s on key ...%s.",
                     model_id, get_key_suffix(key_usage.api_key)
                 )
-                key_usage.trigger_cooldown()
+                self.manager.trigger_cooldown(key_usage, e)
                 self.manager.force_rotate_index()
             raise
         finally:
-            self._record_usage(key_usage, model_id, final_tokens)
+            settle()
 
 
 class SyncGenericProxyHelper:
-    """Helper class to build attribute path chains for sync clients."""
+    """
+    Helper class to build attribute path chains for sync clients.
 
-    def __init__(self, client: SyncGenericRotatingClient, path: List[str]):
+    Child proxies are cached, so repeated access to the same chain allocates nothing.
+    """
+
+    def __init__(self, client: SyncGenericRotatingClient, path: Tuple[str, ...]):
         self.client = client
         self.path = path
+        self._children: Dict[str, "SyncGenericProxyHelper"] = {}
 
     def __getattr__(self, name: str) -> "SyncGenericProxyHelper":
-        return SyncGenericProxyHelper(self.client, self.path + [name])
+        if name.startswith("__"):
+            raise AttributeError(name)
+        child = self._children.get(name)
+        if child is None:
+            child = SyncGenericProxyHelper(self.client, self.path + (name,))
+            self._children[name] = child
+        return child
 
     def __call__(self, *args, **kwargs) -> Any:
         return self.client._execute(self.path, args, kwargs)
@@ -412,94 +705,218 @@ class SyncGenericProxyHelper:
 class AsyncGenericRotatingClient(BaseGenericRotatingClient[T]):
     """Asynchronous generic rotating client."""
 
+    def __init__(
+        self,
+        manager: RotatingKeyManager,
+        limit_resolver: Callable[[str, Optional[str]], RateLimits],
+        default_model: str,
+        config: GenericClientConfig,
+    ):
+        super().__init__(manager, limit_resolver, default_model, config)
+        self._hedger: Optional[Hedger] = Hedger(config.hedge) if config.hedge else None
+        self._single_flight = AsyncSingleFlight()
+
     def __getattr__(self, name: str) -> "AsyncGenericProxyHelper":
-        return AsyncGenericProxyHelper(self, [name])
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self._get_proxy(name, AsyncGenericProxyHelper)
+
+    def _active_client_cache(self) -> Optional[ClientCache]:
+        # Async SDK clients hold connections bound to the loop they were used on, so
+        # each loop gets its own cache. A cache goes away with its loop, and going
+        # back to a loop that is still alive reuses its clients.
+        loop = asyncio.get_running_loop()
+        cache = self._loop_caches.get(loop)
+        if cache is None:
+            cache = self._new_client_cache()
+            if cache is None:
+                return None
+            self._loop_caches[loop] = cache
+        return cache
+
+    async def close(self) -> None:
+        """Close the clients cached for the running event loop."""
+        cache = self._loop_caches.pop(asyncio.get_running_loop(), None)
+        if cache is not None:
+            await cache.aclose()
+
+    async def _acquire_key(
+        self,
+        model_id: str,
+        limits: RateLimits,
+        estimate: TokenEstimate,
+        keys_in_use: Optional[Set[str]] = None,
+    ) -> Optional[KeyUsage]:
+        """Reserve a key for one attempt, skipping keys already used by a hedged twin."""
+        if keys_in_use:
+            return self.manager.get_key(model_id, limits, estimate.tokens, exclude=keys_in_use)
+        return self.manager.get_key(model_id, limits, estimate.tokens)
+
+    async def _invoke(
+        self, key_usage: KeyUsage, target: Callable[..., Any], args: tuple, kwargs: dict
+    ) -> Any:
+        """Call the SDK method on the key's client."""
+        return await target(*args, **kwargs)
+
+    async def _execute(self, path: Tuple[str, ...], args: tuple, kwargs: dict) -> Any:
+        """
+        Execute a method call, answering it from the response cache or sharing it
+        with identical in-flight calls if configured.
+        """
+        cache = self._cache_for(path, kwargs)
+        coalesce = self._coalesces(path, kwargs)
+        if cache is None and not coalesce:
+            return await self._execute_call(path, args, kwargs)
+
+        request = self._request_key(path, args, kwargs)
+        if request is None:
+            # Arguments without a JSON form cannot be told apart reliably
+            return await self._execute_call(path, args, kwargs)
+        if cache is not None:
+            hit, response = cache.get(request)
+            if hit:
+                return response
+
+        async def call() -> Any:
+            result = await self._execute_call(path, args, kwargs)
+            if cache is not None:
+                cache.set(request, result)
+            return result
+
+        return await (self._single_flight.do(request, call) if coalesce else call())
+
+    async def _execute_call(self, path: Tuple[str, ...], args: tuple, kwargs: dict) -> Any:
+        """Execute a method call with key rotation (async), hedging it if configured."""
+        if self._hedger is None or kwargs.get("stream"):
+            return await self._execute_attempt(path, args, kwargs)
+        return await self._hedger.run(
+            self._get_model_id(kwargs),
+            lambda keys_in_use: self._execute_attempt(path, args, kwargs, keys_in_use),
+        )
 
-    async def _execute(self, path: List[str], args: tuple, kwargs: dict) -> Any:
-        """Execute a method call with key rotation (async)."""
+    async def _execute_attempt(
+        self,
+        path: Tuple[str, ...],
+        args: tuple,
+        kwargs: dict,
+        keys_in_use: Optional[Set[str]] = None,
+    ) -> Any:
+        """
+        Run one call with key rotation.
+
+        keys_in_use is shared between a call and its hedge so they pick different keys.
+        """
         model_id = self._get_model_id(kwargs)
         limits = self.limit_resolver(model_id, None)
+        estimate = self._estimate_tokens(model_id, args, kwargs)
 
         for attempt in range(self.config.max_retries + 1):
-            key_usage = self.manager.get_key(model_id, limits, self.config.estimated_tokens)
+            key_usage = await self._acquire_key(model_id, limits, estimate, keys_in_use)
             if not key_usage:
                 raise RuntimeError(f"No available keys for {model_id}")
-
-            # Create backoff for temporary rate limits
-            temp_backoff = ExponentialBackoff(BackoffConfig(
-                initial_interval=TEMP_RATE_LIMIT_INITIAL_DELAY,
-                max_interval=TEMP_RATE_LIMIT_MAX_DELAY,
-                multiplier=TEMP_RATE_LIMIT_MULTIPLIER,
-            ))
-
-            for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
-                try:
-                    real_client = self._get_fresh_client(key_usage)
-
-                    # Navigate to the target method
-                    target = real_client
-                    for p in path:
-                        target = getattr(target, p)
-
-                    result = await target(*args, **kwargs)
-
-                    # Handle async streaming responses
-                    if hasattr(result, "__aiter__"):
-                        return self._wrap_stream(result, key_usage, model_id)
-
-                    self._record_usage(key_usage, model_id, self._extract_usage(result))
-                    return result
-
-                except Exception as e:
-                    # Check for temporary rate limit first - retry with SAME key
-                    if is_temporary_rate_limit_error(e) and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES:
-                        delay = temp_backoff.get_next_interval()
-                        logger.info(
-                            "Temporary rate limit on key ...%s for %s. Waiting %.1fs (%d/%d).",
-                            get_key_suffix(key_usage.api_key), model_id, delay,
-                            temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
-                        )
-                        await asyncio.sleep(delay)
-                        continue  # Retry with SAME key
-
-                    # Hard rate limit - rotate to next key
-                    if is_rate_limit_error(e) and attempt < self.config.max_retries:
+            if keys_in_use is not None:
+                keys_in_use.add(key_usage.api_key)
+
+            # Until usage is recorded, leaving this key (rotation, cancellation,
+            # KeyboardInterrupt) must hand its reservation back
+            settled = False
+            try:
+                # Backoff for temporary rate limits, created on first use
+                temp_backoff: Optional[ExponentialBackoff] = None
+
+                for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
+                    try:
+                        target = self._get_target(key_usage, path)
+                        result = await self._invoke(key_usage, target, args, kwargs)
+
+                        # Handle async streaming responses
+                        if hasattr(result, "__aiter__"):
+                            settled = True
+                            return self._wrap_stream(
+                                result, key_usage, model_id, args, kwargs, estimate
+                            )
+
+                        self._record_usage(key_usage, model_id, self._extract_usage(result), estimate)
+                        settled = True
+                        return result
+
+                    except asyncio.CancelledError:
+                        # Cancelled mid-request (e.g. a losing hedge): the provider still bills
+                        # it, so commit the estimate, as the request's tokens are unknown
+                        reserved = self._reserved(estimate)
+                        self._record_usage(key_usage, model_id, reserved, reserved_tokens=reserved)
+                        settled = True
+                        raise
+
+                    except Exception as e:
+                        # Check for temporary rate limit first - retry with SAME key
+                        if is_temporary_rate_limit_error(e) and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES:
+                            if temp_backoff is None:
+                                temp_backoff = _new_temp_backoff()
+                            delay = temp_backoff.get_next_interval()
+                            logger.info(
+                                "Temporary rate limit on key ...%s for %s. Waiting %.1fs (%d/%d).",
+                                get_key_suffix(key_usage.api_key), model_id, delay,
+                                temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
+                            )
+                            await asyncio.sleep(delay)
+                            continue  # Retry with SAME key
+
+                        # Hard rate limit - rotate to next key
+                        if is_rate_limit_error(e) and attempt < self.config.max_retries:
+                            logger.warning(
+                                "429/RateLimit hit for %s on key ...%s. Rotating. (Attempt %d/%d)",
+                                model_id, get_key_suffix(key_usage.api_key),
+                                attempt + 1, self.config.max_retries + 1
+                            )
+                            self.manager.trigger_cooldown(key_usage, e)
+                            self.manager.force_rotate_index()
+                            await asyncio.sleep(KEY_ROTATION_DELAY_SECONDS)
+                            break  # Break inner loop, continue outer loop with new key
+
+                        self.manager.disable_if_invalid(key_usage, e)
+                        self._record_usage(key_usage, model_id, 0, estimate)
+                        settled = True
+                        raise
+                else:
+                    # Inner loop exhausted without success - continue to next key
+                    if attempt < self.config.max_retries:
                         logger.warning(
-                            "429/RateLimit hit for %s on key ...%s. Rotating. (Attempt %d/%d)",
-                            model_id, get_key_suffix(key_usage.api_key),
-                            attempt + 1, self.config.max_retries + 1
+                            "Temporary rate limit retries exhausted for key ...%s. Rotating.",
+                            get_key_suffix(key_usage.api_key)
                         )
-                        key_usage.trigger_cooldown()
+                        self.manager.trigger_cooldown(key_usage)
                         self.manager.force_rotate_index()
-                        await asyncio.sleep(KEY_ROTATION_DELAY_SECONDS)
-                        break  # Break inner loop, continue outer loop with new key
-
-                    self._record_usage(key_usage, model_id, 0)
-                    raise
-            else:
-                # Inner loop exhausted without success - continue to next key
-                if attempt < self.config.max_retries:
-                    logger.warning(
-                        "Temporary rate limit retries exhausted for key ...%s. Rotating.",
-                        get_key_suffix(key_usage.api_key)
-                    )
-                    key_usage.trigger_cooldown()
-                    self.manager.force_rotate_index()
-                    continue
+                        continue
+            finally:
+                if not settled:
+                    self._release_reservation(key_usage, model_id, estimate)
 
         raise RuntimeError(f"All retry attempts exhausted for {model_id}")
 
-    async def _wrap_stream(
-        self, generator: AsyncGenerator, key_usage: KeyUsage, model_id: str
+    def _wrap_stream(
+        self, generator: AsyncGenerator, key_usage: KeyUsage, model_id: str,
+        args: tuple = (), kwargs: Optional[dict] = None, estimate: Optional[TokenEstimate] = None,
+    ) -> AsyncGenerator:
+        """
+        Wrap an async streaming response to track usage and handle errors.
+
+        Usage is recorded when the stream finishes, fails, is closed or cancelled,
+        or is garbage collected without ever being iterated. Without reported
+        usage, tokens are estimated from the chunks' text as they arrive.
+        """
+        accumulator, settle = self._new_stream_accounting(
+            key_usage, model_id, args, kwargs or {}, estimate
+        )
+        return settle.guard(self._stream_chunks(generator, key_usage, model_id, accumulator, settle))
+
+    async def _stream_chunks(
+        self, generator: AsyncGenerator, key_usage: KeyUsage, model_id: str,
+        accumulator: StreamUsageAccumulator, settle: UsageSettlement,
     ) -> AsyncGenerator:
-        """Wrap an async streaming response to track usage and handle errors."""
-        final_tokens = 0
         try:
             async for chunk in generator:
-                # Try to extract usage from streaming chunks
-                chunk_tokens = self._extract_usage(chunk)
-                if chunk_tokens:
-                    final_tokens = chunk_tokens
+                accumulator.add(chunk, self._extract_usage(chunk))
                 yield chunk
         except Exception as e:
             if is_rate_limit_error(e):
@@ -507,22 +924,124 @@ class AsyncGenericRotatingClient(BaseGenericRotatingClient[T]):
                     "Rate limit hit during streaming for %s on key ...%s.",
                     model_id, get_key_suffix(key_usage.api_key)
                 )
-                key_usage.trigger_cooldown()
+                self.manager.trigger_cooldown(key_usage, e)
                 self.manager.force_rotate_index()
             raise
         finally:
-            self._record_usage(key_usage, model_id, final_tokens)
+            settle()
+
+
+class OffloadedAsyncRotatingClient(AsyncGenericRotatingClient[T]):
+    """
+    Awaitable rotating client for a sync-only SDK.
+
+    Every call runs on a thread pool owned by this client. At most
+    max_in_flight_per_key calls run on one key at a time: key acquisition skips
+    keys at their cap and waits for a slot when every usable key is busy. A slot
+    is held until the worker thread returns, even if the awaiting task was
+    cancelled. Sync streams are read chunk by chunk on the pool and exposed as
+    async generators.
+    """
+
+    def __init__(
+        self,
+        manager: RotatingKeyManager,
+        limit_resolver: Callable[[str, Optional[str]], RateLimits],
+        default_model: str,
+        config: GenericClientConfig,
+    ):
+        super().__init__(manager, limit_resolver, default_model, config)
+        offload = config.offload or OffloadConfig()
+        self._slots = KeySlots(offload.max_in_flight_per_key)
+        workers = offload.max_workers or offload.max_in_flight_per_key * max(1, len(manager.keys))
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix=f"keycycle-{manager.provider_name}"
+        )
+
+    def _active_client_cache(self) -> Optional[ClientCache]:
+        # Sync clients are not bound to an event loop
+        return self._client_cache
+
+    async def close(self) -> None:
+        """Wait for running calls, stop the thread pool and close cached clients."""
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        if self._client_cache is not None:
+            await self._client_cache.aclose()
+
+    async def _acquire_key(
+        self,
+        model_id: str,
+        limits: RateLimits,
+        estimate: TokenEstimate,
+        keys_in_use: Optional[Set[str]] = None,
+    ) -> Optional[KeyUsage]:
+        """Reserve a key below its in-flight cap, waiting while every usable key is busy."""
+        backoff: Optional[ExponentialBackoff] = None
+        while True:
+            busy = self._slots.saturated()
+            exclude = busy | keys_in_use if keys_in_use else busy
+            key_usage = self.manager.get_key(
+                model_id, limits, estimate.tokens, exclude=exclude or None
+            )
+            if key_usage is not None or not busy:
+                return key_usage
+            if backoff is None:
+                backoff = ExponentialBackoff(BackoffConfig(
+                    initial_interval=OFFLOAD_SLOT_POLL_INITIAL,
+                    max_interval=OFFLOAD_SLOT_POLL_MAX,
+                ))
+            await asyncio.sleep(backoff.get_next_interval())
+
+    async def _invoke(
+        self, key_usage: KeyUsage, target: Callable[..., Any], args: tuple, kwargs: dict
+    ) -> Any:
+        """
+        Run the blocking SDK method on the thread pool under the key's in-flight slot.
+
+        A streamed result keeps the slot until the stream is exhausted, closed or dropped,
+        since every chunk is read on the same pool.
+        """
+        release = self._slots.lease(key_usage.api_key)
+        try:
+            future = self._executor.submit(functools.partial(target, *args, **kwargs))
+        except BaseException:
+            release()
+            raise
+        future.add_done_callback(functools.partial(_release_unless_stream, release))
+        try:
+            result = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Nobody will read a stream the call still returns
+            future.add_done_callback(functools.partial(_discard_stream, release))
+            raise
+        if not _is_sync_stream(result):
+            return result
+        stream = iterate_in_thread(result, self._executor, on_close=release)
+        # An async generator that is never iterated never runs its finally
+        weakref.finalize(stream, release)
+        return stream
 
 
 class AsyncGenericProxyHelper:
-    """Helper class to build attribute path chains for async clients."""
+    """
+    Helper class to build attribute path chains for async clients.
 
-    def __init__(self, client: AsyncGenericRotatingClient, path: List[str]):
+    Child proxies are cached, so repeated access to the same chain allocates nothing.
+    """
+
+    def __init__(self, client: AsyncGenericRotatingClient, path: Tuple[str, ...]):
         self.client = client
         self.path = path
+        self._children: Dict[str, "AsyncGenericProxyHelper"] = {}
 
     def __getattr__(self, name: str) -> "AsyncGenericProxyHelper":
-        return AsyncGenericProxyHelper(self.client, self.path + [name])
+        if name.startswith("__"):
+            raise AttributeError(name)
+        child = self._children.get(name)
+        if child is None:
+            child = AsyncGenericProxyHelper(self.client, self.path + (name,))
+            self._children[name] = child
+        return child
 
     async def __call__(self, *args, **kwargs) -> Any:
         return await self.client._execute(self.path, args, kwargs)
@@ -540,6 +1059,16 @@ def create_rotating_client(
     max_retries: int = 5,
     model_param: str = "model",
     excluded_kwargs: Optional[List[str]] = None,
+    client_cache_size: int = DEFAULT_CLIENT_CACHE_SIZE,
+    http_pool: Optional[HttpPoolConfig] = None,
+    http_client_param: str = "http_client",
+    hedge: Optional[HedgeConfig] = None,
+    token_estimator: Optional[Callable[[str], int]] = None,
+    chunk_text_extractor: Optional[Callable[[Any], str]] = None,
+    single_flight: Union[bool, Collection[str]] = False,
+    response_cache: Optional[ResponseCache] = None,
+    adaptive_estimates: bool = False,
+    offload: Optional[OffloadConfig] = None,
     **client_kwargs,
 ) -> Union[SyncGenericRotatingClient[T], AsyncGenericRotatingClient[T]]:
     """
@@ -557,6 +1086,28 @@ def create_rotating_client(
         max_retries: Maximum number of key rotations on rate limit errors
         model_param: Name of the model parameter in API calls
         excluded_kwargs: List of kwarg names to explicitly exclude from client constructor
+        client_cache_size: Maximum number of live client instances reused across calls
+            (one per key is enough). 0 builds a fresh client for every call.
+        http_pool: Limits for a shared httpx connection pool. If set, every client built
+            for this provider receives the same httpx client, so keys share warm connections
+        http_client_param: Name of the constructor parameter that accepts an httpx client
+        hedge: Hedging settings (async clients only). A non-streaming call slower than the
+            configured latency percentile is duplicated on a second key; the first success wins
+        token_estimator: Estimates tokens in a piece of text, used for streams that end
+            without reporting usage (default: chars / 4)
+        chunk_text_extractor: Pulls the generated text out of a stream chunk
+            (default handles OpenAI, Anthropic, Cohere and Gemini chunk shapes)
+        single_flight: Coalesce concurrent identical non-streaming calls into one request
+            and one key reservation; callers share the same response object. True for
+            every path, or a collection of dotted paths such as {"embeddings.create"}
+        response_cache: Serve deterministic calls (embeddings, temperature 0) from this
+            cache; hits skip key acquisition and use no RPM/TPM
+        adaptive_estimates: Size each reservation from the prompt, max_tokens and the
+            provider's learned actual/predicted ratio for the model; estimated_tokens
+            becomes the fallback for calls whose size cannot be predicted
+        offload: Serve a sync-only client to asyncio code: calls run on a managed
+            thread pool and are awaited, with a per-key cap on in-flight calls.
+            Returns an OffloadedAsyncRotatingClient
         **client_kwargs: Additional kwargs to pass to the client constructor
 
     Returns:
@@ -581,10 +1132,40 @@ def create_rotating_client(
         ...     default_model="pegasus-1",
         ...     excluded_kwargs=["model"],  # TwelveLabs doesn't accept model
         ... )
+
+        >>> # All keys share one pool of warm connections to the provider
+        >>> client = create_rotating_client(
+        ...     Anthropic,
+        ...     manager=wrapper.manager,
+        ...     limit_resolver=wrapper._resolve_limits,
+        ...     default_model="claude-3-sonnet",
+        ...     http_pool=HttpPoolConfig(max_connections=50, max_keepalive_connections=20),
+        ... )
+
+        >>> # Race a second key when a call is slower than p95, within 5% extra RPM
+        >>> client = create_rotating_client(
+        ...     AsyncAnthropic,
+        ...     manager=wrapper.manager,
+        ...     limit_resolver=wrapper._resolve_limits,
+        ...     default_model="claude-3-sonnet",
+        ...     hedge=HedgeConfig(percentile=0.95, budget=0.05),
+        ... )
+
+        >>> # Await a sync-only SDK without blocking the event loop
+        >>> client = create_rotating_client(
+        ...     cohere.Client,
+        ...     manager=wrapper.manager,
+        ...     limit_resolver=wrapper._resolve_limits,
+        ...     default_model="embed-english-v3.0",
+        ...     offload=OffloadConfig(max_in_flight_per_key=2),
+        ... )
+        >>> response = await client.embed(texts=["hello"], model="embed-english-v3.0")
     """
     # Auto-detect async if not specified
     if is_async is None:
         is_async = detect_async_client(client_class)
+    if offload is not None and is_async:
+        raise ValueError(f"offload is for sync-only clients; {client_class.__name__} is already async")
 
     # Introspect valid constructor kwargs
     valid_kwargs = get_valid_constructor_kwargs(client_class)
@@ -600,8 +1181,25 @@ def create_rotating_client(
         client_kwargs=client_kwargs,
         excluded_kwargs=frozenset(excluded_kwargs or []),
         valid_kwargs=valid_kwargs,
+        client_cache_size=client_cache_size,
+        http_pool=http_pool,
+        http_client_param=http_client_param,
+        hedge=hedge,
+        token_estimator=token_estimator,
+        chunk_text_extractor=chunk_text_extractor,
+        single_flight=single_flight,
+        response_cache=response_cache,
+        adaptive_estimates=adaptive_estimates,
+        offload=offload,
     )
 
+    if offload is not None:
+        return OffloadedAsyncRotatingClient(
+            manager=manager,
+            limit_resolver=limit_resolver,
+            default_model=default_model,
+            config=config,
+        )
     if is_async:
         return AsyncGenericRotatingClient(
             manager=manager,
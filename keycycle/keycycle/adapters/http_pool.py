@@ -0,0 +1,124 @@
+"""
+Shared HTTP transport for all rotated clients of a provider.
+
+Every SDK client normally owns its own connection pool, so N keys hitting the same
+host keep N separate sets of connections. A SharedHttpPool hands one httpx client to
+every SDK client built for a provider so all keys multiplex over the same warm
+connections.
+"""
+
+import asyncio
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from ..config.constants import (
+    HTTP_POOL_MAX_CONNECTIONS,
+    HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_POOL_KEEPALIVE_EXPIRY,
+)
+
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+
+@dataclass(frozen=True)
+class HttpPoolConfig:
+    """Tunable limits for a shared HTTP connection pool."""
+    max_connections: Optional[int] = HTTP_POOL_MAX_CONNECTIONS
+    max_keepalive_connections: Optional[int] = HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS
+    keepalive_expiry: Optional[float] = HTTP_POOL_KEEPALIVE_EXPIRY
+    timeout: Optional[float] = None  # None keeps the SDK's own timeout
+    http2: bool = False
+
+
+class SharedHttpPool:
+    """
+    Lazily-built shared httpx client.
+
+    Sync pools hold a single httpx.Client. Async pools hold one httpx.AsyncClient
+    per event loop, because async connections cannot move between loops.
+    """
+
+    def __init__(self, config: Optional[HttpPoolConfig] = None, is_async: bool = False):
+        if not HAS_HTTPX:
+            raise ImportError("The 'httpx' library is required for shared HTTP pools. Install with `pip install httpx`.")
+        self.config = config or HttpPoolConfig()
+        self.is_async = is_async
+        self._lock = threading.Lock()
+        self._client: Optional[Any] = None
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _build_kwargs(self) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {
+            "limits": httpx.Limits(
+                max_connections=self.config.max_connections,
+                max_keepalive_connections=self.config.max_keepalive_connections,
+                keepalive_expiry=self.config.keepalive_expiry,
+            ),
+            "http2": self.config.http2,
+        }
+        if self.config.timeout is not None:
+            kwargs["timeout"] = self.config.timeout
+        return kwargs
+
+    def get_client(self) -> Any:
+        """Return the shared httpx client, creating it on first use."""
+        if not self.is_async:
+            with self._lock:
+                if self._client is None or self._client.is_closed:
+                    self._client = httpx.Client(**self._build_kwargs())
+                return self._client
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(**self._build_kwargs())
+                self._async_clients[loop] = client
+            return client
+
+    def close(self) -> None:
+        """Close the sync client. Async clients must be closed with aclose()."""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self) -> None:
+        """Close the async client bound to the running loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+
+_pools: Dict[Tuple[str, bool, HttpPoolConfig], SharedHttpPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_shared_http_pool(
+    provider: str,
+    is_async: bool,
+    config: Optional[HttpPoolConfig] = None,
+) -> SharedHttpPool:
+    """
+    Get the process-wide shared pool for a provider.
+
+    Rotating clients of the same provider, mode and config share one pool.
+    """
+    config = config or HttpPoolConfig()
+    pool_key = (str(provider).lower(), is_async, config)
+    with _pools_lock:
+        pool = _pools.get(pool_key)
+        if pool is None:
+            pool = SharedHttpPool(config, is_async=is_async)
+            _pools[pool_key] = pool
+        return pool
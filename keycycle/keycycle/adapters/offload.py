@@ -0,0 +1,111 @@
+"""
+Awaitable access to sync-only SDK clients.
+
+Some SDKs (older Cohere and TwelveLabs clients, for example) only ship blocking
+clients. Calling them from an event loop stalls every other task, so the
+offloaded adapter runs each call on a thread pool owned by the rotating client
+and awaits the result. KeySlots caps how many of those calls run on one key at
+a time, so a burst of tasks spreads across the pool instead of piling onto
+whichever key the round robin handed out first.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Callable, Dict, Iterator, Optional, Set
+
+from ..config.constants import OFFLOAD_MAX_IN_FLIGHT_PER_KEY
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class OffloadConfig:
+    """Configuration for running a sync client behind an awaitable interface."""
+    max_in_flight_per_key: int = OFFLOAD_MAX_IN_FLIGHT_PER_KEY
+    """Concurrent calls allowed on one key; further calls go to other keys or wait"""
+
+    max_workers: Optional[int] = None
+    """Thread pool size. None sizes it to max_in_flight_per_key for every key"""
+
+    def __post_init__(self):
+        if self.max_in_flight_per_key < 1:
+            raise ValueError(
+                f"max_in_flight_per_key must be at least 1, got: {self.max_in_flight_per_key}"
+            )
+        if self.max_workers is not None and self.max_workers < 1:
+            raise ValueError(f"max_workers must be at least 1, got: {self.max_workers}")
+
+
+class KeySlots:
+    """Thread-safe count of in-flight calls per key against a fixed cap."""
+
+    def __init__(self, cap: int):
+        self.cap = cap
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, api_key: str) -> None:
+        with self._lock:
+            self._counts[api_key] = self._counts.get(api_key, 0) + 1
+
+    def release(self, api_key: str) -> None:
+        with self._lock:
+            count = self._counts.get(api_key, 0) - 1
+            if count > 0:
+                self._counts[api_key] = count
+            else:
+                self._counts.pop(api_key, None)
+
+    def lease(self, api_key: str) -> Callable[[], None]:
+        """Take a slot and return a function that gives it back; calls after the first do nothing."""
+        self.acquire(api_key)
+        held = [True]
+
+        def release() -> None:
+            with self._lock:
+                if not held[0]:
+                    return
+                held[0] = False
+            self.release(api_key)
+
+        return release
+
+    def in_flight(self, api_key: str) -> int:
+        with self._lock:
+            return self._counts.get(api_key, 0)
+
+    def saturated(self) -> Set[str]:
+        """Keys that are at their cap."""
+        with self._lock:
+            return {key for key, count in self._counts.items() if count >= self.cap}
+
+
+async def iterate_in_thread(
+    iterator: Iterator[Any], executor: Executor, on_close: Optional[Callable[[], None]] = None
+) -> AsyncGenerator:
+    """
+    Expose a blocking iterator as an async generator, pulling each item on executor.
+
+    on_close runs once the iterator is exhausted or closed.
+    """
+    loop = asyncio.get_running_loop()
+    done = object()
+    try:
+        while True:
+            item = await loop.run_in_executor(executor, next, iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if callable(close):
+            try:
+                close()
+            except ValueError:
+                # Still executing next() on a worker after a cancellation; it finishes there
+                logger.debug("Offloaded stream closed while a chunk was being read")
+        if on_close is not None:
+            on_close()
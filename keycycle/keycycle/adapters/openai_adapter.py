@@ -1,7 +1,8 @@
 import asyncio
 import logging
 import time
-from typing import List, Any, Optional, Callable, Generator, AsyncGenerator
+import weakref
+from typing import Dict, Any, Optional, Callable, Generator, AsyncGenerator, Set, Tuple
 
 from ..config.dataclasses import KeyUsage, RateLimits
 from ..config.constants import (
@@ -10,10 +11,24 @@ from ..config.constants import (
     TEMP_RATE_LIMIT_MAX_DELAY,
     TEMP_RATE_LIMIT_MULTIPLIER,
     KEY_ROTATION_DELAY_SECONDS,
+    DEFAULT_CLIENT_CACHE_SIZE,
 )
 from ..core.utils import is_rate_limit_error, is_temporary_rate_limit_error, get_key_suffix
 from ..core.backoff import ExponentialBackoff, BackoffConfig
+from ..core.hedging import HedgeConfig, Hedger
+from ..core.single_flight import request_key
+from ..cache.response_cache import ResponseCache
 from ..key_rotation.rotation_manager import RotatingKeyManager
+from .client_cache import ClientCache
+from .settlement import UsageSettlement
+from ..usage.token_estimator import TokenEstimate
+from ..usage.stream_usage import (
+    StreamUsageAccumulator,
+    TokenEstimator,
+    estimate_request_tokens,
+    estimate_tokens_from_text,
+)
+from .http_pool import HttpPoolConfig, SharedHttpPool, get_shared_http_pool
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +55,13 @@ PROVIDER_BASE_URLS = {
 
 }
 
+def _new_temp_backoff() -> ExponentialBackoff:
+    return ExponentialBackoff(BackoffConfig(
+        initial_interval=TEMP_RATE_LIMIT_INITIAL_DELAY,
+        max_interval=TEMP_RATE_LIMIT_MAX_DELAY,
+        multiplier=TEMP_RATE_LIMIT_MULTIPLIER,
+    ))
+
 class BaseRotatingClient:
     def __init__(self,
         manager: RotatingKeyManager,
@@ -49,7 +71,14 @@ class BaseRotatingClient:
         max_retries: int = 5,
         base_url: Optional[str] = None,
         provider: Optional[str] = None,
-        client_kwargs: dict = None
+        client_kwargs: dict = None,
+        client_cache_size: int = DEFAULT_CLIENT_CACHE_SIZE,
+        http_pool: Optional[HttpPoolConfig] = None,
+        hedge: Optional[HedgeConfig] = None,
+        token_estimator: Optional[TokenEstimator] = None,
+        inject_stream_usage: bool = True,
+        response_cache: Optional[ResponseCache] = None,
+        adaptive_estimates: bool = False,
     ):
         """
         Initialize the rotating client.
@@ -63,6 +92,21 @@ class BaseRotatingClient:
             base_url: Base URL for the API (takes precedence over provider)
             provider: Provider name (openai, openrouter, gemini, cerebras, groq)
             client_kwargs: Additional kwargs to pass to OpenAI client
+            client_cache_size: Maximum number of live clients reused across calls
+                (one per key). 0 builds a fresh client for every call.
+            http_pool: Limits for one shared httpx client injected into every
+                OpenAI client built for this provider, so keys share warm connections
+            hedge: Hedging settings (async client only). A non-streaming call slower than
+                the configured latency percentile is duplicated on a second key
+            token_estimator: Estimates tokens in a piece of text, used for streams that
+                end without a usage chunk (default: chars / 4)
+            inject_stream_usage: Send stream_options={"include_usage": True} on streaming
+                calls so the final chunk reports exact usage. The extra usage-only chunk
+                is consumed here unless the caller asked for usage itself.
+            response_cache: Serve deterministic calls (embeddings, temperature 0) from this
+                cache; hits skip key acquisition and use no RPM/TPM
+            adaptive_estimates: Size each reservation from the messages, max_tokens and
+                the learned actual/predicted ratio for the model instead of estimated_tokens
         """
         
         if not HAS_OPENAI:
@@ -91,13 +135,139 @@ class BaseRotatingClient:
         if self.base_url:
             self.client_kwargs['base_url'] = self.base_url
 
-    def _record_usage(self, key_usage: KeyUsage, model_id: str, actual_tokens: int) -> None:
+        self._http_pool: Optional[SharedHttpPool] = None
+        if http_pool is not None:
+            self._http_pool = get_shared_http_pool(
+                provider or self.base_url or "openai",
+                isinstance(self, RotatingAsyncOpenAIClient),
+                http_pool,
+            )
+
+        self.client_cache_size = client_cache_size
+        self._client_cache: Optional[ClientCache] = self._new_client_cache()
+        # Async clients keep one cache per event loop instead (see _active_client_cache)
+        self._loop_caches: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ClientCache]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._proxies: Dict[str, Any] = {}
+        self._hedger: Optional[Hedger] = Hedger(hedge) if hedge else None
+        self.token_estimator: TokenEstimator = token_estimator or estimate_tokens_from_text
+        self.inject_stream_usage = inject_stream_usage
+        self.response_cache = response_cache
+        self.adaptive_estimates = adaptive_estimates
+        if response_cache is not None:
+            manager.register_response_cache(response_cache)
+
+    def _new_client_cache(self) -> Optional[ClientCache]:
+        if self.client_cache_size <= 0:
+            return None
+        # OpenAI.close() closes its http_client, which must survive when shared
+        return ClientCache(self.client_cache_size, close_clients=self._http_pool is None)
+
+    def _http_client_kwargs(self) -> dict:
+        if self._http_pool is None:
+            return {}
+        return {"http_client": self._http_pool.get_client()}
+
+    def _active_client_cache(self) -> Optional[ClientCache]:
+        return self._client_cache
+
+    def _get_client(self, api_key: str):
+        """Return a live client for the key, reusing a cached instance when possible."""
+        cache = self._active_client_cache()
+        if cache is None:
+            return self._get_fresh_client(api_key)
+        return cache.get_or_create(api_key, lambda: self._get_fresh_client(api_key))
+
+    def _get_target(self, api_key: str, path: Tuple[str, ...]):
+        """Return the bound method at path on a live client for the key."""
+        cache = self._active_client_cache()
+        if cache is None:
+            target = self._get_fresh_client(api_key)
+            for p in path:
+                target = getattr(target, p)
+            return target
+        return cache.get_target(api_key, lambda: self._get_fresh_client(api_key), path)
+
+    def _get_proxy(self, name: str, proxy_class):
+        proxy = self._proxies.get(name)
+        if proxy is None:
+            proxy = proxy_class(self, (name,))
+            self._proxies[name] = proxy
+        return proxy
+
+    def _estimate_tokens(self, model_id: str, kwargs: dict) -> TokenEstimate:
+        if not self.adaptive_estimates:
+            return TokenEstimate(self.estimated_tokens)
+        return self.manager.estimator.estimate(
+            model_id, (), kwargs, default_tokens=self.estimated_tokens
+        )
+
+    def _reserved(self, estimate: Optional[TokenEstimate]) -> int:
+        return self.estimated_tokens if estimate is None else estimate.tokens
+
+    def _record_usage(self, key_usage: KeyUsage, model_id: str, actual_tokens: int,
+                      estimate: Optional[TokenEstimate] = None,
+                      reserved_tokens: Optional[int] = None) -> None:
         self.manager.record_usage(
             key_obj=key_usage,
             model_id=model_id,
             actual_tokens=actual_tokens,
-            estimated_tokens=self.estimated_tokens
+            estimated_tokens=self._reserved(estimate) if reserved_tokens is None else reserved_tokens,
+            estimate=estimate
+        )
+
+    def _release_reservation(self, key_usage: KeyUsage, model_id: str,
+                             estimate: Optional[TokenEstimate] = None) -> None:
+        self.manager.release(
+            key_obj=key_usage,
+            model_id=model_id,
+            estimated_tokens=self._reserved(estimate)
+        )
+
+    def _new_stream_accounting(self, key_usage: KeyUsage, model_id: str, kwargs: dict,
+                               estimate: Optional[TokenEstimate] = None
+                               ) -> Tuple[StreamUsageAccumulator, UsageSettlement]:
+        # Estimates tokens from the deltas until (unless) a usage chunk arrives
+        accumulator = StreamUsageAccumulator(
+            reserved_tokens=self._reserved(estimate),
+            top_up=lambda extra: self.manager.reserve(key_usage, model_id, extra),
+            prompt_tokens=estimate_request_tokens((), kwargs, self.token_estimator),
+            estimator=self.token_estimator,
         )
+        settle = UsageSettlement(lambda: self._record_usage(
+            key_usage, model_id, accumulator.total_tokens, estimate,
+            reserved_tokens=accumulator.reserved_tokens
+        ))
+        return accumulator, settle
+
+    def _cache_for(self, path: Tuple[str, ...], kwargs: dict) -> Optional[ResponseCache]:
+        cache = self.response_cache
+        if cache is None or kwargs.get('stream', False) or not cache.is_cacheable(path, kwargs):
+            return None
+        return cache
+
+    def _request_key(self, path: Tuple[str, ...], args, kwargs: dict) -> Optional[str]:
+        return request_key((self.manager.provider_name, self.default_model) + path, args, kwargs)
+
+    def _inject_stream_usage(self, kwargs: dict) -> bool:
+        """
+        Ask for a usage chunk on streaming calls.
+
+        Returns True if the option was added here, in which case the usage-only
+        chunk must not reach the caller.
+        """
+        if not self.inject_stream_usage or not kwargs.get('stream', False):
+            return False
+        stream_options = kwargs.get('stream_options') or {}
+        if stream_options.get('include_usage'):
+            return False
+        kwargs['stream_options'] = {**stream_options, "include_usage": True}
+        return True
+
+    @staticmethod
+    def _is_usage_only_chunk(chunk: Any) -> bool:
+        return not getattr(chunk, 'choices', None) and bool(getattr(chunk, 'usage', None))
 
     def _extract_usage(self, response: Any) -> int:
         try:
@@ -111,92 +281,130 @@ class BaseRotatingClient:
 
 class RotatingOpenAIClient(BaseRotatingClient):
     def _get_fresh_client(self, api_key: str) -> OpenAI:
-        return OpenAI(api_key=api_key, **self.client_kwargs)
+        return OpenAI(api_key=api_key, **self.client_kwargs, **self._http_client_kwargs())
 
     def __getattr__(self, name):
-        return SyncProxyHelper(self, [name])
-
-    def _execute(self, path: List[str], args, kwargs):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self._get_proxy(name, SyncProxyHelper)
+
+    def close(self) -> None:
+        """Close all cached OpenAI clients."""
+        if self._client_cache is not None:
+            self._client_cache.close()
+
+    def _execute(self, path: Tuple[str, ...], args, kwargs):
+        cache = self._cache_for(path, kwargs)
+        if cache is None:
+            return self._execute_call(path, args, kwargs)
+        # Cache hits never acquire a key
+        request = self._request_key(path, args, kwargs)
+        if request is None:
+            # Arguments without a JSON form cannot be told apart reliably
+            return self._execute_call(path, args, kwargs)
+        hit, response = cache.get(request)
+        if hit:
+            return response
+        result = self._execute_call(path, args, kwargs)
+        cache.set(request, result)
+        return result
+
+    def _execute_call(self, path: Tuple[str, ...], args, kwargs):
         model_id = kwargs.get('model', self.default_model)
         if 'model' not in kwargs:
             kwargs['model'] = model_id
         limits = self.limit_resolver(model_id, None)
+        estimate = self._estimate_tokens(model_id, kwargs)
 
-        if kwargs.get('stream', False) and 'stream_options' not in kwargs:
-            kwargs['stream_options'] = {"include_usage": True}
+        strip_usage_chunk = self._inject_stream_usage(kwargs)
 
         for attempt in range(self.max_retries + 1):
-            key_usage = self.manager.get_key(model_id, limits, self.estimated_tokens)
+            key_usage = self.manager.get_key(model_id, limits, estimate.tokens)
             if not key_usage:
                 raise RuntimeError(f"No available keys for {model_id}")
 
-            # Create backoff for temporary rate limits
-            temp_backoff = ExponentialBackoff(BackoffConfig(
-                initial_interval=TEMP_RATE_LIMIT_INITIAL_DELAY,
-                max_interval=TEMP_RATE_LIMIT_MAX_DELAY,
-                multiplier=TEMP_RATE_LIMIT_MULTIPLIER,
-            ))
-
-            for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
-                try:
-                    real_client = self._get_fresh_client(key_usage.api_key)
-
-                    target = real_client
-                    for p in path:
-                        target = getattr(target, p)
-
-                    result = target(*args, **kwargs)
-
-                    if kwargs.get('stream', False):
-                        return self._wrap_stream(result, key_usage, model_id)
-
-                    self._record_usage(key_usage, model_id, self._extract_usage(result))
-                    return result
-
-                except Exception as e:
-                    # Check for temporary rate limit first - retry with SAME key
-                    if is_temporary_rate_limit_error(e) and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES:
-                        delay = temp_backoff.get_next_interval()
-                        logger.info(
-                            "Temporary rate limit on key ...%s for %s. Waiting %.1fs (%d/%d).",
-                            get_key_suffix(key_usage.api_key), model_id, delay,
-                            temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
-                        )
-                        time.sleep(delay)
-                        continue  # Retry with SAME key
-
-                    # Hard rate limit - rotate to next key
-                    if is_rate_limit_error(e) and attempt < self.max_retries:
+            # Until usage is recorded, leaving this key (rotation, cancellation,
+            # KeyboardInterrupt) must hand its reservation back
+            settled = False
+            try:
+                # Backoff for temporary rate limits, created on first use
+                temp_backoff: Optional[ExponentialBackoff] = None
+
+                for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
+                    try:
+                        target = self._get_target(key_usage.api_key, path)
+                        result = target(*args, **kwargs)
+
+                        if kwargs.get('stream', False):
+                            settled = True
+                            return self._wrap_stream(result, key_usage, model_id, kwargs,
+                                                     strip_usage_chunk, estimate)
+
+                        self._record_usage(key_usage, model_id, self._extract_usage(result), estimate)
+                        settled = True
+                        return result
+
+                    except Exception as e:
+                        # Check for temporary rate limit first - retry with SAME key
+                        if is_temporary_rate_limit_error(e) and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES:
+                            if temp_backoff is None:
+                                temp_backoff = _new_temp_backoff()
+                            delay = temp_backoff.get_next_interval()
+                            logger.info(
+                                "Temporary rate limit on key ...%s for %s. Waiting %.1fs (%d/%d).",
+                                get_key_suffix(key_usage.api_key), model_id, delay,
+                                temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
+                            )
+                            time.sleep(delay)
+                            continue  # Retry with SAME key
+
+                        # Hard rate limit - rotate to next key
+                        if is_rate_limit_error(e) and attempt < self.max_retries:
+                            logger.warning(
+                                "429/RateLimit hit for %s on key ...%s. Rotating. (Attempt %d/%d)",
+                                model_id, get_key_suffix(key_usage.api_key), attempt + 1, self.max_retries + 1
+                            )
+                            self.manager.trigger_cooldown(key_usage, e)
+                            self.manager.force_rotate_index()
+                            time.sleep(KEY_ROTATION_DELAY_SECONDS)
+                            break  # Break inner loop, continue outer loop with new key
+
+                        self.manager.disable_if_invalid(key_usage, e)
+                        self._record_usage(key_usage, model_id, 0, estimate)
+                        settled = True
+                        raise
+                else:
+                    # Inner loop exhausted without success - continue to next key
+                    if attempt < self.max_retries:
                         logger.warning(
-                            "429/RateLimit hit for %s on key ...%s. Rotating. (Attempt %d/%d)",
-                            model_id, get_key_suffix(key_usage.api_key), attempt + 1, self.max_retries + 1
+                            "Temporary rate limit retries exhausted for key ...%s. Rotating.",
+                            get_key_suffix(key_usage.api_key)
                         )
-                        key_usage.trigger_cooldown()
+                        self.manager.trigger_cooldown(key_usage)
                         self.manager.force_rotate_index()
-                        time.sleep(KEY_ROTATION_DELAY_SECONDS)
-                        break  # Break inner loop, continue outer loop with new key
-
-                    self._record_usage(key_usage, model_id, 0)
-                    raise
-            else:
-                # Inner loop exhausted without success - continue to next key
-                if attempt < self.max_retries:
-                    logger.warning(
-                        "Temporary rate limit retries exhausted for key ...%s. Rotating.",
-                        get_key_suffix(key_usage.api_key)
-                    )
-                    key_usage.trigger_cooldown()
-                    self.manager.force_rotate_index()
-                    continue
+                        continue
+            finally:
+                if not settled:
+                    self._release_reservation(key_usage, model_id, estimate)
 
         raise RuntimeError(f"All retry attempts exhausted for {model_id}")
 
-    def _wrap_stream(self, generator: Generator, key_usage: KeyUsage, model_id: str):
-        final_tokens = 0
+    def _wrap_stream(self, generator: Generator, key_usage: KeyUsage, model_id: str,
+                     kwargs: Optional[dict] = None, strip_usage_chunk: bool = False,
+                     estimate: Optional[TokenEstimate] = None):
+        accumulator, settle = self._new_stream_accounting(key_usage, model_id, kwargs or {}, estimate)
+        return settle.guard(self._stream_chunks(
+            generator, key_usage, model_id, accumulator, settle, strip_usage_chunk
+        ))
+
+    def _stream_chunks(self, generator: Generator, key_usage: KeyUsage, model_id: str,
+                       accumulator: StreamUsageAccumulator, settle: UsageSettlement,
+                       strip_usage_chunk: bool = False):
         try:
             for chunk in generator:
-                if hasattr(chunk, 'usage') and chunk.usage:
-                    final_tokens = chunk.usage.total_tokens
+                accumulator.add(chunk, self._extract_usage(chunk))
+                if strip_usage_chunk and self._is_usage_only_chunk(chunk):
+                    continue
                 yield chunk
         except Exception as e:
             if is_rate_limit_error(e):
@@ -204,19 +412,26 @@ class RotatingOpenAIClient(BaseRotatingClient):
                     "Rate limit hit during streaming for %s on key ...%s.",
                     model_id, get_key_suffix(key_usage.api_key)
                 )
-                key_usage.trigger_cooldown()
+                self.manager.trigger_cooldown(key_usage, e)
                 self.manager.force_rotate_index()
             raise
         finally:
-            self._record_usage(key_usage, model_id, final_tokens)
+            settle()
 
 class SyncProxyHelper:
-    def __init__(self, client: RotatingOpenAIClient, path: List[str]):
+    def __init__(self, client: RotatingOpenAIClient, path: Tuple[str, ...]):
         self.client = client
         self.path = path
+        self._children: Dict[str, "SyncProxyHelper"] = {}
 
     def __getattr__(self, name):
-        return SyncProxyHelper(self.client, self.path + [name])
+        if name.startswith("__"):
+            raise AttributeError(name)
+        child = self._children.get(name)
+        if child is None:
+            child = SyncProxyHelper(self.client, self.path + (name,))
+            self._children[name] = child
+        return child
 
     def __call__(self, *args, **kwargs):
         return self.client._execute(self.path, args, kwargs)
@@ -226,92 +441,169 @@ class SyncProxyHelper:
 
 class RotatingAsyncOpenAIClient(BaseRotatingClient):
     def _get_fresh_client(self, api_key: str) -> AsyncOpenAI:
-        return AsyncOpenAI(api_key=api_key, **self.client_kwargs)
+        return AsyncOpenAI(api_key=api_key, **self.client_kwargs, **self._http_client_kwargs())
+
+    def _active_client_cache(self) -> Optional[ClientCache]:
+        # AsyncOpenAI connections are bound to the loop they were used on, so each
+        # loop gets its own cache, which goes away with the loop
+        loop = asyncio.get_running_loop()
+        cache = self._loop_caches.get(loop)
+        if cache is None:
+            cache = self._new_client_cache()
+            if cache is None:
+                return None
+            self._loop_caches[loop] = cache
+        return cache
 
     def __getattr__(self, name):
-        return AsyncProxyHelper(self, [name])
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self._get_proxy(name, AsyncProxyHelper)
+
+    async def close(self) -> None:
+        """Close the clients cached for the running event loop."""
+        cache = self._loop_caches.pop(asyncio.get_running_loop(), None)
+        if cache is not None:
+            await cache.aclose()
+
+    async def _execute(self, path: Tuple[str, ...], args, kwargs: dict):
+        cache = self._cache_for(path, kwargs)
+        if cache is None:
+            return await self._execute_call(path, args, kwargs)
+        # Cache hits never acquire a key
+        request = self._request_key(path, args, kwargs)
+        if request is None:
+            # Arguments without a JSON form cannot be told apart reliably
+            return await self._execute_call(path, args, kwargs)
+        hit, response = cache.get(request)
+        if hit:
+            return response
+        result = await self._execute_call(path, args, kwargs)
+        cache.set(request, result)
+        return result
+
+    async def _execute_call(self, path: Tuple[str, ...], args, kwargs: dict):
+        if self._hedger is None or kwargs.get('stream', False):
+            return await self._execute_attempt(path, args, kwargs)
+        return await self._hedger.run(
+            kwargs.get('model', self.default_model),
+            lambda keys_in_use: self._execute_attempt(path, args, kwargs, keys_in_use),
+        )
 
-    async def _execute(self, path: List[str], args, kwargs: dict):
+    async def _execute_attempt(self, path: Tuple[str, ...], args, kwargs: dict,
+                               keys_in_use: Optional[Set[str]] = None):
         model_id = kwargs.get('model', self.default_model)
         if 'model' not in kwargs:
             kwargs['model'] = model_id
         limits = self.limit_resolver(model_id, None)
+        estimate = self._estimate_tokens(model_id, kwargs)
 
-        if kwargs.get('stream', False) and 'stream_options' not in kwargs:
-            kwargs['stream_options'] = {"include_usage": True}
+        strip_usage_chunk = self._inject_stream_usage(kwargs)
 
         for attempt in range(self.max_retries + 1):
-            key_usage = self.manager.get_key(model_id, limits, self.estimated_tokens)
+            # A hedge must not reuse the key its twin is already using
+            if keys_in_use:
+                key_usage = self.manager.get_key(
+                    model_id, limits, estimate.tokens, exclude=keys_in_use
+                )
+            else:
+                key_usage = self.manager.get_key(model_id, limits, estimate.tokens)
             if not key_usage:
                 raise RuntimeError(f"No available keys for {model_id}")
-
-            # Create backoff for temporary rate limits
-            temp_backoff = ExponentialBackoff(BackoffConfig(
-                initial_interval=TEMP_RATE_LIMIT_INITIAL_DELAY,
-                max_interval=TEMP_RATE_LIMIT_MAX_DELAY,
-                multiplier=TEMP_RATE_LIMIT_MULTIPLIER,
-            ))
-
-            for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
-                try:
-                    real_client = self._get_fresh_client(key_usage.api_key)
-
-                    target = real_client
-                    for p in path:
-                        target = getattr(target, p)
-
-                    result = await target(*args, **kwargs)
-
-                    if kwargs.get('stream', False):
-                        return self._wrap_stream(result, key_usage, model_id)
-
-                    self._record_usage(key_usage, model_id, self._extract_usage(result))
-                    return result
-
-                except Exception as e:
-                    # Check for temporary rate limit first - retry with SAME key
-                    if is_temporary_rate_limit_error(e) and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES:
-                        delay = temp_backoff.get_next_interval()
-                        logger.info(
-                            "Temporary rate limit on key ...%s for %s. Waiting %.1fs (%d/%d).",
-                            get_key_suffix(key_usage.api_key), model_id, delay,
-                            temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
-                        )
-                        await asyncio.sleep(delay)
-                        continue  # Retry with SAME key
-
-                    # Hard rate limit - rotate to next key
-                    if is_rate_limit_error(e) and attempt < self.max_retries:
+            if keys_in_use is not None:
+                keys_in_use.add(key_usage.api_key)
+
+            # Until usage is recorded, leaving this key (rotation, cancellation,
+            # KeyboardInterrupt) must hand its reservation back
+            settled = False
+            try:
+                # Backoff for temporary rate limits, created on first use
+                temp_backoff: Optional[ExponentialBackoff] = None
+
+                for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
+                    try:
+                        target = self._get_target(key_usage.api_key, path)
+                        result = await target(*args, **kwargs)
+
+                        if kwargs.get('stream', False):
+                            settled = True
+                            return self._wrap_stream(result, key_usage, model_id, kwargs,
+                                                     strip_usage_chunk, estimate)
+
+                        self._record_usage(key_usage, model_id, self._extract_usage(result), estimate)
+                        settled = True
+                        return result
+
+                    except asyncio.CancelledError:
+                        # Cancelled mid-request (e.g. a losing hedge): the provider still bills
+                        # it, so commit the estimate, as the request's tokens are unknown
+                        reserved = self._reserved(estimate)
+                        self._record_usage(key_usage, model_id, reserved, reserved_tokens=reserved)
+                        settled = True
+                        raise
+
+                    except Exception as e:
+                        # Check for temporary rate limit first - retry with SAME key
+                        if is_temporary_rate_limit_error(e) and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES:
+                            if temp_backoff is None:
+                                temp_backoff = _new_temp_backoff()
+                            delay = temp_backoff.get_next_interval()
+                            logger.info(
+                                "Temporary rate limit on key ...%s for %s. Waiting %.1fs (%d/%d).",
+                                get_key_suffix(key_usage.api_key), model_id, delay,
+                                temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
+                            )
+                            await asyncio.sleep(delay)
+                            continue  # Retry with SAME key
+
+                        # Hard rate limit - rotate to next key
+                        if is_rate_limit_error(e) and attempt < self.max_retries:
+                            logger.warning(
+                                "429/RateLimit hit for %s on key ...%s. Rotating. (Attempt %d/%d)",
+                                model_id, get_key_suffix(key_usage.api_key), attempt + 1, self.max_retries + 1
+                            )
+                            self.manager.trigger_cooldown(key_usage, e)
+                            self.manager.force_rotate_index()
+                            await asyncio.sleep(KEY_ROTATION_DELAY_SECONDS)
+                            break  # Break inner loop, continue outer loop with new key
+
+                        self.manager.disable_if_invalid(key_usage, e)
+                        self._record_usage(key_usage, model_id, 0, estimate)
+                        settled = True
+                        raise
+                else:
+                    # Inner loop exhausted without success - continue to next key
+                    if attempt < self.max_retries:
                         logger.warning(
-                            "429/RateLimit hit for %s on key ...%s. Rotating. (Attempt %d/%d)",
-                            model_id, get_key_suffix(key_usage.api_key), attempt + 1, self.max_retries + 1
+                            "Temporary rate limit retries exhausted for key ...%s. Rotating.",
+                            get_key_suffix(key_usage.api_key)
                         )
-                        key_usage.trigger_cooldown()
+                        self.manager.trigger_cooldown(key_usage)
                         self.manager.force_rotate_index()
-                        await asyncio.sleep(KEY_ROTATION_DELAY_SECONDS)
-                        break  # Break inner loop, continue outer loop with new key
-
-                    self._record_usage(key_usage, model_id, 0)
-                    raise
-            else:
-                # Inner loop exhausted without success - continue to next key
-                if attempt < self.max_retries:
-                    logger.warning(
-                        "Temporary rate limit retries exhausted for key ...%s. Rotating.",
-                        get_key_suffix(key_usage.api_key)
-                    )
-                    key_usage.trigger_cooldown()
-                    self.manager.force_rotate_index()
-                    continue
+                        continue
+            finally:
+                if not settled:
+                    self._release_reservation(key_usage, model_id, estimate)
 
         raise RuntimeError(f"All retry attempts exhausted for {model_id}")
 
-    async def _wrap_stream(self, generator: AsyncGenerator, key_usage: KeyUsage, model_id: str):
-        final_tokens = 0
+    def _wrap_stream(self, generator: AsyncGenerator, key_usage: KeyUsage, model_id: str,
+                     kwargs: Optional[dict] = None, strip_usage_chunk: bool = False,
+                     estimate: Optional[TokenEstimate] = None):
+        # Settles on completion, error, aclose()/cancellation, or GC of a never-started stream
+        accumulator, settle = self._new_stream_accounting(key_usage, model_id, kwargs or {}, estimate)
+        return settle.guard(self._stream_chunks(
+            generator, key_usage, model_id, accumulator, settle, strip_usage_chunk
+        ))
+
+    async def _stream_chunks(self, generator: AsyncGenerator, key_usage: KeyUsage, model_id: str,
+                             accumulator: StreamUsageAccumulator, settle: UsageSettlement,
+                             strip_usage_chunk: bool = False):
         try:
             async for chunk in generator:
-                if hasattr(chunk, 'usage') and chunk.usage:
-                    final_tokens = chunk.usage.total_tokens
+                accumulator.add(chunk, self._extract_usage(chunk))
+                if strip_usage_chunk and self._is_usage_only_chunk(chunk):
+                    continue
                 yield chunk
         except Exception as e:
             if is_rate_limit_error(e):
@@ -319,19 +611,26 @@ class RotatingAsyncOpenAIClient(BaseRotatingClient):
                     "Rate limit hit during streaming for %s on key ...%s.",
                     model_id, get_key_suffix(key_usage.api_key)
                 )
-                key_usage.trigger_cooldown()
+                self.manager.trigger_cooldown(key_usage, e)
                 self.manager.force_rotate_index()
             raise
         finally:
-            self._record_usage(key_usage, model_id, final_tokens)
+            settle()
 
 class AsyncProxyHelper:
-    def __init__(self, client: RotatingAsyncOpenAIClient, path: List[str]):
+    def __init__(self, client: RotatingAsyncOpenAIClient, path: Tuple[str, ...]):
         self.client = client
         self.path = path
+        self._children: Dict[str, "AsyncProxyHelper"] = {}
 
     def __getattr__(self, name):
-        return AsyncProxyHelper(self.client, self.path + [name])
+        if name.startswith("__"):
+            raise AttributeError(name)
+        child = self._children.get(name)
+        if child is None:
+            child = AsyncProxyHelper(self.client, self.path + (name,))
+            self._children[name] = child
+        return child
 
     async def __call__(self, *args, **kwargs):
         return await self.client._execute(self.path, args, kwargs)
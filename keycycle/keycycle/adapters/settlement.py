@@ -0,0 +1,42 @@
+"""
+Exactly-once settlement of a key's token reservation for streamed responses.
+
+A wrapped stream commits its usage from a finally block, but a generator that is
+dropped before its first iteration never runs that block. UsageSettlement guards
+the stream with a weakref finalizer so the reservation is still settled when the
+stream is garbage collected. The record callback reads the stream's running
+usage, so whichever path settles first records the same numbers.
+"""
+
+import threading
+import weakref
+from typing import Callable, TypeVar
+
+S = TypeVar("S")
+
+
+class UsageSettlement:
+    """
+    Records a stream's usage once, whichever path gets there first.
+
+    Example:
+        settle = UsageSettlement(lambda: manager.record_usage(key, model, acc.total_tokens))
+        stream = settle.guard(wrapped_generator(settle))
+    """
+
+    def __init__(self, record: Callable[[], None]):
+        self._record = record
+        self._lock = threading.Lock()
+        self.settled = False
+
+    def __call__(self) -> None:
+        with self._lock:
+            if self.settled:
+                return
+            self.settled = True
+        self._record()
+
+    def guard(self, stream: S) -> S:
+        """Settle with the usage seen so far if stream is collected before it settles itself."""
+        weakref.finalize(stream, self)
+        return stream
@@ -0,0 +1,23 @@
+"""Rate-limit state shared between managers."""
+from .base import StateBackend, InMemoryStateBackend, BackendKeyUsage, BucketMap
+from .mmap_state import MmapStateBackend, SharedUsageBucket, GLOBAL_SCOPE
+from .sql_lease import SqlLeaseBackend, LeasedUsageBucket, SQL_GLOBAL_SCOPE
+from .redis_state import RedisStateBackend, RedisUsageBucket
+from .resp import RespClient, RespError
+
+__all__ = [
+    "StateBackend",
+    "InMemoryStateBackend",
+    "BackendKeyUsage",
+    "BucketMap",
+    "MmapStateBackend",
+    "SharedUsageBucket",
+    "GLOBAL_SCOPE",
+    "SqlLeaseBackend",
+    "LeasedUsageBucket",
+    "SQL_GLOBAL_SCOPE",
+    "RedisStateBackend",
+    "RedisUsageBucket",
+    "RespClient",
+    "RespError",
+]
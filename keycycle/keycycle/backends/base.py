@@ -0,0 +1,165 @@
+"""
+The interface between RotatingKeyManager and wherever rate-limit state lives.
+
+A backend hands the manager one KeyUsage per API key. The KeyUsage holds
+buckets, one per model plus one for the whole key, and each bucket answers
+the manager's questions:
+
+    check     check_limits(limits, est) / headroom(limits, est)
+    reserve   try_reserve(limits, est) (atomic check + reserve), reserve(tokens), release(tokens)
+    commit    commit(actual, reserved, timestamp) / add(tokens, timestamp) for history
+    snapshot  get_snapshot(), pending_tokens, total_requests, total_tokens
+
+UsageBucket is the in-memory implementation; other backends provide objects
+with the same methods. Cooldowns (a key answering 429) go through
+mark_cooldown / last_cooldown so backends that span processes can share them.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from ..config.constants import DEFAULT_COOLDOWN_SECONDS
+from ..config.dataclasses import KeyUsage, UsageBucket
+from ..config.enums import RateLimitStrategy
+
+
+class BucketMap(dict):
+    """
+    Per-model buckets of one key, created on first access (like defaultdict, with the model id).
+
+    With discover, iteration and membership first pick up models that other
+    processes recorded, so stats cover every process sharing the backend.
+    """
+
+    def __init__(self, factory: Callable[[str], Any], discover: Optional[Callable[[], List[str]]] = None):
+        super().__init__()
+        self._factory = factory
+        self._discover = discover
+
+    def __missing__(self, model_id: str) -> Any:
+        bucket = self[model_id] = self._factory(model_id)
+        return bucket
+
+    def _sync(self) -> None:
+        if self._discover is None:
+            return
+        for model_id in self._discover():
+            if not dict.__contains__(self, model_id):
+                self[model_id]
+
+    def __contains__(self, model_id: object) -> bool:
+        self._sync()
+        return dict.__contains__(self, model_id)
+
+    def __iter__(self):
+        self._sync()
+        return dict.__iter__(self)
+
+    def keys(self):
+        self._sync()
+        return dict.keys(self)
+
+    def values(self):
+        self._sync()
+        return dict.values(self)
+
+    def items(self):
+        self._sync()
+        return dict.items(self)
+
+
+@dataclass
+class BackendKeyUsage(KeyUsage):
+    """A KeyUsage whose cooldown is also recorded in (and read from) its backend."""
+    backend: Optional["StateBackend"] = field(default=None, repr=False)
+    provider: str = ""
+
+    def _backend(self) -> "StateBackend":
+        assert self.backend is not None, "BackendKeyUsage is created by StateBackend.key_usage()"
+        return self.backend
+
+    def trigger_cooldown(self):
+        super().trigger_cooldown()
+        self._backend().mark_cooldown(self.provider, self.api_key, self.last_429)
+
+    def is_cooling_down(self, cooldown_seconds: int = DEFAULT_COOLDOWN_SECONDS) -> bool:
+        self.last_429 = max(self.last_429, self._backend().last_cooldown(self.provider, self.api_key))
+        return super().is_cooling_down(cooldown_seconds)
+
+
+class StateBackend:
+    """
+    Base class for rate-limit state backends.
+
+    Subclasses implement bucket(); everything else has a working default.
+    Pass an instance as state_backend to RotatingKeyManager, register_provider
+    or ProviderEnvConfig.
+    """
+
+    # Global (per key) bucket name under RateLimitStrategy.GLOBAL
+    global_scope = "\0global"
+    # Whether buckets only count this process's usage (False when they are shared)
+    local_windows = True
+
+    def bucket(self, provider: str, api_key: str, scope: str) -> Any:
+        """The bucket for a key and a model id (or global_scope)."""
+        raise NotImplementedError
+
+    def scopes(self, provider: str, api_key: str) -> List[str]:
+        """Model ids other processes have recorded for this key."""
+        return []
+
+    def key_usage(
+        self,
+        provider: str,
+        api_key: str,
+        strategy: RateLimitStrategy,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> KeyUsage:
+        """A KeyUsage whose buckets and cooldown live in this backend."""
+        return BackendKeyUsage(
+            api_key=api_key,
+            strategy=strategy,
+            params=params or {},
+            buckets=BucketMap(
+                lambda model_id: self.bucket(provider, api_key, model_id),
+                lambda: self.scopes(provider, api_key),
+            ),
+            global_bucket=self.bucket(provider, api_key, self.global_scope),
+            backend=self,
+            provider=provider,
+        )
+
+    def claim_hydration(self, provider: str) -> bool:
+        """Whether this manager should replay usage_logs history into its buckets."""
+        return True
+
+    def mark_cooldown(self, provider: str, api_key: str, timestamp: float) -> None:
+        """Record that a key was rate-limited at timestamp."""
+
+    def last_cooldown(self, provider: str, api_key: str) -> float:
+        """Latest rate-limit timestamp recorded for a key (0.0 if none)."""
+        return 0.0
+
+    def close(self) -> None:
+        """Release files, connections or leases held by the backend."""
+
+
+class InMemoryStateBackend(StateBackend):
+    """
+    The default: plain UsageBuckets in this process's memory.
+
+    Fast and dependency free, but every process counts only its own usage.
+    """
+
+    def bucket(self, provider: str, api_key: str, scope: str) -> UsageBucket:
+        return UsageBucket()
+
+    def key_usage(
+        self,
+        provider: str,
+        api_key: str,
+        strategy: RateLimitStrategy,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> KeyUsage:
+        return KeyUsage(api_key=api_key, strategy=strategy, params=params or {})
@@ -0,0 +1,397 @@
+"""
+Rate-limit windows shared by every process on a host through a memory-mapped file.
+
+Each RotatingKeyManager normally keeps private in-memory windows, so N worker
+processes sharing a set of keys overshoot provider limits by up to N times.
+MmapStateBackend keeps the windows in one file mapped by all of them, so a
+reservation made by one worker is immediately visible to the others.
+
+File layout (little endian):
+    header   magic, version, capacity, record size
+    records  capacity fixed-size records in an open-addressing table. Each is
+             keyed by a hash of (provider, api key, scope) and also stores a hash
+             of (provider, api key) and the scope name, so a key's models can
+             be listed. Raw keys are never stored. A record holds lifetime
+             totals, the pending reservations of up to 16 workers (each with
+             its own last-touched time), and a ring of time slots for each
+             window: 60 x 1s (minute), 60 x 60s (hour) and 144 x 600s (day).
+
+Each record is guarded by its own POSIX byte-range lock (fcntl.lockf), so
+processes only contend when they touch the same key and model. Slot windows
+may over-count by up to one slot width, which errs on the side of the limit.
+Key cooldowns (429s) are kept in the file too, so one worker's 429 benches
+the key for every worker. A worker that dies with reservations open leaves
+its own pending entry behind; it stops counting once nobody has touched it
+for pending_ttl, however busy the other workers keep the key.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from hashlib import sha256
+from typing import ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from ..config.constants import (
+    SHARED_STATE_CAPACITY, SHARED_STATE_PENDING_SLOTS, SHARED_STATE_PENDING_TTL_SECONDS,
+)
+from ..config.dataclasses import RateLimits, UsageSnapshot, Window
+from .base import BucketMap, StateBackend
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+MAGIC = b"KCSTATE1"
+VERSION = 2
+GLOBAL_SCOPE = "\0global"
+
+_HEADER = struct.Struct("<8sIII")
+_HEADER_SIZE = 64
+# ident, owning key ident, scope (model id, utf-8, truncated)
+_RECORD_ID = struct.Struct("<16s16s64s")
+# last 429 (cooldown records only), total requests, total tokens
+_COUNTERS = struct.Struct("<dqq")
+# (worker, pending tokens, updated at) per worker slot; worker 0 marks a free slot
+_PENDING_ENTRY = struct.Struct("<Qqd")
+_PENDING_AT = _RECORD_ID.size + _COUNTERS.size
+_SLOTS_AT = _PENDING_AT + SHARED_STATE_PENDING_SLOTS * _PENDING_ENTRY.size
+# (slot width in seconds, slot count) for the minute, hour and day windows
+WINDOWS = ((1, 60), (60, 60), (600, 144))
+_SLOT_COUNT = sum(n for _, n in WINDOWS)
+_SLOTS = struct.Struct(f"<{_SLOT_COUNT * 3}q")  # (epoch, requests, tokens) per slot
+_SLOT = struct.Struct("<qqq")
+_RECORD_SIZE = (_SLOTS_AT + _SLOTS.size + 63) // 64 * 64
+_EMPTY = bytes(16)
+
+
+def _ident(*parts: str) -> bytes:
+    return sha256("\0".join(parts).encode()).digest()[:16]
+
+
+class SharedUsageBucket:
+    """
+    A UsageBucket whose counters live in a shared state file.
+
+    Every operation reads or updates the record under its lock, so checking
+    and reserving in try_reserve is atomic across processes.
+    """
+
+    def __init__(self, state: "MmapStateBackend", offset: int):
+        self._state = state
+        self._offset = offset
+
+    # --- raw record access (caller holds the record lock) ---
+
+    def _head(self) -> Tuple[float, int, int]:
+        return _COUNTERS.unpack_from(self._state._map, self._offset + _RECORD_ID.size)
+
+    def _add_totals(self, tokens: int) -> None:
+        stamp, requests, total_tokens = self._head()
+        _COUNTERS.pack_into(
+            self._state._map, self._offset + _RECORD_ID.size, stamp, requests + 1, total_tokens + max(0, tokens)
+        )
+
+    def _pending_entries(self) -> Iterator[Tuple[int, int, int, float]]:
+        """(offset, worker, tokens, updated at) of every worker slot."""
+        at = self._offset + _PENDING_AT
+        for i in range(SHARED_STATE_PENDING_SLOTS):
+            yield (at, *_PENDING_ENTRY.unpack_from(self._state._map, at))
+            at += _PENDING_ENTRY.size
+
+    def _pending(self, now: float) -> int:
+        ttl = self._state.pending_ttl
+        # An entry nobody touched for this long belongs to a worker that died
+        return sum(
+            tokens for _, worker, tokens, updated in self._pending_entries()
+            if worker and now - updated < ttl
+        )
+
+    def _windows(self, now: float) -> Tuple[Window, Window]:
+        slots = _SLOTS.unpack_from(self._state._map, self._offset + _SLOTS_AT)
+        requests: List[int] = []
+        tokens: List[int] = []
+        base = 0
+        for width, count in WINDOWS:
+            current = int(now // width)
+            window_requests = window_tokens = 0
+            for i in range(base, base + count * 3, 3):
+                if current - count < slots[i] <= current:
+                    window_requests += slots[i + 1]
+                    window_tokens += slots[i + 2]
+            requests.append(window_requests)
+            tokens.append(window_tokens)
+            base += count * 3
+        return (requests[0], requests[1], requests[2]), (tokens[0], tokens[1], tokens[2])
+
+    def _add(self, tokens: int, timestamp: float, now: float) -> None:
+        slots_offset = self._offset + _SLOTS_AT
+        slot_index = 0
+        for width, count in WINDOWS:
+            epoch = int(timestamp // width)
+            if epoch > int(now // width) - count:
+                at = slots_offset + (slot_index + epoch % count) * _SLOT.size
+                slot_epoch, requests, slot_tokens = _SLOT.unpack_from(self._state._map, at)
+                if slot_epoch < epoch:
+                    slot_epoch, requests, slot_tokens = epoch, 0, 0
+                if slot_epoch == epoch:
+                    _SLOT.pack_into(self._state._map, at, epoch, requests + 1, slot_tokens + max(0, tokens))
+            slot_index += count
+
+    def _add_pending(self, delta: int, now: float) -> None:
+        """Add delta to this worker's pending entry, taking a free or stale slot if it has none."""
+        me = self._state._worker()
+        ttl = self._state.pending_ttl
+        mine: Optional[Tuple[int, int]] = None
+        free: Optional[int] = None
+        oldest: Optional[int] = None
+        oldest_updated = float("inf")
+        for at, worker, tokens, updated in self._pending_entries():
+            if worker == me:
+                mine = (at, tokens if now - updated < ttl else 0)
+                break
+            if free is None and (worker == 0 or now - updated >= ttl):
+                free = at
+            if updated <= oldest_updated:
+                oldest, oldest_updated = at, updated
+        if mine is None:
+            if delta <= 0:
+                return  # Our entry expired already
+            # Every slot held by a live worker: evict the least recently active one
+            evict = free if free is not None else oldest
+            assert evict is not None
+            mine = (evict, 0)
+        at, tokens = mine
+        tokens += delta
+        if tokens > 0:
+            _PENDING_ENTRY.pack_into(self._state._map, at, me, tokens, now)
+        else:
+            _PENDING_ENTRY.pack_into(self._state._map, at, 0, 0, 0.0)
+
+    # --- UsageBucket interface ---
+
+    @property
+    def pending_tokens(self) -> int:
+        with self._state._locked(self._offset):
+            return self._pending(time.time())
+
+    @property
+    def total_requests(self) -> int:
+        with self._state._locked(self._offset):
+            return self._head()[1]
+
+    @property
+    def total_tokens(self) -> int:
+        with self._state._locked(self._offset):
+            return self._head()[2]
+
+    def clean(self) -> None:
+        """Nothing to do: expired slots are skipped on read and reused on write."""
+
+    def add(self, tokens: int, timestamp: float) -> None:
+        now = time.time()
+        with self._state._locked(self._offset):
+            self._add(tokens, timestamp, now)
+            self._add_totals(tokens)
+
+    def _usage(self, now: float) -> Tuple[Window, Window]:
+        requests, tokens = self._windows(now)
+        pending = self._pending(now)
+        return requests, (tokens[0] + pending, tokens[1] + pending, tokens[2] + pending)
+
+    def check_limits(self, limits: RateLimits, estimated_tokens: int) -> bool:
+        now = time.time()
+        with self._state._locked(self._offset):
+            requests, tokens = self._usage(now)
+        return limits.allows(requests, tokens, estimated_tokens)
+
+    def headroom(self, limits: RateLimits, estimated_tokens: int) -> int:
+        now = time.time()
+        with self._state._locked(self._offset):
+            requests, tokens = self._usage(now)
+        return limits.headroom(requests, tokens, estimated_tokens)
+
+    def try_reserve(self, limits: RateLimits, estimated_tokens: int) -> bool:
+        now = time.time()
+        with self._state._locked(self._offset):
+            requests, tokens = self._usage(now)
+            if not limits.allows(requests, tokens, estimated_tokens):
+                return False
+            self._add_pending(estimated_tokens, now)
+            return True
+
+    def reserve(self, tokens: int) -> None:
+        now = time.time()
+        with self._state._locked(self._offset):
+            self._add_pending(tokens, now)
+
+    def release(self, reserved_tokens: int) -> None:
+        now = time.time()
+        with self._state._locked(self._offset):
+            self._add_pending(-reserved_tokens, now)
+
+    def commit(self, actual_tokens: int, reserved_tokens: int, timestamp: float) -> None:
+        now = time.time()
+        with self._state._locked(self._offset):
+            self._add_pending(-reserved_tokens, now)
+            self._add(actual_tokens, timestamp, now)
+            self._add_totals(actual_tokens)
+
+    def get_snapshot(self) -> UsageSnapshot:
+        now = time.time()
+        with self._state._locked(self._offset):
+            (rpm, rph, rpd), (tpm, tph, tpd) = self._windows(now)
+            _, total_requests, total_tokens = self._head()
+        return UsageSnapshot(
+            rpm=rpm, rph=rph, rpd=rpd, tpm=tpm, tph=tph, tpd=tpd,
+            total_requests=total_requests, total_tokens=total_tokens,
+        )
+
+
+class MmapStateBackend(StateBackend):
+    """
+    Rate-limit state shared by all processes on a host that open the same file.
+
+    Put the file on local storage (e.g. /dev/shm or /run); network filesystems
+    do not honour mmap coherence or byte-range locks. The first manager to
+    claim a provider replays usage_logs history into the file, later ones
+    (other workers, restarts while the file survives) reuse the live counters.
+
+    Example:
+        state = MmapStateBackend("/dev/shm/keycycle-openai.state")
+        manager = RotatingKeyManager(keys, "openai", strategy, db, state_backend=state)
+    """
+
+    global_scope = GLOBAL_SCOPE
+    local_windows = False
+
+    def __init__(
+        self,
+        path: str,
+        capacity: int = SHARED_STATE_CAPACITY,
+        pending_ttl: float = SHARED_STATE_PENDING_TTL_SECONDS,
+    ):
+        """
+        Args:
+            path: State file, created if missing
+            capacity: (key, model) buckets the file can hold; an existing file keeps its own
+            pending_ttl: Seconds after which a worker's untouched reservations are treated as abandoned
+        """
+        if not HAS_FCNTL:
+            raise RuntimeError(
+                "Shared rate-limit state needs POSIX file locks (fcntl), which this platform lacks."
+            )
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got: {capacity}")
+        self.path = path
+        self.pending_ttl = pending_ttl
+        # fcntl locks belong to the process, so threads also serialize on this lock
+        self._thread_lock = threading.RLock()
+        self._offsets: Dict[bytes, int] = {}
+        self._worker_pid = 0
+        self._worker_id = 0
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            with self._file_locked(0, _HEADER_SIZE):
+                if os.fstat(self._fd).st_size == 0:
+                    os.ftruncate(self._fd, _HEADER_SIZE + capacity * _RECORD_SIZE)
+                    os.pwrite(self._fd, _HEADER.pack(MAGIC, VERSION, capacity, _RECORD_SIZE), 0)
+                magic, version, file_capacity, record_size = _HEADER.unpack(
+                    os.pread(self._fd, _HEADER.size, 0)
+                )
+            if magic != MAGIC or version != VERSION or record_size != _RECORD_SIZE:
+                raise ValueError(f"{path} is not a keycycle state file of version {VERSION}")
+            self.capacity = file_capacity
+            self._map = mmap.mmap(self._fd, _HEADER_SIZE + file_capacity * _RECORD_SIZE)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    @contextmanager
+    def _file_locked(self, start: int, length: int) -> Iterator[None]:
+        with self._thread_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+    def _worker(self) -> int:
+        """Nonzero id of this backend in this process, owning its pending entries (new after a fork)."""
+        pid = os.getpid()
+        if self._worker_pid != pid:
+            self._worker_id = int.from_bytes(os.urandom(8), "little") or 1
+            self._worker_pid = pid
+        return self._worker_id
+
+    def _locked(self, offset: int) -> ContextManager[None]:
+        return self._file_locked(offset, _RECORD_SIZE)
+
+    def _record(self, ident: bytes, owner: bytes = _EMPTY, scope: str = "") -> Tuple[int, bool]:
+        """Offset of the record for ident, and whether this call created it."""
+        offset = self._offsets.get(ident)
+        if offset is not None:
+            return offset, False
+        # Claiming a slot in the table is serialized on the header lock
+        with self._file_locked(0, _HEADER_SIZE):
+            start = int.from_bytes(ident[:8], "little") % self.capacity
+            for probe in range(self.capacity):
+                offset = _HEADER_SIZE + (start + probe) % self.capacity * _RECORD_SIZE
+                existing = self._map[offset:offset + 16]
+                if existing == ident:
+                    self._offsets[ident] = offset
+                    return offset, False
+                if existing == _EMPTY:
+                    _RECORD_ID.pack_into(self._map, offset, ident, owner, scope.encode()[:64])
+                    self._offsets[ident] = offset
+                    return offset, True
+        raise RuntimeError(f"Shared state file {self.path} is full ({self.capacity} buckets)")
+
+    def bucket(self, provider: str, api_key: str, scope: str) -> SharedUsageBucket:
+        """The shared bucket for a key and a model id (or GLOBAL_SCOPE)."""
+        offset, _ = self._record(_ident(provider, api_key, scope), _ident(provider, api_key), scope)
+        return SharedUsageBucket(self, offset)
+
+    def scopes(self, provider: str, api_key: str) -> List[str]:
+        """Model ids with a bucket for this key, recorded by any process."""
+        owner = _ident(provider, api_key)
+        found = []
+        with self._file_locked(0, _HEADER_SIZE):
+            for index in range(self.capacity):
+                ident, record_owner, scope = _RECORD_ID.unpack_from(
+                    self._map, _HEADER_SIZE + index * _RECORD_SIZE
+                )
+                if ident != _EMPTY and record_owner == owner:
+                    raw = scope.rstrip(b"\0")
+                    # Skip GLOBAL_SCOPE, and truncated names that cannot be mapped back to their record
+                    if raw and not raw.startswith(b"\0") and len(raw) < 64:
+                        found.append(raw.decode())
+        return found
+
+    def claim_hydration(self, provider: str) -> bool:
+        """True for the first caller per provider: only it should replay history into the file."""
+        _, created = self._record(_ident(provider, "\0hydrated"))
+        return created
+
+    def mark_cooldown(self, provider: str, api_key: str, timestamp: float) -> None:
+        offset, _ = self._record(_ident(provider, api_key, "\0cooldown"))
+        at = offset + _RECORD_ID.size
+        with self._locked(offset):
+            stamp, requests, tokens = _COUNTERS.unpack_from(self._map, at)
+            _COUNTERS.pack_into(self._map, at, max(stamp, timestamp), requests, tokens)
+
+    def last_cooldown(self, provider: str, api_key: str) -> float:
+        offset, _ = self._record(_ident(provider, api_key, "\0cooldown"))
+        with self._locked(offset):
+            stamp: float = _COUNTERS.unpack_from(self._map, offset + _RECORD_ID.size)[0]
+            return stamp
+
+    def close(self) -> None:
+        with self._thread_lock:
+            if not self._map.closed:
+                self._map.close()
+                os.close(self._fd)
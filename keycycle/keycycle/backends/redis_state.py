@@ -0,0 +1,327 @@
+"""
+Rate-limit windows kept in Redis, shared by every process and host using the server.
+
+Each (key, model) bucket is one Redis hash. Like the mmap backend it holds a
+ring of time slots per window (60 x 1s, 60 x 60s, 144 x 600s), stored as
+"epoch:requests:tokens" fields, plus each client's pending tokens and the
+lifetime totals. A client's pending tokens are a lease whose deadline lives in
+a sorted set; the script trims leases past their deadline, so a dead host's
+reservations are reclaimed however busy the key stays. Every operation runs as one Lua script (EVALSHA), so checking and
+reserving is atomic on the server and costs a single round trip.
+
+Keys (API keys are only stored as a hash):
+    {prefix}:{<key hash>}:model:<model id>   bucket per model
+    {prefix}:{<key hash>}:global             bucket for the whole key
+    <bucket>:leases                          pending-lease deadline per client
+    {prefix}:{<key hash>}:scopes             set of model ids seen for the key
+    {prefix}:{<key hash>}:cooldown           timestamp of the last 429
+    {prefix}:hydrated:<provider>             set by the first manager to replay history
+
+The key hash is a Redis Cluster hash tag, so a key's buckets share a slot.
+Buckets and scope sets expire after a day without writes.
+"""
+
+import os
+import time
+import uuid
+from hashlib import sha1, sha256
+from typing import Any, List, Optional, Sequence, Tuple
+
+from ..config.constants import SECONDS_PER_DAY, SHARED_STATE_PENDING_TTL_SECONDS
+from ..config.dataclasses import RateLimits, UsageSnapshot, Window
+from .base import StateBackend
+from .resp import RespClient
+
+# KEYS: bucket hash, scopes set, leases zset
+# ARGV: now, pending ttl, scope ('' for the key bucket), client id, op, op args...
+SCRIPT = """
+local bucket, scopes, leases = KEYS[1], KEYS[2], KEYS[3]
+local now, ttl, scope, client, op = tonumber(ARGV[1]), tonumber(ARGV[2]), ARGV[3], ARGV[4], ARGV[5]
+local RINGS = {{'m', 1, 60}, {'h', 60, 60}, {'d', 600, 144}}
+
+local function parse(slot)
+  local epoch, requests, tokens = string.match(slot, '^(%d+):(%d+):(%d+)$')
+  return tonumber(epoch), tonumber(requests), tonumber(tokens)
+end
+
+-- Leases nobody renewed within the ttl belong to clients that died
+local function trim()
+  local expired = redis.call('ZRANGEBYSCORE', leases, '-inf', now)
+  if #expired > 0 then
+    for i, member in ipairs(expired) do expired[i] = 'pending:' .. member end
+    redis.call('HDEL', bucket, unpack(expired))
+    redis.call('ZREMRANGEBYSCORE', leases, '-inf', now)
+  end
+end
+
+local function pending()
+  trim()
+  local live = redis.call('ZRANGE', leases, 0, -1)
+  local total = 0
+  if #live > 0 then
+    for i, member in ipairs(live) do live[i] = 'pending:' .. member end
+    for _, value in ipairs(redis.call('HMGET', bucket, unpack(live))) do
+      total = total + (tonumber(value) or 0)
+    end
+  end
+  return total
+end
+
+local function add_pending(delta)
+  trim()
+  local field = 'pending:' .. client
+  local value = (tonumber(redis.call('HGET', bucket, field)) or 0) + delta
+  if value > 0 then
+    redis.call('HSET', bucket, field, value)
+    redis.call('ZADD', leases, now + ttl, client)
+  else
+    redis.call('HDEL', bucket, field)
+    redis.call('ZREM', leases, client)
+  end
+end
+
+local function windows()
+  local requests, tokens = {}, {}
+  for r, ring in ipairs(RINGS) do
+    local name, width, count = ring[1], ring[2], ring[3]
+    local current = math.floor(now / width)
+    local fields = {}
+    for i = 0, count - 1 do fields[i + 1] = name .. i end
+    local slots = redis.call('HMGET', bucket, unpack(fields))
+    requests[r], tokens[r] = 0, 0
+    for i = 1, count do
+      if slots[i] then
+        local epoch, n, t = parse(slots[i])
+        if current - count < epoch and epoch <= current then
+          requests[r], tokens[r] = requests[r] + n, tokens[r] + t
+        end
+      end
+    end
+  end
+  return requests, tokens
+end
+
+local function add(used, ts)
+  for _, ring in ipairs(RINGS) do
+    local name, width, count = ring[1], ring[2], ring[3]
+    local epoch = math.floor(ts / width)
+    if epoch > math.floor(now / width) - count then
+      local field = name .. (epoch % count)
+      local slot = redis.call('HGET', bucket, field)
+      local n, t = 0, 0
+      if slot then
+        local old, old_n, old_t = parse(slot)
+        if old == epoch then n, t = old_n, old_t elseif old > epoch then n = nil end
+      end
+      -- n is nil when a newer epoch already reuses the slot
+      if n then
+        redis.call('HSET', bucket, field, string.format('%d:%d:%d', epoch, n + 1, t + used))
+      end
+    end
+  end
+  redis.call('HINCRBY', bucket, 'total_requests', 1)
+  redis.call('HINCRBY', bucket, 'total_tokens', used)
+end
+
+if op == 'usage' then
+  local requests, tokens = windows()
+  local totals = redis.call('HMGET', bucket, 'total_requests', 'total_tokens')
+  return {requests[1], requests[2], requests[3], tokens[1], tokens[2], tokens[3],
+          pending(), tonumber(totals[1]) or 0, tonumber(totals[2]) or 0}
+elseif op == 'try_reserve' then
+  local estimate = tonumber(ARGV[6])
+  local requests, tokens = windows()
+  local p = pending()
+  for r = 1, 3 do
+    local max_requests, max_tokens = tonumber(ARGV[6 + r]), tonumber(ARGV[9 + r])
+    if requests[r] >= max_requests then return 0 end
+    if max_tokens > 0 and tokens[r] + p + estimate > max_tokens then return 0 end
+  end
+  add_pending(estimate)
+elseif op == 'pending' then
+  add_pending(tonumber(ARGV[6]))
+elseif op == 'commit' then
+  add_pending(-tonumber(ARGV[6]))
+  add(tonumber(ARGV[7]), tonumber(ARGV[8]))
+elseif op == 'add' then
+  add(tonumber(ARGV[6]), tonumber(ARGV[7]))
+else
+  return redis.error_reply('unknown op ' .. op)
+end
+
+if scope ~= '' then
+  redis.call('SADD', scopes, scope)
+  redis.call('EXPIRE', scopes, IDLE_EXPIRY)
+end
+redis.call('EXPIRE', bucket, IDLE_EXPIRY)
+redis.call('EXPIRE', leases, IDLE_EXPIRY)
+return 1
+""".replace("IDLE_EXPIRY", str(SECONDS_PER_DAY))
+
+SCRIPT_SHA = sha1(SCRIPT.encode()).hexdigest()
+
+
+def _text(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class RedisUsageBucket:
+    """A UsageBucket whose counters live in a Redis hash; every call is one script run."""
+
+    def __init__(self, state: "RedisStateBackend", key: str, scopes_key: str, scope: str):
+        self._state = state
+        self._key = key
+        self._scopes_key = scopes_key
+        self._scope = scope
+
+    def _run(self, op: str, *args: Any) -> Any:
+        return self._state._run(self._key, self._scopes_key, self._scope, op, *args)
+
+    def _values(self) -> List[int]:
+        """Minute/hour/day requests, minute/hour/day tokens, pending, total requests, total tokens."""
+        return [int(v) for v in self._run("usage")]
+
+    def _usage(self) -> Tuple[Window, Window]:
+        values = self._values()
+        pending = values[6]
+        return (values[0], values[1], values[2]), (values[3] + pending, values[4] + pending, values[5] + pending)
+
+    @property
+    def pending_tokens(self) -> int:
+        return self._values()[6]
+
+    @property
+    def total_requests(self) -> int:
+        return self._values()[7]
+
+    @property
+    def total_tokens(self) -> int:
+        return self._values()[8]
+
+    def clean(self) -> None:
+        """Nothing to do: expired slots are skipped on read and reused on write."""
+
+    def add(self, tokens: int, timestamp: float) -> None:
+        self._run("add", max(0, tokens), timestamp)
+
+    def check_limits(self, limits: RateLimits, estimated_tokens: int) -> bool:
+        requests, tokens = self._usage()
+        return limits.allows(requests, tokens, estimated_tokens)
+
+    def headroom(self, limits: RateLimits, estimated_tokens: int) -> int:
+        requests, tokens = self._usage()
+        return limits.headroom(requests, tokens, estimated_tokens)
+
+    def try_reserve(self, limits: RateLimits, estimated_tokens: int) -> bool:
+        return int(self._run(
+            "try_reserve",
+            estimated_tokens,
+            limits.requests_per_minute,
+            limits.requests_per_hour,
+            limits.requests_per_day,
+            limits.tokens_per_minute or 0,
+            limits.tokens_per_hour or 0,
+            limits.tokens_per_day or 0,
+        )) == 1
+
+    def reserve(self, tokens: int) -> None:
+        self._run("pending", tokens)
+
+    def release(self, reserved_tokens: int) -> None:
+        self._run("pending", -reserved_tokens)
+
+    def commit(self, actual_tokens: int, reserved_tokens: int, timestamp: float) -> None:
+        self._run("commit", reserved_tokens, max(0, actual_tokens), timestamp)
+
+    def get_snapshot(self) -> UsageSnapshot:
+        rpm, rph, rpd, tpm, tph, tpd, _, total_requests, total_tokens = self._values()
+        return UsageSnapshot(
+            rpm=rpm, rph=rph, rpd=rpd, tpm=tpm, tph=tph, tpd=tpd,
+            total_requests=total_requests, total_tokens=total_tokens,
+        )
+
+
+class RedisStateBackend(StateBackend):
+    """
+    Rate-limit state in a Redis server, shared by every process and host that uses it.
+
+    Needs Redis 4+ (or a server speaking the same protocol and Lua scripting).
+    Windows use each host's clock, so keep hosts NTP-synced. The first manager
+    per provider replays usage_logs history, one script run per row.
+
+    Example:
+        state = RedisStateBackend("redis://cache:6379/0")
+        wrapper.register_provider("openai", keys, state_backend=state)
+    """
+
+    local_windows = False
+
+    def __init__(
+        self,
+        url: str = "redis://localhost:6379/0",
+        client: Optional[Any] = None,
+        prefix: str = "keycycle",
+        pending_ttl: float = SHARED_STATE_PENDING_TTL_SECONDS,
+    ):
+        """
+        Args:
+            url: Server to connect to with the built-in RespClient
+            client: Use this client instead (anything with redis-py's execute_command)
+            prefix: Namespace for every key this backend writes
+            pending_ttl: Seconds after which a client's unrenewed reservations are treated as abandoned
+        """
+        self.client = client if client is not None else RespClient(url)
+        self.prefix = prefix
+        self.pending_ttl = pending_ttl
+        self._lease_pid = 0
+        self._lease_id = ""
+
+    def _lease_owner(self) -> str:
+        """Id of this backend in this process, owning its pending leases (new after a fork)."""
+        pid = os.getpid()
+        if self._lease_pid != pid:
+            self._lease_id = uuid.uuid4().hex
+            self._lease_pid = pid
+        return self._lease_id
+
+    def _base(self, provider: str, api_key: str) -> str:
+        ident = sha256(f"{provider}\0{api_key}".encode()).hexdigest()[:32]
+        return f"{self.prefix}:{{{ident}}}"
+
+    def _run(self, key: str, scopes_key: str, scope: str, op: str, *args: Any) -> Any:
+        argv: Sequence[Any] = (time.time(), self.pending_ttl, scope, self._lease_owner(), op) + args
+        keys = (key, scopes_key, f"{key}:leases")
+        try:
+            return self.client.execute_command("EVALSHA", SCRIPT_SHA, len(keys), *keys, *argv)
+        except Exception as e:
+            # First run on this server (or after SCRIPT FLUSH): EVAL also caches the script
+            if "NOSCRIPT" not in str(e) and type(e).__name__ != "NoScriptError":
+                raise
+            return self.client.execute_command("EVAL", SCRIPT, len(keys), *keys, *argv)
+
+    def bucket(self, provider: str, api_key: str, scope: str) -> RedisUsageBucket:
+        base = self._base(provider, api_key)
+        if scope == self.global_scope:
+            return RedisUsageBucket(self, f"{base}:global", f"{base}:scopes", "")
+        return RedisUsageBucket(self, f"{base}:model:{scope}", f"{base}:scopes", scope)
+
+    def scopes(self, provider: str, api_key: str) -> List[str]:
+        members = self.client.execute_command("SMEMBERS", f"{self._base(provider, api_key)}:scopes")
+        return [_text(m) for m in members or ()]
+
+    def claim_hydration(self, provider: str) -> bool:
+        """True for the first caller per provider: only it should replay history into Redis."""
+        return self.client.execute_command("SET", f"{self.prefix}:hydrated:{provider}", 1, "NX") is not None
+
+    def mark_cooldown(self, provider: str, api_key: str, timestamp: float) -> None:
+        key = f"{self._base(provider, api_key)}:cooldown"
+        self.client.execute_command("SET", key, timestamp, "EX", SECONDS_PER_DAY)
+
+    def last_cooldown(self, provider: str, api_key: str) -> float:
+        value = self.client.execute_command("GET", f"{self._base(provider, api_key)}:cooldown")
+        return float(_text(value)) if value is not None else 0.0
+
+    def close(self) -> None:
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            close()
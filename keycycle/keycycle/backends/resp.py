@@ -0,0 +1,124 @@
+"""
+A minimal Redis protocol (RESP2) client, enough for RedisStateBackend.
+
+Keeps keycycle free of a hard redis dependency. Any client with a redis-py
+style execute_command(*args) (redis.Redis, redis.RedisCluster, ...) can be
+passed to RedisStateBackend instead.
+"""
+
+import socket
+import threading
+from typing import Any, BinaryIO, Optional, Tuple, Union
+from urllib.parse import unquote, urlsplit
+
+Arg = Union[str, bytes, int, float]
+
+
+class RespError(Exception):
+    """An error reply from the server (e.g. "NOSCRIPT No matching script")."""
+
+
+class RespClient:
+    """
+    One connection, shared by all threads through a lock.
+
+    Replies map to Python as: simple string -> str, integer -> int,
+    bulk string -> bytes (None for nil), array -> list, error -> RespError.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", timeout: float = 5.0):
+        """
+        Args:
+            url: redis://[[user]:password@]host[:port][/db]
+            timeout: Socket connect and read timeout in seconds
+        """
+        parts = urlsplit(url)
+        if parts.scheme != "redis":
+            raise ValueError(f"Only redis:// URLs are supported, got: {url}")
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.username = unquote(parts.username) if parts.username else None
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._reader: Optional[BinaryIO] = None
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile("rb")
+        try:
+            if self.password:
+                auth = (self.username, self.password) if self.username else (self.password,)
+                self._call("AUTH", *auth)
+            if self.db:
+                self._call("SELECT", self.db)
+        except RespError:
+            self._close()
+            raise
+
+    def _streams(self) -> Tuple[socket.socket, BinaryIO]:
+        if self._sock is None or self._reader is None:
+            raise ConnectionError("Not connected")
+        return self._sock, self._reader
+
+    @staticmethod
+    def _encode(args: Tuple[Arg, ...]) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = (repr(arg) if isinstance(arg, float) else str(arg)).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    def _read(self) -> Any:
+        _, reader = self._streams()
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            return RespError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            return None if length < 0 else reader.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(body)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply from server: {line!r}")
+
+    def _call(self, *args: Arg) -> Any:
+        sock, _ = self._streams()
+        sock.sendall(self._encode(args))
+        reply = self._read()
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def execute_command(self, *args: Arg) -> Any:
+        """Send one command and return its reply, connecting on first use."""
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                return self._call(*args)
+            except (OSError, ConnectionError):
+                # The stream position is unknown now; reconnect on the next command
+                self._close()
+                raise
+
+    def _close(self) -> None:
+        if self._sock is not None:
+            if self._reader is not None:
+                self._reader.close()
+            self._sock.close()
+            self._sock = self._reader = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
@@ -0,0 +1,220 @@
+"""
+Rate-limit reservations coordinated across hosts through the usage database.
+
+MmapStateBackend shares windows between processes on one host. SqlLeaseBackend
+extends that to every host writing to the same UsageDatabase: capacity is
+counted in the rate_windows table, one row per (key, scope, window, window start),
+and claimed with conditional UPDATEs (requests + n <= limit) that the database
+applies atomically.
+
+A round trip per request would put the database on the hot path, so each
+process leases a small quota at a time (SQL_LEASE_FRACTION of the minute's
+limits) and serves reservations from it locally. When the lease runs out it
+claims another chunk, falling back to a single request when the windows are
+nearly full. Lease leftovers are netted into the next claim and handed back on
+close. Tokens used beyond the reservation become debt charged with the next
+claim.
+
+Windows are fixed (aligned to the epoch minute, hour and day) and use each
+host's clock, so keep hosts NTP-synced. Local windows still track this
+process's own usage for stats and as a first check.
+"""
+
+import atexit
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config.constants import SECONDS_PER_DAY, SECONDS_PER_HOUR, SECONDS_PER_MINUTE, SQL_LEASE_FRACTION
+from ..config.dataclasses import KeyUsage, RateLimits, UsageBucket
+from ..config.enums import RateLimitStrategy
+from ..core.utils import get_key_suffix
+from ..usage.db_logic import UsageDatabase, WindowDelta
+from .base import BucketMap, StateBackend
+
+SQL_GLOBAL_SCOPE = "__global__"
+LEASE_WINDOWS = (SECONDS_PER_MINUTE, SECONDS_PER_HOUR, SECONDS_PER_DAY)
+
+Starts = Tuple[int, int, int]
+
+
+def _window_starts(now: float) -> Starts:
+    minute, hour, day = (int(now // width) * width for width in LEASE_WINDOWS)
+    return minute, hour, day
+
+
+@dataclass(eq=False)
+class LeasedUsageBucket(UsageBucket):
+    """A UsageBucket that also draws every reservation from a lease on the shared windows."""
+    backend: Optional["SqlLeaseBackend"] = None
+    provider: str = ""
+    suffix: str = ""
+    scope: str = ""
+
+    # Capacity leased from the windows starting at lease_starts and not yet used
+    lease_starts: Starts = (0, 0, 0)
+    lease_requests: int = 0
+    lease_tokens: int = 0
+    _lease_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def try_reserve(self, limits: RateLimits, estimated_tokens: int) -> bool:
+        if not self.check_limits(limits, estimated_tokens): return False
+        if not self._take(limits, estimated_tokens): return False
+        UsageBucket.reserve(self, estimated_tokens)
+        return True
+
+    def reserve(self, tokens: int) -> None:
+        """Lock in extra tokens (e.g. a stream outgrowing its estimate), charged to the lease"""
+        super().reserve(tokens)
+        with self._lease_lock:
+            self.lease_tokens -= tokens
+
+    def release(self, reserved_tokens: int) -> None:
+        super().release(reserved_tokens)
+        with self._lease_lock:
+            # Only a reservation from the current windows can go back into the lease
+            if self.lease_starts == _window_starts(time.time()):
+                self.lease_requests += 1
+                self.lease_tokens += reserved_tokens
+
+    def commit(self, actual_tokens: int, reserved_tokens: int, timestamp: float) -> None:
+        # Not super().commit: its release() would hand the request back to the lease
+        UsageBucket.release(self, reserved_tokens)
+        self.add(actual_tokens, timestamp)
+        with self._lease_lock:
+            self.lease_tokens += reserved_tokens - actual_tokens
+
+    def _take(self, limits: RateLimits, estimated_tokens: int) -> bool:
+        starts = _window_starts(time.time())
+        with self._lease_lock:
+            if (
+                starts == self.lease_starts
+                and self.lease_requests >= 1
+                and (not limits.tokens_per_minute or self.lease_tokens >= estimated_tokens)
+            ):
+                self.lease_requests -= 1
+                self.lease_tokens -= estimated_tokens
+                return True
+            return self._claim(limits, estimated_tokens, starts)
+
+    def _claim(self, limits: RateLimits, estimated_tokens: int, starts: Starts) -> bool:
+        """Lease a chunk from the database (or a single request if the chunk no longer fits)."""
+        backend = self.backend
+        assert backend is not None, "LeasedUsageBucket is created by SqlLeaseBackend.bucket()"
+        fraction = backend.lease_fraction
+        chunk_requests = max(1, int(limits.requests_per_minute * fraction))
+        if limits.tokens_per_minute:
+            chunk_tokens = max(estimated_tokens, int(limits.tokens_per_minute * fraction))
+        else:
+            chunk_tokens = estimated_tokens * chunk_requests
+
+        for requests, tokens in ((chunk_requests, chunk_tokens), (1, estimated_tokens)):
+            if backend.claim(self, limits, starts, requests, tokens):
+                self.lease_starts = starts
+                self.lease_requests = requests - 1
+                self.lease_tokens = tokens - estimated_tokens
+                return True
+            if chunk_requests == 1 and chunk_tokens == estimated_tokens:
+                break
+        return False
+
+
+class SqlLeaseBackend(StateBackend):
+    """
+    Rate-limit state coordinated through the usage database, for managers on many hosts.
+
+    Every manager hydrates its local windows from usage_logs as usual; the
+    rate_windows counters are what keeps hosts from overbooking each other.
+    Works on SQLite (one host, several processes) and MySQL/TiDB.
+
+    Example:
+        db = UsageDatabase()
+        manager = RotatingKeyManager(keys, "openai", strategy, db, state_backend=SqlLeaseBackend(db))
+    """
+
+    global_scope = SQL_GLOBAL_SCOPE
+
+    def __init__(self, db: UsageDatabase, lease_fraction: float = SQL_LEASE_FRACTION):
+        """
+        Args:
+            db: Database holding the shared rate windows
+            lease_fraction: Share of the minute limits to prefetch per round trip (0 < f <= 1).
+                Larger leases mean fewer round trips but more capacity parked in idle processes.
+        """
+        if not 0 < lease_fraction <= 1:
+            raise ValueError(f"lease_fraction must be in (0, 1], got: {lease_fraction}")
+        self.db = db
+        self.lease_fraction = lease_fraction
+        self._lock = threading.Lock()
+        self._buckets: List[LeasedUsageBucket] = []
+        atexit.register(self.close)
+
+    def bucket(self, provider: str, api_key: str, scope: str) -> LeasedUsageBucket:
+        """A leased bucket for a key and a model id (or global_scope)."""
+        bucket = LeasedUsageBucket(
+            backend=self, provider=provider, suffix=get_key_suffix(api_key), scope=scope
+        )
+        with self._lock:
+            self._buckets.append(bucket)
+        return bucket
+
+    def key_usage(
+        self,
+        provider: str,
+        api_key: str,
+        strategy: RateLimitStrategy,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> KeyUsage:
+        """A KeyUsage whose limit checks go through leases (on the key for GLOBAL, per model otherwise)."""
+        if strategy == RateLimitStrategy.GLOBAL:
+            return KeyUsage(
+                api_key=api_key,
+                strategy=strategy,
+                params=params or {},
+                global_bucket=self.bucket(provider, api_key, self.global_scope),
+            )
+        return KeyUsage(
+            api_key=api_key,
+            strategy=strategy,
+            params=params or {},
+            buckets=BucketMap(lambda model_id: self.bucket(provider, api_key, model_id)),
+        )
+
+    def claim(
+        self, bucket: LeasedUsageBucket, limits: RateLimits, starts: Starts, requests: int, tokens: int
+    ) -> bool:
+        """Charge a new lease to the database, netting the bucket's leftovers and token debt."""
+        request_limits = (limits.requests_per_minute, limits.requests_per_hour, limits.requests_per_day)
+        token_limits = (limits.tokens_per_minute, limits.tokens_per_hour, limits.tokens_per_day)
+        debt = max(0, -bucket.lease_tokens)
+        deltas: List[WindowDelta] = []
+        for width, start, old_start, max_requests, max_tokens in zip(
+            LEASE_WINDOWS, starts, bucket.lease_starts, request_limits, token_limits
+        ):
+            # Leftovers in a window that has since rolled over are simply gone
+            same = start == old_start
+            deltas.append((
+                width,
+                start,
+                requests - (bucket.lease_requests if same else 0),
+                tokens + debt - (max(0, bucket.lease_tokens) if same else 0),
+                max_requests,
+                max_tokens,
+            ))
+        return self.db.lease_window_capacity(bucket.provider, bucket.suffix, bucket.scope, deltas)
+
+    def close(self) -> None:
+        """Hand unused lease capacity back so other processes can use it."""
+        starts = _window_starts(time.time())
+        with self._lock:
+            buckets, self._buckets = self._buckets, []
+        for bucket in buckets:
+            with bucket._lease_lock:
+                if bucket.lease_starts != starts:
+                    continue
+                requests, tokens = bucket.lease_requests, max(0, bucket.lease_tokens)
+                bucket.lease_requests = bucket.lease_tokens = 0
+            if requests or tokens:
+                deltas = [(w, s, -requests, -tokens, None, None) for w, s in zip(LEASE_WINDOWS, starts)]
+                self.db.lease_window_capacity(bucket.provider, bucket.suffix, bucket.scope, deltas)
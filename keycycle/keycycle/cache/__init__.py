@@ -0,0 +1,7 @@
+from .response_cache import ResponseCache, is_deterministic_call
+from .sqlite_tier import SqliteCacheTier
+__all__ = [
+    "ResponseCache",
+    "SqliteCacheTier",
+    "is_deterministic_call",
+]
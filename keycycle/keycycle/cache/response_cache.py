@@ -0,0 +1,171 @@
+"""
+Response cache for deterministic calls.
+
+A cache hit is answered without acquiring a key, so it consumes no RPM/TPM.
+Responses are stored pickled: the byte limit is measured on real sizes, the
+optional disk tier can hold them, and every hit returns a fresh copy that the
+caller is free to mutate.
+"""
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from ..config.constants import (
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL_SECONDS,
+)
+from ..config.dataclasses import CacheStats
+from .sqlite_tier import SqliteCacheTier
+
+logger = logging.getLogger(__name__)
+
+CachePolicy = Callable[[Tuple[str, ...], dict], bool]
+
+
+def is_deterministic_call(path: Tuple[str, ...], kwargs: dict) -> bool:
+    """
+    Default cache policy.
+
+    Caches embedding calls and single-choice calls made with temperature 0.
+    Streaming calls are never cached, and neither are calls with an argument
+    that has no JSON form, whatever the policy (see request_key).
+    """
+    if kwargs.get("stream"):
+        return False
+    if any("embed" in name.lower() for name in path):
+        return True
+    return kwargs.get("temperature") == 0 and kwargs.get("n", 1) == 1
+
+
+class ResponseCache:
+    """
+    Thread-safe in-memory LRU with TTL and byte limits, plus an optional SQLite tier.
+
+    One cache can be shared by several rotating clients; keys include the
+    provider, default model, call path and arguments.
+
+    Example:
+        cache = ResponseCache(max_bytes=32 * 1024 * 1024, ttl=600, disk_path="responses.db")
+        client = wrapper.get_openai_client(response_cache=cache)
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        ttl: float = RESPONSE_CACHE_TTL_SECONDS,
+        disk_path: Optional[str] = None,
+        policy: Optional[CachePolicy] = None,
+    ):
+        """
+        Args:
+            max_entries: Maximum responses kept in memory
+            max_bytes: Maximum pickled bytes kept in memory
+            ttl: Seconds a response stays valid
+            disk_path: SQLite file for a persistent second tier (None: memory only)
+            policy: Decides which calls may be cached (default: is_deterministic_call)
+        """
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be at least 1, got: {max_entries}")
+        if ttl <= 0:
+            raise ValueError(f"ttl must be positive, got: {ttl}")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.policy = policy or is_deterministic_call
+        self._disk = SqliteCacheTier(disk_path) if disk_path else None
+
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    def is_cacheable(self, path: Tuple[str, ...], kwargs: dict) -> bool:
+        return self.policy(path, kwargs)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (True, response) on a hit, (False, None) on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, blob = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats.hits += 1
+                    return True, pickle.loads(blob)
+                self._drop(key)
+                self._stats.expirations += 1
+
+        stored = self._disk.get(key) if self._disk is not None else None
+        with self._lock:
+            if stored is None:
+                self._stats.misses += 1
+                return False, None
+            blob, expires_at = stored
+            self._stats.hits += 1
+            self._stats.disk_hits += 1
+            # Promote to memory without outliving the disk entry
+            self._insert(key, min(expires_at, now + self.ttl), blob)
+        return True, pickle.loads(blob)
+
+    def set(self, key: str, response: Any) -> bool:
+        """Store a response. Returns False if it could not be pickled or is too large."""
+        try:
+            blob = pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.debug("Response of type %s is not cacheable: %s", type(response).__name__, e)
+            return False
+        if len(blob) > self.max_bytes:
+            return False
+
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._insert(key, expires_at, blob)
+            self._stats.stores += 1
+        if self._disk is not None:
+            self._disk.set(key, blob, expires_at)
+        return True
+
+    def _insert(self, key: str, expires_at: float, blob: bytes) -> None:
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (expires_at, blob)
+        self._bytes += len(blob)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self._stats.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        _, blob = self._entries.pop(key)
+        self._bytes -= len(blob)
+
+    def stats(self) -> CacheStats:
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            s = self._stats
+            return CacheStats(
+                hits=s.hits, misses=s.misses, disk_hits=s.disk_hits, stores=s.stores,
+                evictions=s.evictions, expirations=s.expirations,
+                entries=len(self._entries), bytes=self._bytes,
+            )
+
+    def clear(self) -> None:
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self._disk is not None:
+            self._disk.clear()
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+
+    def __len__(self) -> int:
+        return len(self._entries)
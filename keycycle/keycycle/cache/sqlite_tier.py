@@ -0,0 +1,71 @@
+"""On-disk tier for the response cache, backed by a local SQLite file."""
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteCacheTier:
+    """
+    Persistent key -> pickled response store with per-entry expiry.
+
+    Survives restarts, so a warm cache is not lost when the process exits.
+    Expired rows are dropped when read and purged when the file is opened.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "  cache_key TEXT PRIMARY KEY,"
+                "  value BLOB NOT NULL,"
+                "  expires_at REAL NOT NULL"
+                ")"
+            )
+            self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Return (blob, expires_at) for key, or None if absent or expired."""
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM response_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[1] <= time.time():
+                    self._conn.execute("DELETE FROM response_cache WHERE cache_key = ?", (key,))
+                    self._conn.commit()
+                    return None
+            except sqlite3.Error as e:
+                logger.warning("Failed to read response cache entry from %s: %s", self.path, e)
+                return None
+            return row[0], row[1]
+
+    def set(self, key: str, blob: bytes, expires_at: float) -> None:
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (cache_key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, sqlite3.Binary(blob), expires_at),
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("Failed to write response cache entry to %s: %s", self.path, e)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -7,6 +7,7 @@ SECONDS_PER_DAY = 86400
 
 # Cooldown configuration
 DEFAULT_COOLDOWN_SECONDS = 30
+INVALID_KEY_DISABLE_SECONDS = 86400  # keys rejected as unauthorized are tried again after this
 
 # Cleanup intervals
 CLEANUP_INTERVAL_SECONDS = 55
@@ -18,6 +19,7 @@ MAX_POLL_INTERVAL = 5.0
 
 # History lookback
 HISTORY_LOOKBACK_SECONDS = 86400  # 24 hours
+HISTORY_CHUNK_ROWS = 10000  # rows fetched (and replayed) at a time while hydrating
 
 # API key suffix length for logging
 KEY_SUFFIX_LENGTH = 8
@@ -31,5 +33,67 @@ TEMP_RATE_LIMIT_MULTIPLIER = 2.0
 # Key rotation delay (seconds to wait after rotating to a new key)
 KEY_ROTATION_DELAY_SECONDS = 0.5
 
-# Usage logging batch size
-USAGE_LOG_BATCH_SIZE = 50
+# Usage logging: a batch is written when any of the first three limits is reached
+USAGE_LOG_BATCH_SIZE = 500
+USAGE_LOG_MAX_LATENCY_SECONDS = 1.0  # oldest buffered row waits at most this long
+USAGE_LOG_MAX_BATCH_BYTES = 256 * 1024
+USAGE_LOG_MAX_QUEUE_SIZE = 10000  # rows held in memory while the database is slow or down
+USAGE_LOG_RETRY_SECONDS = 2.0  # wait before retrying a failed batch
+USAGE_LOG_WRITE_ATTEMPTS = 3  # tries per batch before it is dropped
+
+# Tailing other processes' usage_logs rows
+USAGE_TAIL_OVERLAP_SECONDS = 30  # re-read this far back each poll to catch rows committed late
+
+# Compact usage schema: a value missing from a dimension table is looked up again after this long
+DIMENSION_MISS_TTL_SECONDS = 5.0
+
+# Local checkpoints of the rate-limit windows, for warm restarts
+CHECKPOINT_INTERVAL_SECONDS = 60
+CHECKPOINT_MAX_AGE_SECONDS = 3600  # older checkpoints are ignored and history is read from the database
+
+# Live SDK clients kept per rotating client (one per key is enough)
+DEFAULT_CLIENT_CACHE_SIZE = 64
+
+# Shared HTTP connection pool defaults (per provider)
+HTTP_POOL_MAX_CONNECTIONS = 100
+HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTP_POOL_KEEPALIVE_EXPIRY = 30.0  # seconds
+
+# Hedged request defaults (async clients, opt-in)
+HEDGE_LATENCY_PERCENTILE = 0.95
+HEDGE_MIN_DELAY_SECONDS = 0.05
+HEDGE_BUDGET_FRACTION = 0.05  # at most 5% extra requests per minute
+HEDGE_LATENCY_WINDOW = 256  # recent latencies kept per model
+HEDGE_MIN_SAMPLES = 20  # no hedging until this many latencies are known
+
+# Streamed usage estimation (when a stream carries no usage payload)
+CHARS_PER_TOKEN = 4
+STREAM_RESERVATION_TOP_UP_TOKENS = 256  # minimum reservation top-up mid-stream
+
+# Response cache for deterministic calls
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64 MiB of pickled responses in memory
+RESPONSE_CACHE_TTL_SECONDS = 3600
+
+# Learned per-model token reservations
+TOKEN_ESTIMATE_EMA_ALPHA = 0.2  # weight of the newest observation
+TOKEN_ESTIMATE_MIN_SAMPLES = 5  # observations before a learned value is trusted
+TOKEN_ESTIMATE_HEADROOM = 1.1  # reserve 10% above the learned expectation
+
+# Capacity-aware batch runner (wrapper.map / wrapper.amap)
+BATCH_MAX_CONCURRENCY = 64
+BATCH_MAX_RETRIES = 5  # retries of one item when the pool is out of capacity
+BATCH_CAPACITY_POLL_SECONDS = 0.05  # how often headroom is re-read while items run
+
+# Sync SDK clients offloaded to a thread pool for asyncio callers
+OFFLOAD_MAX_IN_FLIGHT_PER_KEY = 4
+OFFLOAD_SLOT_POLL_INITIAL = 0.01  # first wait when every usable key is at its cap
+OFFLOAD_SLOT_POLL_MAX = 0.25
+
+# Memory-mapped rate-limit state shared by the processes on a host
+SHARED_STATE_CAPACITY = 1024  # (key, model) buckets one state file can hold
+SHARED_STATE_PENDING_TTL_SECONDS = 600  # a worker's reservations untouched this long are dropped (dead workers)
+SHARED_STATE_PENDING_SLOTS = 16  # workers per (key, model) bucket tracking their own reservations
+
+# SQL-coordinated reservations across hosts
+SQL_LEASE_FRACTION = 0.1  # share of a minute's limits one process prefetches per database round trip
@@ -1,12 +1,16 @@
-from typing import Any, Dict, List, Optional, Union
-from .enums import RateLimitStrategy
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+from .enums import KeyStatus, RateLimitStrategy
 from .constants import (
     SECONDS_PER_MINUTE, SECONDS_PER_HOUR, SECONDS_PER_DAY,
     DEFAULT_COOLDOWN_SECONDS
 )
+import heapq
 import time
+from bisect import bisect_right
 from collections import deque, defaultdict
 from dataclasses import dataclass, field
+from itertools import chain, repeat
+from operator import itemgetter
 
 # --- CONFIGURATION DATA ---
 
@@ -20,6 +24,29 @@ class RateLimits:
     tokens_per_hour: Optional[int] = None
     tokens_per_day: Optional[int] = None
 
+    def allows(self, requests: "Window", tokens: "Window", estimated_tokens: int) -> bool:
+        """Whether one more request of estimated_tokens fits, given (minute, hour, day) usage"""
+        request_limits = (self.requests_per_minute, self.requests_per_hour, self.requests_per_day)
+        if any(used >= limit for used, limit in zip(requests, request_limits)): return False
+        token_limits = (self.tokens_per_minute, self.tokens_per_hour, self.tokens_per_day)
+        return not any(
+            limit and used + estimated_tokens > limit for used, limit in zip(tokens, token_limits)
+        )
+
+    def headroom(self, requests: "Window", tokens: "Window", estimated_tokens: int) -> int:
+        """How many more requests of estimated_tokens fit, given (minute, hour, day) usage"""
+        request_limits = (self.requests_per_minute, self.requests_per_hour, self.requests_per_day)
+        room = min(limit - used for used, limit in zip(requests, request_limits))
+        per_request = max(1, estimated_tokens)
+        token_limits = (self.tokens_per_minute, self.tokens_per_hour, self.tokens_per_day)
+        for used, limit in zip(tokens, token_limits):
+            if limit:
+                room = min(room, (limit - used) // per_request)
+        return max(0, room)
+
+# Usage in the (minute, hour, day) windows
+Window = Tuple[int, int, int]
+
 # Type alias for per-key rate limit overrides
 # Can be a single RateLimits (applies to all models) or a dict mapping model_id -> RateLimits
 KeyLimitOverride = Union[RateLimits, Dict[str, RateLimits]]
@@ -51,8 +78,55 @@ class UsageSnapshot:
 class KeySummary:
     index: int; suffix: str; snapshot: UsageSnapshot
 @dataclass
+class CacheStats:
+    """Response cache counters. Hits never reach a key, so they use no RPM/TPM."""
+    hits: int = 0
+    misses: int = 0
+    disk_hits: int = 0
+    stores: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __add__(self, other):
+        if not isinstance(other, CacheStats): return NotImplemented
+        return CacheStats(
+            self.hits + other.hits, self.misses + other.misses, self.disk_hits + other.disk_hits,
+            self.stores + other.stores, self.evictions + other.evictions,
+            self.expirations + other.expirations, self.entries + other.entries,
+            self.bytes + other.bytes
+        )
+@dataclass
+class UsageLogStats:
+    """AsyncUsageLogger counters. Rows are enqueued, then either written or dropped."""
+    enqueued: int = 0
+    written: int = 0
+    dropped: int = 0
+    flushes: int = 0
+    failed_flushes: int = 0
+    queued: int = 0
+    spooled: int = 0
+    replayed: int = 0
+    flush_seconds: float = 0.0
+    max_flush_seconds: float = 0.0
+
+    @property
+    def avg_flush_seconds(self) -> float:
+        return self.flush_seconds / self.flushes if self.flushes else 0.0
+
+    @property
+    def rows_per_flush(self) -> float:
+        return self.written / self.flushes if self.flushes else 0.0
+@dataclass
 class GlobalStats:
     total: UsageSnapshot; keys: List[KeySummary]
+    cache: Optional[CacheStats] = None
 @dataclass
 class KeyDetailedStats:
     index: int; suffix: str; total: UsageSnapshot; breakdown: Dict[str, UsageSnapshot]
@@ -62,6 +136,34 @@ class ModelAggregatedStats:
     
 
 # --- USAGE TRACKING ---
+
+# (timestamp, tokens, requests) of replayed history; the tokens cover all of the requests
+HistoryEntry = Tuple[float, int, int]
+
+
+def _extend_sorted(d: deque, items: list, key=None) -> None:
+    """Append timestamp-ordered items, merging when they start before the deque's last entry"""
+    if not items: return
+    if d and (key(d[-1]) if key else d[-1]) > (key(items[0]) if key else items[0]):
+        merged = list(heapq.merge(d, items, key=key))
+        d.clear()
+        d.extend(merged)
+    else:
+        d.extend(items)
+
+
+def _add_history(bucket: Any, entries: Sequence[HistoryEntry]) -> None:
+    """Bulk-load a bucket when it supports it, otherwise one add() per request"""
+    add_many = getattr(bucket, "add_many", None)
+    if add_many is not None:
+        add_many(entries)
+        return
+    for ts, tokens, requests in entries:
+        bucket.add(tokens, ts)
+        for _ in range(requests - 1):
+            bucket.add(0, ts)
+
+
 @dataclass
 class UsageBucket:
     """Tracks counters for a SINGLE model context"""
@@ -104,29 +206,61 @@ class UsageBucket:
             self.tokens_hour.append((timestamp, tokens))
             self.tokens_day.append((timestamp, tokens))
             self.total_tokens += tokens
+
+    def add_many(self, entries: Sequence[HistoryEntry]) -> None:
+        """Bulk add() for timestamp-sorted history; entries already outside a window skip its deques"""
+        if not entries: return
+        now = time.time()
+        stamps = [e[0] for e in entries]
+        counts = [e[2] for e in entries]
+        single = all(n == 1 for n in counts)
+        used = [(ts, tok) for ts, tok, _ in entries if tok > 0]
+        used_stamps = [u[0] for u in used]
+        for requests, tokens, width in (
+            (self.requests_minute, self.tokens_minute, SECONDS_PER_MINUTE),
+            (self.requests_hour, self.tokens_hour, SECONDS_PER_HOUR),
+            (self.requests_day, self.tokens_day, SECONDS_PER_DAY),
+        ):
+            cutoff = now - width
+            start = bisect_right(stamps, cutoff)
+            _extend_sorted(requests, stamps[start:] if single else list(
+                chain.from_iterable(map(repeat, stamps[start:], counts[start:]))
+            ))
+            _extend_sorted(tokens, used[bisect_right(used_stamps, cutoff):], key=itemgetter(0))
+        self.total_requests += sum(counts)
+        self.total_tokens += sum(u[1] for u in used)
     
-    def check_limits(self, limits: RateLimits, estimated_tokens: int) -> bool:
+    def _windows(self) -> Tuple[Window, Window]:
+        """(requests, tokens incl. pending) in the minute, hour and day windows"""
         self.clean()
-        if len(self.requests_minute) >= limits.requests_per_minute: return False
-        if len(self.requests_hour) >= limits.requests_per_hour: return False
-        if len(self.requests_day) >= limits.requests_per_day: return False
-        
-        current_tpm = sum(t[1] for t in self.tokens_minute) + self.pending_tokens
-        current_tph = sum(t[1] for t in self.tokens_hour) + self.pending_tokens
-        current_tpd = sum(t[1] for t in self.tokens_day) + self.pending_tokens
-        
-        if limits.tokens_per_minute and (current_tpm + estimated_tokens > limits.tokens_per_minute): return False
-        if limits.tokens_per_hour and (current_tph + estimated_tokens > limits.tokens_per_hour): return False
-        if limits.tokens_per_day and (current_tpd + estimated_tokens > limits.tokens_per_day): return False
-        
+        requests = (len(self.requests_minute), len(self.requests_hour), len(self.requests_day))
+        tokens = tuple(
+            sum(t[1] for t in d) + self.pending_tokens
+            for d in (self.tokens_minute, self.tokens_hour, self.tokens_day)
+        )
+        return requests, tokens
+
+    def check_limits(self, limits: RateLimits, estimated_tokens: int) -> bool:
+        requests, tokens = self._windows()
+        return limits.allows(requests, tokens, estimated_tokens)
+
+    def headroom(self, limits: RateLimits, estimated_tokens: int) -> int:
+        """How many more requests of estimated_tokens fit under every limit right now"""
+        requests, tokens = self._windows()
+        return limits.headroom(requests, tokens, estimated_tokens)
+
+    def try_reserve(self, limits: RateLimits, estimated_tokens: int) -> bool:
+        """Reserve estimated_tokens if the request fits under every limit"""
+        if not self.check_limits(limits, estimated_tokens): return False
+        self.reserve(estimated_tokens)
         return True
     
     def reserve(self, tokens: int):
         """Lock in estimated tokens"""
         self.pending_tokens += tokens
     
-    def commit(self, actual_tokens: int, reserved_tokens: int, timestamp: float):
-        """Remove reservation and add actual usage"""
+    def release(self, reserved_tokens: int):
+        """Remove a reservation without recording a request"""
         self.pending_tokens -= reserved_tokens
         if self.pending_tokens < 0:
             import logging
@@ -135,6 +269,10 @@ class UsageBucket:
                 self.pending_tokens
             )
             self.pending_tokens = 0
+
+    def commit(self, actual_tokens: int, reserved_tokens: int, timestamp: float):
+        """Remove reservation and add actual usage"""
+        self.release(reserved_tokens)
         self.add(actual_tokens, timestamp)
     
     def get_snapshot(self) -> UsageSnapshot:
@@ -161,6 +299,9 @@ class KeyUsage:
     buckets: Dict[str, UsageBucket] = field(default_factory=lambda: defaultdict(UsageBucket))
     global_bucket: UsageBucket = field(default_factory=UsageBucket)
     last_429: float = 0.0
+    # Benched (daily quota used up, or rejected as invalid) until this time
+    disabled_until: float = 0.0
+    disabled_status: Optional[KeyStatus] = None
 
     def get_client_params(self) -> Dict[str, Any]:
         """Returns all params for client instantiation."""
@@ -174,6 +315,13 @@ class KeyUsage:
         if self.strategy == RateLimitStrategy.GLOBAL:
             self.global_bucket.add(tokens, ts)
         
+    def record_history(self, history: Mapping[str, Sequence[HistoryEntry]]) -> None:
+        """Replay historical usage: per model, (timestamp, tokens, requests) sorted by timestamp"""
+        for model_id, entries in history.items():
+            _add_history(self.buckets[model_id], entries)
+        if self.strategy == RateLimitStrategy.GLOBAL:
+            _add_history(self.global_bucket, list(heapq.merge(*history.values())))
+
     def can_use_model(self, model_id: str, limits: RateLimits, estimated_tokens: int = 1000) -> bool:
         """Check limits based on the provider's strategy"""
         if self.strategy == RateLimitStrategy.GLOBAL:
@@ -181,6 +329,20 @@ class KeyUsage:
         else: # Per-Model Limits
             return self.buckets[model_id].check_limits(limits, estimated_tokens)
 
+    def try_reserve(self, model_id: str, limits: RateLimits, estimated_tokens: int = 1000) -> bool:
+        """Check limits and reserve in one step, so shared buckets cannot be overbooked"""
+        if self.strategy == RateLimitStrategy.GLOBAL:
+            if not self.global_bucket.try_reserve(limits, estimated_tokens): return False
+            self.buckets[model_id].reserve(estimated_tokens)
+            return True
+        return self.buckets[model_id].try_reserve(limits, estimated_tokens)
+
+    def headroom(self, model_id: str, limits: RateLimits, estimated_tokens: int = 1000) -> int:
+        """Requests this key can still take for the model, based on the provider's strategy"""
+        if self.strategy == RateLimitStrategy.GLOBAL:
+            return self.global_bucket.headroom(limits, estimated_tokens)
+        return self.buckets[model_id].headroom(limits, estimated_tokens)
+
     def get_total_snapshot(self) -> UsageSnapshot:
         if self.strategy == RateLimitStrategy.GLOBAL:
             return self.global_bucket.get_snapshot()
@@ -194,6 +356,11 @@ class KeyUsage:
         if self.strategy == RateLimitStrategy.GLOBAL:
             self.global_bucket.reserve(tokens)
     
+    def release(self, model_id: str, reserved_tokens: int):
+        self.buckets[model_id].release(reserved_tokens)
+        if self.strategy == RateLimitStrategy.GLOBAL:
+            self.global_bucket.release(reserved_tokens)
+
     def commit(self, model_id: str, actual_tokens: int, reserved_tokens: int, timestamp: float = None):
         ts = timestamp if timestamp else time.time()
         self.buckets[model_id].commit(actual_tokens, reserved_tokens, ts)
@@ -210,3 +377,19 @@ class KeyUsage:
     def trigger_cooldown(self):
         """Mark this key as rate-limited."""
         self.last_429 = time.time()
+
+    def disable(self, status: KeyStatus, until: float) -> None:
+        """Bench this key until the given time (an earlier bench is only ever extended)."""
+        if until > self.disabled_until:
+            self.disabled_until = until
+            self.disabled_status = status
+
+    def enable(self) -> None:
+        """Lift any bench and cooldown on this key."""
+        self.disabled_until = 0.0
+        self.disabled_status = None
+        self.last_429 = 0
+
+    def is_disabled(self) -> bool:
+        """Returns True if the key is benched for an exhausted quota or as invalid."""
+        return time.time() < self.disabled_until
@@ -3,3 +3,16 @@ from enum import Enum
 class RateLimitStrategy(Enum):
     PER_MODEL = "per_model"  # Cerebras, Groq, Gemini
     GLOBAL = "global"        # OpenRouter (Shared limits across all models)
+
+class KeyStatus(Enum):
+    COOLDOWN = "cooldown"    # Rate-limited (429), benched for cooldown_seconds
+    EXHAUSTED = "exhausted"  # Daily quota used up, benched until the next UTC day
+    INVALID = "invalid"      # Rejected as unauthorized (401 or invalid_api_key)
+
+class UsageWriter(Enum):
+    THREAD = "thread"    # AsyncUsageLogger: a background thread per manager
+    ASYNCIO = "asyncio"  # AsyncioUsageLogger: a task on the application's event loop
+
+class QueueOverflow(Enum):
+    BLOCK = "block"              # Callers wait for room (backpressure)
+    DROP_OLDEST = "drop_oldest"  # Oldest unwritten rows are discarded
@@ -13,10 +13,15 @@ from .exceptions import (
 from .utils import (
     get_key_suffix,
     is_rate_limit_error,
+    is_daily_limit_error,
     is_auth_error,
+    is_invalid_key_error,
     validate_api_key,
 )
 from .backoff import ExponentialBackoff, BackoffConfig
+from .hedging import HedgeConfig, Hedger
+from .single_flight import SingleFlight, AsyncSingleFlight, request_key
+from .batch import BatchRunner, AsyncBatchRunner
 
 __all__ = [
     # Exceptions
@@ -32,9 +37,21 @@ __all__ = [
     # Utilities
     "get_key_suffix",
     "is_rate_limit_error",
+    "is_daily_limit_error",
     "is_auth_error",
+    "is_invalid_key_error",
     "validate_api_key",
     # Backoff
     "ExponentialBackoff",
     "BackoffConfig",
+    # Hedging
+    "HedgeConfig",
+    "Hedger",
+    # Request coalescing
+    "SingleFlight",
+    "AsyncSingleFlight",
+    "request_key",
+    # Batch runners
+    "BatchRunner",
+    "AsyncBatchRunner",
 ]
@@ -0,0 +1,258 @@
+"""
+Capacity-aware parallel runners for many calls against a key pool.
+
+A fixed-size thread pool either overruns the pool (and sees "no available keys")
+or idles below it. These runners re-read the pool's headroom as items finish and
+only start as many calls as the keys can take right now, so throughput tracks
+the sum of the keys' RPM/TPM.
+"""
+import asyncio
+import functools
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, Optional, Union
+
+from ..config.constants import (
+    BATCH_CAPACITY_POLL_SECONDS,
+    BATCH_MAX_CONCURRENCY,
+    BATCH_MAX_RETRIES,
+)
+from .backoff import BackoffConfig, ExponentialBackoff
+from .exceptions import NoAvailableKeyError
+from .utils import is_rate_limit_error
+
+# Given the calls in flight, how many more the key pool can start right now
+Headroom = Callable[[int], int]
+BatchItem = Union[Callable[[], Any], Dict[str, Any]]
+
+
+def as_calls(
+    items: Iterable[BatchItem], fn: Optional[Callable[..., Any]] = None
+) -> Iterator[Callable[[], Any]]:
+    """
+    Turn batch items into zero-argument calls.
+
+    Callables are used as they are; a dict of kwargs becomes fn(**item).
+    """
+    for item in items:
+        if callable(item):
+            yield item
+        elif isinstance(item, dict):
+            if fn is None:
+                raise TypeError("Dict batch items need fn to call with them")
+            yield functools.partial(fn, **item)
+        else:
+            raise TypeError(
+                f"Batch items must be callables or kwargs dicts, got: {type(item).__name__}"
+            )
+
+
+def is_capacity_error(error: BaseException) -> bool:
+    """Whether a call failed only because the pool had no capacity left."""
+    if isinstance(error, NoAvailableKeyError):
+        return True
+    if isinstance(error, RuntimeError) and "No available keys" in str(error):
+        return True
+    return isinstance(error, Exception) and is_rate_limit_error(error)
+
+
+class _Outcome:
+    __slots__ = ("value", "error")
+
+    def __init__(self, value: Any = None, error: Optional[BaseException] = None):
+        self.value = value
+        self.error = error
+
+
+class _Results:
+    """Hands finished items back either in input order or as they complete."""
+
+    def __init__(self, ordered: bool, return_exceptions: bool):
+        self.ordered = ordered
+        self.return_exceptions = return_exceptions
+        self._buffer: Dict[int, _Outcome] = {}
+        self._next = 0
+
+    def add(self, index: int, outcome: _Outcome) -> Iterator[Any]:
+        if not self.ordered:
+            yield self._unwrap(outcome)
+            return
+        self._buffer[index] = outcome
+        while self._next in self._buffer:
+            yield self._unwrap(self._buffer.pop(self._next))
+            self._next += 1
+
+    def _unwrap(self, outcome: _Outcome) -> Any:
+        if outcome.error is None:
+            return outcome.value
+        if self.return_exceptions:
+            return outcome.error
+        raise outcome.error
+
+
+class _CapacityGate:
+    def __init__(self, headroom: Headroom, max_concurrency: int):
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got: {max_concurrency}")
+        self.headroom = headroom
+        self.max_concurrency = max_concurrency
+
+    def can_start(self, in_flight: int) -> bool:
+        # One call always runs so an empty pool surfaces (and retries) its error.
+        # The headroom source decides what in-flight calls still take up.
+        if in_flight == 0:
+            return True
+        return in_flight < self.max_concurrency and self.headroom(in_flight) > 0
+
+
+class BatchRunner:
+    """
+    Runs zero-argument calls on a thread pool sized by the key pool's headroom.
+
+    Calls that fail because every key is busy are retried with backoff.
+
+    Example:
+        runner = BatchRunner(lambda n: manager.get_headroom("gpt-4o", limits, 500, in_flight=n))
+        for result in runner.map(lambda p=p: client.chat.completions.create(...) for p in prompts):
+            ...
+    """
+
+    def __init__(
+        self,
+        headroom: Headroom,
+        max_concurrency: int = BATCH_MAX_CONCURRENCY,
+        max_retries: int = BATCH_MAX_RETRIES,
+        backoff: Optional[BackoffConfig] = None,
+        poll_interval: float = BATCH_CAPACITY_POLL_SECONDS,
+    ):
+        self._gate = _CapacityGate(headroom, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff or BackoffConfig()
+        self.poll_interval = poll_interval
+
+    def _call(self, call: Callable[[], Any]) -> _Outcome:
+        backoff = ExponentialBackoff(self.backoff)
+        for attempt in range(self.max_retries + 1):
+            try:
+                return _Outcome(call())
+            except Exception as e:
+                if attempt < self.max_retries and is_capacity_error(e):
+                    time.sleep(backoff.get_next_interval())
+                    continue
+                return _Outcome(error=e)
+        raise AssertionError("unreachable")
+
+    def map(
+        self,
+        calls: Iterable[Callable[[], Any]],
+        ordered: bool = True,
+        return_exceptions: bool = False,
+    ) -> Iterator[Any]:
+        """
+        Run every call and yield the results.
+
+        Args:
+            calls: Zero-argument callables, consumed lazily
+            ordered: Yield in input order (True) or as calls complete (False)
+            return_exceptions: Yield a failed call's exception instead of raising it
+        """
+        results = _Results(ordered, return_exceptions)
+        source = enumerate(calls)
+        exhausted = False
+        pending: Dict[Future, int] = {}
+        pool = ThreadPoolExecutor(max_workers=self._gate.max_concurrency)
+        try:
+            while True:
+                while not exhausted and self._gate.can_start(len(pending)):
+                    try:
+                        index, call = next(source)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[pool.submit(self._call, call)] = index
+
+                if not pending:
+                    return
+                done, _ = wait(pending, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from results.add(pending.pop(future), future.result())
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncBatchRunner:
+    """
+    Runs zero-argument coroutine factories as tasks sized by the key pool's headroom.
+
+    Example:
+        runner = AsyncBatchRunner(lambda n: manager.get_headroom("gpt-4o", limits, 500, in_flight=n))
+        async for result in runner.map(lambda p=p: client.chat.completions.create(...) for p in prompts):
+            ...
+    """
+
+    def __init__(
+        self,
+        headroom: Headroom,
+        max_concurrency: int = BATCH_MAX_CONCURRENCY,
+        max_retries: int = BATCH_MAX_RETRIES,
+        backoff: Optional[BackoffConfig] = None,
+        poll_interval: float = BATCH_CAPACITY_POLL_SECONDS,
+    ):
+        self._gate = _CapacityGate(headroom, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff or BackoffConfig()
+        self.poll_interval = poll_interval
+
+    async def _call(self, call: Callable[[], Awaitable[Any]]) -> _Outcome:
+        backoff = ExponentialBackoff(self.backoff)
+        for attempt in range(self.max_retries + 1):
+            try:
+                return _Outcome(await call())
+            except Exception as e:
+                if attempt < self.max_retries and is_capacity_error(e):
+                    await asyncio.sleep(backoff.get_next_interval())
+                    continue
+                return _Outcome(error=e)
+        raise AssertionError("unreachable")
+
+    async def map(
+        self,
+        calls: Iterable[Callable[[], Awaitable[Any]]],
+        ordered: bool = True,
+        return_exceptions: bool = False,
+    ) -> AsyncIterator[Any]:
+        """
+        Run every call and yield the results.
+
+        Args:
+            calls: Zero-argument callables returning awaitables, consumed lazily
+            ordered: Yield in input order (True) or as calls complete (False)
+            return_exceptions: Yield a failed call's exception instead of raising it
+        """
+        results = _Results(ordered, return_exceptions)
+        source = enumerate(calls)
+        exhausted = False
+        pending: Dict["asyncio.Task[_Outcome]", int] = {}
+        try:
+            while True:
+                while not exhausted and self._gate.can_start(len(pending)):
+                    try:
+                        index, call = next(source)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[asyncio.ensure_future(self._call(call))] = index
+
+                if not pending:
+                    return
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    for result in results.add(pending.pop(task), task.result()):
+                        yield result
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,181 @@
+"""Hedged requests: race a duplicate attempt on a second key when the first is slow."""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+
+from ..config.constants import (
+    HEDGE_LATENCY_PERCENTILE,
+    HEDGE_MIN_DELAY_SECONDS,
+    HEDGE_BUDGET_FRACTION,
+    HEDGE_LATENCY_WINDOW,
+    HEDGE_MIN_SAMPLES,
+    SECONDS_PER_MINUTE,
+)
+
+
+@dataclass
+class HedgeConfig:
+    """Configuration for hedged requests."""
+    percentile: float = HEDGE_LATENCY_PERCENTILE
+    """Hedge once the first attempt is slower than this latency percentile"""
+
+    min_delay: float = HEDGE_MIN_DELAY_SECONDS
+    """Never hedge sooner than this many seconds"""
+
+    budget: float = HEDGE_BUDGET_FRACTION
+    """Max hedged requests as a fraction of requests in the last minute"""
+
+    window: int = HEDGE_LATENCY_WINDOW
+    """Number of recent latencies kept per model"""
+
+    min_samples: int = HEDGE_MIN_SAMPLES
+    """Latencies needed for a model before hedging starts"""
+
+    def __post_init__(self):
+        if not 0 < self.percentile < 1:
+            raise ValueError(f"percentile must be between 0 and 1, got: {self.percentile}")
+        if self.budget < 0:
+            raise ValueError(f"budget must be non-negative, got: {self.budget}")
+
+
+class LatencyTracker:
+    """Rolling window of successful request latencies per model."""
+
+    def __init__(self, window: int = HEDGE_LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model_id: str, latency: float) -> None:
+        with self._lock:
+            samples = self._samples.get(model_id)
+            if samples is None:
+                samples = self._samples[model_id] = deque(maxlen=self.window)
+            samples.append(latency)
+
+    def percentile(self, model_id: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """Return the q-th latency percentile, or None with fewer than min_samples."""
+        with self._lock:
+            samples = self._samples.get(model_id)
+            if not samples or len(samples) < min_samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+class HedgeBudget:
+    """Caps hedges to a fraction of the requests seen in the last minute."""
+
+    def __init__(self, fraction: float = HEDGE_BUDGET_FRACTION):
+        self.fraction = fraction
+        self._requests: Deque[float] = deque()
+        self._hedges: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def _clean(self, now: float) -> None:
+        cutoff = now - SECONDS_PER_MINUTE
+        for timestamps in (self._requests, self._hedges):
+            while timestamps and timestamps[0] <= cutoff:
+                timestamps.popleft()
+
+    def record_request(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._clean(now)
+            self._requests.append(now)
+
+    def try_acquire(self) -> bool:
+        """Take one hedge from the budget if the extra request stays within it."""
+        now = time.monotonic()
+        with self._lock:
+            self._clean(now)
+            if len(self._hedges) + 1 > self.fraction * len(self._requests):
+                return False
+            self._hedges.append(now)
+            return True
+
+
+class Hedger:
+    """
+    Runs an async attempt and, if it is slower than the model's latency
+    percentile, races a second attempt against it.
+
+    Each attempt receives a shared set of API keys already in use so the hedge
+    picks a different key. The first success wins; the loser is cancelled and
+    awaited so it can settle its reservation.
+
+    Example:
+        hedger = Hedger(HedgeConfig(percentile=0.9, budget=0.1))
+        result = await hedger.run("gpt-4o", lambda keys_in_use: call_with_key(keys_in_use))
+    """
+
+    def __init__(self, config: Optional[HedgeConfig] = None):
+        self.config = config or HedgeConfig()
+        self.latencies = LatencyTracker(self.config.window)
+        self.budget = HedgeBudget(self.config.budget)
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    def hedge_delay(self, model_id: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None if there is no latency data yet."""
+        latency = self.latencies.percentile(
+            model_id, self.config.percentile, self.config.min_samples
+        )
+        if latency is None:
+            return None
+        return max(latency, self.config.min_delay)
+
+    async def _timed(self, model_id: str, attempt: Awaitable[Any]) -> Any:
+        start = time.monotonic()
+        result = await attempt
+        self.latencies.record(model_id, time.monotonic() - start)
+        return result
+
+    async def run(
+        self,
+        model_id: str,
+        attempt: Callable[[Set[str]], Awaitable[Any]],
+    ) -> Any:
+        """Run attempt, hedging it with a second call if it is slow."""
+        self.budget.record_request()
+        keys_in_use: Set[str] = set()
+        primary = asyncio.ensure_future(self._timed(model_id, attempt(keys_in_use)))
+        tasks = [primary]
+        try:
+            delay = self.hedge_delay(model_id)
+            if delay is None:
+                return await primary
+
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self.budget.try_acquire():
+                return await primary
+
+            self.hedges_sent += 1
+            hedge = asyncio.ensure_future(self._timed(model_id, attempt(keys_in_use)))
+            tasks.append(hedge)
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None:
+                        if task is hedge:
+                            self.hedges_won += 1
+                        return task.result()
+
+            # Both attempts failed; surface the primary's error
+            return primary.result()
+        finally:
+            losers = [task for task in tasks if not task.done()]
+            for task in losers:
+                task.cancel()
+            if losers:
+                await asyncio.gather(*losers, return_exceptions=True)
+            for task in tasks:
+                # Mark failed attempts' exceptions as retrieved
+                if task.done() and not task.cancelled():
+                    task.exception()
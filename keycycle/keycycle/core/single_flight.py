@@ -0,0 +1,129 @@
+"""Request coalescing: concurrent identical calls share one upstream request."""
+import asyncio
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Collection, Coroutine, Dict, Optional, Tuple, Union
+
+
+def request_key(path: Tuple[str, ...], args: tuple, kwargs: dict) -> Optional[str]:
+    """
+    Canonical sha256 of a call's path, positional and keyword arguments.
+
+    Returns None when an argument has no JSON form. A repr would not do as a
+    fallback: truncated (arrays, data frames) or stateless (file objects, SDK
+    parameter objects) reprs can collide, and such calls must not share a
+    result, so callers neither coalesce nor cache them.
+    """
+    try:
+        payload = json.dumps(
+            [".".join(path), list(args), kwargs],
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def applies_to(setting: Union[bool, Collection[str], None], path: Tuple[str, ...]) -> bool:
+    """
+    Whether coalescing is enabled for a call path.
+
+    setting is True for every path, or a collection of dotted paths
+    such as {"embeddings.create"}.
+    """
+    if not setting:
+        return False
+    if setting is True:
+        return True
+    return ".".join(path) in setting
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Thread-safe coalescing of identical in-flight calls.
+
+    The first caller for a key runs the call; callers arriving before it finishes
+    wait and receive the same result or exception.
+
+    Example:
+        flight = SingleFlight()
+        result = flight.do(request_key(path, args, kwargs), lambda: call(*args, **kwargs))
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        assert call is not None
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """
+    Coalescing of identical in-flight calls on an event loop.
+
+    The shared call runs as its own task, so a caller that is cancelled stops
+    waiting without cancelling the request for the others.
+
+    Example:
+        flight = AsyncSingleFlight()
+        result = await flight.do(request_key(path, args, kwargs), lambda: call(*args, **kwargs))
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, "asyncio.Task[Any]"] = {}
+        self.shared = 0
+
+    async def do(self, key: str, fn: Callable[[], Coroutine[Any, Any, Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        task = self._calls.get(key)
+        if task is None or task.get_loop() is not loop:
+            task = loop.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: "asyncio.Task[Any]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Nobody may be left awaiting; mark the exception as retrieved
+        if not task.cancelled():
+            task.exception()
@@ -85,6 +85,15 @@ HARD_RATE_LIMIT_INDICATORS: FrozenSet[str] = frozenset([
     "x-ratelimit-remaining: 0",
 ])
 
+# Quota indicators for limits that only reset with the next day
+DAILY_LIMIT_INDICATORS: FrozenSet[str] = frozenset([
+    "per-day",
+    "perday",
+    "per day",
+    "daily limit",
+    "daily quota",
+])
+
 # Auth error indicators
 AUTH_STATUS_CODES = {401, 403}
 AUTH_INDICATORS: FrozenSet[str] = frozenset([
@@ -92,6 +101,9 @@ AUTH_INDICATORS: FrozenSet[str] = frozenset([
     "invalid api key", "invalid_api_key", "expired"
 ])
 
+# Error codes providers return for a key that is wrong, revoked or expired
+INVALID_KEY_ERROR_CODES: FrozenSet[str] = frozenset(["invalid_api_key"])
+
 
 def get_key_suffix(api_key: str, length: int = KEY_SUFFIX_LENGTH) -> str:
     """
@@ -178,6 +190,22 @@ def is_temporary_rate_limit_error(e: Exception) -> bool:
     return False
 
 
+def is_daily_limit_error(e: Exception) -> bool:
+    """
+    Detect rate limit errors that mean a key's daily quota is used up.
+
+    Args:
+        e: The exception to check
+
+    Returns:
+        True if this is a rate limit error naming a per-day limit
+    """
+    if not is_rate_limit_error(e):
+        return False
+    err_str = str(e).lower()
+    return any(indicator in err_str for indicator in DAILY_LIMIT_INDICATORS)
+
+
 def is_auth_error(e: Exception) -> bool:
     """
     Detect authentication/authorization errors (invalid/expired keys).
@@ -200,6 +228,42 @@ def is_auth_error(e: Exception) -> bool:
     return False
 
 
+def _error_code(e: Exception) -> Optional[str]:
+    """The provider's error code, from e.code or an error body such as {"error": {"code": ...}}."""
+    code = getattr(e, "code", None)
+    if isinstance(code, str):
+        return code
+    body = getattr(e, "body", None)
+    if isinstance(body, dict):
+        error = body.get("error", body)
+        code = error.get("code") if isinstance(error, dict) else None
+        if isinstance(code, str):
+            return code
+    return None
+
+
+def is_invalid_key_error(e: Exception) -> bool:
+    """
+    Detect errors that say the key itself was rejected.
+
+    Stricter than is_auth_error: only a 401 status or an explicit
+    invalid_api_key error code counts. A 403 (e.g. a model or region the
+    key may not use) or matching message text is not enough to bench a key.
+
+    Args:
+        e: The exception to check
+
+    Returns:
+        True if the provider rejected the key
+    """
+    status = getattr(e, "status_code", None)
+    if status is None:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+    if status == 401:
+        return True
+    return _error_code(e) in INVALID_KEY_ERROR_CODES
+
+
 def validate_api_key(api_key: str) -> bool:
     """
     Basic validation of API key format.
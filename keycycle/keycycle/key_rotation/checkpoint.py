@@ -0,0 +1,184 @@
+"""
+Binary checkpoints of a manager's rate-limit windows, for warm restarts.
+
+A checkpoint holds, per key, the cooldown timestamp and every bucket's
+lifetime totals plus the requests and token entries still inside the day
+window (the minute and hour windows are the newest part of it), and the
+reservation estimator's learned usage per model. A restarted manager loads
+it and only reads usage_logs rows newer than the checkpoint.
+
+Layout, little-endian:
+
+    header   magic "KCCP", version u16, strategy u8, pad, created_at f64,
+             body length u32, body crc32 u32
+    body     provider (str), key count u32, then per key:
+                 ident 16 bytes, last_429 f64, bucket count u32, then per bucket:
+                     scope (str), total requests u64, total tokens u64,
+                     request count u32, token count u32,
+                     request timestamps f64[], token timestamps f64[], tokens i64[]
+             model count u32, then per model: model (str), typical tokens f64, samples u32
+    str      u16 byte length + UTF-8
+
+API keys are stored only as a hash. Files are replaced atomically, so a
+reader never sees a partial checkpoint.
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from dataclasses import dataclass, field
+from hashlib import sha256
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config.enums import RateLimitStrategy
+
+MAGIC = b"KCCP"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHBxdII")
+_STRATEGIES = {RateLimitStrategy.PER_MODEL: 0, RateLimitStrategy.GLOBAL: 1}
+
+
+@dataclass
+class BucketState:
+    scope: str
+    total_requests: int
+    total_tokens: int
+    requests: List[float] = field(default_factory=list)
+    tokens: List[Tuple[float, int]] = field(default_factory=list)
+
+
+@dataclass
+class KeyState:
+    ident: bytes
+    last_429: float
+    buckets: List[BucketState] = field(default_factory=list)
+
+
+@dataclass
+class Checkpoint:
+    provider: str
+    strategy: RateLimitStrategy
+    created_at: float
+    keys: List[KeyState] = field(default_factory=list)
+    # model id -> (typical tokens, samples)
+    estimates: Dict[str, Tuple[float, int]] = field(default_factory=dict)
+
+
+def key_ident(provider: str, api_key: str) -> bytes:
+    return sha256(f"{provider}\0{api_key}".encode()).digest()[:16]
+
+
+class _Writer:
+    def __init__(self) -> None:
+        self.parts: List[bytes] = []
+
+    def pack(self, fmt: str, *values: Any) -> None:
+        self.parts.append(struct.pack("<" + fmt, *values))
+
+    def text(self, value: str) -> None:
+        data = value.encode()
+        self.pack("H", len(data))
+        self.parts.append(data)
+
+
+class _Reader:
+    def __init__(self, buffer: mmap.mmap, offset: int, end: int) -> None:
+        self.buffer = buffer
+        self.offset = offset
+        self.end = end
+
+    def unpack(self, fmt: str) -> tuple:
+        fmt = "<" + fmt
+        size = struct.calcsize(fmt)
+        if self.offset + size > self.end:
+            raise ValueError("Checkpoint is truncated")
+        values = struct.unpack_from(fmt, self.buffer, self.offset)
+        self.offset += size
+        return values
+
+    def text(self) -> str:
+        (length,) = self.unpack("H")
+        data: bytes = self.unpack(f"{length}s")[0]
+        return data.decode()
+
+
+def save_checkpoint(path: str, checkpoint: Checkpoint) -> None:
+    """Write a checkpoint to path, replacing any previous one atomically."""
+    w = _Writer()
+    w.text(checkpoint.provider)
+    w.pack("I", len(checkpoint.keys))
+    for key in checkpoint.keys:
+        w.pack("16sdI", key.ident, key.last_429, len(key.buckets))
+        for b in key.buckets:
+            w.text(b.scope)
+            w.pack("QQII", b.total_requests, b.total_tokens, len(b.requests), len(b.tokens))
+            w.pack(f"{len(b.requests)}d", *b.requests)
+            w.pack(f"{len(b.tokens)}d", *(ts for ts, _ in b.tokens))
+            w.pack(f"{len(b.tokens)}q", *(tokens for _, tokens in b.tokens))
+    w.pack("I", len(checkpoint.estimates))
+    for model_id, (typical, samples) in checkpoint.estimates.items():
+        w.text(model_id)
+        w.pack("dI", typical, samples)
+    body = b"".join(w.parts)
+    header = _HEADER.pack(
+        MAGIC, VERSION, _STRATEGIES[checkpoint.strategy], checkpoint.created_at, len(body), zlib.crc32(body)
+    )
+
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_checkpoint(path: str) -> Optional[Checkpoint]:
+    """Read a checkpoint; None if there is none. Raises ValueError for a damaged or foreign file."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size < _HEADER.size:
+            raise ValueError("Checkpoint is truncated")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            magic, version, strategy, created_at, length, crc = _HEADER.unpack_from(buffer, 0)
+            if magic != MAGIC:
+                raise ValueError("Not a keycycle checkpoint")
+            if version != VERSION:
+                raise ValueError(f"Unsupported checkpoint version {version} (expected {VERSION})")
+            end = _HEADER.size + length
+            if end > size or zlib.crc32(buffer[_HEADER.size:end]) != crc:
+                raise ValueError("Checkpoint is damaged")
+
+            r = _Reader(buffer, _HEADER.size, end)
+            strategies = {code: s for s, code in _STRATEGIES.items()}
+            checkpoint = Checkpoint(r.text(), strategies[strategy], created_at)
+            (key_count,) = r.unpack("I")
+            for _ in range(key_count):
+                ident, last_429, bucket_count = r.unpack("16sdI")
+                key = KeyState(ident, last_429)
+                for _ in range(bucket_count):
+                    scope = r.text()
+                    total_requests, total_tokens, n_requests, n_tokens = r.unpack("QQII")
+                    requests = list(r.unpack(f"{n_requests}d"))
+                    stamps = r.unpack(f"{n_tokens}d")
+                    amounts = r.unpack(f"{n_tokens}q")
+                    key.buckets.append(
+                        BucketState(scope, total_requests, total_tokens, requests, list(zip(stamps, amounts)))
+                    )
+                checkpoint.keys.append(key)
+            (model_count,) = r.unpack("I")
+            for _ in range(model_count):
+                model_id = r.text()
+                checkpoint.estimates[model_id] = r.unpack("dI")
+            return checkpoint
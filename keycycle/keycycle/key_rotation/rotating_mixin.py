@@ -14,6 +14,7 @@ from ..config.constants import (
 )
 from ..core.utils import is_rate_limit_error, is_temporary_rate_limit_error, get_key_suffix
 from ..core.backoff import ExponentialBackoff, BackoffConfig
+from ..usage.stream_usage import StreamUsageAccumulator, estimate_request_tokens
 if TYPE_CHECKING:
     from agno.models.response import ModelResponse
 
@@ -26,6 +27,16 @@ class _UsageResponse:
         self.response_usage = usage
 
 
+def _response_text(chunk) -> str:
+    content = getattr(chunk, "content", None)
+    return content if isinstance(content, str) else ""
+
+
+def _usage_tokens(usage) -> int:
+    tokens = getattr(usage, "total_tokens", 0) if usage else 0
+    return tokens if isinstance(tokens, int) else 0
+
+
 class RotatingCredentialsMixin:
     """
     Mixin that handles key rotation, 429 detection, and 30s cooldown triggers.
@@ -110,10 +121,16 @@ class RotatingCredentialsMixin:
     def _get_retry_limit(self) -> int:
         return min(self._max_retries, len(self.wrapper.manager.keys) - 1)
 
-    def _record_usage(self, key_obj: KeyUsage, response: Optional["ModelResponse"]):
+    def _record_usage(
+        self,
+        key_obj: KeyUsage,
+        response: Optional["ModelResponse"],
+        stream_usage: Optional[StreamUsageAccumulator] = None,
+    ):
         """
         Extracts usage from the response and reports it to the manager.
-        Falls back to estimated_tokens if response is None or usage is missing.
+        Falls back to the stream's running estimate, then to estimated_tokens,
+        if response is None or usage is missing.
         """
         if not self.wrapper:
             return
@@ -123,7 +140,10 @@ class RotatingCredentialsMixin:
         if response and response.response_usage:
             actual_tokens = response.response_usage.total_tokens
 
-        # Fallback: If no usage found (or streaming), use the estimate
+        if actual_tokens == 0 and stream_usage is not None:
+            actual_tokens = stream_usage.total_tokens
+
+        # Fallback: If no usage found, use the estimate
         if actual_tokens == 0:
             actual_tokens = self._estimated_tokens
 
@@ -131,9 +151,57 @@ class RotatingCredentialsMixin:
             key_obj=key_obj,
             model_id=self.model_id,
             actual_tokens=actual_tokens,
-            estimated_tokens=self._estimated_tokens
+            estimated_tokens=self._reserved_tokens(stream_usage)
+        )
+
+    def _release_usage(self, key_obj: KeyUsage, stream_usage: Optional[StreamUsageAccumulator] = None):
+        """Hands back a reservation when no response was received on this key."""
+        if not self.wrapper:
+            return
+
+        self.wrapper.manager.release(
+            key_obj=key_obj,
+            model_id=self.model_id,
+            estimated_tokens=self._reserved_tokens(stream_usage)
+        )
+
+    def _reserved_tokens(self, stream_usage: Optional[StreamUsageAccumulator]) -> int:
+        return stream_usage.reserved_tokens if stream_usage is not None else self._estimated_tokens
+
+    def _new_stream_usage(self, key_obj: KeyUsage, args: tuple, kwargs: dict) -> StreamUsageAccumulator:
+        """
+        Running token count for a stream on key_obj. Tops up the key's reservation
+        as content arrives so long generations count against TPM mid-stream.
+        """
+        top_up = None
+        if self.wrapper:
+            manager = self.wrapper.manager
+            top_up = lambda extra: manager.reserve(key_obj, self.model_id, extra)
+        return StreamUsageAccumulator(
+            reserved_tokens=self._estimated_tokens,
+            top_up=top_up,
+            prompt_tokens=estimate_request_tokens(args, kwargs),
+            text_extractor=_response_text,
         )
 
+    def _settle_stream(
+        self,
+        key_obj: KeyUsage,
+        chunks_received: bool,
+        final_usage=None,
+        stream_usage: Optional[StreamUsageAccumulator] = None,
+    ):
+        """
+        Settles a stream that ended early (error, close or cancellation).
+        A stream that produced chunks was served, so it is recorded; otherwise released.
+        """
+        if chunks_received:
+            self._record_usage(
+                key_obj, _UsageResponse(final_usage) if final_usage else None, stream_usage
+            )
+        else:
+            self._release_usage(key_obj, stream_usage)
+
     def _create_temp_backoff(self) -> ExponentialBackoff:
         """Create a backoff instance for temporary rate limit retries."""
         return ExponentialBackoff(BackoffConfig(
@@ -148,45 +216,52 @@ class RotatingCredentialsMixin:
         for attempt in range(limit + 1):
             key_usage = self._rotate_credentials()
             temp_backoff = self._create_temp_backoff()
-
-            for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
-                try:
-                    response = super().invoke(*args, **kwargs)
-                    self._record_usage(key_usage, response)
-                    return response
-                except Exception as e:
-                    # Check for temporary rate limit first - retry with SAME key
-                    if is_temporary_rate_limit_error(e) and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES:
-                        delay = temp_backoff.get_next_interval()
-                        self.logger.info(
-                            "Temporary rate limit on key %s [%s]. Waiting %.1fs (%d/%d).",
-                            get_key_suffix(self.api_key), self.model_id, delay,
-                            temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
-                        )
-                        time.sleep(delay)
-                        continue  # Retry with SAME key
-
-                    # Hard rate limit - rotate key
-                    if is_rate_limit_error(e) and attempt < limit:
+            settled = False
+
+            try:
+                for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
+                    try:
+                        response = super().invoke(*args, **kwargs)
+                        self._record_usage(key_usage, response)
+                        settled = True
+                        return response
+                    except Exception as e:
+                        # Check for temporary rate limit first - retry with SAME key
+                        if is_temporary_rate_limit_error(e) and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES:
+                            delay = temp_backoff.get_next_interval()
+                            self.logger.info(
+                                "Temporary rate limit on key %s [%s]. Waiting %.1fs (%d/%d).",
+                                get_key_suffix(self.api_key), self.model_id, delay,
+                                temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
+                            )
+                            time.sleep(delay)
+                            continue  # Retry with SAME key
+
+                        # Hard rate limit - rotate key
+                        if is_rate_limit_error(e) and attempt < limit:
+                            self.logger.warning(
+                                "429 Hit on key %s (Sync) [%s]. Rotating and retrying (%d/%d).",
+                                get_key_suffix(self.api_key), self.model_id, attempt + 1, limit
+                            )
+                            self.wrapper.manager.trigger_cooldown(key_usage, e)
+                            self.wrapper.manager.force_rotate_index()
+                            break  # Break inner loop, continue outer with new key
+                        self.wrapper.manager.disable_if_invalid(key_usage, e)
+                        raise
+                else:
+                    # Temp retries exhausted, move to next key
+                    if attempt < limit:
                         self.logger.warning(
-                            "429 Hit on key %s (Sync) [%s]. Rotating and retrying (%d/%d).",
-                            get_key_suffix(self.api_key), self.model_id, attempt + 1, limit
+                            "Temp rate limit retries exhausted for key %s. Rotating.",
+                            get_key_suffix(self.api_key)
                         )
-                        key_usage.trigger_cooldown()
+                        self.wrapper.manager.trigger_cooldown(key_usage)
                         self.wrapper.manager.force_rotate_index()
-                        break  # Break inner loop, continue outer with new key
+                        continue
                     raise
-            else:
-                # Temp retries exhausted, move to next key
-                if attempt < limit:
-                    self.logger.warning(
-                        "Temp rate limit retries exhausted for key %s. Rotating.",
-                        get_key_suffix(self.api_key)
-                    )
-                    key_usage.trigger_cooldown()
-                    self.wrapper.manager.force_rotate_index()
-                    continue
-                raise
+            finally:
+                if not settled:
+                    self._release_usage(key_usage)
 
     async def ainvoke(self, *args, **kwargs) -> "ModelResponse":
         limit = self._get_retry_limit()
@@ -194,45 +269,58 @@ class RotatingCredentialsMixin:
         for attempt in range(limit + 1):
             key_usage = self._rotate_credentials()
             temp_backoff = self._create_temp_backoff()
-
-            for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
-                try:
-                    response = await super().ainvoke(*args, **kwargs)
-                    self._record_usage(key_usage, response)
-                    return response
-                except Exception as e:
-                    # Check for temporary rate limit first - retry with SAME key
-                    if is_temporary_rate_limit_error(e) and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES:
-                        delay = temp_backoff.get_next_interval()
-                        self.logger.info(
-                            "Temporary rate limit on key %s [%s]. Waiting %.1fs (%d/%d).",
-                            get_key_suffix(self.api_key), self.model_id, delay,
-                            temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
-                        )
-                        await asyncio.sleep(delay)
-                        continue  # Retry with SAME key
-
-                    # Hard rate limit - rotate key
-                    if is_rate_limit_error(e) and attempt < limit:
+            settled = False
+
+            try:
+                for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
+                    try:
+                        response = await super().ainvoke(*args, **kwargs)
+                        self._record_usage(key_usage, response)
+                        settled = True
+                        return response
+                    except asyncio.CancelledError:
+                        # The request was in flight, so count it (at the estimate)
+                        self._record_usage(key_usage, None)
+                        settled = True
+                        raise
+                    except Exception as e:
+                        # Check for temporary rate limit first - retry with SAME key
+                        if is_temporary_rate_limit_error(e) and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES:
+                            delay = temp_backoff.get_next_interval()
+                            self.logger.info(
+                                "Temporary rate limit on key %s [%s]. Waiting %.1fs (%d/%d).",
+                                get_key_suffix(self.api_key), self.model_id, delay,
+                                temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
+                            )
+                            await asyncio.sleep(delay)
+                            continue  # Retry with SAME key
+
+                        # Hard rate limit - rotate key
+                        if is_rate_limit_error(e) and attempt < limit:
+                            self.logger.warning(
+                                "429 Hit on key %s (Async) [%s]. Rotating and retrying (%d/%d).",
+                                get_key_suffix(self.api_key), self.model_id, attempt + 1, limit
+                            )
+                            self.wrapper.manager.trigger_cooldown(key_usage, e)
+                            self.wrapper.manager.force_rotate_index()
+                            break  # Break inner loop, continue outer with new key
+                        self.wrapper.manager.disable_if_invalid(key_usage, e)
+                        raise
+                else:
+                    # Temp retries exhausted, move to next key
+                    if attempt < limit:
                         self.logger.warning(
-                            "429 Hit on key %s (Async) [%s]. Rotating and retrying (%d/%d).",
-                            get_key_suffix(self.api_key), self.model_id, attempt + 1, limit
+                            "Temp rate limit retries exhausted for key %s. Rotating.",
+                            get_key_suffix(self.api_key)
                         )
-                        key_usage.trigger_cooldown()
+                        self.wrapper.manager.trigger_cooldown(key_usage)
                         self.wrapper.manager.force_rotate_index()
-                        break  # Break inner loop, continue outer with new key
+                        continue
                     raise
-            else:
-                # Temp retries exhausted, move to next key
-                if attempt < limit:
-                    self.logger.warning(
-                        "Temp rate limit retries exhausted for key %s. Rotating.",
-                        get_key_suffix(self.api_key)
-                    )
-                    key_usage.trigger_cooldown()
-                    self.wrapper.manager.force_rotate_index()
-                    continue
-                raise
+            finally:
+                # Errors, rotation and cancellation while backing off hand the reservation back
+                if not settled:
+                    self._release_usage(key_usage)
     
     def invoke_stream(self, *args, **kwargs) -> Iterator["ModelResponse"]:
         limit = self._get_retry_limit()
@@ -240,54 +328,65 @@ class RotatingCredentialsMixin:
         for attempt in range(limit + 1):
             key_usage = self._rotate_credentials()
             temp_backoff = self._create_temp_backoff()
-
-            for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
-                chunks_received = False
-                try:
-                    stream = super().invoke_stream(*args, **kwargs)
-                    final_usage = None
-                    for chunk in stream:
-                        chunks_received = True
-                        if chunk.response_usage:
-                            final_usage = chunk.response_usage
-                        yield chunk
-                    if final_usage:
-                        dummy_response = _UsageResponse(final_usage)
-                        self._record_usage(key_usage, dummy_response)
-                    else:
-                        # If the stream didn't return usage data, fallback to estimation
-                        self._record_usage(key_usage, None)
-
-                    return
-                except Exception as e:
-                    # Only retry temp limits if NO chunks received yet
-                    if (is_temporary_rate_limit_error(e)
-                        and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES
-                        and not chunks_received):
-                        delay = temp_backoff.get_next_interval()
-                        self.logger.info(
-                            "Temporary rate limit on key %s (Stream) [%s]. Waiting %.1fs (%d/%d).",
-                            get_key_suffix(self.api_key), self.model_id, delay,
-                            temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
-                        )
-                        time.sleep(delay)
-                        continue
-
-                    if is_rate_limit_error(e) and attempt < limit:
-                        self.logger.warning(
-                            "429 Hit on key %s (Sync Stream) [%s]. Rotating and retrying (%d/%d).",
-                            get_key_suffix(self.api_key), self.model_id, attempt + 1, limit
-                        )
-                        key_usage.trigger_cooldown()
+            settled = False
+            chunks_received = False
+            final_usage = None
+            stream_usage = self._new_stream_usage(key_usage, args, kwargs)
+
+            try:
+                for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
+                    chunks_received = False
+                    try:
+                        stream = super().invoke_stream(*args, **kwargs)
+                        final_usage = None
+                        for chunk in stream:
+                            chunks_received = True
+                            if chunk.response_usage:
+                                final_usage = chunk.response_usage
+                            stream_usage.add(chunk, _usage_tokens(chunk.response_usage))
+                            yield chunk
+                        if final_usage:
+                            dummy_response = _UsageResponse(final_usage)
+                            self._record_usage(key_usage, dummy_response, stream_usage)
+                        else:
+                            # If the stream didn't return usage data, use the running estimate
+                            self._record_usage(key_usage, None, stream_usage)
+                        settled = True
+
+                        return
+                    except Exception as e:
+                        # Only retry temp limits if NO chunks received yet
+                        if (is_temporary_rate_limit_error(e)
+                            and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES
+                            and not chunks_received):
+                            delay = temp_backoff.get_next_interval()
+                            self.logger.info(
+                                "Temporary rate limit on key %s (Stream) [%s]. Waiting %.1fs (%d/%d).",
+                                get_key_suffix(self.api_key), self.model_id, delay,
+                                temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
+                            )
+                            time.sleep(delay)
+                            continue
+
+                        if is_rate_limit_error(e) and attempt < limit:
+                            self.logger.warning(
+                                "429 Hit on key %s (Sync Stream) [%s]. Rotating and retrying (%d/%d).",
+                                get_key_suffix(self.api_key), self.model_id, attempt + 1, limit
+                            )
+                            self.wrapper.manager.trigger_cooldown(key_usage, e)
+                            self.wrapper.manager.force_rotate_index()
+                            break
+                        self.wrapper.manager.disable_if_invalid(key_usage, e)
+                        raise
+                else:
+                    if attempt < limit:
+                        self.wrapper.manager.trigger_cooldown(key_usage)
                         self.wrapper.manager.force_rotate_index()
-                        break
+                        continue
                     raise
-            else:
-                if attempt < limit:
-                    key_usage.trigger_cooldown()
-                    self.wrapper.manager.force_rotate_index()
-                    continue
-                raise
+            finally:
+                if not settled:
+                    self._settle_stream(key_usage, chunks_received, final_usage, stream_usage)
 
     async def ainvoke_stream(self, *args, **kwargs) -> AsyncIterator["ModelResponse"]:
         limit = self._get_retry_limit()
@@ -295,53 +394,65 @@ class RotatingCredentialsMixin:
         for attempt in range(limit + 1):
             key_usage = self._rotate_credentials()
             temp_backoff = self._create_temp_backoff()
-
-            for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
-                chunks_received = False
-                try:
-                    stream = super().ainvoke_stream(*args, **kwargs)
-
-                    final_usage = None
-                    async for chunk in stream:
-                        chunks_received = True
-                        if chunk.response_usage:
-                            final_usage = chunk.response_usage
-                        yield chunk
-
-                    # Stream completed successfully. Record usage.
-                    if final_usage:
-                        dummy_response = _UsageResponse(final_usage)
-                        self._record_usage(key_usage, dummy_response)
-                    else:
-                        self._record_usage(key_usage, None)
-
-                    return
-                except Exception as e:
-                    # Only retry temp limits if NO chunks received yet
-                    if (is_temporary_rate_limit_error(e)
-                        and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES
-                        and not chunks_received):
-                        delay = temp_backoff.get_next_interval()
-                        self.logger.info(
-                            "Temporary rate limit on key %s (Async Stream) [%s]. Waiting %.1fs (%d/%d).",
-                            get_key_suffix(self.api_key), self.model_id, delay,
-                            temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
-                        )
-                        await asyncio.sleep(delay)
-                        continue
-
-                    if is_rate_limit_error(e) and attempt < limit:
-                        self.logger.warning(
-                            "429 Hit on key %s (Async Stream) [%s]. Rotating and retrying (%d/%d).",
-                            get_key_suffix(self.api_key), self.model_id, attempt + 1, limit
-                        )
-                        key_usage.trigger_cooldown()
+            settled = False
+            chunks_received = False
+            final_usage = None
+            stream_usage = self._new_stream_usage(key_usage, args, kwargs)
+
+            try:
+                for temp_attempt in range(TEMP_RATE_LIMIT_MAX_RETRIES + 1):
+                    chunks_received = False
+                    try:
+                        stream = super().ainvoke_stream(*args, **kwargs)
+
+                        final_usage = None
+                        async for chunk in stream:
+                            chunks_received = True
+                            if chunk.response_usage:
+                                final_usage = chunk.response_usage
+                            stream_usage.add(chunk, _usage_tokens(chunk.response_usage))
+                            yield chunk
+
+                        # Stream completed successfully. Record usage.
+                        if final_usage:
+                            dummy_response = _UsageResponse(final_usage)
+                            self._record_usage(key_usage, dummy_response, stream_usage)
+                        else:
+                            self._record_usage(key_usage, None, stream_usage)
+                        settled = True
+
+                        return
+                    except Exception as e:
+                        # Only retry temp limits if NO chunks received yet
+                        if (is_temporary_rate_limit_error(e)
+                            and temp_attempt < TEMP_RATE_LIMIT_MAX_RETRIES
+                            and not chunks_received):
+                            delay = temp_backoff.get_next_interval()
+                            self.logger.info(
+                                "Temporary rate limit on key %s (Async Stream) [%s]. Waiting %.1fs (%d/%d).",
+                                get_key_suffix(self.api_key), self.model_id, delay,
+                                temp_attempt + 1, TEMP_RATE_LIMIT_MAX_RETRIES
+                            )
+                            await asyncio.sleep(delay)
+                            continue
+
+                        if is_rate_limit_error(e) and attempt < limit:
+                            self.logger.warning(
+                                "429 Hit on key %s (Async Stream) [%s]. Rotating and retrying (%d/%d).",
+                                get_key_suffix(self.api_key), self.model_id, attempt + 1, limit
+                            )
+                            self.wrapper.manager.trigger_cooldown(key_usage, e)
+                            self.wrapper.manager.force_rotate_index()
+                            break
+                        self.wrapper.manager.disable_if_invalid(key_usage, e)
+                        raise
+                else:
+                    if attempt < limit:
+                        self.wrapper.manager.trigger_cooldown(key_usage)
                         self.wrapper.manager.force_rotate_index()
-                        break
+                        continue
                     raise
-            else:
-                if attempt < limit:
-                    key_usage.trigger_cooldown()
-                    self.wrapper.manager.force_rotate_index()
-                    continue
-                raise
+            finally:
+                # Also runs on cancellation and on aclose() of an abandoned stream
+                if not settled:
+                    self._settle_stream(key_usage, chunks_received, final_usage, stream_usage)
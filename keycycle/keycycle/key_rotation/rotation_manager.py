@@ -1,26 +1,44 @@
+import heapq
 import time
 import atexit
 import threading
+import uuid
 from threading import Lock, Event
 import logging
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple, Union
 
 from ..config.dataclasses import (
     RateLimits, UsageSnapshot,
-    GlobalStats, KeySummary,
+    GlobalStats, KeySummary, CacheStats,
     KeyDetailedStats, ModelAggregatedStats,
-    KeyUsage
+    KeyUsage, HistoryEntry
 )
-from ..config.enums import RateLimitStrategy
+from ..config.enums import KeyStatus, RateLimitStrategy, UsageWriter
 from ..config.log_config import default_logger
 from ..config.constants import (
+    CHECKPOINT_INTERVAL_SECONDS,
+    CHECKPOINT_MAX_AGE_SECONDS,
     CLEANUP_INTERVAL_SECONDS,
+    HISTORY_CHUNK_ROWS,
     HISTORY_LOOKBACK_SECONDS,
     DEFAULT_COOLDOWN_SECONDS,
+    INVALID_KEY_DISABLE_SECONDS,
+    SECONDS_PER_DAY,
+    SECONDS_PER_MINUTE,
 )
-from ..core.utils import get_key_suffix, KeyEntry, normalize_key_entries
-from ..usage.usage_logger import AsyncUsageLogger
+from ..core.utils import (
+    get_key_suffix, KeyEntry, normalize_key_entries, is_daily_limit_error, is_invalid_key_error,
+)
+from ..usage.usage_logger import AsyncUsageLogger, UsageLogConfig
+from ..usage.asyncio_usage_logger import AsyncioUsageLogger
 from ..usage.db_logic import UsageDatabase
+from ..usage.token_estimator import ReservationEstimator, TokenEstimate
+from ..usage.usage_tail import UsageTail
+from ..backends.base import InMemoryStateBackend, StateBackend
+from .checkpoint import BucketState, Checkpoint, KeyState, key_ident, load_checkpoint, save_checkpoint
 
 class RotatingKeyManager:
     """Manages API key rotation with rate limiting"""
@@ -35,33 +53,92 @@ class RotatingKeyManager:
         cooldown_seconds: int = DEFAULT_COOLDOWN_SECONDS,
         limit_resolver: Optional[Callable[[str, Optional[str]], RateLimits]] = None,
         api_key_param: str = "api_key",
+        state_backend: Optional[StateBackend] = None,
+        tail_interval: Optional[float] = None,
+        usage_log: Optional[UsageLogConfig] = None,
+        checkpoint_path: Optional[str] = None,
+        checkpoint_interval: float = CHECKPOINT_INTERVAL_SECONDS,
     ):
+        """
+        Args:
+            state_backend: Where rate-limit windows and cooldowns live. Defaults to
+                this process's memory (InMemoryStateBackend); MmapStateBackend shares
+                them with every process on the host, RedisStateBackend and
+                SqlLeaseBackend with every host
+            tail_interval: Every this many seconds, fold usage_logs rows written by
+                other processes into the local windows (None: only read history at startup).
+                Not needed, and rejected, when the backend already shares windows.
+            usage_log: Batching, queue bound and overflow policy for usage_logs writes, and
+                whether they are written from a thread or from a task on the event loop
+            checkpoint_path: File to write the windows, cooldowns and learned reservations
+                to every checkpoint_interval seconds and on stop(). A restart reads it
+                and only the usage_logs rows written since, instead of a day of history.
+                Rejected when the backend shares windows (they outlive the process anyway).
+        """
         self.provider_name = provider_name
         self.logger = logger or default_logger
         self.strategy = strategy
         self.cooldown_seconds = cooldown_seconds
         self.limit_resolver = limit_resolver
         self.api_key_param = api_key_param
+        self.state_backend = state_backend or InMemoryStateBackend()
+        if tail_interval is not None and not self.state_backend.local_windows:
+            raise ValueError(
+                f"tail_interval would double count: {type(self.state_backend).__name__} already shares usage."
+            )
+        self.tail_interval = tail_interval
+        if checkpoint_path is not None and not self.state_backend.local_windows:
+            raise ValueError(
+                f"checkpoint_path is not needed: {type(self.state_backend).__name__} already keeps windows across restarts."
+            )
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
 
         # Normalize key entries and create KeyUsage objects with params
         normalized = normalize_key_entries(api_keys, api_key_param)
-        self.keys = [
-            KeyUsage(api_key=primary, strategy=strategy, params=params)
-            for primary, params in normalized
-        ]
+        self.keys = [self._new_key_usage(primary, params) for primary, params in normalized]
         self.current_index = 0
         self.lock = Lock()
+        # Response caches in front of this provider's clients, reported in stats
+        self._response_caches: List[Any] = []
 
         self.db = db
-        self.usage_logger = AsyncUsageLogger(self.db)
-        self._hydrate()
+        # Tags this manager's usage_logs rows so its tail can skip them
+        self.writer_id = uuid.uuid4().hex[:16]
+        asyncio_writer = usage_log is not None and usage_log.writer is UsageWriter.ASYNCIO
+        self.usage_logger: Union[AsyncUsageLogger, AsyncioUsageLogger] = (
+            AsyncioUsageLogger if asyncio_writer else AsyncUsageLogger
+        )(self.db, writer_id=self.writer_id, config=usage_log)
+        # Key states are written from here, in order, so a 429 never waits on the database
+        self._key_state_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="keycycle-key-state")
+        # Learns per-model reservations from actual usage, seeded by _hydrate
+        self.estimator = ReservationEstimator()
+        self._tail: Optional[UsageTail] = None
+        if tail_interval is not None:
+            # Primed before hydrating, so rows in between are counted twice rather than missed
+            self._tail = UsageTail(self.db, provider_name, self.writer_id)
+            self._tail.prime()
+        if not self._restore_checkpoint():
+            self._hydrate()
+        self._restore_key_states()
 
         self._stop_event = Event()
         self._start_cleanup()
+        self._tail_thread: Optional[threading.Thread] = None
+        if self._tail is not None:
+            self._tail_thread = threading.Thread(target=self._tail_loop, daemon=True)
+            self._tail_thread.start()
+        self._checkpoint_thread: Optional[threading.Thread] = None
+        if checkpoint_path is not None:
+            self._checkpoint_thread = threading.Thread(target=self._checkpoint_loop, daemon=True)
+            self._checkpoint_thread.start()
         atexit.register(self.stop)
 
         self.logger.info("Initialized %d keys for provider %s.", len(self.keys), provider_name)
     
+    def _new_key_usage(self, api_key: str, params: Dict[str, Any]) -> KeyUsage:
+        return self.state_backend.key_usage(self.provider_name, api_key, self.strategy, params)
+
     def force_rotate_index(self) -> None:
         """
         Force the internal pointer to increment.
@@ -71,23 +148,215 @@ class RotatingKeyManager:
             self.current_index = (self.current_index + 1) % len(self.keys)
 
     def _hydrate(self) -> None:
-        """Load historical usage from database to restore state."""
+        """
+        Load historical usage from database to restore state.
+
+        Whole minutes that can no longer count towards the minute window come
+        from usage_rollups; only the last one to two minutes are read as raw rows.
+        Rows are streamed and replayed HISTORY_CHUNK_ROWS at a time, so memory
+        beyond the windows themselves does not grow with the history.
+        """
         self.logger.debug("Loading history for provider %s.", self.provider_name)
-        all_history = self.db.load_provider_history(self.provider_name, HISTORY_LOOKBACK_SECONDS)
-        if not all_history:
+        now = time.time()
+        boundary = int((now - SECONDS_PER_MINUTE) // SECONDS_PER_MINUTE) * SECONDS_PER_MINUTE
+        rollups = self.db.load_provider_rollups(
+            self.provider_name, now - HISTORY_LOOKBACK_SECONDS, boundary, chunk_size=HISTORY_CHUNK_ROWS
+        )
+        recent = self.db.load_provider_history(self.provider_name, since=boundary, chunk_size=HISTORY_CHUNK_ROWS)
+        # (suffix, model, timestamp, tokens, requests), oldest first; a rollup is stamped at its
+        # minute's last second, so the hour and day windows never free it early
+        history = chain(
+            ((s, m, minute + SECONDS_PER_MINUTE - 1, tokens, requests) for s, m, minute, requests, tokens in rollups),
+            ((s, m, ts, tokens, 1) for s, m, ts, tokens in recent),
+        )
+
+        key_map: Optional[Dict[str, KeyUsage]] = None
+        count = 0
+        for chunk in iter(lambda: list(islice(history, HISTORY_CHUNK_ROWS)), []):
+            if key_map is None:
+                # Shared windows already hold this history unless this manager is the first to claim them
+                replay = self.state_backend.claim_hydration(self.provider_name)
+                key_map = {get_key_suffix(k.api_key): k for k in self.keys} if replay else {}
+            count += self._replay_history(key_map, chunk)
+        if key_map is None:
             self.logger.info("No history found in DB for %s.", self.provider_name)
             return
+        self.logger.info("Hydrated %d records for %s.", 
+                    count, self.provider_name)
+
+    def _restore_checkpoint(self) -> bool:
+        """
+        Load the windows from checkpoint_path plus the usage_logs rows written since.
+
+        Returns False, leaving the buckets untouched, when there is no usable
+        checkpoint: missing, damaged, too old, or written for other keys.
+        Reservations of calls in flight when it was written are not restored;
+        those calls died with the process that made them.
+        """
+        if self.checkpoint_path is None:
+            return False
+        try:
+            checkpoint = load_checkpoint(self.checkpoint_path)
+        except (OSError, ValueError) as e:
+            self.logger.warning("Ignoring checkpoint %s: %s", self.checkpoint_path, e)
+            return False
+        if checkpoint is None:
+            return False
+        now = time.time()
+        states = {key.ident: key for key in checkpoint.keys}
+        idents = [key_ident(self.provider_name, k.api_key) for k in self.keys]
+        if (
+            checkpoint.provider != self.provider_name
+            or checkpoint.strategy != self.strategy
+            or not 0 <= now - checkpoint.created_at <= CHECKPOINT_MAX_AGE_SECONDS
+            or not all(ident in states for ident in idents)
+        ):
+            self.logger.info("Checkpoint %s does not match %s, reading history instead.",
+                             self.checkpoint_path, self.provider_name)
+            return False
+
+        for key, ident in zip(self.keys, idents):
+            state = states[ident]
+            key.last_429 = state.last_429
+            for b in state.buckets:
+                bucket = key.global_bucket if b.scope == self.state_backend.global_scope else key.buckets[b.scope]
+                bucket.add_many(list(heapq.merge(
+                    ((ts, 0, 1) for ts in b.requests), ((ts, tokens, 0) for ts, tokens in b.tokens)
+                )))
+                bucket.total_requests, bucket.total_tokens = b.total_requests, b.total_tokens
+        self.estimator.restore_usage(checkpoint.estimates)
+
+        delta = self.db.load_provider_history(
+            self.provider_name, since=checkpoint.created_at, chunk_size=HISTORY_CHUNK_ROWS
+        )
+        rows = ((s, m, ts, tokens, 1) for s, m, ts, tokens in delta)
+        key_map = {get_key_suffix(k.api_key): k for k in self.keys}
+        count = 0
+        for chunk in iter(lambda: list(islice(rows, HISTORY_CHUNK_ROWS)), []):
+            count += self._replay_history(key_map, chunk)
+        self.logger.info("Restored %s from checkpoint (%.0fs old) plus %d newer records.",
+                         self.provider_name, now - checkpoint.created_at, count)
+        return True
+
+    def checkpoint(self) -> None:
+        """Write the windows, cooldowns and learned reservations to checkpoint_path now."""
+        if self.checkpoint_path is None:
+            raise ValueError("No checkpoint_path configured.")
+        with self.lock:
+            created_at = time.time()
+            keys = []
+            for key in self.keys:
+                scopes = list(key.buckets.items())
+                if self.strategy == RateLimitStrategy.GLOBAL:
+                    scopes.append((self.state_backend.global_scope, key.global_bucket))
+                buckets = []
+                for scope, bucket in scopes:
+                    bucket.clean()
+                    buckets.append(BucketState(
+                        scope, bucket.total_requests, bucket.total_tokens,
+                        list(bucket.requests_day), list(bucket.tokens_day),
+                    ))
+                keys.append(KeyState(key_ident(self.provider_name, key.api_key), key.last_429, buckets))
+        estimates = self.estimator.usage_state()
+        save_checkpoint(
+            self.checkpoint_path, Checkpoint(self.provider_name, self.strategy, created_at, keys, estimates)
+        )
+
+    def _checkpoint_loop(self) -> None:
+        """Periodically write a checkpoint."""
+        while not self._stop_event.wait(self.checkpoint_interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                self.logger.error("Checkpoint error: %s", e, exc_info=True)
 
+    def _restore_key_states(self) -> None:
+        """Bench keys that a previous run found rate-limited, exhausted or invalid."""
         key_map = {get_key_suffix(k.api_key): k for k in self.keys}
+        for suffix, status, since, until in self.db.load_key_states(self.provider_name):
+            key = key_map.get(suffix)
+            if key is None:
+                continue
+            if status == KeyStatus.COOLDOWN.value:
+                key.last_429 = max(key.last_429, since)
+            else:
+                key.disable(KeyStatus(status), until)
+
+    def _save_key_state(self, key_obj: KeyUsage, status: KeyStatus, since: float, until: float) -> None:
+        """Queue a key state write; runs inline only once stop() has shut the writer down."""
+        self._queue_key_state_write(self._write_key_state, get_key_suffix(key_obj.api_key), status.value, since, until)
+
+    def _queue_key_state_write(self, write: Callable[..., None], *args: Any) -> None:
+        # One writer thread keeps the writes for a key in the order they were made
+        try:
+            self._key_state_writer.submit(write, *args)
+        except RuntimeError:
+            write(*args)
+
+    def _write_key_state(self, suffix: str, status: str, since: float, until: float) -> None:
+        try:
+            self.db.save_key_state(self.provider_name, suffix, status, since, until)
+        except Exception as e:
+            self.logger.warning("Could not persist %s state of key %s: %s", status, suffix, e)
+
+    def _clear_key_states(self, suffix: str) -> None:
+        try:
+            self.db.delete_key_states(self.provider_name, suffix)
+        except Exception as e:
+            self.logger.warning("Could not clear the stored states of key %s: %s", suffix, e)
+
+    def trigger_cooldown(self, key_obj: KeyUsage, error: Optional[Exception] = None) -> None:
+        """
+        Bench a key after a 429, and remember it across restarts.
+
+        If error says a per-day quota is used up, the key is also disabled
+        until the next UTC day instead of only for cooldown_seconds.
+        """
+        key_obj.trigger_cooldown()
+        self._save_key_state(
+            key_obj, KeyStatus.COOLDOWN, key_obj.last_429, key_obj.last_429 + self.cooldown_seconds
+        )
+        if error is not None and is_daily_limit_error(error):
+            until = (key_obj.last_429 // SECONDS_PER_DAY + 1) * SECONDS_PER_DAY
+            self.disable_key(key_obj, KeyStatus.EXHAUSTED, until)
+
+    def disable_key(self, key_obj: KeyUsage, status: KeyStatus, until: Optional[float] = None) -> None:
+        """Stop handing out a key until the given time, and remember it across restarts."""
+        now = time.time()
+        if until is None:
+            until = now + (INVALID_KEY_DISABLE_SECONDS if status == KeyStatus.INVALID else SECONDS_PER_DAY)
+        self.logger.warning("Disabling key %s (%s) for %.0fs.", get_key_suffix(key_obj.api_key), status.value, until - now)
+        with self.lock:
+            key_obj.disable(status, until)
+        self._save_key_state(key_obj, status, now, until)
+
+    def enable_key(self, key_obj: KeyUsage) -> None:
+        """Put a benched key back into rotation now, and forget its stored states."""
+        self.logger.info("Enabling key %s.", get_key_suffix(key_obj.api_key))
+        with self.lock:
+            key_obj.enable()
+        self._queue_key_state_write(self._clear_key_states, get_key_suffix(key_obj.api_key))
+
+    def disable_if_invalid(self, key_obj: KeyUsage, error: Exception) -> None:
+        """Disable a key the provider rejected: a 401, or an invalid_api_key error code."""
+        if is_invalid_key_error(error):
+            self.disable_key(key_obj, KeyStatus.INVALID)
+
+    def _replay_history(self, key_map: Dict[str, KeyUsage], rows: List[tuple]) -> int:
+        """Group time-ordered rows per key and model and load them in bulk; returns requests replayed."""
+        history: Dict[str, Dict[str, List[HistoryEntry]]] = defaultdict(lambda: defaultdict(list))
+        seeds: Dict[str, List[int]] = defaultdict(list)
         count = 0
-        for row in all_history:
-            suffix, model_id, ts, tokens = row
-            
+        for suffix, model_id, ts, tokens, requests in rows:
             if suffix in key_map:
-                key_map[suffix].record_usage(model_id, tokens=tokens, timestamp=ts)
-                count += 1
-        self.logger.info("Hydrated %d records for %s.", 
-                    count, self.provider_name)
+                history[suffix][model_id].append((ts, tokens, requests))
+                count += requests
+            seeds[model_id].append(tokens // max(requests, 1))
+        for suffix, models in history.items():
+            key_map[suffix].record_history(models)
+        for model_id, values in seeds.items():
+            self.estimator.seed_many(model_id, values)
+        return count
     
     def _cleanup_loop(self) -> None:
         """Periodically clean deques to prevent memory bloat."""
@@ -103,18 +372,61 @@ class RotatingKeyManager:
                 self.logger.error("Cleanup loop error: %s", e, exc_info=True)
             time.sleep(CLEANUP_INTERVAL_SECONDS)
     
+    def _tail_loop(self) -> None:
+        """Periodically fold other processes' usage into the local windows."""
+        while not self._stop_event.wait(self.tail_interval):
+            try:
+                self.fold_peer_usage()
+            except Exception as e:
+                self.logger.error("Usage tail error: %s", e, exc_info=True)
+
+    def fold_peer_usage(self) -> int:
+        """
+        Record usage_logs rows other processes wrote since the last call; returns how many.
+
+        Always 0 for a manager created without tail_interval.
+        """
+        if self._tail is None:
+            return 0
+        rows = self._tail.poll()
+        key_map = {get_key_suffix(k.api_key): k for k in self.keys}
+        count = 0
+        with self.lock:
+            for _, suffix, model_id, ts, tokens, _ in rows:
+                key = key_map.get(suffix)
+                if key is not None:
+                    key.record_usage(model_id, tokens=tokens, timestamp=ts)
+                    count += 1
+        return count
+
     def _start_cleanup(self) -> None:
         self._thread = threading.Thread(target=self._cleanup_loop, daemon=True)
         self._thread.start()
 
     def stop(self) -> None:
-        """Stop the cleanup thread and flush logs."""
+        """Stop the background threads, flush logs and write a last checkpoint."""
         self._stop_event.set()
         self.usage_logger.stop()  # Flush logs
+        self._key_state_writer.shutdown(wait=True)
+        if self._checkpoint_thread is not None:
+            if self._checkpoint_thread.is_alive():
+                self._checkpoint_thread.join(timeout=10)
+            try:
+                self.checkpoint()
+            except Exception as e:
+                self.logger.error("Final checkpoint error: %s", e, exc_info=True)
         if self._thread.is_alive():
             self._thread.join(timeout=10)
+        if self._tail_thread is not None and self._tail_thread.is_alive():
+            self._tail_thread.join(timeout=10)
 
-    def get_key(self, model_id: str, default_limits: RateLimits, estimated_tokens: int = 1000) -> Optional[KeyUsage]:
+    def get_key(
+        self,
+        model_id: str,
+        default_limits: RateLimits,
+        estimated_tokens: int = 1000,
+        exclude: Optional[Collection[str]] = None,
+    ) -> Optional[KeyUsage]:
         """
         Get an available API key that can handle the request.
 
@@ -122,6 +434,7 @@ class RotatingKeyManager:
             model_id: The model identifier for rate limit lookup
             default_limits: Default limits to use if no per-key override exists
             estimated_tokens: Estimated token usage for this request
+            exclude: API keys to skip (e.g. keys already serving the same request)
 
         Returns:
             KeyUsage object if a key is available, None otherwise
@@ -131,7 +444,10 @@ class RotatingKeyManager:
                 idx = (self.current_index + offset) % len(self.keys)
                 key: KeyUsage = self.keys[idx]
 
-                if key.is_cooling_down(self.cooldown_seconds):
+                if exclude and key.api_key in exclude:
+                    continue
+
+                if key.is_cooling_down(self.cooldown_seconds) or key.is_disabled():
                     continue
 
                 # Resolve limits for this specific key (supports per-key overrides)
@@ -141,12 +457,41 @@ class RotatingKeyManager:
                 else:
                     limits = default_limits
 
-                if key.can_use_model(model_id, limits, estimated_tokens):
-                    key.reserve(model_id, estimated_tokens)
+                if key.try_reserve(model_id, limits, estimated_tokens):
                     self.current_index = idx
                     return key
             return None
     
+    def get_headroom(
+        self, model_id: str, default_limits: RateLimits, estimated_tokens: int = 1000, in_flight: int = 0
+    ) -> int:
+        """
+        Requests of estimated_tokens the whole pool can start right now.
+
+        Sums every key that is not cooling down or disabled. In-flight requests hold their
+        token reservations but only count against RPM once they are recorded, so in_flight
+        (requests started and not yet recorded) comes off the request limits alone.
+        """
+        total = 0
+        requests = 0
+        with self.lock:
+            for key in self.keys:
+                if key.is_cooling_down(self.cooldown_seconds) or key.is_disabled():
+                    continue
+                if self.limit_resolver:
+                    limits = self.limit_resolver(model_id, get_key_suffix(key.api_key))
+                else:
+                    limits = default_limits
+                total += key.headroom(model_id, limits, estimated_tokens)
+                if in_flight:
+                    request_limits = RateLimits(
+                        limits.requests_per_minute, limits.requests_per_hour, limits.requests_per_day
+                    )
+                    requests += key.headroom(model_id, request_limits, estimated_tokens)
+        if not in_flight:
+            return total
+        return max(0, min(total, requests - in_flight))
+
     def get_specific_key(self, identifier: Union[int, str], model_id: str, estimated_tokens: int = 1000) -> Optional[KeyUsage]:
         """
         Get a specific key by index or identifier.
@@ -161,13 +506,44 @@ class RotatingKeyManager:
             return None
 
     def record_usage(
-        self, key_obj: KeyUsage, model_id: str, actual_tokens: int, estimated_tokens: int = 1000
+        self,
+        key_obj: KeyUsage,
+        model_id: str,
+        actual_tokens: int,
+        estimated_tokens: int = 1000,
+        estimate: Optional[TokenEstimate] = None,
     ) -> None:
-        """Record usage for a specific API key."""
+        """
+        Record usage for a specific API key.
+
+        estimated_tokens is the reservation being committed. If the call was
+        sized by self.estimator, pass its estimate so the prediction is corrected.
+        """
         with self.lock:
             key_obj.commit(model_id, actual_tokens, estimated_tokens)
+        self.estimator.observe(model_id, estimate, actual_tokens)
         self.usage_logger.log(self.provider_name, model_id, key_obj.api_key, actual_tokens)
 
+    def reserve(self, key_obj: KeyUsage, model_id: str, tokens: int) -> None:
+        """
+        Add to a key's existing reservation without a limit check.
+
+        Used when an in-flight request (e.g. a long stream) outgrows its estimate.
+        The caller must commit or release the larger total.
+        """
+        with self.lock:
+            key_obj.reserve(model_id, tokens)
+
+    def release(self, key_obj: KeyUsage, model_id: str, estimated_tokens: int = 1000) -> None:
+        """
+        Drop a reservation without counting a request.
+
+        Use when a key was reserved but the request was never served by it
+        (rotated away after a 429, or cancelled before it was sent).
+        """
+        with self.lock:
+            key_obj.release(model_id, estimated_tokens)
+
     # --- STATS HELPERS ---
 
     def _find_key(self, identifier: Union[int, str]) -> Tuple[Optional[KeyUsage], int]:
@@ -181,6 +557,23 @@ class RotatingKeyManager:
                     return k, i
         return None, -1
 
+    def register_response_cache(self, cache: Any) -> None:
+        """Include a client's response cache counters in get_global_stats()."""
+        with self.lock:
+            if not any(c is cache for c in self._response_caches):
+                self._response_caches.append(cache)
+
+    def get_cache_stats(self) -> Optional[CacheStats]:
+        """Summed counters of the registered response caches, or None if there are none."""
+        with self.lock:
+            caches = list(self._response_caches)
+        if not caches:
+            return None
+        total = CacheStats()
+        for cache in caches:
+            total = total + cache.stats()
+        return total
+
     def get_global_stats(self) -> GlobalStats:
         """Aggregates usage across all keys and models."""
         total = UsageSnapshot()
@@ -191,7 +584,7 @@ class RotatingKeyManager:
                 total = total + snap
                 suffix = get_key_suffix(key.api_key)
                 keys_summary.append(KeySummary(index=i, suffix=suffix, snapshot=snap))
-        return GlobalStats(total=total, keys=keys_summary)
+        return GlobalStats(total=total, keys=keys_summary, cache=self.get_cache_stats())
 
     def get_key_stats(self, identifier: Union[int, str]) -> Optional[KeyDetailedStats]:
         """Stats for a specific key, including per-model breakdown."""
@@ -3,7 +3,10 @@ import time
 import logging
 from pathlib import Path
 from threading import RLock
-from typing import Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar, Union
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type,
+    TypeVar, Union,
+)
 
 from dotenv import load_dotenv
 from rich.console import Console
@@ -18,7 +21,7 @@ from .key_rotation.rotating_mixin import RotatingCredentialsMixin
 from .config.dataclasses import KeyUsage, RateLimits, UsageSnapshot, KeyLimitOverride
 from .config.enums import RateLimitStrategy
 from .config.models import MODEL_LIMITS, PROVIDER_STRATEGIES
-from .config.constants import DEFAULT_COOLDOWN_SECONDS
+from .config.constants import BATCH_MAX_CONCURRENCY, DEFAULT_COOLDOWN_SECONDS, DEFAULT_CLIENT_CACHE_SIZE
 from .core.utils import (
     validate_api_key,
     get_key_suffix,
@@ -29,9 +32,14 @@ from .core.utils import (
 )
 from .core.exceptions import NoAvailableKeyError, KeyNotFoundError
 from .core.backoff import ExponentialBackoff, BackoffConfig
+from .core.hedging import HedgeConfig
+from .core.batch import AsyncBatchRunner, BatchItem, BatchRunner, as_calls
+from .cache.response_cache import ResponseCache
+from .backends.base import StateBackend
 from .usage.db_logic import UsageDatabase
 from .config.log_config import default_logger
 from .adapters.openai_adapter import RotatingOpenAIClient, RotatingAsyncOpenAIClient
+from .adapters.http_pool import HttpPoolConfig
 from .adapters.generic_adapter import (
     create_rotating_client,
     SyncGenericRotatingClient,
@@ -161,6 +169,7 @@ class MultiProviderWrapper:
         logger: Optional[logging.Logger] = None,
         cooldown_seconds: int = DEFAULT_COOLDOWN_SECONDS,
         key_limits: Optional[Dict[Union[int, str], KeyLimitOverride]] = None,
+        state_backend: Optional[StateBackend] = None,
         **kwargs
     ):
         self.provider = provider.lower()
@@ -191,6 +200,7 @@ class MultiProviderWrapper:
             api_keys, self.provider, self.strategy, self.db,
             cooldown_seconds=cooldown_seconds,
             limit_resolver=self._resolve_limits_internal,
+            state_backend=state_backend,
         )
         self._model_cache_lock = RLock()  # Thread safety for RotatingClass creation
         self._RotatingClass = None
@@ -313,6 +323,11 @@ class MultiProviderWrapper:
         self, 
         estimated_tokens: int = 1000, 
         max_retries: int = 5, 
+        client_cache_size: int = DEFAULT_CLIENT_CACHE_SIZE,
+        http_pool: Optional[HttpPoolConfig] = None,
+        inject_stream_usage: bool = True,
+        response_cache: Optional[ResponseCache] = None,
+        adaptive_estimates: bool = False,
         **kwargs
     ) -> RotatingOpenAIClient:
         """
@@ -321,6 +336,13 @@ class MultiProviderWrapper:
         Args:
             estimated_tokens: Estimated tokens per request for rate limiting
             max_retries: Maximum retries on rate limit errors
+            client_cache_size: Live OpenAI clients reused across calls (0 disables reuse)
+            http_pool: Share one pooled httpx.Client with these limits across all keys
+            inject_stream_usage: Request a usage chunk on streams for exact accounting;
+                it is hidden from the caller unless stream_options asked for it
+            response_cache: Answer deterministic calls from this cache without using a key
+            adaptive_estimates: Size reservations per call from the request and learned usage,
+                with estimated_tokens as the fallback
             **kwargs: Additional arguments passed to the OpenAI client
         """
         return RotatingOpenAIClient(
@@ -331,12 +353,23 @@ class MultiProviderWrapper:
             max_retries=max_retries,
             provider=self.provider,  # Pass provider so it can look up base_url
             client_kwargs={**self.model_kwargs, **kwargs},
+            client_cache_size=client_cache_size,
+            http_pool=http_pool,
+            inject_stream_usage=inject_stream_usage,
+            response_cache=response_cache,
+            adaptive_estimates=adaptive_estimates,
         )
 
     def get_async_openai_client(
         self,
         estimated_tokens: int = 1000,
         max_retries: int = 5,
+        client_cache_size: int = DEFAULT_CLIENT_CACHE_SIZE,
+        http_pool: Optional[HttpPoolConfig] = None,
+        hedge: Optional[HedgeConfig] = None,
+        inject_stream_usage: bool = True,
+        response_cache: Optional[ResponseCache] = None,
+        adaptive_estimates: bool = False,
         **kwargs
     ) -> RotatingAsyncOpenAIClient:
         """
@@ -345,6 +378,14 @@ class MultiProviderWrapper:
         Args:
             estimated_tokens: Estimated tokens per request for rate limiting
             max_retries: Maximum retries on rate limit errors
+            client_cache_size: Live AsyncOpenAI clients reused across calls (0 disables reuse)
+            http_pool: Share one pooled httpx.AsyncClient with these limits across all keys
+            hedge: Race slow non-streaming calls against a second key within a budget
+            inject_stream_usage: Request a usage chunk on streams for exact accounting;
+                it is hidden from the caller unless stream_options asked for it
+            response_cache: Answer deterministic calls from this cache without using a key
+            adaptive_estimates: Size reservations per call from the request and learned usage,
+                with estimated_tokens as the fallback
             **kwargs: Additional arguments passed to the AsyncOpenAI client
         """
         return RotatingAsyncOpenAIClient(
@@ -354,7 +395,13 @@ class MultiProviderWrapper:
             estimated_tokens=estimated_tokens,
             max_retries=max_retries,
             provider=self.provider,  # Pass provider so it can look up base_url
-            client_kwargs={**self.model_kwargs, **kwargs}
+            client_kwargs={**self.model_kwargs, **kwargs},
+            client_cache_size=client_cache_size,
+            http_pool=http_pool,
+            hedge=hedge,
+            inject_stream_usage=inject_stream_usage,
+            response_cache=response_cache,
+            adaptive_estimates=adaptive_estimates,
         )
 
     def get_rotating_client(
@@ -577,6 +624,83 @@ class MultiProviderWrapper:
         else:
             self.logger.warning("API key not found in manager for recording usage")
 
+    # --- BATCH HELPERS ---
+
+    def _headroom(self, model_id: str, estimated_tokens: int) -> Callable[[int], int]:
+        limits = self._resolve_limits_internal(model_id)
+        return lambda in_flight: self.manager.get_headroom(model_id, limits, estimated_tokens, in_flight)
+
+    def _chat_call(self, model_id: str, estimated_tokens: int, is_async: bool) -> Callable[..., Any]:
+        """chat.completions.create on a rotating client that is only built if a dict item needs it."""
+        clients: List[Any] = []
+
+        def call(**kwargs):
+            with self._model_cache_lock:
+                if not clients:
+                    factory = self.get_async_openai_client if is_async else self.get_openai_client
+                    clients.append(factory(estimated_tokens=estimated_tokens))
+            return clients[0].chat.completions.create(**{"model": model_id, **kwargs})
+
+        return call
+
+    def map(
+        self,
+        items: Iterable[BatchItem],
+        model: Optional[str] = None,
+        fn: Optional[Callable[..., Any]] = None,
+        ordered: bool = True,
+        estimated_tokens: int = 1000,
+        max_concurrency: int = BATCH_MAX_CONCURRENCY,
+        return_exceptions: bool = False,
+    ) -> Iterator[Any]:
+        """
+        Run many calls in parallel threads, as many at a time as the key pool can take.
+
+        Concurrency follows the pool's live headroom for the model, so it grows
+        with the number of keys and shrinks as RPM/TPM windows fill. Items that
+        fail because no key is available are retried with backoff.
+
+        Args:
+            items: Zero-argument callables, or kwargs dicts passed to fn
+            model: Model whose limits size the concurrency (uses default if None)
+            fn: Called as fn(**item) for dict items. Defaults to chat.completions.create
+                on a rotating OpenAI client with model filled in
+            ordered: Yield results in input order (True) or as they complete (False)
+            estimated_tokens: Tokens one item is expected to use
+            max_concurrency: Upper bound on items in flight
+            return_exceptions: Yield a failed item's exception instead of raising it
+
+        Example:
+            >>> prompts = [{"messages": [{"role": "user", "content": p}]} for p in texts]
+            >>> for response in wrapper.map(prompts, estimated_tokens=500):
+            ...     print(response.choices[0].message.content)
+        """
+        model_id = model or self.default_model_id
+        fn = fn or self._chat_call(model_id, estimated_tokens, is_async=False)
+        runner = BatchRunner(self._headroom(model_id, estimated_tokens), max_concurrency=max_concurrency)
+        return runner.map(as_calls(items, fn), ordered=ordered, return_exceptions=return_exceptions)
+
+    def amap(
+        self,
+        items: Iterable[BatchItem],
+        model: Optional[str] = None,
+        fn: Optional[Callable[..., Awaitable[Any]]] = None,
+        ordered: bool = True,
+        estimated_tokens: int = 1000,
+        max_concurrency: int = BATCH_MAX_CONCURRENCY,
+        return_exceptions: bool = False,
+    ) -> AsyncIterator[Any]:
+        """
+        Async variant of map(): items run as tasks and results are yielded with async for.
+
+        Callable items and fn must return awaitables. Dict items default to
+        chat.completions.create on a rotating AsyncOpenAI client.
+        """
+        model_id = model or self.default_model_id
+        fn = fn or self._chat_call(model_id, estimated_tokens, is_async=True)
+        runner = AsyncBatchRunner(self._headroom(model_id, estimated_tokens), max_concurrency=max_concurrency)
+        return runner.map(as_calls(items, fn), ordered=ordered, return_exceptions=return_exceptions)
+
     # --- PRINTING HELPERS ---
     
     def _create_usage_table(self, title: str, data: List[Tuple[str, UsageSnapshot]]) -> Table:
@@ -645,6 +769,12 @@ class MultiProviderWrapper:
 
         grid.add_row("Total Requests:", f"[{'#faa0a0'}]{total_s.total_requests}[/]")
         grid.add_row("Total Tokens:",   f"[{'#e5baff'}]{total_s.total_tokens:,}[/]")
+        if stats.cache is not None:
+            grid.add_row(
+                "Cache Hits:",
+                f"[{'#baffc9'}]{stats.cache.hits}[/] / {stats.cache.hits + stats.cache.misses}"
+                f" ({stats.cache.hit_rate:.0%})"
+            )
         
         self.console.print()
         self.console.print(Panel(
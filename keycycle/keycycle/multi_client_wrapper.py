@@ -10,7 +10,10 @@ This module provides the primary interface for keycycle, supporting:
 import os
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Type, TypeVar, Union
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Type, TypeVar,
+    Union,
+)
 
 from dotenv import load_dotenv
 
@@ -18,6 +21,8 @@ from .key_rotation.rotation_manager import RotatingKeyManager
 from .config.dataclasses import RateLimits, KeyLimitOverride
 from .config.enums import RateLimitStrategy
 from .config.models import MODEL_LIMITS, PROVIDER_STRATEGIES
+from .config.constants import BATCH_MAX_CONCURRENCY
+from .core.batch import AsyncBatchRunner, BatchItem, BatchRunner, as_calls
 from .core.utils import (
     KeyEntry,
     get_key_suffix,
@@ -25,6 +30,8 @@ from .core.utils import (
     normalize_key_limits as _normalize_key_limits,
 )
 from .usage.db_logic import UsageDatabase
+from .usage.usage_logger import UsageLogConfig
+from .backends.base import StateBackend
 from .adapters.generic_adapter import (
     create_rotating_client,
     SyncGenericRotatingClient,
@@ -56,6 +63,12 @@ class ProviderEnvConfig:
         api_key_param: Name of the API key parameter (default: "api_key")
         excluded_kwargs: List of kwarg names to exclude from client constructor.
             Useful for clients that don't accept certain params (e.g., TwelveLabs doesn't accept 'model').
+        state_backend: Where rate-limit windows and cooldowns live (default: process memory)
+        tail_interval: Seconds between polls folding other processes' usage_logs rows
+            into the local windows (default: only read history at startup)
+        usage_log: Batching, queue bound and overflow policy for usage_logs writes
+        checkpoint_path: Local file the provider's windows are checkpointed to, so a
+            restart skips most of the history scan (default: no checkpoints)
     """
     default_model: Optional[str] = None
     extra_params: Optional[List[str]] = None
@@ -63,6 +76,10 @@ class ProviderEnvConfig:
     limits: Optional[Dict[str, RateLimits]] = None
     api_key_param: str = "api_key"
     excluded_kwargs: Optional[List[str]] = None
+    state_backend: Optional[StateBackend] = None
+    tail_interval: Optional[float] = None
+    usage_log: Optional[UsageLogConfig] = None
+    checkpoint_path: Optional[str] = None
 
 
 class MultiClientWrapper:
@@ -91,15 +108,16 @@ class MultiClientWrapper:
     MODEL_LIMITS = MODEL_LIMITS
     PROVIDER_STRATEGIES = PROVIDER_STRATEGIES
 
-    def __init__(self, db_url: Optional[str] = None, db_env_var: str = "TIDB_DB_URL"):
+    def __init__(self, db_url: Optional[str] = None, db_env_var: str = "TIDB_DB_URL", compact_usage: bool = False):
         """
         Initialize a MultiClientWrapper.
 
         Args:
             db_url: Database URL for usage persistence (optional)
             db_env_var: Environment variable name for database URL
+            compact_usage: Store usage rows in the compact usage_events schema
         """
-        self.db = UsageDatabase(db_url, db_env_var)
+        self.db = UsageDatabase(db_url, db_env_var, compact=compact_usage)
         self._managers: Dict[str, RotatingKeyManager] = {}
         self._configs: Dict[str, ProviderConfig] = {}
         self._key_limits: Dict[str, Dict[str, KeyLimitOverride]] = {}
@@ -113,6 +131,7 @@ class MultiClientWrapper:
         limits: Optional[Dict[str, RateLimits]] = None,
         api_key_param: str = "api_key",
         key_limits: Optional[Dict[Union[int, str], KeyLimitOverride]] = None,
+        state_backend: Optional[StateBackend] = None,
         **kwargs
     ) -> "MultiClientWrapper":
         """
@@ -126,6 +145,8 @@ class MultiClientWrapper:
             limits: Custom rate limits per model
             api_key_param: Name of the API key parameter
             key_limits: Per-key rate limit overrides
+            state_backend: Where rate-limit windows and cooldowns live, e.g. a
+                RedisStateBackend shared by every host (default: process memory)
             **kwargs: Additional arguments for RotatingKeyManager
 
         Returns:
@@ -148,6 +169,7 @@ class MultiClientWrapper:
             db=self.db,
             api_key_param=api_key_param,
             limit_resolver=lambda m, k, p=provider: self._resolve_limits(p, m, k),
+            state_backend=state_backend,
             **kwargs
         )
         self._managers[provider] = manager
@@ -280,6 +302,63 @@ class MultiClientWrapper:
             raise ValueError(f"Provider '{provider}' not registered.")
         return manager
 
+    def _headroom(self, provider: str, model: Optional[str], estimated_tokens: int) -> Callable[[int], int]:
+        manager = self.get_manager(provider)
+        provider = provider.lower()
+        model_id = model or self._configs[provider].default_model or "default"
+        limits = self._resolve_limits(provider, model_id)
+        return lambda in_flight: manager.get_headroom(model_id, limits, estimated_tokens, in_flight)
+
+    def map(
+        self,
+        provider: str,
+        items: Iterable[BatchItem],
+        fn: Optional[Callable[..., Any]] = None,
+        model: Optional[str] = None,
+        ordered: bool = True,
+        estimated_tokens: int = 1000,
+        max_concurrency: int = BATCH_MAX_CONCURRENCY,
+        return_exceptions: bool = False,
+    ) -> Iterator[Any]:
+        """
+        Run many calls in parallel threads, as many at a time as the provider's keys can take.
+
+        Concurrency follows the pool's live headroom for the model. Items that
+        fail because no key is available are retried with backoff.
+
+        Args:
+            provider: Registered provider name
+            items: Zero-argument callables, or kwargs dicts passed to fn
+            fn: Called as fn(**item) for dict items, usually a method of a rotating client
+            model: Model whose limits size the concurrency (defaults to provider's default_model)
+            ordered: Yield results in input order (True) or as they complete (False)
+            estimated_tokens: Tokens one item is expected to use
+            max_concurrency: Upper bound on items in flight
+            return_exceptions: Yield a failed item's exception instead of raising it
+
+        Example:
+            >>> client = wrapper.get_rotating_client("cohere", cohere.Client)
+            >>> docs = [{"texts": [t], "model": "embed-english-v3.0"} for t in texts]
+            >>> vectors = list(wrapper.map("cohere", docs, fn=client.embed))
+        """
+        runner = BatchRunner(self._headroom(provider, model, estimated_tokens), max_concurrency=max_concurrency)
+        return runner.map(as_calls(items, fn), ordered=ordered, return_exceptions=return_exceptions)
+
+    def amap(
+        self,
+        provider: str,
+        items: Iterable[BatchItem],
+        fn: Optional[Callable[..., Awaitable[Any]]] = None,
+        model: Optional[str] = None,
+        ordered: bool = True,
+        estimated_tokens: int = 1000,
+        max_concurrency: int = BATCH_MAX_CONCURRENCY,
+        return_exceptions: bool = False,
+    ) -> AsyncIterator[Any]:
+        """Async variant of map(): items run as tasks and results are yielded with async for."""
+        runner = AsyncBatchRunner(self._headroom(provider, model, estimated_tokens), max_concurrency=max_concurrency)
+        return runner.map(as_calls(items, fn), ordered=ordered, return_exceptions=return_exceptions)
+
     @classmethod
     def from_env(
         cls,
@@ -287,6 +366,7 @@ class MultiClientWrapper:
         env_file: Optional[str] = None,
         db_url: Optional[str] = None,
         db_env_var: str = "TIDB_DB_URL",
+        compact_usage: bool = False,
     ) -> "MultiClientWrapper":
         """
         Create a wrapper from environment variables.
@@ -296,6 +376,7 @@ class MultiClientWrapper:
             env_file: Path to .env file (optional)
             db_url: Database URL for usage persistence
             db_env_var: Environment variable name for database URL
+            compact_usage: Store usage rows in the compact usage_events schema
 
         Returns:
             Configured MultiClientWrapper instance
@@ -318,7 +399,7 @@ class MultiClientWrapper:
             TWELVELABS_API_KEY_2=key2
             TWELVELABS_INDEX_ID_2=idx_xyz
         """
-        instance = cls(db_url=db_url, db_env_var=db_env_var)
+        instance = cls(db_url=db_url, db_env_var=db_env_var, compact_usage=compact_usage)
 
         for provider, config in providers.items():
             keys = cls.load_api_keys(
@@ -334,6 +415,10 @@ class MultiClientWrapper:
                 strategy=config.strategy,
                 limits=config.limits,
                 api_key_param=config.api_key_param,
+                state_backend=config.state_backend,
+                tail_interval=config.tail_interval,
+                usage_log=config.usage_log,
+                checkpoint_path=config.checkpoint_path,
             )
             # Store excluded_kwargs from env config
             if config.excluded_kwargs:
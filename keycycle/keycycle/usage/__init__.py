@@ -1,6 +1,24 @@
 from .db_logic import UsageDatabase
-from .usage_logger import AsyncUsageLogger
+from .usage_logger import AsyncUsageLogger, UsageLogConfig
+from .asyncio_usage_logger import AsyncioUsageLogger
+from .stream_usage import (
+    StreamUsageAccumulator,
+    default_chunk_text_extractor,
+    estimate_request_tokens,
+    estimate_tokens_from_text,
+)
+from .token_estimator import ReservationEstimator, TokenEstimate
+from .usage_tail import UsageTail
 __all__ = [
     "UsageDatabase",
-    "AsyncUsageLogger"
+    "AsyncUsageLogger",
+    "AsyncioUsageLogger",
+    "UsageLogConfig",
+    "StreamUsageAccumulator",
+    "default_chunk_text_extractor",
+    "estimate_request_tokens",
+    "estimate_tokens_from_text",
+    "ReservationEstimator",
+    "TokenEstimate",
+    "UsageTail",
 ]
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""
+Usage log writer that runs as a task on the application's event loop.
+
+AsyncUsageLogger gives every manager its own writer thread doing blocking
+database calls. Asyncio services can use this writer instead: rows are
+batched with the same triggers and written through UsageDatabase's async
+engine (aiosqlite, aiomysql, ...), with no extra threads.
+"""
+import asyncio
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .db_logic import UsageDatabase
+from .usage_logger import UsageLogConfig, _UsageLoggerBase
+from ..config.constants import USAGE_LOG_RETRY_SECONDS
+from ..config.enums import QueueOverflow
+
+
+class AsyncioUsageLogger(_UsageLoggerBase):
+    """
+    Batches usage_logs writes on an asyncio task.
+
+    The task starts with the first log() call made on a running loop, or with
+    start(); rows logged before that wait in the queue. log() may also be
+    called from other threads. aclose() writes what is queued and ends the
+    task, and so does cancelling it, as asyncio.run() does on loop shutdown.
+
+    A full queue always drops its oldest rows, since blocking log() would stall
+    the loop, and a failed batch is retried in memory (no spool file) up to
+    max_attempts times, then dropped.
+    """
+    def __init__(
+        self,
+        db: UsageDatabase,
+        logger: Optional[logging.Logger] = None,
+        writer_id: Optional[str] = None,
+        config: Optional[UsageLogConfig] = None,
+    ):
+        super().__init__(db, logger, writer_id, config)
+        if self.config.overflow is QueueOverflow.BLOCK or self.config.spool_dir is not None:
+            raise ValueError("AsyncioUsageLogger supports neither overflow='block' nor spool_dir.")
+        self.queue: Deque[Dict[str, Any]] = deque()
+        self._queued_bytes = 0
+        # Guards the queue: log() may run on worker threads as well as on the loop
+        self._lock = threading.Lock()
+        # Batch taken from the queue but not written yet
+        self._inflight: List[Dict[str, Any]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._closing = False
+        atexit.register(self.stop)
+
+    def start(self) -> None:
+        """Start the writer task on the running loop; log() does this on first use."""
+        loop = asyncio.get_running_loop()
+        if self._running():
+            if self._loop is loop:
+                return
+            raise RuntimeError("AsyncioUsageLogger is already running on another event loop.")
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = loop.create_task(self._run())
+        if self.queue:
+            self._wakeup.set()
+
+    def _running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _require_started(self) -> Tuple[asyncio.AbstractEventLoop, asyncio.Event, "asyncio.Task[None]"]:
+        """The writer's loop, wakeup event and task; only valid once start() has run."""
+        assert self._loop is not None and self._wakeup is not None and self._task is not None
+        return self._loop, self._wakeup, self._task
+
+    def log(self, provider: str, model: str, api_key: str, tokens: int) -> None:
+        row = self._row((provider, model, api_key, time.time(), tokens))
+        with self._stats_lock:
+            self._stats.enqueued += 1
+        dropped = 0
+        with self._lock:
+            if len(self.queue) >= self.config.max_queue_size:
+                self._queued_bytes -= self._row_bytes(self.queue.popleft())
+                dropped = 1
+            self.queue.append(row)
+            self._queued_bytes += self._row_bytes(row)
+            # The writer waits for the first row, then for a full batch or max_latency
+            wake = len(self.queue) == 1 or self._batch_ready()
+        if dropped:
+            self._count_dropped(dropped)
+        if wake:
+            self._wake()
+
+    def _batch_ready(self) -> bool:
+        return len(self.queue) >= self.config.max_batch_size or self._queued_bytes >= self.config.max_batch_bytes
+
+    def _wake(self) -> None:
+        if not self._running():
+            try:
+                self.start()
+            except RuntimeError:
+                return  # No loop here; the rows wait for start() or stop()
+            return
+        loop, wakeup, _ = self._require_started()
+        try:
+            if asyncio.get_running_loop() is loop:
+                wakeup.set()
+                return
+        except RuntimeError:
+            pass
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            pass  # The loop closed; stop() writes what is left
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        batch: List[Dict[str, Any]] = []
+        size = 0
+        with self._lock:
+            while self.queue and len(batch) < self.config.max_batch_size and size < self.config.max_batch_bytes:
+                row = self.queue.popleft()
+                row_bytes = self._row_bytes(row)
+                self._queued_bytes -= row_bytes
+                size += row_bytes
+                batch.append(row)
+        return batch
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        started = time.perf_counter()
+        # A retry after a lost commit acknowledgement must not insert the rows twice
+        inserted = await self.db.asave_usage_rows_once(batch)
+        self._count_written(inserted, time.perf_counter() - started)
+
+    async def _write_queued(self) -> None:
+        """Write batches until the queue is empty; a failed batch is retried up to max_attempts times."""
+        attempt = 0
+        while True:
+            if not self._inflight:
+                self._inflight = self._take_batch()
+                attempt = 0
+                if not self._inflight:
+                    return
+            attempt += 1
+            try:
+                await self._write(self._inflight)
+                self._inflight = []
+            except Exception as e:
+                with self._stats_lock:
+                    self._stats.failed_flushes += 1
+                if self._closing:
+                    raise
+                self.logger.exception("Usage log write error", exc_info=e)
+                if attempt >= self.config.max_attempts:
+                    self._give_up(len(self._inflight), attempt)
+                    self._inflight = []
+                    continue
+                await asyncio.sleep(USAGE_LOG_RETRY_SECONDS)
+
+    async def _run(self) -> None:
+        loop, wakeup, _ = self._require_started()
+        try:
+            while not self._closing:
+                await wakeup.wait()
+                wakeup.clear()
+                deadline = loop.time() + self.config.max_latency
+                while not self._closing and not self._batch_ready():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    wakeup.clear()
+                await self._write_queued()
+                with self._lock:
+                    if self.queue:
+                        wakeup.set()
+        except asyncio.CancelledError:
+            # Loop shutdown: write what is queued, then let the engine go with the loop
+            await self._drain()
+            await self.db.adispose()
+            raise
+        await self._drain()
+
+    async def _drain(self) -> None:
+        self._closing = True
+        try:
+            await self._write_queued()
+        except Exception as e:
+            self.logger.exception("Usage log write error on exit", exc_info=e)
+            with self._lock:
+                lost = len(self._inflight) + len(self.queue)
+                self._inflight = []
+                self.queue.clear()
+                self._queued_bytes = 0
+            self._count_dropped(lost)
+
+    async def aclose(self) -> None:
+        """Write everything queued and end the writer task."""
+        self._closing = True
+        if self._running():
+            loop, wakeup, task = self._require_started()
+            if asyncio.get_running_loop() is not loop:
+                raise RuntimeError("aclose() must be awaited on the logger's event loop.")
+            wakeup.set()
+            await asyncio.shield(task)
+        elif self.queue or self._inflight:
+            await self._drain()
+
+    def _queued(self) -> int:
+        return len(self.queue) + len(self._inflight)
+
+    def stop(self):
+        """Drain from outside the loop; rows left after the loop ended are written synchronously."""
+        self._closing = True
+        if self._running():
+            loop, wakeup, _ = self._require_started()
+            try:
+                on_loop = asyncio.get_running_loop() is loop
+            except RuntimeError:
+                on_loop = False
+            if on_loop:
+                wakeup.set()  # Cannot wait here; the task drains on its own
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self.aclose(), loop).result(timeout=10)
+                return
+            except Exception as e:
+                self.logger.warning("AsyncioUsageLogger did not drain cleanly: %s", e)
+                return
+        with self._lock:
+            rows = self._inflight + list(self.queue)
+            self._inflight = []
+            self.queue.clear()
+            self._queued_bytes = 0
+        if rows:
+            try:
+                self._count_written(self.db.save_usage_rows_once(rows), 0.0)
+            except Exception as e:
+                self.logger.exception("Usage log write error on exit", exc_info=e)
+                self._count_dropped(len(rows))
@@ -1,21 +1,162 @@
+import asyncio
 import os
 import time
-from typing import Optional, List
+import weakref
+from collections import defaultdict
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, Optional, List, Sequence, Tuple
 from sqlalchemy import (
-    create_engine, select, and_, Table, Column,
+    create_engine, select, and_, or_, Table, Column,
     Integer, String, Float, MetaData, Index, delete,
-    URL
+    URL, BigInteger, PrimaryKeyConstraint, insert, update, inspect, text, make_url,
+    ForeignKey, SmallInteger, UniqueConstraint, func, Connection, Select, Engine, ColumnElement
 )
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+
+try:
+    import greenlet  # noqa: F401  (SQLAlchemy's asyncio extension runs on it)
+    from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+    HAS_ASYNC_ENGINE = True
+except ImportError:
+    HAS_ASYNC_ENGINE = False
 
 from ..core.utils import get_key_suffix
-from ..config.constants import SECONDS_PER_DAY
+from ..config.constants import DIMENSION_MISS_TTL_SECONDS, HISTORY_CHUNK_ROWS, SECONDS_PER_DAY, SECONDS_PER_MINUTE
+
+# (provider, api_key_suffix, model, minute start) -> [requests, tokens]
+RollupDeltas = Dict[Tuple[str, str, str, int], List[int]]
+
+_UPSERT_DIALECTS = {'sqlite': sqlite, 'mysql': mysql, 'mariadb': mysql, 'postgresql': postgresql}
+_UPSERT_CHUNK = 100  # rows per multi-row upsert, well under every driver's parameter limit
+# asyncio driver used for a database URL that names a sync one
+_ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'mysql': 'aiomysql', 'mariadb': 'aiomysql', 'postgresql': 'asyncpg'}
+
+# (window seconds, window start, requests, tokens, max requests, max tokens)
+WindowDelta = Tuple[int, int, int, int, Optional[int], Optional[int]]
+
+
+class _WindowFull(Exception):
+    """A conditional window update matched no row; rolls back the lease transaction."""
+
+
+# SQLite only auto-increments an INTEGER PRIMARY KEY
+_SMALL_ID = SmallInteger().with_variant(Integer(), 'sqlite')
+
+
+class _Dimension:
+    """
+    In-process cache of a dimension table (id -> natural key, e.g. a model name).
+
+    Ids never change once assigned, so entries are cached for the life of the
+    process; a miss reloads the table once, since another process may have
+    added the value, and only then inserts it. A value still missing after the
+    reload is not looked up again for DIMENSION_MISS_TTL_SECONDS.
+
+    The a-prefixed methods read through an async engine instead.
+    """
+    def __init__(self, engine: Engine, table: Table, columns: Sequence[str]):
+        self.engine = engine
+        self.table = table
+        self.columns = list(columns)
+        self.ids: Dict[tuple, int] = {}
+        self.values: Dict[int, tuple] = {}
+        # value -> monotonic time of the reload that did not find it
+        self._misses: Dict[tuple, float] = {}
+
+    def _select(self):
+        return select(self.table.c.id, *(self.table.c[name] for name in self.columns))
+
+    def _store(self, rows: Iterable[Sequence[Any]]) -> None:
+        for row in rows:
+            self.ids[tuple(row[1:])] = row[0]
+            self.values[row[0]] = tuple(row[1:])
+
+    def load(self) -> None:
+        with self.engine.connect() as conn:
+            self._store(conn.execute(self._select()))
+
+    async def aload(self, engine: "AsyncEngine") -> None:
+        async with engine.connect() as conn:
+            self._store(await conn.execute(self._select()))
+
+    def _should_reload(self, value: tuple) -> bool:
+        if value in self.ids:
+            return False
+        missed_at = self._misses.get(value)
+        return missed_at is None or time.monotonic() - missed_at >= DIMENSION_MISS_TTL_SECONDS
+
+    def _found(self, value: tuple) -> Optional[int]:
+        row_id = self.ids.get(value)
+        if row_id is None:
+            self._misses[value] = time.monotonic()
+        else:
+            self._misses.pop(value, None)
+        return row_id
+
+    def find(self, value: tuple) -> Optional[int]:
+        """The value's id, or None if no process stored it yet."""
+        if not self._should_reload(value):
+            return self.ids.get(value)
+        self.load()
+        return self._found(value)
+
+    async def afind(self, engine: "AsyncEngine", value: tuple) -> Optional[int]:
+        """find() through an async engine."""
+        if not self._should_reload(value):
+            return self.ids.get(value)
+        await self.aload(engine)
+        return self._found(value)
+
+    def id_for(self, value: tuple) -> int:
+        """The value's id, inserting it (in its own transaction) if it is new."""
+        row_id = self.ids.get(value)
+        if row_id is not None:
+            return row_id
+        row_id = self.find(value)
+        if row_id is not None:
+            return row_id
+        try:
+            with self.engine.begin() as conn:
+                inserted = conn.execute(
+                    insert(self.table).values(dict(zip(self.columns, value)))
+                ).inserted_primary_key
+                assert inserted is not None, "a single-row INSERT reports its primary key"
+                row_id = inserted[0]
+        except IntegrityError:
+            # Another process inserted it first
+            self.load()
+            row_id = self.ids[value]
+        self._misses.pop(value, None)
+        self.ids[value] = row_id
+        self.values[row_id] = value
+        return row_id
+
+    def value_of(self, row_id: int) -> tuple:
+        if row_id not in self.values:
+            self.load()
+        return self.values[row_id]
 
 
 # --- DATABASE LAYER ---
 
 class UsageDatabase:
     """Handles Online persistence for API usage"""
-    def __init__(self, db_url: Optional[str] = None, db_env_var: str = "TIDB_DB_URL"):
+    def __init__(
+        self,
+        db_url: Optional[str] = None,
+        db_env_var: str = "TIDB_DB_URL",
+        async_db_url: Optional[str] = None,
+        compact: bool = False,
+    ):
+        """
+        Args:
+            async_db_url: URL for the a-prefixed methods (default: db_url with its
+                asyncio driver, e.g. sqlite+aiosqlite or mysql+aiomysql)
+            compact: Store usage rows in usage_events (small integer ids into the
+                provider, model and key tables, integer-millisecond timestamps)
+                instead of usage_logs. See migrate_from_legacy().
+        """
+        self.compact = compact
         self.db_url = db_url or os.getenv(db_env_var)
         if not self.db_url:
             raise ValueError(f"Database URL not provided and {db_env_var} not set.")
@@ -23,10 +164,45 @@ class UsageDatabase:
             self.db_url,
             pool_recycle = 300   
         )
+        self.async_db_url = async_db_url or self._async_url(self.db_url)
+        # Pooled async connections belong to the loop that opened them, so one engine per loop
+        self._async_engines: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncEngine]" = (
+            weakref.WeakKeyDictionary()
+        )
         self._init_db()
 
+    @staticmethod
+    def _async_url(db_url: str) -> str:
+        url = make_url(db_url)
+        driver = _ASYNC_DRIVERS.get(url.get_backend_name())
+        if driver is None or url.get_driver_name() in _ASYNC_DRIVERS.values():
+            return db_url
+        return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+    def async_engine(self) -> "AsyncEngine":
+        """The async engine for the running event loop, created on first use."""
+        if not HAS_ASYNC_ENGINE:
+            raise ImportError(
+                "Async database access needs SQLAlchemy's asyncio extra and a driver: "
+                "pip install 'sqlalchemy[asyncio]' aiosqlite (or aiomysql)"
+            )
+        loop = asyncio.get_running_loop()
+        engine = self._async_engines.get(loop)
+        if engine is None:
+            engine = self._async_engines[loop] = create_async_engine(self.async_db_url, pool_recycle=300)
+        return engine
+
+    async def adispose(self) -> None:
+        """Close the running loop's async connections; call before the loop closes."""
+        engine = self._async_engines.pop(asyncio.get_running_loop(), None)
+        if engine is not None:
+            await engine.dispose()
+
     def _init_db(self):
         metadata = MetaData()
+        inspector = inspect(self.engine)
+        had_rollups = inspector.has_table('usage_rollups')
+        has_legacy_logs = inspector.has_table('usage_logs')
         self.usage_logs = Table(
             'usage_logs',
             metadata,
@@ -36,18 +212,481 @@ class UsageDatabase:
             Column('api_key_suffix', String(50)),
             Column('timestamp', Float),
             Column('tokens', Integer),
+            # Process that wrote the row, so tailing managers can skip their own usage
+            Column('writer_id', String(32)),
+            # Unique per row, so replaying a spooled batch never inserts it twice
+            Column('record_id', String(32)),
+            # When the row was inserted; tailing pages on this, since a spooled or
+            # retried row can reach the table long after its own timestamp
+            Column('written_at', Float),
 
             Index('idx_key_usage', 'provider', 'api_key_suffix', 'timestamp'),
             Index('idx_cleanup', 'timestamp'),
-            Index('idx_model_reporting', 'provider', 'model', 'timestamp')
+            Index('idx_model_reporting', 'provider', 'model', 'timestamp'),
+            Index('idx_provider_tail', 'provider', 'timestamp'),
+            Index('idx_provider_written', 'provider', 'written_at'),
+            Index('idx_record_id', 'record_id', unique=True)
+        )
+        # Fixed-window counters used to coordinate reservations across hosts
+        self.rate_windows = Table(
+            'rate_windows',
+            metadata,
+            Column('provider', String(100), nullable=False),
+            Column('api_key_suffix', String(50), nullable=False),
+            Column('scope', String(100), nullable=False),
+            Column('window', Integer, nullable=False),
+            Column('window_start', BigInteger, nullable=False),
+            Column('requests', Integer, nullable=False, default=0),
+            Column('tokens', BigInteger, nullable=False, default=0),
+
+            PrimaryKeyConstraint('provider', 'api_key_suffix', 'scope', 'window', 'window_start'),
+            Index('idx_window_cleanup', 'window_start'),
+        )
+        # Requests and tokens per key, model and minute; hydration reads these instead of raw rows
+        self.usage_rollups = Table(
+            'usage_rollups',
+            metadata,
+            Column('provider', String(100), nullable=False),
+            Column('api_key_suffix', String(50), nullable=False),
+            Column('model', String(100), nullable=False),
+            Column('minute', BigInteger, nullable=False),
+            Column('requests', Integer, nullable=False, default=0),
+            Column('tokens', BigInteger, nullable=False, default=0),
+
+            PrimaryKeyConstraint('provider', 'api_key_suffix', 'model', 'minute'),
+            Index('idx_rollup_provider', 'provider', 'minute'),
+            Index('idx_rollup_cleanup', 'minute'),
+        )
+        # Cooldowns, exhausted quotas and invalid keys, so a restart does not retry them at once
+        self.key_states = Table(
+            'key_states',
+            metadata,
+            Column('provider', String(100), nullable=False),
+            Column('api_key_suffix', String(50), nullable=False),
+            Column('status', String(16), nullable=False),
+            Column('since', Float, nullable=False),
+            Column('until', Float, nullable=False),
+
+            PrimaryKeyConstraint('provider', 'api_key_suffix', 'status'),
+            Index('idx_key_state_cleanup', 'until'),
+        )
+        # Compact schema: the strings of a usage row live once in these dimension tables
+        self.usage_providers = Table(
+            'usage_providers',
+            metadata,
+            Column('id', _SMALL_ID, primary_key=True),
+            Column('name', String(100), nullable=False, unique=True),
+        )
+        self.usage_models = Table(
+            'usage_models',
+            metadata,
+            Column('id', _SMALL_ID, primary_key=True),
+            Column('name', String(100), nullable=False, unique=True),
+        )
+        self.usage_keys = Table(
+            'usage_keys',
+            metadata,
+            Column('id', Integer, primary_key=True),
+            Column('provider_id', SmallInteger, ForeignKey('usage_providers.id'), nullable=False),
+            Column('api_key_suffix', String(50), nullable=False),
+
+            UniqueConstraint('provider_id', 'api_key_suffix', name='uq_usage_key'),
+        )
+        self.usage_events = Table(
+            'usage_events',
+            metadata,
+            Column('id', Integer, primary_key=True),
+            Column('provider_id', SmallInteger, ForeignKey('usage_providers.id'), nullable=False),
+            Column('key_id', Integer, ForeignKey('usage_keys.id'), nullable=False),
+            Column('model_id', SmallInteger, ForeignKey('usage_models.id'), nullable=False),
+            Column('ts_ms', BigInteger, nullable=False),
+            Column('tokens', Integer),
+            Column('writer_id', String(32)),
+            Column('record_id', String(32)),
+            Column('written_ms', BigInteger),
+
+            # Covers history reads, which never touch the table rows; per-key and
+            # per-model reporting reads usage_rollups, so those indexes are not repeated here
+            Index('idx_event_provider', 'provider_id', 'ts_ms', 'key_id', 'model_id', 'tokens'),
+            Index('idx_event_cleanup', 'ts_ms'),
+            Index('idx_event_record_id', 'record_id', unique=True),
+            Index('idx_event_written', 'provider_id', 'written_ms'),
+        )
+        shared = [self.rate_windows, self.usage_rollups, self.key_states]
+        if self.compact:
+            dimensions = [self.usage_providers, self.usage_models, self.usage_keys]
+            metadata.create_all(self.engine, tables=shared + dimensions + [self.usage_events])
+            self._upgrade_table(self.usage_events)
+            self._providers = _Dimension(self.engine, self.usage_providers, ['name'])
+            self._models = _Dimension(self.engine, self.usage_models, ['name'])
+            self._keys = _Dimension(self.engine, self.usage_keys, ['provider_id', 'api_key_suffix'])
+            for dimension in (self._providers, self._models, self._keys):
+                dimension.load()
+        else:
+            metadata.create_all(self.engine, tables=shared + [self.usage_logs])
+            self._upgrade_schema()
+        if not had_rollups:
+            # Until migrate_from_legacy() runs, a compact database's rows are still in usage_logs
+            self._backfill_rollups(from_events=self.compact and not has_legacy_logs)
+
+    def _upgrade_schema(self) -> None:
+        """Add columns and indexes introduced after an existing usage_logs table was created."""
+        self._upgrade_table(self.usage_logs)
+
+    def _upgrade_table(self, table: Table) -> None:
+        """Add the table's nullable columns and its indexes that an existing copy lacks."""
+        columns, indexes = self._existing_schema(table)
+        for column in table.columns:
+            if column.name not in columns and column.nullable and not column.primary_key:
+                ddl = column.type.compile(dialect=self.engine.dialect)
+                try:
+                    with self.engine.begin() as conn:
+                        conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {ddl}'))
+                except (OperationalError, ProgrammingError):
+                    # Fine if another process added it first; anything else (e.g. no ALTER privilege) is not
+                    if column.name not in self._existing_schema(table)[0]:
+                        raise
+        for index in table.indexes:
+            if index.name not in indexes:
+                try:
+                    index.create(self.engine)
+                except (OperationalError, ProgrammingError):
+                    if index.name not in self._existing_schema(table)[1]:
+                        raise
+
+    def _existing_schema(self, table: Table) -> Tuple[set, set]:
+        """Names of the columns and indexes the table has in the database right now."""
+        inspector = inspect(self.engine)
+        return (
+            {c['name'] for c in inspector.get_columns(table.name)},
+            {i['name'] for i in inspector.get_indexes(table.name)},
+        )
+
+    @staticmethod
+    def _rollup_deltas(rows: Iterable[dict]) -> RollupDeltas:
+        deltas: RollupDeltas = defaultdict(lambda: [0, 0])
+        for row in rows:
+            minute = int(row['timestamp'] // SECONDS_PER_MINUTE) * SECONDS_PER_MINUTE
+            delta = deltas[(row['provider'], row['api_key_suffix'], row['model'], minute)]
+            delta[0] += 1
+            delta[1] += row['tokens'] or 0
+        return deltas
+
+    def _upsert_rollups(self, conn: Connection, deltas: RollupDeltas, accumulate: bool = True) -> None:
+        """Add deltas to their minute rows (or overwrite them), creating missing rows."""
+        t = self.usage_rollups
+        values = [
+            {'provider': p, 'api_key_suffix': s, 'model': m, 'minute': minute, 'requests': r, 'tokens': tok}
+            # Sorted so concurrent writers lock rows in the same order
+            for (p, s, m, minute), (r, tok) in sorted(deltas.items())
+        ]
+        dialect = _UPSERT_DIALECTS.get(self.engine.dialect.name)
+        for start in range(0, len(values), _UPSERT_CHUNK):
+            chunk = values[start:start + _UPSERT_CHUNK]
+            if dialect is None:
+                self._update_or_insert_rollups(conn, chunk, accumulate)
+                continue
+            stmt = dialect.insert(t).values(chunk)
+            new = stmt.inserted if dialect is mysql else stmt.excluded
+            changes = {
+                'requests': t.c.requests + new.requests if accumulate else new.requests,
+                'tokens': t.c.tokens + new.tokens if accumulate else new.tokens,
+            }
+            if dialect is mysql:
+                stmt = stmt.on_duplicate_key_update(**changes)
+            else:
+                stmt = stmt.on_conflict_do_update(index_elements=list(t.primary_key.columns), set_=changes)
+            conn.execute(stmt)
+
+    def _update_or_insert_rollups(self, conn: Connection, values: List[dict], accumulate: bool) -> None:
+        """Fallback for databases without an upsert statement."""
+        t = self.usage_rollups
+        for v in values:
+            row = and_(
+                t.c.provider == v['provider'], t.c.api_key_suffix == v['api_key_suffix'],
+                t.c.model == v['model'], t.c.minute == v['minute'],
+            )
+            changes = (
+                {'requests': t.c.requests + v['requests'], 'tokens': t.c.tokens + v['tokens']}
+                if accumulate else {'requests': v['requests'], 'tokens': v['tokens']}
+            )
+            if conn.execute(update(t).where(row).values(**changes)).rowcount == 0:
+                conn.execute(insert(t).values(**v))
+
+    def _backfill_rollups(self, from_events: bool) -> None:
+        """Build rollups for the last day of usage rows written before the table existed."""
+        now = time.time()
+        # The current minute is left to the writers, which add to it from now on
+        current = int(now // SECONDS_PER_MINUTE) * SECONDS_PER_MINUTE
+        if from_events:
+            t = self.usage_events
+            stmt = select(t.c.key_id, t.c.model_id, t.c.ts_ms, t.c.tokens).where(
+                t.c.ts_ms > int((now - SECONDS_PER_DAY) * 1000), t.c.ts_ms < current * 1000
+            )
+            rows = (self._decode_row(row) for row in self._stream(stmt, HISTORY_CHUNK_ROWS))
+        else:
+            logs = self.usage_logs
+            stmt = select(
+                logs.c.provider, logs.c.api_key_suffix, logs.c.model, logs.c.timestamp, logs.c.tokens
+            ).where(logs.c.timestamp > now - SECONDS_PER_DAY, logs.c.timestamp < current)
+            rows = (row._asdict() for row in self._stream(stmt, HISTORY_CHUNK_ROWS))
+        deltas = self._rollup_deltas(rows)
+        with self.engine.begin() as conn:
+            # Overwrite rather than add, so a second process backfilling at the same time agrees
+            self._upsert_rollups(conn, deltas, accumulate=False)
+
+    def _stream(self, stmt: Select, chunk_size: int) -> Iterator[Any]:
+        """Rows of a query through a server-side cursor, chunk_size rows in memory at a time."""
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+            yield from result
+
+    def _fetch(self, stmt: Select, chunk_size: Optional[int]) -> Iterable[Any]:
+        if chunk_size is not None:
+            return self._stream(stmt, chunk_size)
+        with self.engine.connect() as conn:
+            return conn.execute(stmt).all()
+
+    @property
+    def log_table(self) -> Table:
+        """The table usage rows are written to: usage_events if compact, else usage_logs."""
+        return self.usage_events if self.compact else self.usage_logs
+
+    def _known_ids(self, row: dict) -> Optional[Tuple[int, int, int]]:
+        """(provider_id, key_id, model_id) of a usage row from the cached dimensions, or None if one is missing."""
+        provider_id = self._providers.ids.get((row['provider'],))
+        if provider_id is None:
+            return None
+        key_id = self._keys.ids.get((provider_id, row['api_key_suffix']))
+        model_id = self._models.ids.get((row['model'],))
+        if key_id is None or model_id is None:
+            return None
+        return provider_id, key_id, model_id
+
+    def _ids_for(self, row: dict) -> Tuple[int, int, int]:
+        """_known_ids(), creating the missing dimension ids."""
+        known = self._known_ids(row)
+        if known is not None:
+            return known
+        provider_id = self._providers.id_for((row['provider'],))
+        return (
+            provider_id,
+            self._keys.id_for((provider_id, row['api_key_suffix'])),
+            self._models.id_for((row['model'],)),
+        )
+
+    @staticmethod
+    def _compact_row(row: dict, ids: Tuple[int, int, int]) -> dict:
+        provider_id, key_id, model_id = ids
+        return {
+            'provider_id': provider_id, 'key_id': key_id, 'model_id': model_id,
+            'ts_ms': int(row['timestamp'] * 1000), 'tokens': row['tokens'],
+            'writer_id': row.get('writer_id'), 'record_id': row.get('record_id'),
+        }
+
+    def _encode_rows(self, rows: List[dict]) -> List[dict]:
+        """Usage rows as stored in log_table; compact rows get their dimension ids, creating missing ones."""
+        if not self.compact:
+            return rows
+        return [self._compact_row(row, self._ids_for(row)) for row in rows]
+
+    def _encode_known_rows(self, rows: List[dict]) -> Optional[List[dict]]:
+        """_encode_rows() from cached ids only; None if a row needs an id that is not cached."""
+        if not self.compact:
+            return rows
+        encoded = []
+        for row in rows:
+            ids = self._known_ids(row)
+            if ids is None:
+                return None
+            encoded.append(self._compact_row(row, ids))
+        return encoded
+
+    def _decode_row(self, row: Sequence[Any]) -> dict:
+        """A (key_id, model_id, ts_ms, tokens) usage_events row as a usage row dict."""
+        key_id, model_id, ts_ms, tokens = row
+        provider_id, suffix = self._keys.value_of(key_id)
+        return {
+            'provider': self._providers.value_of(provider_id)[0], 'api_key_suffix': suffix,
+            'model': self._models.value_of(model_id)[0], 'timestamp': ts_ms / 1000, 'tokens': tokens,
+        }
+
+    def _history_decoder(self) -> Callable[[Sequence[Any]], tuple]:
+        """Maps a (key_id, model_id, ts_ms, tokens) usage_events row to (api_key_suffix, model, timestamp, tokens)."""
+        suffixes = {key_id: value[1] for key_id, value in self._keys.values.items()}
+        models = {model_id: value[0] for model_id, value in self._models.values.items()}
+
+        def decode(row: Sequence[Any]) -> tuple:
+            key_id, model_id, ts_ms, tokens = row
+            if key_id not in suffixes or model_id not in models:
+                # Added by another process since the maps were built
+                suffixes[key_id] = self._keys.value_of(key_id)[1]
+                models[model_id] = self._models.value_of(model_id)[0]
+            return suffixes[key_id], models[model_id], ts_ms / 1000, tokens
+
+        return decode
+
+    def _provider_id(self, provider: str) -> int:
+        """The provider's compact id; 0, which matches no row, if it has none yet."""
+        return self._providers.find((provider,)) or 0
+
+    def _insert_usage_rows(self, conn: Connection, rows: List[dict], stored: List[dict]) -> None:
+        written = time.time()
+        stamp = {'written_ms': int(written * 1000)} if self.compact else {'written_at': written}
+        conn.execute(self.log_table.insert(), [{**row, **stamp} for row in stored])
+        self._upsert_rollups(conn, self._rollup_deltas(rows))
+
+    def save_usage_rows(self, rows: List[dict]) -> None:
+        """Insert usage rows and add them to their minute rollups, in one transaction."""
+        # Dimension ids are created first, in their own transactions
+        stored = self._encode_rows(rows)
+        with self.engine.begin() as conn:
+            self._insert_usage_rows(conn, rows, stored)
+
+    async def asave_usage_rows(self, rows: List[dict]) -> None:
+        """save_usage_rows() on the async engine."""
+        stored = self._encode_known_rows(rows)
+        if stored is None:
+            # A provider, model or key seen for the first time: create its ids off the loop
+            stored = await asyncio.get_running_loop().run_in_executor(None, self._encode_rows, rows)
+        async with self.async_engine().begin() as conn:
+            await conn.run_sync(self._insert_usage_rows, rows, stored)
+
+    def _window_row(self, provider: str, suffix: str, scope: str, window: int, start: int) -> ColumnElement[bool]:
+        t = self.rate_windows
+        return and_(
+            t.c.provider == provider,
+            t.c.api_key_suffix == suffix,
+            t.c.scope == scope,
+            t.c.window == window,
+            t.c.window_start == start,
         )
-        metadata.create_all(self.engine)
 
-    def load_history(self, provider: str, api_key: str, seconds_lookback: int) -> List[tuple[str, float, int]]:
+    def _apply_window_deltas(
+        self, conn: Connection, provider: str, suffix: str, scope: str, deltas: Sequence[WindowDelta]
+    ) -> List[Tuple[int, int]]:
+        """Apply every delta; return the (window, start) rows that were missing."""
+        t = self.rate_windows
+        missing = []
+        for window, start, requests, tokens, max_requests, max_tokens in deltas:
+            if requests == 0 and tokens == 0:
+                continue
+            row = self._window_row(provider, suffix, scope, window, start)
+            conditions = [row]
+            if requests > 0 and max_requests is not None:
+                conditions.append(t.c.requests + requests <= max_requests)
+            if tokens > 0 and max_tokens:
+                conditions.append(t.c.tokens + tokens <= max_tokens)
+            result = conn.execute(
+                update(t).where(and_(*conditions)).values(
+                    requests=t.c.requests + requests, tokens=t.c.tokens + tokens
+                )
+            )
+            if result.rowcount == 1:
+                continue
+            if conn.execute(select(t.c.requests).where(row)).first() is not None:
+                raise _WindowFull()
+            missing.append((window, start))
+        return missing
+
+    def lease_window_capacity(
+        self, provider: str, suffix: str, scope: str, deltas: Sequence[WindowDelta]
+    ) -> bool:
+        """
+        Atomically add usage to several rate windows, only if every window stays within its max.
+
+        Positive deltas are conditional (requests + delta <= max); negative ones
+        hand back unused capacity. Uses only conditional UPDATEs and plain INSERTs,
+        so it behaves the same on SQLite and MySQL/TiDB.
+
+        Returns:
+            True if every delta was applied, False (nothing applied) if a window is full
+        """
+        for _ in range(2):
+            try:
+                with self.engine.begin() as conn:
+                    missing = self._apply_window_deltas(conn, provider, suffix, scope, deltas)
+                    if not missing:
+                        return True
+                    raise _WindowFull(missing)
+            except _WindowFull as e:
+                if not e.args:
+                    return False
+                # Create the missing rows outside the transaction, then retry once
+                self._create_windows(provider, suffix, scope, e.args[0])
+        return False
+
+    def _create_windows(self, provider: str, suffix: str, scope: str, windows: List[Tuple[int, int]]) -> None:
+        for window, start in windows:
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(insert(self.rate_windows).values(
+                        provider=provider, api_key_suffix=suffix, scope=scope,
+                        window=window, window_start=start, requests=0, tokens=0,
+                    ))
+            except IntegrityError:
+                pass  # Another process created it first
+
+    def load_window_usage(self, provider: str, suffix: str, scope: str, window: int, start: int) -> Tuple[int, int]:
+        """(requests, tokens) counted in one rate window across all processes."""
+        stmt = select(self.rate_windows.c.requests, self.rate_windows.c.tokens).where(
+            self._window_row(provider, suffix, scope, window, start)
+        )
+        with self.engine.connect() as conn:
+            row = conn.execute(stmt).first()
+        return (row[0], row[1]) if row else (0, 0)
+
+    def save_key_state(self, provider: str, suffix: str, status: str, since: float, until: float) -> None:
+        """Record that a key is benched (cooldown, exhausted, invalid) from since until until."""
+        t = self.key_states
+        row = and_(t.c.provider == provider, t.c.api_key_suffix == suffix, t.c.status == status)
+        for _ in range(2):
+            try:
+                with self.engine.begin() as conn:
+                    if conn.execute(update(t).where(row).values(since=since, until=until)).rowcount == 0:
+                        conn.execute(insert(t).values(
+                            provider=provider, api_key_suffix=suffix, status=status, since=since, until=until,
+                        ))
+                return
+            except IntegrityError:
+                pass  # Another process inserted it first; update that row instead
+
+    def delete_key_states(self, provider: str, suffix: str) -> None:
+        """Forget every bench recorded for a key."""
+        t = self.key_states
+        with self.engine.begin() as conn:
+            conn.execute(delete(t).where(t.c.provider == provider, t.c.api_key_suffix == suffix))
+
+    def load_key_states(self, provider: str) -> List[tuple]:
+        """(suffix, status, since, until) of the provider's keys that are still benched."""
+        t = self.key_states
+        stmt = select(t.c.api_key_suffix, t.c.status, t.c.since, t.c.until).where(
+            t.c.provider == provider, t.c.until > time.time()
+        )
+        with self.engine.connect() as conn:
+            return [tuple(row) for row in conn.execute(stmt)]
+
+    def load_history(self, provider: str, api_key: str, seconds_lookback: float) -> List[tuple[str, float, int]]:
         """Load history SPECIFIC to this Provider + Model combination"""
         suffix = get_key_suffix(api_key)
         cutoff = time.time() - seconds_lookback
 
+        if self.compact:
+            t = self.usage_events
+            provider_id = self._provider_id(provider)
+            stmt = (
+                select(t.c.model_id, t.c.ts_ms, t.c.tokens)
+                .where(
+                    t.c.provider_id == provider_id,
+                    t.c.key_id == (self._keys.find((provider_id, suffix)) or 0),
+                    t.c.ts_ms > int(cutoff * 1000),
+                )
+                .order_by(t.c.ts_ms.asc())
+            )
+            with self.engine.connect() as conn:
+                rows = conn.execute(stmt).all()
+            return [(self._models.value_of(model_id)[0], ts_ms / 1000, tokens) for model_id, ts_ms, tokens in rows]
+
         stmt = (
             select(
                 self.usage_logs.c.model,
@@ -65,13 +704,28 @@ class UsageDatabase:
         )
 
         with self.engine.connect() as conn:
-            return conn.execute(stmt).all()
+            return [tuple(row) for row in conn.execute(stmt)]
 
-    def load_provider_history(self, provider: str, seconds_lookback: int):
-        """Optimization: Load everything for the provider in ONE call"""
-        cutoff = time.time() - seconds_lookback
+    @staticmethod
+    def _history_start(seconds_lookback: Optional[float], since: Optional[float]) -> float:
+        if since is not None:
+            return since
+        if seconds_lookback is None:
+            raise ValueError("Either seconds_lookback or since is required")
+        return time.time() - seconds_lookback
 
-        stmt = (
+    def _provider_history_stmt(self, provider: str, since: float, provider_id: Optional[int] = None) -> Select:
+        """Usage rows of the provider stamped at or after since; compact ones filter on provider_id if given."""
+        if self.compact:
+            t = self.usage_events
+            if provider_id is None:
+                provider_id = self._provider_id(provider)
+            return (
+                select(t.c.key_id, t.c.model_id, t.c.ts_ms, t.c.tokens)
+                .where(t.c.provider_id == provider_id, t.c.ts_ms >= int(since * 1000))
+                .order_by(t.c.ts_ms.asc())
+            )
+        return (
             select(
                 self.usage_logs.c.api_key_suffix,
                 self.usage_logs.c.model,
@@ -80,19 +734,241 @@ class UsageDatabase:
             )
             .where(
                 self.usage_logs.c.provider == provider,
-                self.usage_logs.c.timestamp > cutoff,
+                self.usage_logs.c.timestamp >= since,
             )
+            .order_by(self.usage_logs.c.timestamp.asc())
         )
 
+    def load_provider_history(
+        self,
+        provider: str,
+        seconds_lookback: Optional[float] = None,
+        chunk_size: Optional[int] = None,
+        since: Optional[float] = None,
+    ) -> Iterable[Any]:
+        """
+        Optimization: Load everything for the provider in ONE call, oldest first
+
+        Rows are those of the last seconds_lookback seconds, or, with since, those
+        stamped at or after that absolute time. With chunk_size, returns an
+        iterator that streams the rows instead of a list.
+        """
+        stmt = self._provider_history_stmt(provider, self._history_start(seconds_lookback, since))
+        rows = self._fetch(stmt, chunk_size)
+        if not self.compact:
+            return rows
+        rows = map(self._history_decoder(), rows)
+        return rows if chunk_size is not None else list(rows)
+
+    def _provider_rollups_stmt(self, provider: str, since: float, until: float) -> Select:
+        t = self.usage_rollups
+        first = int(since // SECONDS_PER_MINUTE) * SECONDS_PER_MINUTE
+        return (
+            select(t.c.api_key_suffix, t.c.model, t.c.minute, t.c.requests, t.c.tokens)
+            .where(t.c.provider == provider, t.c.minute >= first, t.c.minute < until)
+            .order_by(t.c.minute.asc())
+        )
+
+    def load_provider_rollups(
+        self, provider: str, since: float, until: float, chunk_size: Optional[int] = None
+    ) -> Iterable[Any]:
+        """
+        Per-minute usage for the provider, for whole minutes starting in [since, until).
+
+        Returns (api_key_suffix, model, minute start, requests, tokens), oldest first. The
+        minute containing `since` is included, so nothing inside the lookback is missed.
+        With chunk_size, returns an iterator that streams the rows instead of a list.
+        """
+        return self._fetch(self._provider_rollups_stmt(provider, since, until), chunk_size)
+
+    async def _astream(self, stmt: Select, chunk_size: int) -> AsyncIterator[Any]:
+        async with self.async_engine().connect() as conn:
+            result = await conn.stream(stmt.execution_options(yield_per=chunk_size))
+            async for row in result:
+                yield row
+
+    def aload_provider_history(
+        self,
+        provider: str,
+        seconds_lookback: Optional[float] = None,
+        chunk_size: int = HISTORY_CHUNK_ROWS,
+        since: Optional[float] = None,
+    ) -> AsyncIterator[Any]:
+        """load_provider_history() on the async engine, streamed chunk_size rows at a time."""
+        start = self._history_start(seconds_lookback, since)
+        if self.compact:
+            return self._aload_compact_history(provider, start, chunk_size)
+        return self._astream(self._provider_history_stmt(provider, start), chunk_size)
+
+    async def _aload_compact_history(self, provider: str, since: float, chunk_size: int) -> AsyncIterator[tuple]:
+        # Dimension lookups go through the async engine too, never blocking the loop
+        engine = self.async_engine()
+        keys, models = self._keys, self._models
+        provider_id = await self._providers.afind(engine, (provider,)) or 0
+        decode = self._history_decoder()
+        async for row in self._astream(self._provider_history_stmt(provider, since, provider_id), chunk_size):
+            if row[0] not in keys.values or row[1] not in models.values:
+                # Added by another process since the maps were loaded
+                await keys.aload(engine)
+                await models.aload(engine)
+            yield decode(row)
+
+    def aload_provider_rollups(
+        self, provider: str, since: float, until: float, chunk_size: int = HISTORY_CHUNK_ROWS
+    ) -> AsyncIterator[Any]:
+        """load_provider_rollups() on the async engine, streamed chunk_size rows at a time."""
+        return self._astream(self._provider_rollups_stmt(provider, since, until), chunk_size)
+
+    def load_provider_tail(self, provider: str, since: float, exclude_writer: Optional[str] = None) -> List[tuple]:
+        """
+        Rows for the provider inserted after since, minus those written by exclude_writer.
+
+        Returns (id, api_key_suffix, model, timestamp, tokens, written at) ordered by
+        insertion time. Rows without a writer_id (older clients) are always included;
+        rows without an insertion time (also older clients) count as inserted at
+        their timestamp.
+        """
+        if self.compact:
+            t = self.usage_events
+            written, stamped = t.c.written_ms, t.c.ts_ms
+            cutoff = since * 1000
+            provider_match = t.c.provider_id == self._provider_id(provider)
+            columns = (t.c.id, t.c.key_id, t.c.model_id, t.c.ts_ms, t.c.tokens)
+        else:
+            t = self.usage_logs
+            written, stamped = t.c.written_at, t.c.timestamp
+            cutoff = since
+            provider_match = t.c.provider == provider
+            columns = (t.c.id, t.c.api_key_suffix, t.c.model, t.c.timestamp, t.c.tokens)
+        written_at = func.coalesce(written, stamped)
+        conditions = [provider_match, or_(written > cutoff, and_(written.is_(None), stamped > cutoff))]
+        if exclude_writer is not None:
+            conditions.append(or_(t.c.writer_id.is_(None), t.c.writer_id != exclude_writer))
+        stmt = select(*columns, written_at).where(*conditions).order_by(written_at.asc())
         with self.engine.connect() as conn:
-            return conn.execute(stmt).all()
+            rows = [tuple(row) for row in conn.execute(stmt)]
+        if not self.compact:
+            return rows
+        decode = self._history_decoder()
+        return [(row[0], *decode(row[1:5]), row[5] / 1000) for row in rows]
+
+    def save_usage_rows_once(self, rows: List[dict]) -> int:
+        """
+        Insert the rows whose record_id is not stored yet, in one transaction.
+
+        Safe to repeat after a failure part-way, or after a write whose outcome
+        was unknown. Returns the number of rows inserted.
+        """
+        stored = self._encode_rows(rows)
+        with self.engine.begin() as conn:
+            return self._insert_usage_rows_once(conn, rows, stored)
+
+    async def asave_usage_rows_once(self, rows: List[dict]) -> int:
+        """save_usage_rows_once() on the async engine."""
+        stored = self._encode_known_rows(rows)
+        if stored is None:
+            stored = await asyncio.get_running_loop().run_in_executor(None, self._encode_rows, rows)
+        async with self.async_engine().begin() as conn:
+            return await conn.run_sync(self._insert_usage_rows_once, rows, stored)
+
+    def _insert_usage_rows_once(self, conn: Connection, rows: List[dict], stored: List[dict]) -> int:
+        existing = self._stored_record_ids(conn, [row['record_id'] for row in rows])
+        fresh = [i for i, row in enumerate(rows) if row['record_id'] not in existing]
+        if fresh:
+            self._insert_usage_rows(conn, [rows[i] for i in fresh], [stored[i] for i in fresh])
+        return len(fresh)
+
+    def _stored_record_ids(self, conn: Connection, ids: List[str]) -> set:
+        t = self.log_table
+        existing: set[str] = set()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            existing.update(conn.execute(select(t.c.record_id).where(t.c.record_id.in_(chunk))).scalars())
+        return existing
+
+    def migrate_from_legacy(self, chunk_size: int = HISTORY_CHUNK_ROWS, drop_legacy: bool = False) -> int:
+        """
+        Copy usage_logs rows into the compact usage_events table.
 
-    def prune_old_records(self, days_retention: int = 3) -> None:
-        """Delete records older than retention period to keep DB small (3 days)"""
-        cutoff = time.time() - (days_retention * SECONDS_PER_DAY)
+        Rows are copied in id order, chunk_size per transaction, and skipped if
+        their record_id is already there, so an interrupted migration can be
+        run again. Rows older than record_id get a stable one derived from
+        their id. Rollups already count these rows and are left alone. With
+        drop_legacy, usage_logs is dropped once every row is copied.
+
+        Returns:
+            Number of rows copied
+        """
+        if not self.compact:
+            raise ValueError("migrate_from_legacy() needs a UsageDatabase(compact=True).")
+        if not inspect(self.engine).has_table('usage_logs'):
+            return 0
+        # Tables from before writer_id and record_id existed lack the columns copied below
+        self._upgrade_schema()
+        logs = self.usage_logs
+        columns = (
+            logs.c.id, logs.c.provider, logs.c.model, logs.c.api_key_suffix,
+            logs.c.timestamp, logs.c.tokens, logs.c.writer_id, logs.c.record_id,
+        )
+        copied = 0
+        last_id = 0
+        while True:
+            with self.engine.connect() as conn:
+                chunk = conn.execute(
+                    select(*columns).where(logs.c.id > last_id).order_by(logs.c.id.asc()).limit(chunk_size)
+                ).all()
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            rows = [
+                {**row._asdict(), 'record_id': row.record_id or f"legacy-{row.id}"}
+                for row in chunk
+            ]
+            stored = self._encode_rows(rows)
+            with self.engine.begin() as conn:
+                existing = self._stored_record_ids(conn, [row['record_id'] for row in rows])
+                # Already counted by every reader, so they are not news to a tail
+                fresh = [
+                    {**row, 'written_ms': row['ts_ms']} for row in stored if row['record_id'] not in existing
+                ]
+                if fresh:
+                    conn.execute(self.usage_events.insert(), fresh)
+            copied += len(fresh)
+        if drop_legacy:
+            logs.drop(self.engine)
+        return copied
+
+    def prune_old_records(self, days_retention: int = 3, raw_days_retention: Optional[float] = None) -> None:
+        """
+        Delete records older than retention period to keep DB small (3 days)
+
+        raw_days_retention keeps raw usage rows for a shorter time than the
+        rollups; hydration only reads the last two minutes of raw rows.
+        """
+        now = time.time()
+        cutoff = now - (days_retention * SECONDS_PER_DAY)
+        raw_cutoff = now - (raw_days_retention if raw_days_retention is not None else days_retention) * SECONDS_PER_DAY
         with self.engine.connect() as conn:
+            if self.compact:
+                conn.execute(
+                    delete(self.usage_events).where(
+                    self.usage_events.c.ts_ms < int(raw_cutoff * 1000)
+                ))
+            else:
+                conn.execute(
+                    delete(self.usage_logs).where(
+                    self.usage_logs.c.timestamp < raw_cutoff
+                ))
+            conn.execute(
+                delete(self.usage_rollups).where(
+                self.usage_rollups.c.minute < cutoff
+            ))
+            conn.execute(
+                delete(self.rate_windows).where(
+                self.rate_windows.c.window_start < cutoff
+            ))
             conn.execute(
-                delete(self.usage_logs).where(
-                self.usage_logs.c.timestamp < cutoff
+                delete(self.key_states).where(
+                self.key_states.c.until < now
             ))
             conn.commit()
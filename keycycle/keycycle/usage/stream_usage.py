@@ -0,0 +1,158 @@
+"""
+Token accounting for streamed responses that may not carry a usage payload.
+
+A StreamUsageAccumulator counts the text deltas of each chunk with a fast token
+estimator. When the running estimate passes what was reserved for the call, it
+tops up the reservation so a long generation counts against TPM while it is
+still streaming. If the provider reports usage, that figure wins at the end.
+"""
+
+from typing import Any, Callable, Iterable, List, Optional
+
+from ..config.constants import CHARS_PER_TOKEN, STREAM_RESERVATION_TOP_UP_TOKENS
+
+TokenEstimator = Callable[[str], int]
+ChunkTextExtractor = Callable[[Any], str]
+
+
+def estimate_tokens_from_text(text: str) -> int:
+    """Fast token estimate: about one token per CHARS_PER_TOKEN characters."""
+    if not text:
+        return 0
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _field(obj: Any, name: str) -> Any:
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def default_chunk_text_extractor(chunk: Any) -> str:
+    """
+    Extract the generated text from a stream chunk.
+
+    Supports:
+    - plain strings
+    - chunk.choices[].delta.content / choices[].text (OpenAI-compatible)
+    - chunk.delta.text (Anthropic content_block_delta)
+    - chunk.content (agno ModelResponse)
+    - chunk.text (Cohere, Gemini)
+    - the same shapes as dicts
+
+    Returns:
+        The chunk's text, or "" if none was found
+    """
+    if isinstance(chunk, str):
+        return chunk
+    try:
+        choices = _field(chunk, "choices")
+        if choices:
+            parts: List[str] = []
+            for choice in choices:
+                delta = _field(choice, "delta")
+                text = _field(delta, "content") if delta is not None else _field(choice, "text")
+                if isinstance(text, str):
+                    parts.append(text)
+            return "".join(parts)
+
+        delta = _field(chunk, "delta")
+        if delta is not None:
+            text = _field(delta, "text")
+            if isinstance(text, str):
+                return text
+
+        for name in ("content", "text"):
+            text = _field(chunk, name)
+            if isinstance(text, str):
+                return text
+    except (AttributeError, TypeError, ValueError):
+        pass
+    return ""
+
+
+def _iter_request_text(value: Any, depth: int = 0) -> Iterable[str]:
+    if depth > 4 or value is None:
+        return
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for name in ("content", "text", "input", "prompt"):
+            if name in value:
+                yield from _iter_request_text(value[name], depth + 1)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _iter_request_text(item, depth + 1)
+    else:
+        content = getattr(value, "content", None)
+        if content is not None:
+            yield from _iter_request_text(content, depth + 1)
+
+
+def estimate_request_tokens(
+    args: tuple,
+    kwargs: dict,
+    estimator: TokenEstimator = estimate_tokens_from_text,
+) -> int:
+    """Estimate prompt tokens from the messages/prompt/input of a call."""
+    total = 0
+    for name in ("messages", "prompt", "input", "system"):
+        for text in _iter_request_text(kwargs.get(name)):
+            total += estimator(text)
+    for arg in args:
+        if isinstance(arg, (list, tuple, str)):
+            for text in _iter_request_text(arg):
+                total += estimator(text)
+    return total
+
+
+class StreamUsageAccumulator:
+    """
+    Running token count for one streamed call.
+
+    Example:
+        acc = StreamUsageAccumulator(
+            reserved_tokens=1000,
+            top_up=lambda extra: manager.reserve(key, model_id, extra),
+            prompt_tokens=estimate_request_tokens(args, kwargs),
+        )
+        for chunk in stream:
+            acc.add(chunk, reported_tokens=extract_usage(chunk))
+        manager.record_usage(key, model_id, acc.total_tokens, acc.reserved_tokens)
+    """
+
+    def __init__(
+        self,
+        reserved_tokens: int = 0,
+        top_up: Optional[Callable[[int], None]] = None,
+        prompt_tokens: int = 0,
+        estimator: Optional[TokenEstimator] = None,
+        text_extractor: Optional[ChunkTextExtractor] = None,
+        top_up_step: int = STREAM_RESERVATION_TOP_UP_TOKENS,
+    ):
+        self.reserved_tokens = reserved_tokens
+        self.estimated_tokens = prompt_tokens
+        self.reported_tokens = 0
+        self._top_up = top_up
+        self._estimator = estimator or estimate_tokens_from_text
+        self._text_extractor = text_extractor or default_chunk_text_extractor
+        self._top_up_step = max(1, top_up_step)
+
+    @property
+    def total_tokens(self) -> int:
+        """Provider-reported usage if any was seen, otherwise the running estimate."""
+        return self.reported_tokens or self.estimated_tokens
+
+    def add(self, chunk: Any, reported_tokens: int = 0) -> None:
+        """Count one chunk, topping up the reservation if the estimate outgrew it."""
+        if reported_tokens:
+            self.reported_tokens = reported_tokens
+        text = self._text_extractor(chunk)
+        if text:
+            self.estimated_tokens += self._estimator(text)
+
+        if self._top_up is not None and self.total_tokens > self.reserved_tokens:
+            # Reserve in steps so long streams take the manager lock rarely
+            extra = max(self.total_tokens - self.reserved_tokens, self._top_up_step)
+            self._top_up(extra)
+            self.reserved_tokens += extra
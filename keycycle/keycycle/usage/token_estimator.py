@@ -0,0 +1,188 @@
+"""
+Per-request token reservations learned from actual usage.
+
+A fixed estimated_tokens over-reserves small calls and under-reserves large
+ones, wasting TPM headroom either way. ReservationEstimator predicts a call's
+tokens from its prompt length and max_tokens, then corrects the prediction
+with a per-model EMA of actual / predicted usage learned in record_usage.
+Calls whose size cannot be read from the request fall back to an EMA of the
+model's actual usage, seeded from usage_logs history at startup.
+"""
+
+import math
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+from ..config.constants import (
+    TOKEN_ESTIMATE_EMA_ALPHA,
+    TOKEN_ESTIMATE_HEADROOM,
+    TOKEN_ESTIMATE_MIN_SAMPLES,
+)
+from .stream_usage import TokenEstimator, estimate_request_tokens, estimate_tokens_from_text
+
+MAX_TOKENS_PARAMS = ("max_tokens", "max_completion_tokens", "max_output_tokens")
+
+
+@dataclass(frozen=True)
+class TokenEstimate:
+    """A reservation and the raw prediction it was derived from."""
+    tokens: int
+    """Tokens to reserve for the call"""
+
+    predicted: int = 0
+    """Prompt (+ max_tokens) read from the request; 0 if the request had neither"""
+
+    bounded: bool = False
+    """Whether predicted includes an explicit max_tokens"""
+
+
+class _Ema:
+    __slots__ = ("value", "samples")
+
+    def __init__(self):
+        self.value = 0.0
+        self.samples = 0
+
+    def update(self, x: float, alpha: float) -> None:
+        self.value = x if self.samples == 0 else alpha * x + (1 - alpha) * self.value
+        self.samples += 1
+
+
+def _max_tokens(kwargs: dict) -> int:
+    for name in MAX_TOKENS_PARAMS:
+        value = kwargs.get(name)
+        if isinstance(value, int) and value > 0:
+            return value
+    return 0
+
+
+class ReservationEstimator:
+    """
+    Thread-safe per-model reservation estimator for one provider.
+
+    Example:
+        estimate = estimator.estimate("gpt-4o", (), {"messages": [...], "max_tokens": 200})
+        key = manager.get_key("gpt-4o", limits, estimate.tokens)
+        ...
+        estimator.observe("gpt-4o", estimate, actual_tokens)
+    """
+
+    def __init__(
+        self,
+        default_tokens: int = 1000,
+        alpha: float = TOKEN_ESTIMATE_EMA_ALPHA,
+        min_samples: int = TOKEN_ESTIMATE_MIN_SAMPLES,
+        headroom: float = TOKEN_ESTIMATE_HEADROOM,
+        text_estimator: Optional[TokenEstimator] = None,
+    ):
+        if not 0 < alpha <= 1:
+            raise ValueError(f"alpha must be in (0, 1], got: {alpha}")
+        self.default_tokens = default_tokens
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.headroom = headroom
+        self.text_estimator = text_estimator or estimate_tokens_from_text
+        self._usage: Dict[str, _Ema] = {}
+        self._ratios: Dict[Tuple[str, bool], _Ema] = {}
+        self._lock = threading.Lock()
+
+    def _ready(self, ema: _Ema) -> bool:
+        return ema.samples >= self.min_samples
+
+    def estimate(
+        self,
+        model_id: str,
+        args: tuple = (),
+        kwargs: Optional[dict] = None,
+        default_tokens: Optional[int] = None,
+    ) -> TokenEstimate:
+        """Reservation for a call, from its arguments and what was learned for the model."""
+        kwargs = kwargs or {}
+        fallback = self.default_tokens if default_tokens is None else default_tokens
+        max_tokens = _max_tokens(kwargs)
+        predicted = estimate_request_tokens(args, kwargs, self.text_estimator) + max_tokens
+        bounded = max_tokens > 0
+
+        with self._lock:
+            usage = self._usage.get(model_id)
+            ratio = self._ratios.get((model_id, bounded))
+            typical = math.ceil(usage.value * self.headroom) if usage is not None and self._ready(usage) else fallback
+            if predicted == 0:
+                return TokenEstimate(max(1, typical))
+            if ratio is not None and self._ready(ratio):
+                tokens = math.ceil(predicted * ratio.value * self.headroom)
+            elif bounded:
+                # Prompt + max_tokens is already an upper bound
+                tokens = predicted
+            else:
+                tokens = max(predicted, typical)
+        return TokenEstimate(max(1, tokens), predicted, bounded)
+
+    def observe(self, model_id: str, estimate: Optional[TokenEstimate], actual_tokens: int) -> None:
+        """Learn from a call's actual usage."""
+        if actual_tokens <= 0:
+            return
+        with self._lock:
+            usage = self._usage.get(model_id)
+            if usage is None:
+                usage = self._usage[model_id] = _Ema()
+            usage.update(actual_tokens, self.alpha)
+            if estimate is not None and estimate.predicted > 0:
+                key = (model_id, estimate.bounded)
+                ratio = self._ratios.get(key)
+                if ratio is None:
+                    ratio = self._ratios[key] = _Ema()
+                ratio.update(actual_tokens / estimate.predicted, self.alpha)
+
+    def seed(self, model_id: str, actual_tokens: int) -> None:
+        """Warm the per-model usage average from a historical usage_logs row."""
+        self.observe(model_id, None, actual_tokens)
+
+    def seed_many(self, model_id: str, actual_tokens: Sequence[int]) -> None:
+        """
+        seed() for each value, oldest first, in one step.
+
+        Only the newest values that still carry weight are folded in: anything
+        older, including what was learned before the call, contributes less
+        than a millionth of the average. Long histories can be fed in chunks.
+        """
+        values = [t for t in actual_tokens if t > 0]
+        if not values:
+            return
+        keep = len(values) if self.alpha >= 1 else math.ceil(math.log(1e-6) / math.log(1 - self.alpha))
+        with self._lock:
+            usage = self._usage.get(model_id)
+            if usage is None:
+                usage = self._usage[model_id] = _Ema()
+            skipped = max(0, len(values) - keep)
+            if skipped:
+                # Start over from the oldest value kept; the rest would round away anyway
+                usage.value, usage.samples = values[skipped], usage.samples + skipped + 1
+                skipped += 1
+            for value in values[skipped:]:
+                usage.update(value, self.alpha)
+
+    def usage_state(self) -> Dict[str, Tuple[float, int]]:
+        """Per model (typical tokens, samples), for checkpoints."""
+        with self._lock:
+            return {model_id: (ema.value, ema.samples) for model_id, ema in self._usage.items()}
+
+    def restore_usage(self, state: Dict[str, Tuple[float, int]]) -> None:
+        """Load what usage_state() returned, replacing what was learned for those models."""
+        with self._lock:
+            for model_id, (value, samples) in state.items():
+                ema = self._usage[model_id] = _Ema()
+                ema.value, ema.samples = value, samples
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Learned values per model: typical tokens and actual/predicted ratios."""
+        with self._lock:
+            result: Dict[str, Dict[str, float]] = {
+                model_id: {"typical_tokens": ema.value, "samples": ema.samples}
+                for model_id, ema in self._usage.items()
+            }
+            for (model_id, bounded), ema in self._ratios.items():
+                name = "bounded_ratio" if bounded else "prompt_ratio"
+                result.setdefault(model_id, {})[name] = ema.value
+            return result
@@ -1,86 +1,357 @@
+import abc
 import atexit
 import logging
 import queue
 import threading
 import time
-from typing import Optional
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
 from .db_logic import UsageDatabase
+from .usage_spool import UsageSpool
 from ..config.log_config import default_logger
-from ..config.constants import USAGE_LOG_BATCH_SIZE
+from ..config.constants import (
+    USAGE_LOG_BATCH_SIZE,
+    USAGE_LOG_MAX_BATCH_BYTES,
+    USAGE_LOG_MAX_LATENCY_SECONDS,
+    USAGE_LOG_MAX_QUEUE_SIZE,
+    USAGE_LOG_RETRY_SECONDS,
+    USAGE_LOG_WRITE_ATTEMPTS,
+)
+from ..config.dataclasses import UsageLogStats
+from ..config.enums import QueueOverflow, UsageWriter
 from ..core.utils import get_key_suffix
 
-# --- ASYNC LOGGER ---
-class AsyncUsageLogger:
-    """Decouples Turso DB writes from the main thread using batching."""
-    def __init__(self, db: UsageDatabase, logger: Optional[logging.Logger] = None):
+# (provider, model, api_key, timestamp, tokens)
+UsageRecord = Tuple[str, str, str, float, int]
+
+def _is_transient(error: Exception) -> bool:
+    """True for failures that say nothing about the rows: the database is down, busy or unreachable."""
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(error, (OperationalError, InterfaceError, PoolTimeoutError, OSError))
+
+
+# Fixed per-row cost on top of the string columns: timestamp, tokens and driver overhead
+ROW_OVERHEAD_BYTES = 32
+
+
+@dataclass(frozen=True)
+class UsageLogConfig:
+    """Flush triggers and queue bounds for the usage log writer."""
+    max_batch_size: int = USAGE_LOG_BATCH_SIZE
+    """Write a batch once it holds this many rows"""
+
+    max_latency: float = USAGE_LOG_MAX_LATENCY_SECONDS
+    """Write a batch once its oldest row has waited this many seconds"""
+
+    max_batch_bytes: int = USAGE_LOG_MAX_BATCH_BYTES
+    """Write a batch once its rows add up to about this many bytes"""
+
+    max_queue_size: int = USAGE_LOG_MAX_QUEUE_SIZE
+    """Rows held in memory waiting for the writer, e.g. during a database outage"""
+
+    max_attempts: int = USAGE_LOG_WRITE_ATTEMPTS
+    """Writes tried per batch before it is logged and dropped"""
+
+    overflow: Union[QueueOverflow, str] = QueueOverflow.DROP_OLDEST
+    """What log() does when the queue is full: block the caller, or drop the oldest row"""
+
+    spool_dir: Optional[str] = None
+    """Directory for a local file that holds batches the database rejects until it recovers"""
+
+    writer: Union[UsageWriter, str] = UsageWriter.THREAD
+    """Write from a background thread, or from a task on the application's event loop"""
+
+    def __post_init__(self):
+        for name in ("max_batch_size", "max_batch_bytes", "max_queue_size", "max_attempts"):
+            if getattr(self, name) < 1:
+                raise ValueError(f"{name} must be at least 1, got: {getattr(self, name)}")
+        if self.max_latency < 0:
+            raise ValueError(f"max_latency must not be negative, got: {self.max_latency}")
+        object.__setattr__(self, "overflow", QueueOverflow(self.overflow))
+        object.__setattr__(self, "writer", UsageWriter(self.writer))
+        if self.writer is UsageWriter.ASYNCIO:
+            if self.overflow is QueueOverflow.BLOCK:
+                raise ValueError("overflow='block' would stall the event loop; the asyncio writer drops the oldest rows.")
+            if self.spool_dir is not None:
+                raise ValueError("spool_dir is only supported by the thread writer.")
+
+
+class _UsageLoggerBase(abc.ABC):
+    """Row building, drop accounting and stats shared by the usage log writers."""
+    def __init__(
+        self,
+        db: UsageDatabase,
+        logger: Optional[logging.Logger] = None,
+        writer_id: Optional[str] = None,
+        config: Optional[UsageLogConfig] = None,
+    ):
         self.db = db
-        self.queue = queue.Queue()
+        self.writer_id = writer_id
+        self.config = config or UsageLogConfig()
+        self.logger = logger or default_logger
+        self._stats = UsageLogStats()
+        self._stats_lock = threading.Lock()
+        # Set after a drop; cleared by the next successful write so an outage warns once
+        self._dropping = False
+
+    def _count_dropped(self, rows: int) -> None:
+        with self._stats_lock:
+            self._stats.dropped += rows
+            warn, self._dropping = not self._dropping, True
+        if warn:
+            self.logger.warning(
+                "Usage log queue overflowing (%d rows held); dropping rows until the database catches up.",
+                self.config.max_queue_size,
+            )
+
+    def _give_up(self, rows: int, attempts: int) -> None:
+        with self._stats_lock:
+            self._stats.dropped += rows
+        self.logger.error("Dropped a batch of %d usage rows after %d failed writes.", rows, attempts)
+
+    def _row(self, record: UsageRecord) -> Dict[str, Any]:
+        provider, model, full_key, ts, tokens = record
+        return {
+            "provider": provider,
+            "model": model,
+            "api_key_suffix": get_key_suffix(full_key),
+            "timestamp": ts,
+            "tokens": tokens,
+            "writer_id": self.writer_id,
+            "record_id": uuid.uuid4().hex,
+        }
+
+    def _row_bytes(self, row: Dict[str, Any]) -> int:
+        return (
+            len(row["provider"]) + len(row["model"]) + len(row["api_key_suffix"])
+            + len(row["writer_id"] or "") + ROW_OVERHEAD_BYTES
+        )
+
+    def _count_written(self, rows: int, elapsed: float) -> None:
+        with self._stats_lock:
+            s = self._stats
+            s.written += rows
+            s.flushes += 1
+            s.flush_seconds += elapsed
+            s.max_flush_seconds = max(s.max_flush_seconds, elapsed)
+            self._dropping = False
+
+    @abc.abstractmethod
+    def _queued(self) -> int:
+        """Rows logged but not written or dropped yet."""
+
+    def stats(self) -> UsageLogStats:
+        """Return a snapshot of the logger counters."""
+        with self._stats_lock:
+            s = self._stats
+            return UsageLogStats(
+                enqueued=s.enqueued, written=s.written, dropped=s.dropped,
+                flushes=s.flushes, failed_flushes=s.failed_flushes, queued=self._queued(),
+                spooled=s.spooled, replayed=s.replayed,
+                flush_seconds=s.flush_seconds, max_flush_seconds=s.max_flush_seconds,
+            )
+
+
+# --- ASYNC LOGGER ---
+class AsyncUsageLogger(_UsageLoggerBase):
+    """
+    Decouples usage_logs writes from the calling threads.
+
+    Rows wait in a bounded queue and are written in batches: a batch goes out
+    when it reaches max_batch_size rows or max_batch_bytes, or when its oldest
+    row is max_latency seconds old. A failed batch is retried up to
+    max_attempts times while new rows keep queueing, then dropped; once the
+    queue is full, the overflow policy either blocks log() or drops the
+    oldest rows.
+
+    With a spool_dir, a failed batch goes to a local spool file instead, and
+    later batches follow it there until the spool has been replayed in order.
+    A spool left by an earlier run is replayed once the database answers. A
+    spooled batch rejected max_attempts times while the database is up is
+    set aside in the spool's .rejected file so later batches can drain.
+    """
+    def __init__(
+        self,
+        db: UsageDatabase,
+        logger: Optional[logging.Logger] = None,
+        writer_id: Optional[str] = None,
+        config: Optional[UsageLogConfig] = None,
+    ):
+        super().__init__(db, logger, writer_id, config)
+        self.queue: "queue.Queue[UsageRecord]" = queue.Queue(maxsize=self.config.max_queue_size)
+        self.spool = UsageSpool.claim(self.config.spool_dir) if self.config.spool_dir else None
+        # Spool position already replayed, and when replay may be tried again
+        self._replay_offset = 0
+        self._next_replay = 0.0
+        # Rejections of the spooled batch at _replay_offset while the database was up
+        self._replay_rejections = 0
         self._stop_event = threading.Event()
         self._thread = threading.Thread(target=self._writer_loop, daemon=True)
         self._thread.start()
         atexit.register(self.stop)
 
-        self.logger = logger or default_logger
+    def log(self, provider: str, model: str, api_key: str, tokens: int) -> None:
+        record = (provider, model, api_key, time.time(), tokens)
+        with self._stats_lock:
+            self._stats.enqueued += 1
+        if self.config.overflow is QueueOverflow.DROP_OLDEST:
+            while True:
+                try:
+                    self.queue.put_nowait(record)
+                    return
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                    except queue.Empty:
+                        continue
+                    self._count_dropped(1)
+        while True:
+            try:
+                self.queue.put(record, timeout=1.0)
+                return
+            except queue.Full:
+                if not self._thread.is_alive():
+                    # Nobody will ever make room
+                    self._count_dropped(1)
+                    return
 
-    def log(self, provider: str, model: str, api_key: str, tokens: int):
-        self.queue.put((provider, model, api_key, time.time(), tokens))
+    def _collect(self) -> List[Dict[str, Any]]:
+        """Block for the first row, then gather more until a flush trigger fires."""
+        try:
+            first = self.queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [self._row(first)]
+        size = self._row_bytes(batch[0])
+        deadline = time.monotonic() + self.config.max_latency
+        while len(batch) < self.config.max_batch_size and size < self.config.max_batch_bytes:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                # Shutting down: write what was gathered without waiting for more
+                if remaining <= 0 or self._stop_event.is_set():
+                    break
+                try:
+                    # Short waits so stop() is noticed before the deadline
+                    record = self.queue.get(timeout=min(remaining, 0.1))
+                except queue.Empty:
+                    continue
+            row = self._row(record)
+            batch.append(row)
+            size += self._row_bytes(row)
+        return batch
 
-    def _writer_loop(self):
-        batch = []
-        insert_stmt = self.db.usage_logs.insert()
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        started = time.perf_counter()
+        # A retry after a lost commit acknowledgement must not insert the rows twice
+        inserted = self.db.save_usage_rows_once(batch)
+        self._count_written(inserted, time.perf_counter() - started)
 
-        while not self._stop_event.is_set() or not self.queue.empty(): #always empty queue
+    def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        """Write a batch, retrying up to max_attempts times before dropping it."""
+        spool = self.spool
+        if spool is not None:
+            self._flush_spooled(spool, batch)
+            return
+        attempt = 0
+        while True:
+            attempt += 1
             try:
-                record = self.queue.get(timeout=1.0)
-                # Parse record for batch formatting
-                provider, model, full_key, ts, tokens = record
-                suffix = get_key_suffix(full_key)
-                batch.append({
-                    "provider": provider,
-                    "model": model,
-                    "api_key_suffix": suffix,
-                    "timestamp": ts,
-                    "tokens": tokens
-                })
-                
-                # Drain queue up to USAGE_LOG_BATCH_SIZE items to batch write
-                while len(batch) < USAGE_LOG_BATCH_SIZE:
-                    try:
-                        r = self.queue.get_nowait()
-                        p, m, k, t, tok = r
-                        s = get_key_suffix(k)
-                        batch.append({
-                            "provider": p,
-                            "model": m,
-                            "api_key_suffix": s,
-                            "timestamp": t,
-                            "tokens": tok
-                        })
-                    except queue.Empty:
-                        break
-                
-                if batch:
-                    with self.db.engine.connect() as conn:
-                        conn.execute(insert_stmt, batch)
-                        conn.commit()
-                    batch.clear()
-                
-            except queue.Empty:
-                continue
+                self._write(batch)
+                return
             except Exception as e:
-                # print(f"Logging thread error: {e}")
+                with self._stats_lock:
+                    self._stats.failed_flushes += 1
                 self.logger.exception("Logging thread error", exc_info=e)
-                time.sleep(2)
-        
-        if batch:
+                if attempt >= self.config.max_attempts:
+                    self._give_up(len(batch), attempt)
+                    return
+                # Once stopping, the remaining attempts follow without a pause
+                self._stop_event.wait(USAGE_LOG_RETRY_SECONDS)
+
+    def _flush_spooled(self, spool: UsageSpool, batch: List[Dict[str, Any]]) -> None:
+        """Write a batch, or spool it when the database fails or older batches are still spooled."""
+        if not spool.pending:
+            try:
+                self._write(batch)
+                return
+            except Exception as e:
+                with self._stats_lock:
+                    self._stats.failed_flushes += 1
+                self.logger.warning("Usage log write failed, spooling to %s: %s", spool.path, e)
+                self._next_replay = time.monotonic() + USAGE_LOG_RETRY_SECONDS
+        try:
+            spool.append(batch)
+        except OSError as e:
+            self.logger.exception("Could not spool usage rows", exc_info=e)
+            self._count_dropped(len(batch))
+            return
+        with self._stats_lock:
+            self._stats.spooled += len(batch)
+        self._replay(spool)
+
+    def _replay(self, spool: UsageSpool, force: bool = False) -> None:
+        """Write spooled batches in order; the spool is emptied once all of them are stored."""
+        if not spool.pending or (not force and time.monotonic() < self._next_replay):
+            return
+        for end, rows in spool.records(self._replay_offset):
             try:
-                with self.db.engine.connect() as conn:
-                    conn.execute(insert_stmt, batch)
-                    conn.commit()
+                inserted = self.db.save_usage_rows_once(rows)
             except Exception as e:
-                self.logger.exception("Logging thread error on exit", exc_info=e)
-                
+                if not _is_transient(e):
+                    self._replay_rejections += 1
+                if self._replay_rejections < self.config.max_attempts or not self._set_aside(spool, rows, e):
+                    self.logger.warning("Usage spool replay failed, retrying later: %s", e)
+                    self._next_replay = time.monotonic() + USAGE_LOG_RETRY_SECONDS
+                    return
+            else:
+                with self._stats_lock:
+                    self._stats.written += inserted
+                    self._stats.replayed += len(rows)
+            self._replay_offset = end
+            self._replay_rejections = 0
+        spool.clear()
+        self._replay_offset = 0
+        self.logger.info("Usage spool %s replayed.", spool.path)
+
+    def _set_aside(self, spool: UsageSpool, rows: List[Dict[str, Any]], error: Exception) -> bool:
+        """Move a batch the database keeps rejecting out of the spool; False if it could not be saved."""
+        try:
+            path = spool.reject(rows)
+        except OSError as e:
+            self.logger.exception("Could not set aside rejected usage rows", exc_info=e)
+            return False
+        with self._stats_lock:
+            self._stats.dropped += len(rows)
+        self.logger.error(
+            "Usage spool batch of %d rows rejected %d times (%s); moved to %s.",
+            len(rows), self._replay_rejections, error, path,
+        )
+        return True
+
+    def _writer_loop(self):
+        spool = self.spool
+        while not self._stop_event.is_set() or not self.queue.empty(): #always empty queue
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+            elif spool is not None:
+                self._replay(spool)
+        if spool is not None:
+            # Last attempt; whatever is left stays on disk for the next run
+            self._replay(spool, force=True)
+            spool.close()
+
+    def _queued(self) -> int:
+        return self.queue.qsize()
+
     def stop(self):
         self._stop_event.set()
         if self._thread.is_alive():
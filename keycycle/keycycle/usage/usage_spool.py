@@ -0,0 +1,108 @@
+"""
+Local, append-only spool for usage_logs batches the database did not accept.
+
+Each record is one batch: a 4-byte payload length, a 4-byte CRC32 and the
+rows as JSON. A batch is fsynced once when appended, so a crash loses at most
+the batch being written; a torn record at the end of the file is cut off on
+open. Rows carry their record_id, so replaying a batch that had in fact
+reached the database inserts nothing twice.
+
+A batch the database keeps rejecting is moved to usage-<n>.spool.rejected,
+one JSON line per batch, so the batches after it can still be replayed.
+
+A spool directory can be shared by every process on a host: each logger
+claims the first spool file no live process holds (flock), which also hands
+the leftovers of a process that died to the next one that starts.
+"""
+
+import json
+import os
+import struct
+import zlib
+from typing import Any, Dict, Iterator, List, Tuple
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:  # Windows: one spool file, not guarded against a second process
+    HAS_FCNTL = False
+
+_RECORD_HEADER = struct.Struct("<II")  # payload length, crc32 of payload
+
+
+class UsageSpool:
+    """One claimed spool file. Not thread-safe: owned by the logger's writer thread."""
+
+    def __init__(self, path: str, handle: Any):
+        self.path = path
+        self._file = handle
+        self._file.seek(0, os.SEEK_END)
+        self._size: int = self._file.tell()
+        # Drop a record torn by a crash mid-append so new records follow valid ones
+        end = 0
+        for end, _ in self.records():
+            pass
+        if end != self._size:
+            self._file.truncate(end)
+            self._size = end
+
+    @classmethod
+    def claim(cls, directory: str) -> "UsageSpool":
+        """Open the first usage-<n>.spool in `directory` that no other process holds."""
+        os.makedirs(directory, exist_ok=True)
+        n = 0
+        while True:
+            path = os.path.join(directory, f"usage-{n}.spool")
+            handle = open(path, "a+b")
+            if not HAS_FCNTL:
+                return cls(path, handle)
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                n += 1
+                continue
+            return cls(path, handle)
+
+    @property
+    def pending(self) -> bool:
+        return self._size > 0
+
+    def append(self, rows: List[Dict[str, Any]]) -> None:
+        """Add a batch at the end of the file and fsync it."""
+        payload = json.dumps(rows, separators=(",", ":")).encode()
+        self._file.write(_RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._size += _RECORD_HEADER.size + len(payload)
+
+    def records(self, offset: int = 0) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """Yield (offset after the record, rows) for each intact record from `offset` on."""
+        while offset + _RECORD_HEADER.size <= self._size:
+            self._file.seek(offset)
+            length, crc = _RECORD_HEADER.unpack(self._file.read(_RECORD_HEADER.size))
+            payload = self._file.read(length)
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                return
+            offset += _RECORD_HEADER.size + length
+            yield offset, json.loads(payload)
+
+    def reject(self, rows: List[Dict[str, Any]]) -> str:
+        """Set a batch aside in the .rejected file next to the spool; returns that file's path."""
+        path = self.path + ".rejected"
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rows, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return path
+
+    def clear(self) -> None:
+        """Empty the file once every record has been replayed."""
+        self._file.truncate(0)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._size = 0
+
+    def close(self) -> None:
+        # Closing the file also releases the flock
+        self._file.close()
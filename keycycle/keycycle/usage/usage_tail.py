@@ -0,0 +1,64 @@
+"""
+Near-real-time awareness of usage recorded by other processes.
+
+_hydrate reads usage_logs once at startup; after that a process only sees
+its own requests. UsageTail polls for rows other writers added since the
+last poll (one indexed range query on provider + insertion time) so a
+manager can fold them into its local windows.
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .db_logic import UsageDatabase
+from ..config.constants import USAGE_TAIL_OVERLAP_SECONDS
+
+# (id, api_key_suffix, model, timestamp, tokens, written at)
+TailRow = Tuple[int, str, str, float, int, float]
+
+
+class UsageTail:
+    """
+    Follows usage_logs rows written by other processes for one provider.
+
+    Rows are paged by the time they were inserted, not by their own timestamp:
+    a spooled batch replayed after an outage, or a batch retried during one,
+    lands long after its rows happened. Ids would not do either: they are not
+    allocated in commit order (and not monotonic at all on TiDB). Each poll
+    re-reads the last `overlap` seconds of inserts, which covers transactions
+    committing after a later one, and drops ids it has already returned.
+    """
+
+    def __init__(
+        self,
+        db: UsageDatabase,
+        provider: str,
+        writer_id: Optional[str],
+        overlap: float = USAGE_TAIL_OVERLAP_SECONDS,
+    ):
+        self.db = db
+        self.provider = provider
+        self.writer_id = writer_id
+        self.overlap = overlap
+        self.cursor = time.time()
+        self._seen: Dict[int, float] = {}
+
+    def prime(self) -> None:
+        """Mark rows already in the overlap window as seen; call before hydrating from history."""
+        self.cursor = time.time()
+        self._remember(self._fetch())
+
+    def _fetch(self) -> List[TailRow]:
+        return self.db.load_provider_tail(self.provider, self.cursor - self.overlap, self.writer_id)
+
+    def _remember(self, rows: List[TailRow]) -> None:
+        for row in rows:
+            self._seen[row[0]] = row[5]
+            self.cursor = max(self.cursor, row[5])
+        horizon = self.cursor - self.overlap
+        self._seen = {row_id: ts for row_id, ts in self._seen.items() if ts > horizon}
+
+    def poll(self) -> List[TailRow]:
+        """Rows from other writers that no earlier poll returned."""
+        rows = [row for row in self._fetch() if row[0] not in self._seen]
+        self._remember(rows)
+        return rows
@@ -1,11 +1,14 @@
 """
 Shared pytest fixtures and configuration for keycycle tests.
 """
+import atexit
 import os
+import tempfile
+import unittest
 import pytest
 from pathlib import Path
 from unittest.mock import MagicMock, patch
-from typing import List
+from typing import List, Optional, Sequence
 
 # Path to local.env for integration tests
 LOCAL_ENV_PATH = Path(__file__).parent / "local.env"
@@ -97,6 +100,34 @@ def mock_key_usage():
     )
 
 
+def make_manager(provider_name: str, keys: Sequence[str], db=None, history: Optional[list] = None, **kwargs):
+    """
+    Build a RotatingKeyManager for unit tests.
+    Uses a mock UsageDatabase returning ``history`` unless ``db`` is given.
+    """
+    from keycycle.config.enums import RateLimitStrategy
+    from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+
+    if db is None:
+        db = MagicMock()
+        db.load_provider_history.return_value = history or []
+    kwargs.setdefault("strategy", RateLimitStrategy.PER_MODEL)
+    manager = RotatingKeyManager(api_keys=list(keys), provider_name=provider_name, db=db, **kwargs)
+    # The cleanup thread is a daemon; skip the exit-time join
+    atexit.unregister(manager.stop)
+    return manager
+
+
+class UsageDbTestCase(unittest.TestCase):
+    """Base TestCase with a throwaway SQLite usage database at self.path / self.url."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "usage.db")
+        self.url = "sqlite:///" + self.path
+
+
 @pytest.fixture(scope="session")
 def integration_env():
     """
@@ -0,0 +1,180 @@
+"""
+Tests for the asyncio usage log writer and UsageDatabase's async API.
+"""
+import asyncio
+import atexit
+import os
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy import func, select
+
+from keycycle.config.enums import RateLimitStrategy
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+from keycycle.usage import db_logic
+from keycycle.usage.asyncio_usage_logger import AsyncioUsageLogger
+from keycycle.usage.db_logic import UsageDatabase
+from keycycle.usage.usage_logger import UsageLogConfig
+
+try:
+    import aiosqlite  # noqa: F401
+    HAS_AIOSQLITE = True
+except ImportError:
+    HAS_AIOSQLITE = False
+
+KEY = "sk-asyncio-key-AAAAAAAA"
+
+
+@unittest.skipUnless(db_logic.HAS_ASYNC_ENGINE and HAS_AIOSQLITE, "needs sqlalchemy[asyncio] and aiosqlite")
+class _AsyncDbTestCase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = UsageDatabase(db_url="sqlite:///" + os.path.join(tmp.name, "usage.db"))
+        self.addCleanup(self.db.engine.dispose)
+
+    def _logger(self, db=None, **config) -> AsyncioUsageLogger:
+        logger = AsyncioUsageLogger(db or self.db, writer_id="w", config=UsageLogConfig(writer="asyncio", **config))
+        atexit.unregister(logger.stop)
+        return logger
+
+    def _count(self) -> int:
+        with self.db.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(self.db.usage_logs)).scalar()
+
+
+class TestAsyncioUsageLogger(_AsyncDbTestCase):
+    def test_batches_and_aclose_drains(self):
+        logger = self._logger(max_batch_size=2, max_latency=60)
+
+        async def main():
+            for _ in range(5):
+                logger.log("p", "m", KEY, 10)
+            await logger.aclose()
+            await self.db.adispose()
+
+        asyncio.run(main())
+        self.assertEqual(self._count(), 5)
+        stats = logger.stats()
+        self.assertEqual((stats.written, stats.flushes, stats.queued), (5, 3, 0))
+
+    def test_loop_shutdown_drains_the_queue(self):
+        logger = self._logger(max_latency=60)
+
+        async def main():
+            logger.log("p", "m", KEY, 10)
+            await asyncio.sleep(0)
+
+        # asyncio.run() cancels the writer task on the way out
+        asyncio.run(main())
+        self.assertEqual(self._count(), 1)
+
+    def test_rows_logged_from_threads_and_stop_from_outside_the_loop(self):
+        logger = self._logger(max_latency=0.01)
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(logger.start)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        ready.wait(5)
+        for _ in range(3):
+            logger.log("p", "m", KEY, 10)
+        logger.stop()
+        self.assertEqual(self._count(), 3)
+
+        async def dispose():
+            await self.db.adispose()
+
+        asyncio.run_coroutine_threadsafe(dispose(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
+
+    def test_rows_left_without_a_loop_are_written_by_stop(self):
+        logger = self._logger()
+        logger.log("p", "m", KEY, 10)
+        logger.stop()
+        self.assertEqual(self._count(), 1)
+
+    def test_full_queue_drops_oldest_rows(self):
+        db = MagicMock()
+        db.asave_usage_rows_once.side_effect = RuntimeError("database is down")
+        logger = self._logger(db=db, max_queue_size=3)
+        for tokens in range(5):
+            logger.log("p", "m", KEY, tokens)
+        self.assertEqual([row["tokens"] for row in logger.queue], [2, 3, 4])
+        self.assertEqual(logger.stats().dropped, 2)
+
+    def test_batch_is_dropped_after_max_attempts(self):
+        db = MagicMock()
+        db.asave_usage_rows_once = AsyncMock(side_effect=[RuntimeError("row rejected"), RuntimeError("row rejected"), 1])
+        logger = self._logger(db=db, max_latency=0, max_attempts=2)
+
+        async def main():
+            logger.log("p", "m", KEY, 10)
+            # Let the first batch fail twice before the next row is logged
+            while logger.stats().dropped == 0:
+                await asyncio.sleep(0.01)
+            logger.log("p", "m", KEY, 20)
+            await logger.aclose()
+
+        with patch("keycycle.usage.asyncio_usage_logger.USAGE_LOG_RETRY_SECONDS", 0.01):
+            asyncio.run(asyncio.wait_for(main(), 5))
+        stats = logger.stats()
+        self.assertEqual((stats.dropped, stats.failed_flushes, stats.written), (1, 2, 1))
+
+    def test_blocking_overflow_is_rejected(self):
+        with self.assertRaises(ValueError):
+            UsageLogConfig(writer="asyncio", overflow="block")
+
+
+class TestAsyncReads(_AsyncDbTestCase):
+    def test_async_history_and_rollups_match_sync(self):
+        now = time.time()
+        self.db.save_usage_rows([
+            {"provider": "p", "model": "m", "api_key_suffix": "AAAAAAAA", "timestamp": now - i * 30,
+             "tokens": i, "writer_id": "w", "record_id": uuid.uuid4().hex}
+            for i in range(20)
+        ])
+
+        async def main():
+            history = [tuple(r) async for r in self.db.aload_provider_history("p", 3600, chunk_size=3)]
+            rollups = [tuple(r) async for r in self.db.aload_provider_rollups("p", now - 3600, now)]
+            await self.db.adispose()
+            return history, rollups
+
+        history, rollups = asyncio.run(main())
+        self.assertEqual(history, [tuple(r) for r in self.db.load_provider_history("p", 3600)])
+        self.assertEqual(rollups, [tuple(r) for r in self.db.load_provider_rollups("p", now - 3600, now)])
+
+    def test_manager_uses_the_asyncio_writer(self):
+        manager = RotatingKeyManager(
+            api_keys=[KEY], provider_name="p", strategy=RateLimitStrategy.PER_MODEL, db=self.db,
+            usage_log=UsageLogConfig(writer="asyncio"),
+        )
+        atexit.unregister(manager.stop)
+        atexit.unregister(manager.usage_logger.stop)
+        self.addCleanup(manager._stop_event.set)
+        self.assertIsInstance(manager.usage_logger, AsyncioUsageLogger)
+
+        async def main():
+            manager.record_usage(manager.keys[0], "m", 25)
+            await manager.usage_logger.aclose()
+            await self.db.adispose()
+
+        asyncio.run(main())
+        self.assertEqual(self._count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,231 @@
+"""
+Tests for pool headroom and the capacity-aware batch runners.
+"""
+import asyncio
+import atexit
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from keycycle import MultiClientWrapper
+from keycycle.config.dataclasses import RateLimits
+from keycycle.config.enums import RateLimitStrategy
+from keycycle.core.backoff import BackoffConfig
+from keycycle.core.batch import AsyncBatchRunner, BatchRunner
+from keycycle.core.exceptions import NoAvailableKeyError
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+
+KEYS = ["sk-batch-key-AAAAAAAA", "sk-batch-key-BBBBBBBB"]
+MODEL = "m"
+FAST_BACKOFF = BackoffConfig(initial_interval=0.001, max_interval=0.01, jitter=0)
+
+
+def _make_manager(strategy=RateLimitStrategy.PER_MODEL) -> RotatingKeyManager:
+    db = MagicMock()
+    db.load_provider_history.return_value = []
+    manager = RotatingKeyManager(
+        api_keys=KEYS,
+        provider_name="batch-test",
+        strategy=strategy,
+        db=db,
+    )
+    atexit.unregister(manager.stop)
+    return manager
+
+
+class _InFlight:
+    """Counts concurrent calls and remembers the peak."""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.current -= 1
+
+
+class TestHeadroom(unittest.TestCase):
+    """Test the pool headroom computed by the manager."""
+
+    def test_sums_keys_and_shrinks_with_usage(self):
+        manager = _make_manager()
+        limits = RateLimits(5, 100, 1000)
+        self.assertEqual(manager.get_headroom(MODEL, limits), 10)
+
+        manager.record_usage(manager.keys[0], MODEL, 10, estimated_tokens=0)
+        self.assertEqual(manager.get_headroom(MODEL, limits), 9)
+
+    def test_token_limit_and_pending_reservations(self):
+        manager = _make_manager()
+        limits = RateLimits(100, 1000, 10000, tokens_per_minute=1000)
+        self.assertEqual(manager.get_headroom(MODEL, limits, estimated_tokens=250), 8)
+
+        manager.get_key(MODEL, limits, estimated_tokens=500)
+        self.assertEqual(manager.get_headroom(MODEL, limits, estimated_tokens=250), 6)
+        # The in-flight request's tokens are already reserved; it is not taken off again
+        self.assertEqual(manager.get_headroom(MODEL, limits, estimated_tokens=250, in_flight=1), 6)
+
+    def test_in_flight_requests_come_off_the_request_limits(self):
+        manager = _make_manager()
+        limits = RateLimits(5, 100, 1000, tokens_per_minute=100_000)
+        manager.get_key(MODEL, limits, estimated_tokens=10)
+        manager.get_key(MODEL, limits, estimated_tokens=10)
+        self.assertEqual(manager.get_headroom(MODEL, limits, estimated_tokens=10), 10)
+        self.assertEqual(manager.get_headroom(MODEL, limits, estimated_tokens=10, in_flight=2), 8)
+        self.assertEqual(manager.get_headroom(MODEL, limits, estimated_tokens=10, in_flight=20), 0)
+
+    def test_cooling_down_keys_are_skipped(self):
+        manager = _make_manager(RateLimitStrategy.GLOBAL)
+        limits = RateLimits(5, 100, 1000)
+        manager.keys[1].trigger_cooldown()
+        self.assertEqual(manager.get_headroom(MODEL, limits), 5)
+
+
+class TestBatchRunner(unittest.TestCase):
+    """Test concurrency sizing, ordering and retries for threads."""
+
+    def test_concurrency_follows_headroom(self):
+        in_flight = _InFlight()
+
+        def work(i):
+            with in_flight:
+                time.sleep(0.02)
+            return i
+
+        runner = BatchRunner(lambda n: 3 - n, max_concurrency=50)
+        results = list(runner.map(lambda i=i: work(i) for i in range(12)))
+
+        self.assertEqual(results, list(range(12)))
+        self.assertEqual(in_flight.peak, 3)
+
+    def test_max_concurrency_caps_headroom(self):
+        in_flight = _InFlight()
+
+        def work():
+            with in_flight:
+                time.sleep(0.02)
+
+        list(BatchRunner(lambda n: 100 - n, max_concurrency=2).map([work] * 6))
+        self.assertEqual(in_flight.peak, 2)
+
+    def test_zero_headroom_still_makes_progress(self):
+        runner = BatchRunner(lambda n: 0)
+        self.assertEqual(list(runner.map([lambda: 1, lambda: 2])), [1, 2])
+
+    def test_unordered_yields_as_completed(self):
+        def work(delay, value):
+            time.sleep(delay)
+            return value
+
+        runner = BatchRunner(lambda n: 10 - n)
+        calls = [lambda: work(0.1, "slow"), lambda: work(0.0, "fast")]
+        self.assertEqual(list(runner.map(calls, ordered=False)), ["fast", "slow"])
+        self.assertEqual(list(runner.map(calls)), ["slow", "fast"])
+
+    def test_capacity_errors_are_retried(self):
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise NoAvailableKeyError("p", "m", wait=False, timeout=0, total_keys=2, cooling_down=2)
+            return "ok"
+
+        runner = BatchRunner(lambda n: 1 - n, backoff=FAST_BACKOFF)
+        self.assertEqual(list(runner.map([flaky])), ["ok"])
+        self.assertEqual(len(attempts), 3)
+
+    def test_other_errors_raise_or_are_returned(self):
+        def boom():
+            raise ValueError("bad request")
+
+        runner = BatchRunner(lambda n: 5 - n, backoff=FAST_BACKOFF)
+        with self.assertRaises(ValueError):
+            list(runner.map([lambda: 1, boom]))
+
+        results = list(runner.map([lambda: 1, boom], return_exceptions=True))
+        self.assertEqual(results[0], 1)
+        self.assertIsInstance(results[1], ValueError)
+
+
+class TestAsyncBatchRunner(unittest.TestCase):
+    """Test the task-based runner."""
+
+    def test_concurrency_and_order(self):
+        in_flight = _InFlight()
+
+        async def work(i):
+            with in_flight:
+                await asyncio.sleep(0.01 * (5 - i % 5))
+            return i
+
+        async def run(ordered):
+            runner = AsyncBatchRunner(lambda n: 4 - n)
+            return [r async for r in runner.map((lambda i=i: work(i) for i in range(10)), ordered=ordered)]
+
+        self.assertEqual(asyncio.run(run(True)), list(range(10)))
+        self.assertEqual(in_flight.peak, 4)
+        self.assertEqual(sorted(asyncio.run(run(False))), list(range(10)))
+
+    def test_retries_runtime_capacity_error(self):
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("No available keys for p/m")
+            return "ok"
+
+        async def run():
+            runner = AsyncBatchRunner(lambda n: 1 - n, backoff=FAST_BACKOFF)
+            return [r async for r in runner.map([flaky])]
+
+        self.assertEqual(asyncio.run(run()), ["ok"])
+
+
+class TestWrapperMap(unittest.TestCase):
+    """Test map() on MultiClientWrapper with kwargs items."""
+
+    @patch('keycycle.multi_client_wrapper.UsageDatabase')
+    def test_map_kwargs_items(self, mock_db_class):
+        mock_db = MagicMock()
+        mock_db.load_provider_history.return_value = []
+        mock_db_class.return_value = mock_db
+
+        wrapper = MultiClientWrapper()
+        wrapper.register_provider(
+            provider="embedder",
+            keys=KEYS,
+            default_model=MODEL,
+            limits={MODEL: RateLimits(2, 100, 1000)},
+        )
+        for manager in wrapper._managers.values():
+            atexit.unregister(manager.stop)
+
+        in_flight = _InFlight()
+
+        def embed(text):
+            with in_flight:
+                time.sleep(0.02)
+            return text.upper()
+
+        items = [{"text": t} for t in "abcdef"]
+        self.assertEqual(list(wrapper.map("embedder", items, fn=embed)), list("ABCDEF"))
+        # Two keys at 2 RPM each, nothing recorded yet: at most 4 in flight
+        self.assertLessEqual(in_flight.peak, 4)
+        self.assertGreater(in_flight.peak, 1)
+
+        with self.assertRaises(TypeError):
+            list(wrapper.map("embedder", items))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Tests for loading history into buckets in bulk.
+"""
+import random
+import time
+import unittest
+
+from keycycle.config.dataclasses import KeyUsage, UsageBucket
+from keycycle.config.enums import RateLimitStrategy
+from keycycle.usage.token_estimator import ReservationEstimator
+
+
+def _history(now, count, seed=7):
+    rng = random.Random(seed)
+    stamps = sorted(now - rng.uniform(0, 90000) for _ in range(count))
+    return [(ts, rng.choice([0, 5, 120]), rng.choice([1, 1, 1, 3])) for ts in stamps]
+
+
+def _add_one_by_one(bucket, entries):
+    for ts, tokens, requests in entries:
+        bucket.add(tokens, ts)
+        for _ in range(requests - 1):
+            bucket.add(0, ts)
+
+
+class TestAddMany(unittest.TestCase):
+    def test_matches_per_row_add(self):
+        entries = _history(time.time(), 2000)
+        bulk, single = UsageBucket(), UsageBucket()
+        bulk.add_many(entries)
+        _add_one_by_one(single, entries)
+        self.assertEqual(bulk.get_snapshot(), single.get_snapshot())
+        # Entries older than a window never reach its deques
+        self.assertLessEqual(len(bulk.requests_minute), len(bulk.requests_hour))
+        self.assertEqual(list(bulk.requests_hour), list(single.requests_hour))
+
+    def test_merges_with_newer_entries_already_present(self):
+        now = time.time()
+        bucket = UsageBucket()
+        bucket.add(7, now - 1)
+        bucket.add_many([(now - 30, 3, 2), (now - 20, 0, 1)])
+        self.assertEqual(list(bucket.requests_minute), [now - 30, now - 30, now - 20, now - 1])
+        self.assertEqual(list(bucket.tokens_minute), [(now - 30, 3), (now - 1, 7)])
+        self.assertEqual((bucket.total_requests, bucket.total_tokens), (4, 10))
+
+
+class TestRecordHistory(unittest.TestCase):
+    def test_global_bucket_sees_every_model(self):
+        now = time.time()
+        history = {"a": _history(now, 300, seed=1), "b": _history(now, 300, seed=2)}
+        key = KeyUsage(api_key="k", strategy=RateLimitStrategy.GLOBAL)
+        key.record_history(history)
+
+        expected = UsageBucket()
+        _add_one_by_one(expected, sorted(history["a"] + history["b"]))
+        self.assertEqual(key.global_bucket.get_snapshot(), expected.get_snapshot())
+        self.assertEqual(list(key.global_bucket.requests_day), list(expected.requests_day))
+
+    def test_buckets_without_add_many_fall_back_to_add(self):
+        class AddOnly:
+            def __init__(self):
+                self.calls = []
+
+            def add(self, tokens, timestamp):
+                self.calls.append((tokens, timestamp))
+
+        key = KeyUsage(api_key="k", strategy=RateLimitStrategy.PER_MODEL)
+        key.buckets["m"] = AddOnly()
+        key.record_history({"m": [(1.0, 9, 3)]})
+        self.assertEqual(key.buckets["m"].calls, [(9, 1.0), (0, 1.0), (0, 1.0)])
+
+
+class TestSeedMany(unittest.TestCase):
+    def test_matches_seeding_one_by_one(self):
+        values = [random.Random(3).randint(0, 500) for _ in range(500)]
+        bulk, single = ReservationEstimator(), ReservationEstimator()
+        bulk.seed_many("m", values)
+        for value in values:
+            single.seed("m", value)
+        b, s = bulk.snapshot()["m"], single.snapshot()["m"]
+        self.assertEqual(b["samples"], s["samples"])
+        self.assertAlmostEqual(b["typical_tokens"], s["typical_tokens"], delta=s["typical_tokens"] * 1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+"""
+Tests that cancelled or abandoned async calls never leak token reservations.
+"""
+import asyncio
+import gc
+import random
+import unittest
+from unittest.mock import MagicMock
+
+from conftest import make_manager
+from keycycle.adapters.generic_adapter import create_rotating_client
+from keycycle.config.dataclasses import RateLimits
+from keycycle.key_rotation.rotating_mixin import RotatingCredentialsMixin
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+
+KEYS = ["sk-cancel-key-AAAAAAAA", "sk-cancel-key-BBBBBBBB", "sk-cancel-key-CCCCCCCC"]
+LIMITS = RateLimits(10**6, 10**7, 10**8)
+MODEL = "m"
+
+
+def _pending(manager: RotatingKeyManager) -> int:
+    return sum(bucket.pending_tokens for key in manager.keys for bucket in key.buckets.values())
+
+
+async def _behave(mode: str):
+    if mode == "temp":
+        raise Exception("429: temporarily rate-limited upstream, please retry")
+    if mode == "hard":
+        raise Exception("429: too many requests")
+    if mode == "error":
+        raise ValueError("bad request")
+    await asyncio.sleep(random.uniform(0, 0.03))
+    return {"usage": {"total_tokens": 3}}
+
+
+class ChaosClient:
+    """Async fake SDK that sleeps, fails or rate-limits depending on `mode`."""
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    async def create(self, mode: str = "ok", **kwargs):
+        return await _behave(mode)
+
+    async def stream(self, **kwargs):
+        return self._chunks()
+
+    async def _chunks(self):
+        for i in range(5):
+            await asyncio.sleep(0.005)
+            yield {"usage": {"total_tokens": i + 1}}
+
+
+async def _cancel_storm(call, calls: int = 300) -> None:
+    modes = ["ok", "ok", "ok", "temp", "hard", "error"]
+
+    async def one():
+        try:
+            await asyncio.wait_for(call(random.choice(modes)), timeout=random.uniform(0, 0.04))
+        except (asyncio.TimeoutError, Exception):
+            pass
+
+    await asyncio.gather(*(one() for _ in range(calls)))
+
+
+class TestGenericAdapterCancellation(unittest.TestCase):
+    """Test reservation release in AsyncGenericRotatingClient."""
+
+    def setUp(self):
+        self.manager = make_manager("cancel-test", KEYS)
+        self.client = create_rotating_client(
+            ChaosClient,
+            manager=self.manager,
+            limit_resolver=lambda m, k: LIMITS,
+            default_model=MODEL,
+            is_async=True,
+            estimated_tokens=100,
+            max_retries=2,
+        )
+
+    def test_mass_cancellation_leaks_no_pending_tokens(self):
+        asyncio.run(_cancel_storm(lambda mode: self.client.create(mode=mode)))
+        self.assertEqual(_pending(self.manager), 0)
+
+    def test_unstarted_stream_settles_when_collected(self):
+        async def run():
+            stream = await self.client.stream()
+            self.assertEqual(_pending(self.manager), 100)
+            del stream
+            gc.collect()
+
+        asyncio.run(run())
+
+        self.assertEqual(_pending(self.manager), 0)
+        self.assertEqual(self.manager.get_global_stats().total.total_requests, 1)
+
+    def test_cancelled_stream_consumer_settles(self):
+        async def consume():
+            async for _ in await self.client.stream():
+                await asyncio.sleep(1)
+
+        async def run():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(consume(), timeout=0.05)
+
+        asyncio.run(run())
+
+        self.assertEqual(_pending(self.manager), 0)
+        # Usage seen before cancellation is kept
+        self.assertEqual(self.manager.get_global_stats().total.total_tokens, 1)
+
+
+class TestOpenAIAdapterCancellation(unittest.TestCase):
+    """Test reservation release in RotatingAsyncOpenAIClient."""
+
+    def test_mass_cancellation_leaks_no_pending_tokens(self):
+        from keycycle.adapters.openai_adapter import RotatingAsyncOpenAIClient
+
+        manager = make_manager("cancel-test", KEYS)
+        client = RotatingAsyncOpenAIClient(
+            manager=manager,
+            limit_resolver=lambda m, k: LIMITS,
+            default_model=MODEL,
+            estimated_tokens=100,
+            max_retries=2,
+            provider="openai",
+        )
+
+        async def fake_create(mode="ok", **kwargs):
+            result = await _behave(mode)
+            return MagicMock(usage=MagicMock(total_tokens=result["usage"]["total_tokens"]))
+
+        client._get_target = lambda api_key, path: fake_create
+
+        asyncio.run(_cancel_storm(lambda mode: client.chat.completions.create(mode=mode)))
+        self.assertEqual(_pending(manager), 0)
+
+
+class FakeModel:
+    """Stands in for an agno model class."""
+
+    async def ainvoke(self, mode: str = "ok"):
+        await _behave(mode)
+        return MagicMock(response_usage=MagicMock(total_tokens=3))
+
+    async def ainvoke_stream(self, mode: str = "ok"):
+        for _ in range(3):
+            await _behave(mode)
+            yield MagicMock(response_usage=None)
+
+
+class RotatingFakeModel(RotatingCredentialsMixin, FakeModel):
+    pass
+
+
+class TestMixinCancellation(unittest.TestCase):
+    """Test reservation release in RotatingCredentialsMixin."""
+
+    def setUp(self):
+        self.manager = make_manager("cancel-test", KEYS)
+        wrapper = MagicMock()
+        wrapper.manager = self.manager
+        wrapper.get_key_usage.side_effect = lambda model_id, estimated_tokens, **kw: (
+            self.manager.get_key(model_id, LIMITS, estimated_tokens)
+        )
+        self.model = RotatingFakeModel(
+            model_id=MODEL, wrapper=wrapper, rotating_estimated_tokens=100,
+        )
+
+    def test_mass_cancellation_leaks_no_pending_tokens(self):
+        asyncio.run(_cancel_storm(lambda mode: self.model.ainvoke(mode=mode)))
+        self.assertEqual(_pending(self.manager), 0)
+
+    def test_abandoned_stream_settles(self):
+        async def consume(mode):
+            async for _ in self.model.ainvoke_stream(mode=mode):
+                pass
+
+        asyncio.run(_cancel_storm(consume, calls=100))
+        self.assertEqual(_pending(self.manager), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
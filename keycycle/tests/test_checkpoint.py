@@ -0,0 +1,137 @@
+"""
+Tests for local checkpoints of the rate-limit windows.
+"""
+import atexit
+import os
+import struct
+import tempfile
+import time
+import unittest
+import uuid
+from unittest.mock import patch
+
+from keycycle.backends.base import InMemoryStateBackend
+from keycycle.config.enums import RateLimitStrategy
+from keycycle.key_rotation.checkpoint import (
+    BucketState, Checkpoint, KeyState, key_ident, load_checkpoint, save_checkpoint,
+)
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+from keycycle.usage.db_logic import UsageDatabase
+
+KEYS = ["sk-checkpoint-key-AAAAAAAA", "sk-checkpoint-key-BBBBBBBB"]
+
+
+def _row(ts, tokens=10, suffix="AAAAAAAA", model="m"):
+    return {
+        "provider": "p", "model": model, "api_key_suffix": suffix, "timestamp": ts,
+        "tokens": tokens, "writer_id": "w", "record_id": uuid.uuid4().hex,
+    }
+
+
+class TestCheckpointFormat(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "p.ckpt")
+
+    def test_round_trip(self):
+        checkpoint = Checkpoint(
+            "p", RateLimitStrategy.GLOBAL, 1_700_000_000.5,
+            [KeyState(key_ident("p", "k"), 12.5, [
+                BucketState("m", 7, 900, [1.0, 2.0, 2.0], [(1.0, 300), (2.0, 200)]),
+                BucketState("\0global", 7, 900),
+            ])],
+            {"m": (250.0, 7)},
+        )
+        save_checkpoint(self.path, checkpoint)
+        self.assertEqual(load_checkpoint(self.path), checkpoint)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["p.ckpt"])
+
+    def test_missing_file_is_none(self):
+        self.assertIsNone(load_checkpoint(self.path))
+
+    def test_other_versions_and_damage_are_rejected(self):
+        save_checkpoint(self.path, Checkpoint("p", RateLimitStrategy.PER_MODEL, 1.0))
+        with open(self.path, "r+b") as f:
+            data = bytearray(f.read())
+            f.seek(4)
+            f.write(struct.pack("<H", 99))
+        with self.assertRaisesRegex(ValueError, "version 99"):
+            load_checkpoint(self.path)
+        data[-1] ^= 0xFF
+        with open(self.path, "wb") as f:
+            f.write(bytes(data))
+        with self.assertRaisesRegex(ValueError, "damaged"):
+            load_checkpoint(self.path)
+
+
+class TestWarmRestart(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "p.ckpt")
+        self.db = UsageDatabase(db_url="sqlite:///" + os.path.join(tmp.name, "usage.db"))
+        self.addCleanup(self.db.engine.dispose)
+
+    def _manager(self, keys=KEYS, **kwargs) -> RotatingKeyManager:
+        manager = RotatingKeyManager(
+            api_keys=keys, provider_name="p", strategy=RateLimitStrategy.PER_MODEL, db=self.db,
+            checkpoint_path=self.path, **kwargs
+        )
+        atexit.unregister(manager.stop)
+        self.addCleanup(manager.usage_logger.stop)
+        self.addCleanup(manager._stop_event.set)
+        return manager
+
+    def _checkpointed(self) -> float:
+        first = self._manager()
+        first.record_usage(first.keys[0], "m", 40)
+        first.record_usage(first.keys[0], "m", 60)
+        first.keys[1].trigger_cooldown()
+        first.checkpoint()
+        first.usage_logger.stop()
+        return time.time()
+
+    def test_restores_windows_and_reads_only_newer_rows(self):
+        checkpointed = self._checkpointed()
+        # Not in the checkpoint and older than it: a restore must not read it
+        self.db.save_usage_rows([_row(checkpointed - 5, tokens=1000)])
+        time.sleep(0.01)
+        self.db.save_usage_rows([_row(time.time(), tokens=5)])
+
+        restarted = self._manager()
+        stats = restarted.get_key_stats(0).total
+        self.assertEqual((stats.rpm, stats.tpm, stats.total_tokens), (3, 105, 105))
+        self.assertTrue(restarted.keys[1].is_cooling_down())
+        self.assertEqual(restarted.estimator.usage_state()["m"][1], 3)
+
+    def test_stop_writes_a_last_checkpoint(self):
+        # A short cleanup interval keeps stop() from waiting on the cleanup thread
+        with patch("keycycle.key_rotation.rotation_manager.CLEANUP_INTERVAL_SECONDS", 0.05):
+            manager = self._manager(checkpoint_interval=3600)
+            manager.record_usage(manager.keys[0], "m", 10)
+            manager.stop()
+        checkpoint = load_checkpoint(self.path)
+        self.assertEqual(checkpoint.keys[0].buckets[0].total_tokens, 10)
+
+    def test_unusable_checkpoints_fall_back_to_history(self):
+        self._checkpointed()
+        # A key the checkpoint does not know
+        restarted = self._manager(keys=KEYS + ["sk-checkpoint-key-CCCCCCCC"])
+        self.assertEqual(restarted.get_key_stats(0).total.tpm, 100)
+        self.assertFalse(restarted.keys[1].is_cooling_down())
+
+        with open(self.path, "wb") as f:
+            f.write(b"garbage")
+        self.assertEqual(self._manager().get_key_stats(0).total.tpm, 100)
+
+    def test_rejected_when_windows_are_shared(self):
+        class Shared(InMemoryStateBackend):
+            local_windows = False
+
+        with self.assertRaises(ValueError):
+            self._manager(state_backend=Shared())
+
+
+if __name__ == '__main__':
+    unittest.main()
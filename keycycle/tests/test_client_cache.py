@@ -0,0 +1,312 @@
+"""
+Tests for reuse of live SDK client instances across calls.
+"""
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from keycycle.adapters.client_cache import ClientCache, freeze_kwargs
+from keycycle.adapters.generic_adapter import create_rotating_client
+from keycycle.config.dataclasses import KeyUsage, RateLimits
+from keycycle.config.enums import RateLimitStrategy
+
+
+def _make_manager(keys):
+    manager = MagicMock()
+    usages = [KeyUsage(api_key=k, strategy=RateLimitStrategy.PER_MODEL) for k in keys]
+    manager.keys = usages
+    manager.get_key.side_effect = lambda *a, **kw: usages[manager.get_key.call_count % len(usages)]
+    return manager
+
+
+class CountingClient:
+    """Fake SDK client that counts constructions and closes."""
+    created = 0
+    closed = 0
+
+    def __init__(self, api_key: str, timeout: int = 30):
+        type(self).created += 1
+        self.api_key = api_key
+        self.completions = MagicMock()
+        self.completions.create.return_value = {"usage": {"total_tokens": 5}}
+
+    def close(self):
+        type(self).closed += 1
+
+
+class AsyncCountingClient:
+    created = 0
+    closed = 0
+
+    def __init__(self, api_key: str):
+        type(self).created += 1
+        self.api_key = api_key
+
+    async def create(self, **kwargs):
+        return {"usage": {"total_tokens": 5}}
+
+    async def aclose(self):
+        type(self).closed += 1
+
+
+class TestClientCache(unittest.TestCase):
+    """Test the ClientCache LRU."""
+
+    def test_get_or_create_reuses_instance(self):
+        cache = ClientCache(max_size=4)
+        factory = MagicMock(side_effect=lambda: object())
+
+        first = cache.get_or_create("a", factory)
+        second = cache.get_or_create("a", factory)
+
+        self.assertIs(first, second)
+        self.assertEqual(factory.call_count, 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_eviction_closes_least_recently_used(self):
+        cache = ClientCache(max_size=2)
+        a, b, c = MagicMock(), MagicMock(), MagicMock()
+
+        cache.get_or_create("a", lambda: a)
+        cache.get_or_create("b", lambda: b)
+        cache.get_or_create("a", lambda: a)  # "b" is now least recently used
+        cache.get_or_create("c", lambda: c)
+
+        b.close.assert_called_once()
+        a.close.assert_not_called()
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_slow_constructor_does_not_block_other_keys(self):
+        cache = ClientCache(max_size=4)
+        building, release = threading.Event(), threading.Event()
+
+        def slow_factory():
+            building.set()
+            release.wait(5)
+            return MagicMock()
+
+        thread = threading.Thread(target=cache.get_or_create, args=("slow", slow_factory))
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        self.assertTrue(building.wait(5))
+        fast = MagicMock()
+        self.assertIs(cache.get_or_create("fast", lambda: fast), fast)
+        self.assertFalse(release.is_set())
+
+    def test_racing_builds_keep_one_client_and_close_the_other(self):
+        cache = ClientCache(max_size=4)
+        first, second = MagicMock(), MagicMock()
+
+        def racing_factory():
+            # Another caller inserts the same key while this one is building
+            cache.get_or_create("a", lambda: first)
+            return second
+
+        self.assertIs(cache.get_or_create("a", racing_factory), first)
+        second.close.assert_called_once()
+        first.close.assert_not_called()
+        self.assertEqual(len(cache), 1)
+
+    def test_invalid_size_raises(self):
+        with self.assertRaises(ValueError):
+            ClientCache(max_size=0)
+
+    def test_freeze_kwargs_handles_unhashable_values(self):
+        shared = {"nested": [1, 2]}
+        frozen = freeze_kwargs({"api_key": "k", "opts": shared, "client": []})
+        hash(frozen)
+        self.assertEqual(frozen, freeze_kwargs({"client": [], "opts": shared, "api_key": "k"}))
+
+
+class TestGenericClientReuse(unittest.TestCase):
+    """Test that rotating clients reuse SDK clients per key."""
+
+    def setUp(self):
+        CountingClient.created = 0
+        CountingClient.closed = 0
+
+    def _client(self, **kwargs):
+        manager = _make_manager(["key-a", "key-b"])
+        return create_rotating_client(
+            CountingClient,
+            manager=manager,
+            limit_resolver=lambda m, k: RateLimits(10, 100, 1000),
+            default_model="m",
+            is_async=False,
+            **kwargs,
+        )
+
+    def test_clients_reused_across_calls(self):
+        client = self._client()
+
+        for _ in range(10):
+            client.completions.create(prompt="hi")
+
+        # One client per key, not one per call
+        self.assertEqual(CountingClient.created, 2)
+
+    def test_cache_disabled_builds_fresh_clients(self):
+        client = self._client(client_cache_size=0)
+
+        for _ in range(3):
+            client.completions.create(prompt="hi")
+
+        self.assertEqual(CountingClient.created, 3)
+
+    def test_kwargs_filtered_once_per_key(self):
+        client = self._client(timeout=5, unknown="dropped")
+        key_usage = client.manager.keys[0]
+
+        kwargs_1, cache_key_1 = client._get_client_kwargs(key_usage)
+        kwargs_2, cache_key_2 = client._get_client_kwargs(key_usage)
+
+        self.assertIs(kwargs_1, kwargs_2)
+        self.assertEqual(kwargs_1, {"api_key": "key-a", "timeout": 5})
+        self.assertEqual(cache_key_1[0], "key-a")
+
+    def test_close_closes_cached_clients(self):
+        client = self._client()
+        client.completions.create(prompt="hi")
+        client.completions.create(prompt="hi")
+
+        client.close()
+
+        self.assertEqual(CountingClient.closed, 2)
+
+
+class TestAsyncClientReuse(unittest.TestCase):
+    """Test client reuse for async rotating clients."""
+
+    def setUp(self):
+        AsyncCountingClient.created = 0
+        AsyncCountingClient.closed = 0
+        self.client = create_rotating_client(
+            AsyncCountingClient,
+            manager=_make_manager(["key-a"]),
+            limit_resolver=lambda m, k: RateLimits(10, 100, 1000),
+            default_model="m",
+        )
+
+    def test_reused_within_loop_and_closed_with_aclose(self):
+        async def run():
+            for _ in range(5):
+                await self.client.create(prompt="hi")
+            await self.client.close()
+
+        asyncio.run(run())
+
+        self.assertEqual(AsyncCountingClient.created, 1)
+        self.assertEqual(AsyncCountingClient.closed, 1)
+
+    def test_new_event_loop_gets_new_client(self):
+        async def run():
+            await self.client.create(prompt="hi")
+
+        asyncio.run(run())
+        asyncio.run(run())
+
+        self.assertEqual(AsyncCountingClient.created, 2)
+
+    def test_switching_loops_keeps_each_loops_clients(self):
+        async def run():
+            await self.client.create(prompt="hi")
+
+        first, second = asyncio.new_event_loop(), asyncio.new_event_loop()
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        for loop in (first, second, first, second):
+            loop.run_until_complete(run())
+        self.assertEqual(AsyncCountingClient.created, 2)
+
+        # Closing on one loop closes that loop's clients only
+        first.run_until_complete(self.client.close())
+        self.assertEqual(AsyncCountingClient.closed, 1)
+        second.run_until_complete(self.client.close())
+        self.assertEqual(AsyncCountingClient.closed, 2)
+
+
+class TestProxyPathCaching(unittest.TestCase):
+    """Test that proxy chains and bound targets are resolved once."""
+
+    def setUp(self):
+        CountingClient.created = 0
+        self.client = create_rotating_client(
+            CountingClient,
+            manager=_make_manager(["key-a", "key-b"]),
+            limit_resolver=lambda m, k: RateLimits(10, 100, 1000),
+            default_model="m",
+            is_async=False,
+        )
+
+    def test_proxy_chain_reused(self):
+        self.assertIs(self.client.completions.create, self.client.completions.create)
+        self.assertEqual(self.client.completions.create.path, ("completions", "create"))
+
+    def test_target_resolved_once_per_client(self):
+        lookups = []
+
+        class TrackingClient(CountingClient):
+            @property
+            def completions(self):
+                lookups.append(self.api_key)
+                return self._completions
+
+            @completions.setter
+            def completions(self, value):
+                self._completions = value
+
+        client = create_rotating_client(
+            TrackingClient,
+            manager=_make_manager(["key-a", "key-b"]),
+            limit_resolver=lambda m, k: RateLimits(10, 100, 1000),
+            default_model="m",
+            is_async=False,
+        )
+        # First call per key builds the client and resolves the target
+        client.completions.create(prompt="hi")
+        client.completions.create(prompt="hi")
+        lookups.clear()
+
+        for _ in range(6):
+            client.completions.create(prompt="hi")
+
+        self.assertEqual(lookups, [])
+
+    def test_evicted_client_gets_new_target(self):
+        cache = ClientCache(max_size=1)
+        first = cache.get_target("a", lambda: CountingClient("a"), ("completions", "create"))
+        second = cache.get_target("b", lambda: CountingClient("b"), ("completions", "create"))
+        self.assertIsNot(first, second)
+
+    def test_dunder_lookups_are_not_proxied(self):
+        self.assertFalse(hasattr(self.client, "__aiter__"))
+        self.assertFalse(hasattr(self.client.completions, "__aiter__"))
+
+
+class TestOpenAIClientReuse(unittest.TestCase):
+    """Test client reuse in the OpenAI adapter."""
+
+    def test_same_key_returns_same_client(self):
+        from keycycle.adapters.openai_adapter import RotatingOpenAIClient
+
+        client = RotatingOpenAIClient(
+            manager=MagicMock(),
+            limit_resolver=MagicMock(),
+            default_model="gpt-4o",
+            provider="openai",
+        )
+
+        first = client._get_client("sk-test-key-aaaaaaaaaaaaaaaa")
+        second = client._get_client("sk-test-key-aaaaaaaaaaaaaaaa")
+        other = client._get_client("sk-test-key-bbbbbbbbbbbbbbbb")
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+Tests for the compact usage_events schema and the migration from usage_logs.
+"""
+import asyncio
+import atexit
+import os
+import tempfile
+import time
+import unittest
+import uuid
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, func, inspect, select, text
+
+from keycycle.config.enums import RateLimitStrategy
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+from keycycle.usage import db_logic
+from keycycle.usage.db_logic import UsageDatabase
+from keycycle.usage.usage_tail import UsageTail
+
+try:
+    import aiosqlite  # noqa: F401
+    HAS_AIOSQLITE = True
+except ImportError:
+    HAS_AIOSQLITE = False
+
+KEYS = ["sk-compact-key-AAAAAAAA", "sk-compact-key-BBBBBBBB"]
+
+
+def _row(ts, tokens=10, suffix="AAAAAAAA", model="m", provider="p", writer="w", record_id=None):
+    return {
+        "provider": provider, "model": model, "api_key_suffix": suffix, "timestamp": ts,
+        "tokens": tokens, "writer_id": writer, "record_id": record_id or uuid.uuid4().hex,
+    }
+
+
+class TestCompactSchema(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.url = "sqlite:///" + os.path.join(tmp.name, "usage.db")
+        self.db = self._db()
+
+    def _db(self, compact=True) -> UsageDatabase:
+        db = UsageDatabase(db_url=self.url, compact=compact)
+        self.addCleanup(db.engine.dispose)
+        return db
+
+    def _count(self, table) -> int:
+        with self.db.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(table)).scalar()
+
+    def test_rows_round_trip_through_the_dimensions(self):
+        now = time.time()
+        rows = [_row(now - 30, 5), _row(now - 20, 7, suffix="BBBBBBBB", model="m2"), _row(now - 10, 9)]
+        self.db.save_usage_rows(rows)
+        self.assertEqual(self._count(self.db.usage_models), 2)
+        self.assertEqual(self._count(self.db.usage_keys), 2)
+
+        # A second process starts with an empty cache and loads the dimensions
+        other = self._db()
+        history = other.load_provider_history("p", 60)
+        self.assertEqual([(s, m, tokens) for s, m, _, tokens in history],
+                         [("AAAAAAAA", "m", 5), ("BBBBBBBB", "m2", 7), ("AAAAAAAA", "m", 9)])
+        self.assertAlmostEqual(history[0][2], now - 30, delta=0.001)
+        self.assertEqual(list(other.load_provider_history("p", 60, chunk_size=2)), history)
+        self.assertEqual([tokens for _, _, tokens in other.load_history("p", KEYS[0], 60)], [5, 9])
+        self.assertEqual(other.load_provider_history("unknown", 60), [])
+        self.assertEqual(sum(r[3] for r in other.load_provider_rollups("p", now - 60, now + 60)), 3)
+
+    def test_values_added_by_another_process_are_picked_up(self):
+        tail = UsageTail(self.db, "p", writer_id="w")
+        self._db().save_usage_rows([_row(time.time(), model="new-model", writer="other")])
+        (row,) = tail.poll()
+        self.assertEqual(row[1:3], ("AAAAAAAA", "new-model"))
+
+    def test_replayed_rows_are_inserted_once(self):
+        rows = [_row(time.time()), _row(time.time())]
+        self.assertEqual(self.db.save_usage_rows_once(rows[:1]), 1)
+        self.assertEqual(self.db.save_usage_rows_once(rows), 1)
+        self.assertEqual(self._count(self.db.usage_events), 2)
+
+    def test_prune_uses_millisecond_timestamps(self):
+        now = time.time()
+        self.db.save_usage_rows([_row(now - 2 * 86400), _row(now)])
+        self.db.prune_old_records(raw_days_retention=1)
+        self.assertEqual(self._count(self.db.usage_events), 1)
+
+    def test_migration_copies_legacy_rows_and_can_resume(self):
+        now = time.time()
+        legacy = self._db(compact=False)
+        legacy.save_usage_rows([_row(now - i, i, suffix=("AAAAAAAA", "BBBBBBBB")[i % 2]) for i in range(7)])
+        with legacy.engine.begin() as conn:
+            # A row written before record_id existed
+            conn.execute(legacy.usage_logs.insert().values(
+                provider="p", model="m", api_key_suffix="AAAAAAAA", timestamp=now - 100, tokens=100,
+            ))
+        expected = [tuple(r) for r in legacy.load_provider_history("p", 3600)]
+
+        self.assertEqual(self.db.migrate_from_legacy(chunk_size=3), 8)
+        self.assertEqual(self.db.migrate_from_legacy(chunk_size=3), 0)
+        history = self.db.load_provider_history("p", 3600)
+        self.assertEqual([(s, m, tokens) for s, m, _, tokens in history], [(s, m, t) for s, m, _, t in expected])
+
+        self.db.migrate_from_legacy(drop_legacy=True)
+        self.assertFalse(inspect(self.db.engine).has_table("usage_logs"))
+        with self.assertRaises(ValueError):
+            legacy.migrate_from_legacy()
+
+    def test_old_usage_logs_are_upgraded_and_counted_in_rollups(self):
+        # A usage_logs table from before writer_id, record_id and usage_rollups
+        url = self.url.replace("usage.db", "old.db")
+        engine = create_engine(url)
+        now = time.time()
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE usage_logs (id INTEGER PRIMARY KEY, provider VARCHAR(100), model VARCHAR(100),"
+                " api_key_suffix VARCHAR(50), timestamp FLOAT, tokens INTEGER)"
+            ))
+            for i, tokens in enumerate((10, 20, 30)):
+                conn.execute(text(
+                    "INSERT INTO usage_logs (provider, model, api_key_suffix, timestamp, tokens)"
+                    " VALUES ('p', 'm', 'AAAAAAAA', :ts, :tokens)"
+                ), {"ts": now - 300 - i, "tokens": tokens})
+        engine.dispose()
+
+        self.url = url
+        db = self._db()
+        rollups = db.load_provider_rollups("p", now - 3600, now)
+        self.assertEqual(sum(r[3] for r in rollups), 3)
+        self.assertEqual(sum(r[4] for r in rollups), 60)
+
+        self.assertEqual(db.migrate_from_legacy(), 3)
+        self.assertEqual([tokens for _, _, _, tokens in db.load_provider_history("p", 3600)], [30, 20, 10])
+
+    def test_manager_hydrates_from_compact_rows(self):
+        self.db.save_usage_rows([_row(time.time() - 5, 40), _row(time.time() - 3, 60)])
+        manager = RotatingKeyManager(
+            api_keys=KEYS, provider_name="p", strategy=RateLimitStrategy.PER_MODEL, db=self.db,
+        )
+        atexit.unregister(manager.stop)
+        self.addCleanup(manager.usage_logger.stop)
+        self.addCleanup(manager._stop_event.set)
+        self.assertEqual(manager.get_key_stats(0).total.tpm, 100)
+
+    @unittest.skipUnless(db_logic.HAS_ASYNC_ENGINE and HAS_AIOSQLITE, "needs sqlalchemy[asyncio] and aiosqlite")
+    def test_async_writes_and_reads(self):
+        async def main():
+            await self.db.asave_usage_rows([_row(time.time(), model="async-model")])
+            history = [r async for r in self.db.aload_provider_history("p", 60)]
+            await self.db.adispose()
+            return history
+
+        history = asyncio.run(main())
+        self.assertEqual([r[1] for r in history], ["async-model"])
+
+    @unittest.skipUnless(db_logic.HAS_ASYNC_ENGINE and HAS_AIOSQLITE, "needs sqlalchemy[asyncio] and aiosqlite")
+    def test_async_reads_resolve_new_values_without_the_sync_engine(self):
+        reader = self._db()
+        self.db.save_usage_rows([_row(time.time(), model="new-model", suffix="CCCCCCCC")])
+
+        async def main():
+            history = [r async for r in reader.aload_provider_history("p", 60)]
+            await reader.adispose()
+            return history
+
+        with patch.object(reader.engine, "connect", side_effect=AssertionError("blocking read on the loop")):
+            history = asyncio.run(main())
+        self.assertEqual([(r[0], r[1]) for r in history], [("CCCCCCCC", "new-model")])
+
+    def test_missing_values_are_not_reloaded_on_every_lookup(self):
+        with patch.object(self.db._providers, "load", wraps=self.db._providers.load) as load:
+            self.assertEqual(self.db.load_provider_tail("p", 0), [])
+            self.assertEqual(self.db.load_provider_history("p", 60), [])
+            self.assertEqual(load.call_count, 1)
+
+            self.db.save_usage_rows([_row(time.time())])
+            self.assertEqual(len(self.db.load_provider_tail("p", 0)), 1)
+
+            # A value another process adds is found once the miss expires
+            self.assertIsNone(self.db._providers.find(("q",)))
+            self._db().save_usage_rows([_row(time.time(), provider="q")])
+            self.assertIsNone(self.db._providers.find(("q",)))
+            with patch.object(db_logic, "DIMENSION_MISS_TTL_SECONDS", 0):
+                self.assertIsNotNone(self.db._providers.find(("q",)))
+
+
+if __name__ == '__main__':
+    unittest.main()
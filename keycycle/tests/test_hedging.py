@@ -0,0 +1,171 @@
+"""
+Tests for hedged requests across keys.
+"""
+import asyncio
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from keycycle.adapters.generic_adapter import create_rotating_client
+from keycycle.config.dataclasses import RateLimits
+from keycycle.config.enums import RateLimitStrategy
+from keycycle.core.hedging import HedgeBudget, HedgeConfig, Hedger, LatencyTracker
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+
+SLOW_KEY = "sk-slow-key-AAAAAAAA"
+FAST_KEY = "sk-fast-key-BBBBBBBB"
+LIMITS = RateLimits(1000, 10000, 100000)
+
+
+class LatencyClient:
+    """Async fake SDK whose latency depends on the API key."""
+    cancelled = 0
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    async def create(self, **kwargs):
+        try:
+            await asyncio.sleep(1.0 if self.api_key == SLOW_KEY else 0.01)
+        except asyncio.CancelledError:
+            type(self).cancelled += 1
+            raise
+        return {"key": self.api_key, "usage": {"total_tokens": 7}}
+
+
+def _make_manager():
+    db = MagicMock()
+    db.load_provider_history.return_value = []
+    return RotatingKeyManager(
+        api_keys=[SLOW_KEY, FAST_KEY],
+        provider_name="hedge-test",
+        strategy=RateLimitStrategy.PER_MODEL,
+        db=db,
+    )
+
+
+def _warm(hedger: Hedger, model_id: str, latency: float = 0.02) -> None:
+    for _ in range(hedger.config.min_samples):
+        hedger.latencies.record(model_id, latency)
+
+
+class TestLatencyTracker(unittest.TestCase):
+    """Test per-model latency percentiles."""
+
+    def test_percentile(self):
+        tracker = LatencyTracker(window=100)
+        for i in range(1, 101):
+            tracker.record("m", i / 100)
+        self.assertAlmostEqual(tracker.percentile("m", 0.95), 0.95)
+        self.assertAlmostEqual(tracker.percentile("m", 0.5), 0.5)
+
+    def test_needs_min_samples(self):
+        tracker = LatencyTracker()
+        tracker.record("m", 0.1)
+        self.assertIsNone(tracker.percentile("m", 0.95, min_samples=2))
+        self.assertIsNone(tracker.percentile("other", 0.95))
+
+    def test_window_keeps_recent(self):
+        tracker = LatencyTracker(window=3)
+        for latency in (5.0, 0.1, 0.2, 0.3):
+            tracker.record("m", latency)
+        self.assertAlmostEqual(tracker.percentile("m", 0.99), 0.3)
+
+
+class TestHedgeBudget(unittest.TestCase):
+    """Test the extra-RPM budget."""
+
+    def test_budget_is_fraction_of_requests(self):
+        budget = HedgeBudget(fraction=0.1)
+        for _ in range(20):
+            budget.record_request()
+        self.assertTrue(budget.try_acquire())
+        self.assertTrue(budget.try_acquire())
+        self.assertFalse(budget.try_acquire())
+
+    def test_zero_budget_never_hedges(self):
+        budget = HedgeBudget(fraction=0.0)
+        budget.record_request()
+        self.assertFalse(budget.try_acquire())
+
+    def test_invalid_config(self):
+        with self.assertRaises(ValueError):
+            HedgeConfig(percentile=1.5)
+
+
+class TestManagerExclude(unittest.TestCase):
+    """Test that get_key can skip keys already in use."""
+
+    def test_exclude_skips_key(self):
+        manager = _make_manager()
+        key = manager.get_key("m", LIMITS, 10, exclude={SLOW_KEY})
+        self.assertEqual(key.api_key, FAST_KEY)
+        self.assertIsNone(manager.get_key("m", LIMITS, 10, exclude={SLOW_KEY, FAST_KEY}))
+
+
+class TestHedgedClient(unittest.TestCase):
+    """Test hedging in the async generic rotating client."""
+
+    def setUp(self):
+        LatencyClient.cancelled = 0
+        self.manager = _make_manager()
+
+    def _client(self, budget: float):
+        client = create_rotating_client(
+            LatencyClient,
+            manager=self.manager,
+            limit_resolver=lambda m, k: LIMITS,
+            default_model="m",
+            is_async=True,
+            estimated_tokens=50,
+            hedge=HedgeConfig(budget=budget),
+        )
+        _warm(client._hedger, "m")
+        return client
+
+    def _bucket(self, api_key):
+        key = next(k for k in self.manager.keys if k.api_key == api_key)
+        return key.buckets["m"]
+
+    def test_slow_key_is_hedged_and_loser_cancelled(self):
+        client = self._client(budget=1.0)
+
+        async def run():
+            start = time.monotonic()
+            result = await client.create(prompt="classify")
+            return result, time.monotonic() - start
+
+        result, elapsed = asyncio.run(run())
+
+        self.assertEqual(result["key"], FAST_KEY)
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(LatencyClient.cancelled, 1)
+        self.assertEqual(client._hedger.hedges_won, 1)
+
+        # Both attempts count as requests; the cancelled loser is billed at its estimate
+        slow, fast = self._bucket(SLOW_KEY), self._bucket(FAST_KEY)
+        self.assertEqual((slow.total_requests, slow.total_tokens, slow.pending_tokens), (1, 50, 0))
+        self.assertEqual(slow.get_snapshot().tpm, 50)
+        self.assertEqual((fast.total_requests, fast.total_tokens, fast.pending_tokens), (1, 7, 0))
+
+    def test_no_hedge_without_budget(self):
+        client = self._client(budget=0.0)
+
+        result = asyncio.run(client.create(prompt="classify"))
+
+        self.assertEqual(result["key"], SLOW_KEY)
+        self.assertEqual(client._hedger.hedges_sent, 0)
+        self.assertEqual(self._bucket(FAST_KEY).total_requests, 0)
+
+    def test_no_hedge_without_latency_history(self):
+        client = self._client(budget=1.0)
+        client._hedger.latencies = LatencyTracker()
+
+        result = asyncio.run(client.create(prompt="classify"))
+
+        self.assertEqual(result["key"], SLOW_KEY)
+        self.assertEqual(client._hedger.hedges_sent, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
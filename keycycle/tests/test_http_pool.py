@@ -0,0 +1,148 @@
+"""
+Tests for sharing one HTTP connection pool across all rotated keys of a provider.
+
+Uses a local keep-alive HTTP server as a stand-in for the provider and counts
+accepted TCP connections.
+"""
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+
+import httpx
+
+from keycycle.adapters.generic_adapter import create_rotating_client
+from keycycle.adapters.http_pool import HttpPoolConfig, get_shared_http_pool
+from keycycle.config.dataclasses import KeyUsage, RateLimits
+from keycycle.config.enums import RateLimitStrategy
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"usage": {"total_tokens": 3}}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.connections = 0
+
+    def get_request(self):
+        request = super().get_request()
+        self.connections += 1
+        return request
+
+
+class FakeSDKClient:
+    """Minimal SDK client that talks HTTP through an (optionally injected) httpx client."""
+    base_url = ""
+
+    def __init__(self, api_key: str, http_client=None):
+        self.api_key = api_key
+        self._http = http_client or httpx.Client()
+
+    def ping(self, model=None):
+        response = self._http.get(
+            f"{self.base_url}/v1/ping", headers={"Authorization": f"Bearer {self.api_key}"}
+        )
+        return response.json()
+
+    def close(self):
+        self._http.close()
+
+
+def _make_manager(provider, keys):
+    manager = MagicMock()
+    manager.provider_name = provider
+    usages = [KeyUsage(api_key=k, strategy=RateLimitStrategy.PER_MODEL) for k in keys]
+    counter = iter(range(10**6))
+    manager.get_key.side_effect = lambda *a, **kw: usages[next(counter) % len(usages)]
+    return manager
+
+
+class TestSharedHttpPool(unittest.TestCase):
+    """Test connection sharing against a local HTTP stand-in server."""
+
+    def setUp(self):
+        self.server = _CountingServer()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        FakeSDKClient.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _run(self, provider, requests=30, **kwargs):
+        client = create_rotating_client(
+            FakeSDKClient,
+            manager=_make_manager(provider, ["key-a", "key-b", "key-c"]),
+            limit_resolver=lambda m, k: RateLimits(1000, 10000, 100000),
+            default_model="m",
+            is_async=False,
+            **kwargs,
+        )
+        for _ in range(requests):
+            self.assertEqual(client.ping()["usage"]["total_tokens"], 3)
+        client.close()
+
+    def test_per_key_clients_open_one_connection_per_key(self):
+        self._run("pool-test-private")
+        self.assertEqual(self.server.connections, 3)
+
+    def test_shared_pool_multiplexes_keys_over_one_connection(self):
+        self._run("pool-test-shared", http_pool=HttpPoolConfig(max_connections=4))
+        self.assertEqual(self.server.connections, 1)
+
+    def test_fresh_clients_without_cache_still_share_connections(self):
+        self._run("pool-test-nocache", client_cache_size=0, http_pool=HttpPoolConfig())
+        self.assertEqual(self.server.connections, 1)
+
+    def test_pool_survives_client_close(self):
+        config = HttpPoolConfig(max_connections=2)
+        self._run("pool-test-reuse", http_pool=config)
+        self._run("pool-test-reuse", http_pool=config)
+
+        pool = get_shared_http_pool("pool-test-reuse", False, config)
+        self.assertFalse(pool.get_client().is_closed)
+        self.assertEqual(self.server.connections, 1)
+
+
+class TestGetSharedHttpPool(unittest.TestCase):
+    """Test the per-provider pool registry."""
+
+    def test_same_provider_and_config_share_pool(self):
+        config = HttpPoolConfig(max_connections=7)
+        self.assertIs(
+            get_shared_http_pool("Groq", False, config),
+            get_shared_http_pool("groq", False, config),
+        )
+
+    def test_sync_and_async_pools_are_separate(self):
+        self.assertIsNot(
+            get_shared_http_pool("groq", False),
+            get_shared_http_pool("groq", True),
+        )
+
+    def test_limits_applied_to_httpx_client(self):
+        pool = get_shared_http_pool("limits-test", False, HttpPoolConfig(max_connections=3))
+        client = pool.get_client()
+        self.assertIsInstance(client, httpx.Client)
+        pool.close()
+        self.assertTrue(client.is_closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+Tests for persisting cooldowns, exhausted quotas and invalid keys across restarts.
+"""
+import atexit
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from keycycle.config.dataclasses import RateLimits
+from keycycle.config.enums import KeyStatus, RateLimitStrategy
+from keycycle.core.utils import is_daily_limit_error, is_invalid_key_error
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+from keycycle.usage.db_logic import UsageDatabase
+
+KEYS = ["sk-state-key-AAAAAAAA", "sk-state-key-BBBBBBBB"]
+LIMITS = RateLimits(requests_per_minute=100, requests_per_hour=1000, requests_per_day=10000)
+
+
+class _HttpError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TestKeyStates(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = UsageDatabase(db_url="sqlite:///" + os.path.join(tmp.name, "usage.db"))
+        self.addCleanup(self.db.engine.dispose)
+
+    def _manager(self, db=None, **kwargs) -> RotatingKeyManager:
+        manager = RotatingKeyManager(
+            api_keys=KEYS, provider_name="p", strategy=RateLimitStrategy.PER_MODEL, db=db or self.db, **kwargs
+        )
+        atexit.unregister(manager.stop)
+        self.addCleanup(manager.usage_logger.stop)
+        self.addCleanup(manager._stop_event.set)
+        self.addCleanup(manager._key_state_writer.shutdown)
+        return manager
+
+    def _restart(self, first: RotatingKeyManager, **kwargs) -> RotatingKeyManager:
+        # Key states are written in the background; wait for them as stop() would
+        first._key_state_writer.shutdown(wait=True)
+        return self._manager(**kwargs)
+
+    def test_cooldown_survives_a_restart(self):
+        first = self._manager()
+        first.trigger_cooldown(first.keys[0], _HttpError("Too many requests", 429))
+        self.assertFalse(first.keys[0].is_disabled())
+
+        restarted = self._restart(first)
+        self.assertTrue(restarted.keys[0].is_cooling_down())
+        self.assertFalse(restarted.keys[1].is_cooling_down())
+        self.assertIs(restarted.get_key("m", LIMITS), restarted.keys[1])
+
+    def test_daily_quota_disables_until_the_next_day(self):
+        error = _HttpError("429 Quota exceeded for GenerateRequestsPerDayPerProjectPerModel", 429)
+        self.assertTrue(is_daily_limit_error(error))
+        first = self._manager()
+        first.trigger_cooldown(first.keys[1], error)
+
+        restarted = self._restart(first, cooldown_seconds=0)
+        key = restarted.keys[1]
+        self.assertTrue(key.is_disabled())
+        self.assertEqual(key.disabled_status, KeyStatus.EXHAUSTED)
+        self.assertEqual(key.disabled_until % 86400, 0)
+        self.assertIs(restarted.get_key("m", LIMITS), restarted.keys[0])
+        self.assertEqual(restarted.get_headroom("m", LIMITS), 100)
+
+    def test_only_auth_errors_disable_a_key_as_invalid(self):
+        first = self._manager()
+        first.disable_if_invalid(first.keys[0], ValueError("model not found"))
+        first.disable_if_invalid(first.keys[0], _HttpError("Forbidden: model not available in your region", 403))
+        first.disable_if_invalid(first.keys[0], ValueError("401 Unauthorized: token expired upstream"))
+        self.assertFalse(first.keys[0].is_disabled())
+        first.disable_if_invalid(first.keys[0], _HttpError("Incorrect API key provided", 401))
+        self.assertEqual(first.keys[0].disabled_status, KeyStatus.INVALID)
+
+        restarted = self._restart(first)
+        self.assertEqual(restarted.keys[0].disabled_status, KeyStatus.INVALID)
+        self.assertIsNone(restarted.keys[1].disabled_status)
+
+    def test_invalid_api_key_code_disables_a_key(self):
+        error = _HttpError("Bad request", 400)
+        error.body = {"error": {"code": "invalid_api_key", "message": "Incorrect API key"}}
+        self.assertTrue(is_invalid_key_error(error))
+        self.assertFalse(is_invalid_key_error(_HttpError("Bad request", 400)))
+
+    def test_enable_key_clears_the_stored_states(self):
+        first = self._manager()
+        first.trigger_cooldown(first.keys[0])
+        first.disable_key(first.keys[0], KeyStatus.INVALID)
+        first.enable_key(first.keys[0])
+        self.assertFalse(first.keys[0].is_disabled())
+        self.assertFalse(first.keys[0].is_cooling_down())
+
+        restarted = self._restart(first)
+        self.assertFalse(restarted.keys[0].is_disabled())
+        self.assertFalse(restarted.keys[0].is_cooling_down())
+        self.assertEqual(self.db.load_key_states("p"), [])
+
+    def test_expired_states_are_not_restored_and_are_pruned(self):
+        past = time.time() - 120
+        self.db.save_key_state("p", "AAAAAAAA", KeyStatus.INVALID.value, past - 60, past)
+        self.assertFalse(self._manager().keys[0].is_disabled())
+        self.db.prune_old_records()
+        with self.db.engine.connect() as conn:
+            self.assertEqual(conn.execute(self.db.key_states.select()).all(), [])
+
+    def test_database_errors_do_not_break_rotation(self):
+        db = MagicMock()
+        db.save_key_state.side_effect = RuntimeError("database is down")
+        manager = self._manager(db=db)
+        manager.trigger_cooldown(manager.keys[0])
+        self.assertTrue(manager.keys[0].is_cooling_down())
+
+    def test_a_slow_database_does_not_hold_up_a_429(self):
+        db = MagicMock()
+        db.load_key_states.return_value = []
+        release = threading.Event()
+        db.save_key_state.side_effect = lambda *args: release.wait(10)
+        manager = self._manager(db=db)
+        self.addCleanup(release.set)
+
+        started = time.perf_counter()
+        manager.trigger_cooldown(manager.keys[0])
+        manager.disable_key(manager.keys[1], KeyStatus.INVALID)
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertTrue(manager.keys[0].is_cooling_down())
+
+        release.set()
+        manager._key_state_writer.shutdown(wait=True)
+        self.assertEqual([c.args[2] for c in db.save_key_state.call_args_list],
+                         [KeyStatus.COOLDOWN.value, KeyStatus.INVALID.value])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+"""
+Tests for rate-limit windows shared across processes through a memory-mapped file.
+"""
+import atexit
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from keycycle.backends import mmap_state
+from keycycle.backends.mmap_state import MmapStateBackend
+from keycycle.config.dataclasses import RateLimits
+from keycycle.config.enums import RateLimitStrategy
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+
+KEYS = ["sk-shared-key-AAAAAAAA", "sk-shared-key-BBBBBBBB"]
+MODEL = "m"
+
+
+def _make_manager(path, history=None, strategy=RateLimitStrategy.PER_MODEL) -> RotatingKeyManager:
+    db = MagicMock()
+    db.load_provider_history.return_value = history or []
+    manager = RotatingKeyManager(
+        api_keys=KEYS,
+        provider_name="shared-test",
+        strategy=strategy,
+        db=db,
+        state_backend=MmapStateBackend(path, capacity=16),
+    )
+    atexit.unregister(manager.stop)
+    return manager
+
+
+def _reserve_until_full(path, results):
+    """Child process: take every reservation the shared windows allow."""
+    backend = MmapStateBackend(path)
+    key = backend.key_usage("race", KEYS[0], RateLimitStrategy.PER_MODEL)
+    limits = RateLimits(1000, 10000, 100000, tokens_per_minute=5000)
+    won = 0
+    while key.try_reserve(MODEL, limits, 100):
+        won += 1
+    results.put(won)
+
+
+@unittest.skipUnless(mmap_state.HAS_FCNTL, "POSIX file locks required")
+class TestSharedWindows(unittest.TestCase):
+    """Test that managers on one file see each other's usage."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "keycycle.state")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_usage_is_visible_to_other_managers(self):
+        first, second = _make_manager(self.path), _make_manager(self.path)
+        limits = RateLimits(3, 100, 1000)
+
+        for _ in range(3):
+            key = first.get_key(MODEL, limits, 10)
+            first.record_usage(key, MODEL, 10, estimated_tokens=10)
+
+        # Key A is exhausted for both managers; the other manager moves on to key B
+        self.assertEqual(second.get_headroom(MODEL, limits), 3)
+        key = second.get_key(MODEL, limits, 10)
+        self.assertEqual(key.api_key, KEYS[1])
+        self.assertEqual(first.keys[1].buckets[MODEL].pending_tokens, 10)
+
+        snapshot = second.get_key_stats(0).total
+        self.assertEqual((snapshot.rpm, snapshot.tpm, snapshot.total_tokens), (3, 30, 30))
+
+    def test_global_strategy_shares_the_key_bucket(self):
+        first = _make_manager(self.path, strategy=RateLimitStrategy.GLOBAL)
+        second = _make_manager(self.path, strategy=RateLimitStrategy.GLOBAL)
+        limits = RateLimits(1, 100, 1000)
+
+        key = first.get_key("a", limits, 10)
+        first.record_usage(key, "a", 5, estimated_tokens=10)
+        self.assertNotEqual(second.get_key("b", limits, 10).api_key, key.api_key)
+
+    def test_cooldowns_are_shared(self):
+        first, second = _make_manager(self.path), _make_manager(self.path)
+        first.keys[0].trigger_cooldown()
+        self.assertTrue(second.keys[0].is_cooling_down(30))
+        self.assertFalse(second.keys[1].is_cooling_down(30))
+
+    def test_only_the_first_manager_replays_history(self):
+        history = [("AAAAAAAA", MODEL, time.time() - 30, 50)] * 4
+        _make_manager(self.path, history)
+        second = _make_manager(self.path, history)
+
+        snapshot = second.get_key_stats(0).total
+        self.assertEqual((snapshot.rpm, snapshot.rph, snapshot.tpm), (4, 4, 200))
+        # History still seeds the local estimator
+        self.assertEqual(second.estimator.snapshot()[MODEL]["samples"], 4)
+
+    def test_old_history_only_counts_in_longer_windows(self):
+        manager = _make_manager(self.path, [("AAAAAAAA", MODEL, time.time() - 1800, 70)])
+        snapshot = manager.get_key_stats(0).total
+        self.assertEqual((snapshot.rpm, snapshot.rph, snapshot.rpd, snapshot.tph), (0, 1, 1, 70))
+
+    def test_abandoned_reservations_expire(self):
+        backend = MmapStateBackend(self.path, pending_ttl=0.05)
+        bucket = backend.bucket("p", KEYS[0], MODEL)
+        bucket.reserve(500)
+        self.assertEqual(bucket.pending_tokens, 500)
+        time.sleep(0.08)
+        self.assertEqual(bucket.pending_tokens, 0)
+
+    def test_leaked_reservation_expires_while_the_key_stays_busy(self):
+        dead = MmapStateBackend(self.path, pending_ttl=0.1).bucket("p", KEYS[0], MODEL)
+        busy = MmapStateBackend(self.path, pending_ttl=0.1).bucket("p", KEYS[0], MODEL)
+        dead.reserve(500)  # Never released: the worker died
+        deadline = time.time() + 0.3
+        while time.time() < deadline:
+            busy.reserve(10)
+            busy.commit(10, 10, time.time())
+            time.sleep(0.01)
+        busy.reserve(10)
+        self.assertEqual(busy.pending_tokens, 10)
+
+    def test_full_file_and_foreign_file(self):
+        backend = MmapStateBackend(self.path, capacity=2)
+        backend.bucket("p", "k", "a")
+        backend.bucket("p", "k", "b")
+        with self.assertRaises(RuntimeError):
+            backend.bucket("p", "k", "c")
+
+        foreign = os.path.join(self.tmp.name, "foreign")
+        with open(foreign, "wb") as f:
+            f.write(b"not a state file" * 8)
+        with self.assertRaises(ValueError):
+            MmapStateBackend(foreign)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "fork required")
+    def test_processes_never_overbook(self):
+        MmapStateBackend(self.path)
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        workers = [context.Process(target=_reserve_until_full, args=(self.path, results)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+
+        # 5000 TPM / 100 tokens: exactly 50 reservations across all processes
+        self.assertEqual(sum(results.get(timeout=5) for _ in workers), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
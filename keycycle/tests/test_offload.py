@@ -0,0 +1,181 @@
+"""
+Tests for offloading sync-only clients to a thread pool for asyncio callers.
+"""
+import asyncio
+import threading
+import time
+import unittest
+from collections import Counter
+
+from conftest import make_manager
+from keycycle.adapters.generic_adapter import OffloadedAsyncRotatingClient, create_rotating_client
+from keycycle.adapters.offload import KeySlots, OffloadConfig
+from keycycle.config.dataclasses import RateLimits
+
+KEYS = ["sk-offload-key-AAAAAAAA", "sk-offload-key-BBBBBBBB"]
+LIMITS = RateLimits(1000, 10000, 100000)
+MODEL = "m"
+
+
+class BlockingClient:
+    """Sync fake SDK that blocks its thread and tracks concurrency per key."""
+    lock = threading.Lock()
+    running: Counter = Counter()
+    peak: Counter = Counter()
+    delay = 0.05
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    def embed(self, **kwargs):
+        with BlockingClient.lock:
+            BlockingClient.running[self.api_key] += 1
+            BlockingClient.peak[self.api_key] = max(
+                BlockingClient.peak[self.api_key], BlockingClient.running[self.api_key]
+            )
+        try:
+            time.sleep(BlockingClient.delay)
+        finally:
+            with BlockingClient.lock:
+                BlockingClient.running[self.api_key] -= 1
+        return {"key": self.api_key, "usage": {"total_tokens": 5}}
+
+    def stream(self, **kwargs):
+        for word in ("a", "b", "c"):
+            time.sleep(0.01)
+            yield {"text": word}
+        yield {"text": "", "usage": {"total_tokens": 11}}
+
+
+class AsyncClient:
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    async def embed(self, **kwargs):
+        return {}
+
+
+class TestKeySlots(unittest.TestCase):
+    """Test per-key in-flight counting."""
+
+    def test_saturation(self):
+        slots = KeySlots(cap=2)
+        slots.acquire("a")
+        self.assertEqual(slots.saturated(), set())
+        slots.acquire("a")
+        self.assertEqual(slots.saturated(), {"a"})
+        slots.release("a")
+        self.assertEqual(slots.in_flight("a"), 1)
+        self.assertEqual(slots.saturated(), set())
+
+    def test_invalid_config(self):
+        with self.assertRaises(ValueError):
+            OffloadConfig(max_in_flight_per_key=0)
+
+
+class TestOffloadedClient(unittest.TestCase):
+    """Test awaiting a sync client without blocking the event loop."""
+
+    def setUp(self):
+        BlockingClient.running.clear()
+        BlockingClient.peak.clear()
+        self.manager = make_manager("offload-test", KEYS)
+        self.client = create_rotating_client(
+            BlockingClient,
+            manager=self.manager,
+            limit_resolver=lambda m, k: LIMITS,
+            default_model=MODEL,
+            estimated_tokens=50,
+            offload=OffloadConfig(max_in_flight_per_key=2),
+        )
+
+    def _pending(self) -> int:
+        return sum(k.buckets[MODEL].pending_tokens for k in self.manager.keys)
+
+    def test_factory_returns_offloaded_client(self):
+        self.assertIsInstance(self.client, OffloadedAsyncRotatingClient)
+        with self.assertRaises(ValueError):
+            create_rotating_client(
+                AsyncClient,
+                manager=self.manager,
+                limit_resolver=lambda m, k: LIMITS,
+                default_model=MODEL,
+                offload=OffloadConfig(),
+            )
+
+    def test_calls_respect_per_key_caps_and_leave_loop_free(self):
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.005)
+
+        async def run():
+            tick_task = asyncio.ensure_future(ticker())
+            results = await asyncio.gather(*(self.client.embed(input=i) for i in range(12)))
+            tick_task.cancel()
+            await self.client.close()
+            return results
+
+        results = asyncio.run(run())
+
+        self.assertEqual(len(results), 12)
+        self.assertEqual(set(r["key"] for r in results), set(KEYS))
+        self.assertTrue(all(peak <= 2 for peak in BlockingClient.peak.values()))
+        # Blocking sleeps ran on worker threads, so the loop kept ticking
+        self.assertGreater(len(ticks), 10)
+        stats = self.manager.get_global_stats()
+        self.assertEqual(stats.total.total_requests, 12)
+        self.assertEqual(stats.total.total_tokens, 60)
+        self.assertEqual(self._pending(), 0)
+
+    def test_sync_stream_becomes_async(self):
+        async def run():
+            stream = await self.client.stream()
+            return [chunk["text"] async for chunk in stream]
+
+        self.assertEqual(asyncio.run(run()), ["a", "b", "c", ""])
+        self.assertEqual(self.manager.get_global_stats().total.total_tokens, 11)
+        self.assertEqual(self._pending(), 0)
+
+    def test_stream_holds_its_slot_until_read_or_closed(self):
+        def busy():
+            return sum(self.client._slots.in_flight(k) for k in KEYS)
+
+        async def run():
+            stream = await self.client.stream()
+            counts = []
+            async for _ in stream:
+                counts.append(busy())
+            counts.append(busy())
+
+            stream = await self.client.stream()
+            await stream.__anext__()
+            counts.append(busy())
+            await stream.aclose()
+            counts.append(busy())
+            return counts
+
+        self.assertEqual(asyncio.run(run()), [1, 1, 1, 1, 0, 1, 0])
+
+    def test_cancellation_settles_and_frees_slot_when_thread_finishes(self):
+        async def run():
+            task = asyncio.ensure_future(self.client.embed(input="x"))
+            while not sum(BlockingClient.running.values()):
+                await asyncio.sleep(0.001)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            busy = sum(self.client._slots.in_flight(k) for k in KEYS)
+            await self.client.close()
+            return busy
+
+        self.assertEqual(asyncio.run(run()), 1)
+        self.assertEqual(sum(self.client._slots.in_flight(k) for k in KEYS), 0)
+        self.assertEqual(self._pending(), 0)
+        self.assertEqual(self.manager.get_global_stats().total.total_requests, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,382 @@
+"""
+Tests for the pluggable state backends and the Redis-protocol backend.
+
+The Redis tests run against a small in-process RESP server that implements the
+commands RedisStateBackend sends, with the Lua script ported to Python. Set
+KEYCYCLE_TEST_REDIS_URL to also run them against a real server.
+"""
+import atexit
+import math
+import os
+import socketserver
+import threading
+import time
+import unittest
+import uuid
+from unittest.mock import MagicMock, patch
+
+from keycycle import MultiClientWrapper
+from keycycle.backends import InMemoryStateBackend, RedisStateBackend, RespClient, RespError, StateBackend
+from keycycle.backends.redis_state import SCRIPT, SCRIPT_SHA
+from keycycle.config.dataclasses import KeyUsage, RateLimits
+from keycycle.config.enums import RateLimitStrategy
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+
+KEYS = ["sk-redis-key-AAAAAAAA", "sk-redis-key-BBBBBBBB"]
+MODEL = "m"
+REAL_REDIS_URL = os.getenv("KEYCYCLE_TEST_REDIS_URL")
+
+
+class StandInRedis(socketserver.ThreadingTCPServer):
+    """Just enough of a Redis server for RedisStateBackend (script semantics ported to Python)."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.data = {}
+        self.scripts = set()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return "redis://127.0.0.1:%d/0" % self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def execute(self, args):
+        name, args = args[0].decode().upper(), args[1:]
+        with self.lock:
+            if name == "PING":
+                return "PONG"
+            if name == "GET":
+                return self.data.get(args[0])
+            if name == "SET":
+                if b"NX" in args[2:] and args[0] in self.data:
+                    return None
+                self.data[args[0]] = args[1]
+                return "OK"
+            if name == "SMEMBERS":
+                return sorted(self.data.get(args[0], set()))
+            if name in ("EVAL", "EVALSHA"):
+                if name == "EVALSHA":
+                    if args[0].decode() not in self.scripts:
+                        return RespError("NOSCRIPT No matching script. Please use EVAL.")
+                elif args[0] == SCRIPT.encode():
+                    self.scripts.add(SCRIPT_SHA)
+                else:
+                    return RespError("ERR stand-in only runs the keycycle script")
+                numkeys = int(args[1])
+                return self._script(args[2:2 + numkeys], args[2 + numkeys:])
+            return RespError("ERR unknown command %r" % name)
+
+    def _script(self, keys, argv):
+        bucket = self.data.setdefault(keys[0], {})
+        leases = self.data.setdefault(keys[2], {})
+        now, ttl, scope, client, op = float(argv[0]), float(argv[1]), argv[2], argv[3], argv[4].decode()
+        rings = (("m", 1, 60), ("h", 60, 60), ("d", 600, 144))
+
+        def trim():
+            for member, deadline in list(leases.items()):
+                if deadline <= now:
+                    del leases[member]
+                    bucket.pop(b"pending:" + member, None)
+
+        def pending():
+            trim()
+            return sum(bucket.get(b"pending:" + member, 0) for member in leases)
+
+        def add_pending(delta):
+            trim()
+            value = bucket.get(b"pending:" + client, 0) + delta
+            if value > 0:
+                bucket[b"pending:" + client], leases[client] = value, now + ttl
+            else:
+                bucket.pop(b"pending:" + client, None)
+                leases.pop(client, None)
+
+        def windows():
+            requests, tokens = [], []
+            for name, width, count in rings:
+                current = math.floor(now / width)
+                slots = [bucket.get(("%s%d" % (name, i)).encode()) for i in range(count)]
+                live = [s for s in slots if s and current - count < s[0] <= current]
+                requests.append(sum(s[1] for s in live))
+                tokens.append(sum(s[2] for s in live))
+            return requests, tokens
+
+        def add(used, ts):
+            for name, width, count in rings:
+                epoch = math.floor(ts / width)
+                if epoch > math.floor(now / width) - count:
+                    field = ("%s%d" % (name, epoch % count)).encode()
+                    old = bucket.get(field, (epoch, 0, 0))
+                    if old[0] < epoch:
+                        old = (epoch, 0, 0)
+                    if old[0] == epoch:
+                        bucket[field] = (epoch, old[1] + 1, old[2] + used)
+            bucket[b"total_requests"] = bucket.get(b"total_requests", 0) + 1
+            bucket[b"total_tokens"] = bucket.get(b"total_tokens", 0) + used
+
+        num = [float(a) for a in argv[5:]]
+        if op == "usage":
+            requests, tokens = windows()
+            return requests + tokens + [
+                pending(), bucket.get(b"total_requests", 0), bucket.get(b"total_tokens", 0)
+            ]
+        if op == "try_reserve":
+            estimate = num[0]
+            requests, tokens = windows()
+            p = pending()
+            for r in range(3):
+                if requests[r] >= num[1 + r]:
+                    return 0
+                if num[4 + r] > 0 and tokens[r] + p + estimate > num[4 + r]:
+                    return 0
+            add_pending(estimate)
+        elif op == "pending":
+            add_pending(num[0])
+        elif op == "commit":
+            add_pending(-num[0])
+            add(num[1], num[2])
+        elif op == "add":
+            add(num[0], num[1])
+        if scope:
+            self.data.setdefault(keys[1], set()).add(scope)
+        return 1
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            self.wfile.write(_encode(self.server.execute(args)))
+
+
+def _encode(value):
+    if isinstance(value, RespError):
+        return b"-%s\r\n" % str(value).encode()
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, (int, float)):
+        return b":%d\r\n" % int(value)
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(_encode(v) for v in value)
+
+
+def _make_manager(backend, history=None, strategy=RateLimitStrategy.PER_MODEL) -> RotatingKeyManager:
+    db = MagicMock()
+    db.load_provider_history.return_value = history or []
+    manager = RotatingKeyManager(
+        api_keys=KEYS, provider_name="redis-test", strategy=strategy, db=db, state_backend=backend,
+    )
+    atexit.unregister(manager.stop)
+    return manager
+
+
+class TestDefaultBackend(unittest.TestCase):
+    """Test that managers default to in-memory state."""
+
+    def test_in_memory_default(self):
+        manager = _make_manager(None)
+        self.assertIsInstance(manager.state_backend, InMemoryStateBackend)
+        self.assertIs(type(manager.keys[0]), KeyUsage)
+
+    def test_base_backend_shares_cooldowns(self):
+        class Cooldowns(InMemoryStateBackend):
+            key_usage = StateBackend.key_usage
+
+            def __init__(self):
+                self.marks = {}
+
+            def mark_cooldown(self, provider, api_key, timestamp):
+                self.marks[api_key] = timestamp
+
+            def last_cooldown(self, provider, api_key):
+                return self.marks.get(api_key, 0.0)
+
+        backend = Cooldowns()
+        first, second = _make_manager(backend), _make_manager(backend)
+        first.keys[0].trigger_cooldown()
+        self.assertTrue(second.keys[0].is_cooling_down(30))
+        self.assertEqual(second.get_key(MODEL, RateLimits(5, 50, 500), 10).api_key, KEYS[1])
+
+    @patch('keycycle.multi_client_wrapper.UsageDatabase')
+    def test_provider_env_config_selects_backend(self, mock_db_class):
+        from keycycle import ProviderEnvConfig
+        mock_db_class.return_value.load_provider_history.return_value = []
+        backend = InMemoryStateBackend()
+        env = {"NUM_ACME": "1", "ACME_API_KEY_1": KEYS[0]}
+        with patch.dict(os.environ, env):
+            wrapper = MultiClientWrapper.from_env({"acme": ProviderEnvConfig(state_backend=backend)})
+        manager = wrapper._managers["acme"]
+        atexit.unregister(manager.stop)
+        self.assertIs(manager.state_backend, backend)
+
+
+class _RedisBackendTests:
+    """Shared by the stand-in and real-server test cases."""
+    url = None
+
+    def setUp(self):
+        self.prefix = "kctest-" + uuid.uuid4().hex[:8]
+        self.backends = []
+        self.managers = []
+
+    def tearDown(self):
+        # Stop cleanup threads before the server goes away
+        for manager in self.managers:
+            manager._stop_event.set()
+        for backend in self.backends:
+            backend.close()
+
+    def _manager(self, backend, *args, **kwargs) -> RotatingKeyManager:
+        manager = _make_manager(backend, *args, **kwargs)
+        self.managers.append(manager)
+        return manager
+
+    def _backend(self, **kwargs) -> RedisStateBackend:
+        backend = RedisStateBackend(self.url, prefix=self.prefix, **kwargs)
+        self.backends.append(backend)
+        return backend
+
+    def test_usage_is_visible_to_other_managers(self):
+        first, second = self._manager(self._backend()), self._manager(self._backend())
+        limits = RateLimits(3, 100, 1000)
+
+        for _ in range(3):
+            key = first.get_key(MODEL, limits, 10)
+            first.record_usage(key, MODEL, 10, estimated_tokens=10)
+
+        self.assertEqual(second.get_headroom(MODEL, limits), 3)
+        self.assertEqual(second.get_key(MODEL, limits, 10).api_key, KEYS[1])
+        self.assertEqual(first.keys[1].buckets[MODEL].pending_tokens, 10)
+        snapshot = second.get_key_stats(0).total
+        self.assertEqual((snapshot.rpm, snapshot.tpm, snapshot.total_tokens), (3, 30, 30))
+
+    def test_global_strategy_and_cooldowns_are_shared(self):
+        first = self._manager(self._backend(), strategy=RateLimitStrategy.GLOBAL)
+        second = self._manager(self._backend(), strategy=RateLimitStrategy.GLOBAL)
+        limits = RateLimits(1, 100, 1000)
+
+        key = first.get_key("a", limits, 10)
+        first.record_usage(key, "a", 5, estimated_tokens=10)
+        self.assertEqual(second.get_key("b", limits, 10).api_key, KEYS[1])
+
+        second.keys[1].trigger_cooldown()
+        self.assertTrue(first.keys[1].is_cooling_down(30))
+
+    def test_only_the_first_manager_replays_history(self):
+        history = [("AAAAAAAA", MODEL, time.time() - 30, 50)] * 4
+        self._manager(self._backend(), history)
+        second = self._manager(self._backend(), history)
+
+        snapshot = second.get_key_stats(0).total
+        self.assertEqual((snapshot.rpm, snapshot.rph, snapshot.tpm), (4, 4, 200))
+        self.assertEqual(second.estimator.snapshot()[MODEL]["samples"], 4)
+
+    def test_token_limits_and_abandoned_reservations(self):
+        bucket = self._backend(pending_ttl=0.2).bucket("p", KEYS[0], MODEL)
+        limits = RateLimits(100, 1000, 10000, tokens_per_minute=250)
+        self.assertTrue(bucket.try_reserve(limits, 100))
+        self.assertTrue(bucket.try_reserve(limits, 100))
+        self.assertFalse(bucket.try_reserve(limits, 100))
+        time.sleep(0.3)
+        self.assertEqual(bucket.pending_tokens, 0)
+
+    def test_dead_clients_lease_expires_while_the_key_stays_busy(self):
+        dead = self._backend(pending_ttl=0.2).bucket("p", KEYS[0], MODEL)
+        busy = self._backend(pending_ttl=0.2).bucket("p", KEYS[0], MODEL)
+        dead.reserve(500)  # Never released: the host died
+        deadline = time.time() + 0.4
+        while time.time() < deadline:
+            busy.reserve(10)
+            busy.commit(10, 10, time.time())
+            time.sleep(0.02)
+        busy.reserve(10)
+        self.assertEqual(busy.pending_tokens, 10)
+
+    def test_concurrent_clients_never_overbook(self):
+        limits = RateLimits(1000, 10000, 100000, tokens_per_minute=5000)
+        won = []
+
+        def run():
+            key = self._backend().key_usage("race", KEYS[0], RateLimitStrategy.PER_MODEL)
+            count = 0
+            while key.try_reserve(MODEL, limits, 100):
+                count += 1
+            won.append(count)
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+        self.assertEqual(sum(won), 50)
+
+
+class TestRedisStandIn(_RedisBackendTests, unittest.TestCase):
+    """Run the Redis backend against the in-process stand-in server."""
+
+    def setUp(self):
+        self.server = StandInRedis()
+        self.url = self.server.url
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.server.stop()
+
+    def test_script_is_loaded_once(self):
+        backend = self._backend()
+        bucket = backend.bucket("p", KEYS[0], MODEL)
+        bucket.add(10, time.time())
+        self.assertIn(SCRIPT_SHA, self.server.scripts)
+        bucket.add(10, time.time())
+        self.assertEqual(bucket.total_requests, 2)
+        self.assertEqual(backend.scopes("p", KEYS[0]), [MODEL])
+        # Raw keys never reach the server
+        self.assertFalse(any(b"sk-redis" in k for k in self.server.data))
+
+
+@unittest.skipUnless(REAL_REDIS_URL, "KEYCYCLE_TEST_REDIS_URL not set")
+class TestRealRedis(_RedisBackendTests, unittest.TestCase):
+    """Run the same tests against a real Redis server."""
+    url = REAL_REDIS_URL
+
+
+class TestRespClient(unittest.TestCase):
+    """Test URL parsing and error replies."""
+
+    def test_url_and_errors(self):
+        client = RespClient("redis://:secret@cache:6380/2")
+        self.assertEqual((client.host, client.port, client.password, client.db), ("cache", 6380, "secret", 2))
+        with self.assertRaises(ValueError):
+            RespClient("http://cache")
+
+        server = StandInRedis()
+        try:
+            client = RespClient(server.url)
+            self.assertEqual(client.execute_command("PING"), "PONG")
+            with self.assertRaises(RespError):
+                client.execute_command("FLUSHALL")
+            client.close()
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+"""
+Tests for the response cache in front of the rotating clients.
+"""
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from conftest import make_manager
+from keycycle.adapters.generic_adapter import create_rotating_client
+from keycycle.cache.response_cache import ResponseCache, is_deterministic_call
+from keycycle.config.dataclasses import RateLimits
+
+KEY = "sk-cache-key-AAAAAAAA"
+LIMITS = RateLimits(10**6, 10**7, 10**8)
+MODEL = "m"
+
+
+class TestPolicy(unittest.TestCase):
+    """Test which calls count as deterministic."""
+
+    def test_default_policy(self):
+        self.assertTrue(is_deterministic_call(("embeddings", "create"), {"input": "x"}))
+        self.assertTrue(is_deterministic_call(("chat", "completions", "create"), {"temperature": 0}))
+        self.assertFalse(is_deterministic_call(("chat", "completions", "create"), {}))
+        self.assertFalse(is_deterministic_call(("chat", "completions", "create"), {"temperature": 0.7}))
+        self.assertFalse(is_deterministic_call(("chat", "completions", "create"), {"temperature": 0, "n": 3}))
+        self.assertFalse(is_deterministic_call(("embed",), {"stream": True}))
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test LRU, TTL and byte limits."""
+
+    def test_hit_returns_a_copy(self):
+        cache = ResponseCache()
+        cache.set("k", {"data": [1, 2]})
+        _, first = cache.get("k")
+        first["data"].append(3)
+        self.assertEqual(cache.get("k"), (True, {"data": [1, 2]}))
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("b"), (False, None))
+        self.assertEqual(cache.get("a"), (True, 1))
+        self.assertEqual(cache.stats().evictions, 1)
+
+    def test_byte_limit(self):
+        cache = ResponseCache(max_bytes=300)
+        self.assertFalse(cache.set("huge", "x" * 1000))
+        cache.set("a", "x" * 200)
+        cache.set("b", "y" * 200)
+        self.assertEqual(len(cache), 1)
+        self.assertLessEqual(cache.stats().bytes, 300)
+
+    def test_ttl_expiry(self):
+        cache = ResponseCache(ttl=0.05)
+        cache.set("k", 1)
+        time.sleep(0.08)
+        self.assertEqual(cache.get("k"), (False, None))
+        self.assertEqual(cache.stats().expirations, 1)
+
+    def test_unpicklable_response_is_skipped(self):
+        cache = ResponseCache()
+        self.assertFalse(cache.set("k", lambda: None))
+        self.assertEqual(cache.get("k"), (False, None))
+
+    def test_disk_tier_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "responses.db")
+            cache = ResponseCache(disk_path=path)
+            cache.set("k", {"vector": [0.1, 0.2]})
+            cache.close()
+
+            warm = ResponseCache(disk_path=path)
+            self.assertEqual(warm.get("k"), (True, {"vector": [0.1, 0.2]}))
+            self.assertEqual(warm.stats().disk_hits, 1)
+            # Promoted to memory
+            self.assertEqual(len(warm), 1)
+            warm.close()
+
+    def test_disk_hit_keeps_the_disk_expiry(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "responses.db")
+            cache = ResponseCache(ttl=0.2, disk_path=path)
+            cache.set("k", 1)
+            cache.close()
+            time.sleep(0.1)
+
+            warm = ResponseCache(ttl=0.2, disk_path=path)
+            self.assertEqual(warm.get("k"), (True, 1))
+            time.sleep(0.15)
+            self.assertEqual(warm.get("k"), (False, None))
+            warm.close()
+
+    def test_disk_read_error_is_a_miss(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(disk_path=os.path.join(tmp, "responses.db"))
+            # Any sqlite3.Error from the file must not reach the caller
+            cache._disk._conn.close()
+            self.assertEqual(cache.get("k"), (False, None))
+            self.assertEqual(cache.stats().misses, 1)
+
+
+class EmbedClient:
+    """Fake SDK counting upstream calls."""
+    calls = 0
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    def embed(self, **kwargs):
+        EmbedClient.calls += 1
+        return {"vector": [0.5], "usage": {"total_tokens": 4}}
+
+    def complete(self, **kwargs):
+        EmbedClient.calls += 1
+        return {"text": "hi", "usage": {"total_tokens": 9}}
+
+
+class AsyncEmbedClient(EmbedClient):
+    async def embed(self, **kwargs):
+        return EmbedClient.embed(self, **kwargs)
+
+
+class TestCachedClients(unittest.TestCase):
+    """Test that cache hits bypass key acquisition."""
+
+    def setUp(self):
+        EmbedClient.calls = 0
+        self.manager = make_manager("cache-test", [KEY])
+        self.cache = ResponseCache()
+
+    def _client(self, client_class, is_async=False):
+        return create_rotating_client(
+            client_class,
+            manager=self.manager,
+            limit_resolver=lambda m, k: LIMITS,
+            default_model=MODEL,
+            is_async=is_async,
+            estimated_tokens=100,
+            response_cache=self.cache,
+        )
+
+    def test_hits_use_no_rpm_or_tpm(self):
+        client = self._client(EmbedClient)
+        for _ in range(5):
+            self.assertEqual(client.embed(input="doc")["vector"], [0.5])
+
+        stats = self.manager.get_global_stats()
+        self.assertEqual(EmbedClient.calls, 1)
+        self.assertEqual(stats.total.total_requests, 1)
+        self.assertEqual(stats.total.total_tokens, 4)
+        self.assertEqual((stats.cache.hits, stats.cache.misses), (4, 1))
+
+    def test_non_deterministic_calls_are_not_cached(self):
+        client = self._client(EmbedClient)
+        client.complete(prompt="hi", temperature=0.7)
+        client.complete(prompt="hi", temperature=0.7)
+        client.complete(prompt="hi", temperature=0)
+        client.complete(prompt="hi", temperature=0)
+        self.assertEqual(EmbedClient.calls, 3)
+
+    def test_arguments_without_a_json_form_are_not_cached(self):
+        client = self._client(EmbedClient)
+        client.embed(input=object())
+        client.embed(input=object())
+        self.assertEqual(EmbedClient.calls, 2)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_async_client(self):
+        client = self._client(AsyncEmbedClient, is_async=True)
+
+        async def run():
+            for _ in range(3):
+                await client.embed(input="doc")
+
+        asyncio.run(run())
+        self.assertEqual(EmbedClient.calls, 1)
+        self.assertEqual(self.manager.get_global_stats().cache.hits, 2)
+
+    def test_no_cache_stats_without_cache(self):
+        self.assertIsNone(make_manager("cache-test", [KEY]).get_global_stats().cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+"""
+Tests for coalescing identical in-flight calls.
+"""
+import asyncio
+import threading
+import time
+import unittest
+
+from conftest import make_manager
+from keycycle.adapters.generic_adapter import create_rotating_client
+from keycycle.config.dataclasses import RateLimits
+from keycycle.core.single_flight import AsyncSingleFlight, SingleFlight, request_key
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+
+KEYS = ["sk-flight-key-AAAAAAAA", "sk-flight-key-BBBBBBBB"]
+LIMITS = RateLimits(10**6, 10**7, 10**8)
+MODEL = "m"
+
+
+def _requests(manager: RotatingKeyManager) -> int:
+    return manager.get_global_stats().total.total_requests
+
+
+class TestRequestKey(unittest.TestCase):
+    """Test the canonical call hash."""
+
+    def test_kwarg_order_does_not_matter(self):
+        a = request_key(("embeddings", "create"), (), {"input": "x", "model": "m"})
+        b = request_key(("embeddings", "create"), (), {"model": "m", "input": "x"})
+        self.assertEqual(a, b)
+
+    def test_path_and_args_matter(self):
+        base = request_key(("embeddings", "create"), (), {"input": "x"})
+        self.assertNotEqual(base, request_key(("chat", "create"), (), {"input": "x"}))
+        self.assertNotEqual(base, request_key(("embeddings", "create"), ("y",), {"input": "x"}))
+        self.assertNotEqual(base, request_key(("embeddings", "create"), (), {"input": "y"}))
+
+    def test_arguments_without_a_json_form_have_no_key(self):
+        self.assertIsNone(request_key(("files", "create"), (), {"file": object()}))
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test the sync and async coalescing primitives."""
+
+    def test_threads_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+        gate = threading.Event()
+
+        def slow():
+            calls.append(1)
+            gate.wait(1)
+            return "result"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        gate.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["result"] * 5)
+        self.assertEqual(flight.shared, 4)
+
+    def test_error_reaches_every_caller(self):
+        flight = AsyncSingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def run():
+            return await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+
+    def test_cancelled_waiter_does_not_cancel_shared_call(self):
+        flight = AsyncSingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        async def run():
+            first = asyncio.ensure_future(flight.do("k", slow))
+            second = asyncio.ensure_future(flight.do("k", slow))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        self.assertEqual(asyncio.run(run()), "done")
+
+
+class EmbedClient:
+    """Fake SDK counting upstream calls."""
+    calls = 0
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    def create(self, **kwargs):
+        type(self).calls += 1
+        time.sleep(0.05)
+        return {"usage": {"total_tokens": 5}}
+
+
+class AsyncEmbedClient:
+    """Async fake SDK counting upstream calls."""
+    calls = 0
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    async def create(self, **kwargs):
+        type(self).calls += 1
+        await asyncio.sleep(0.05)
+        return {"usage": {"total_tokens": 5}}
+
+    async def other(self, **kwargs):
+        type(self).calls += 1
+        await asyncio.sleep(0.05)
+        return {"usage": {"total_tokens": 5}}
+
+
+class TestCoalescingClients(unittest.TestCase):
+    """Test single-flight in the generic rotating clients."""
+
+    def setUp(self):
+        EmbedClient.calls = 0
+        AsyncEmbedClient.calls = 0
+        self.manager = make_manager("flight-test", KEYS)
+
+    def _client(self, client_class, **kwargs):
+        return create_rotating_client(
+            client_class,
+            manager=self.manager,
+            limit_resolver=lambda m, k: LIMITS,
+            default_model=MODEL,
+            estimated_tokens=100,
+            **kwargs,
+        )
+
+    def test_sync_identical_calls_share_one_request(self):
+        client = self._client(EmbedClient, single_flight=True)
+        threads = [threading.Thread(target=lambda: client.create(input="same")) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(EmbedClient.calls, 1)
+        self.assertEqual(_requests(self.manager), 1)
+
+    def test_async_identical_calls_share_one_request(self):
+        client = self._client(AsyncEmbedClient, single_flight=True)
+
+        async def run():
+            await asyncio.gather(*(client.create(input="same") for _ in range(6)))
+            await asyncio.gather(client.create(input="a"), client.create(input="b"))
+
+        asyncio.run(run())
+
+        self.assertEqual(AsyncEmbedClient.calls, 3)
+        self.assertEqual(_requests(self.manager), 3)
+
+    def test_only_configured_paths_coalesce(self):
+        client = self._client(AsyncEmbedClient, single_flight={"create"})
+
+        async def run():
+            await asyncio.gather(*(client.create(input="same") for _ in range(3)))
+            await asyncio.gather(*(client.other(input="same") for _ in range(3)))
+
+        asyncio.run(run())
+        self.assertEqual(AsyncEmbedClient.calls, 1 + 3)
+
+    def test_calls_without_a_json_form_are_not_coalesced(self):
+        client = self._client(AsyncEmbedClient, single_flight=True)
+
+        class Params:
+            # Same repr for different contents
+            def __init__(self, text):
+                self.text = text
+
+            def __repr__(self):
+                return "Params(...)"
+
+        async def run():
+            await asyncio.gather(client.create(input=Params("a")), client.create(input=Params("b")))
+
+        asyncio.run(run())
+        self.assertEqual(AsyncEmbedClient.calls, 2)
+
+    def test_disabled_by_default(self):
+        client = self._client(AsyncEmbedClient)
+
+        async def run():
+            await asyncio.gather(*(client.create(input="same") for _ in range(3)))
+
+        asyncio.run(run())
+        self.assertEqual(AsyncEmbedClient.calls, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
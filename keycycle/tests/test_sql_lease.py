@@ -0,0 +1,167 @@
+"""
+Tests for reservations coordinated across hosts through the usage database.
+"""
+import atexit
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from keycycle.backends import sql_lease
+from keycycle.backends.sql_lease import SqlLeaseBackend
+from keycycle.config.dataclasses import RateLimits
+from keycycle.config.enums import RateLimitStrategy
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+from keycycle.usage.db_logic import UsageDatabase
+
+KEYS = ["sk-lease-key-AAAAAAAA", "sk-lease-key-BBBBBBBB"]
+MODEL = "m"
+# Fixed clock in the middle of a minute, hour and day
+NOW = 1_700_000_030.0
+
+
+class _SqlTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.url = "sqlite:///" + os.path.join(self.tmp.name, "usage.db")
+        self.db = UsageDatabase(db_url=self.url)
+        self.backends = []
+
+    def tearDown(self):
+        for backend in self.backends:
+            atexit.unregister(backend.close)
+        self.db.engine.dispose()
+        self.tmp.cleanup()
+
+    def _backend(self, **kwargs) -> SqlLeaseBackend:
+        """A backend with its own engine, like a separate process would have."""
+        backend = SqlLeaseBackend(UsageDatabase(db_url=self.url), **kwargs)
+        self.backends.append(backend)
+        return backend
+
+    def _window(self, suffix, scope, width=60):
+        start = int(NOW // width) * width
+        return self.db.load_window_usage("p", suffix, scope, width, start)
+
+
+class TestWindowCounters(_SqlTestCase):
+    """Test the conditional updates on rate_windows."""
+
+    def test_capacity_is_claimed_until_full(self):
+        deltas = [(60, 60, 2, 100, 5, 250)]
+        self.assertTrue(self.db.lease_window_capacity("p", "k", "m", deltas))
+        self.assertTrue(self.db.lease_window_capacity("p", "k", "m", deltas))
+        # Tokens would reach 300 > 250: nothing is applied
+        self.assertFalse(self.db.lease_window_capacity("p", "k", "m", deltas))
+        self.assertEqual(self.db.load_window_usage("p", "k", "m", 60, 60), (4, 200))
+
+    def test_all_windows_or_none(self):
+        self.db.lease_window_capacity("p", "k", "m", [(3600, 0, 9, 0, 10, None)])
+        deltas = [(60, 60, 2, 0, 5, None), (3600, 0, 2, 0, 10, None)]
+        self.assertFalse(self.db.lease_window_capacity("p", "k", "m", deltas))
+        self.assertEqual(self.db.load_window_usage("p", "k", "m", 60, 60), (0, 0))
+
+        # Negative deltas hand capacity back without a limit check
+        self.assertTrue(self.db.lease_window_capacity("p", "k", "m", [(3600, 0, -4, 0, 10, None)]))
+        self.assertEqual(self.db.load_window_usage("p", "k", "m", 3600, 0), (5, 0))
+
+
+@patch.object(sql_lease.time, "time", return_value=NOW)
+class TestLeasedReservations(_SqlTestCase):
+    """Test leasing through the manager."""
+
+    def _manager(self, backend, strategy=RateLimitStrategy.PER_MODEL) -> RotatingKeyManager:
+        db = MagicMock()
+        db.load_provider_history.return_value = []
+        manager = RotatingKeyManager(
+            api_keys=KEYS, provider_name="p", strategy=strategy, db=db, state_backend=backend,
+        )
+        atexit.unregister(manager.stop)
+        return manager
+
+    def test_leases_limit_round_trips_and_hosts_share_capacity(self, _):
+        limits = RateLimits(10, 100, 1000)
+        first = self._manager(self._backend(lease_fraction=0.5))
+        second = self._manager(self._backend(lease_fraction=0.5))
+
+        with patch.object(
+            UsageDatabase, "lease_window_capacity", autospec=True,
+            side_effect=UsageDatabase.lease_window_capacity,
+        ) as claims:
+            for _ in range(5):
+                key = first.get_key(MODEL, limits, 10)
+                self.assertEqual(key.api_key, KEYS[0])
+                first.record_usage(key, MODEL, 10, estimated_tokens=10)
+            # One chunk of 5 requests served all five reservations
+            self.assertEqual(claims.call_count, 1)
+
+        self.assertEqual(self._window("AAAAAAAA", MODEL), (5, 50))
+        # The other host leases the remaining 5 on key A, then moves to key B
+        picked = [second.get_key(MODEL, limits, 10).api_key for _ in range(7)]
+        self.assertEqual(picked, [KEYS[0]] * 5 + [KEYS[1]] * 2)
+        self.assertEqual(self._window("AAAAAAAA", MODEL)[0], 10)
+
+    def test_falls_back_to_single_requests_when_nearly_full(self, _):
+        limits = RateLimits(3, 100, 1000)
+        backend = self._backend(lease_fraction=1.0)
+        first = self._manager(backend)
+        self.assertEqual(first.get_key(MODEL, limits, 10).api_key, KEYS[0])
+
+        second = self._manager(self._backend(lease_fraction=1.0))
+        # Key A is fully leased by the first host
+        self.assertEqual(second.get_key(MODEL, limits, 10).api_key, KEYS[1])
+
+        backend.close()
+        # The two unused requests went back, but a 3-request chunk no longer fits
+        self.assertEqual(self._window("AAAAAAAA", MODEL)[0], 1)
+        self.assertTrue(second.keys[0].try_reserve(MODEL, limits, 10))
+        self.assertEqual(self._window("AAAAAAAA", MODEL)[0], 2)
+
+    def test_token_overrun_is_charged_with_the_next_lease(self, _):
+        limits = RateLimits(100, 1000, 10000, tokens_per_minute=1000)
+        manager = self._manager(self._backend())
+        key = manager.get_key(MODEL, limits, 100)
+        self.assertEqual(self._window("AAAAAAAA", MODEL), (10, 100))
+
+        manager.record_usage(key, MODEL, 400, estimated_tokens=100)
+        manager.get_key(MODEL, limits, 100)
+        # Second lease: 9 leftover requests netted, 300 tokens of debt added
+        self.assertEqual(self._window("AAAAAAAA", MODEL), (11, 500))
+
+    def test_global_strategy_leases_per_key(self, _):
+        limits = RateLimits(2, 100, 1000)
+        first = self._manager(self._backend(lease_fraction=1.0), RateLimitStrategy.GLOBAL)
+        second = self._manager(self._backend(lease_fraction=1.0), RateLimitStrategy.GLOBAL)
+
+        self.assertEqual(first.get_key("a", limits, 10).api_key, KEYS[0])
+        self.assertEqual(second.get_key("b", limits, 10).api_key, KEYS[1])
+        self.assertEqual(self._window("AAAAAAAA", sql_lease.SQL_GLOBAL_SCOPE)[0], 2)
+
+    def test_concurrent_hosts_never_overbook(self, _):
+        limits = RateLimits(1000, 10000, 100000, tokens_per_minute=5000)
+        backends = [self._backend(lease_fraction=0.05) for _ in range(4)]
+        won = []
+
+        def run(backend):
+            key = backend.key_usage("p", KEYS[0], RateLimitStrategy.PER_MODEL)
+            count = 0
+            while key.try_reserve(MODEL, limits, 100):
+                count += 1
+            won.append(count)
+
+        threads = [threading.Thread(target=run, args=(b,)) for b in backends]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+
+        # 5000 TPM / 100 tokens: never more than 50 reservations across all hosts
+        self.assertLessEqual(sum(won), 50)
+        self.assertGreaterEqual(sum(won), 40)
+        self.assertLessEqual(self._window("AAAAAAAA", MODEL)[1], 5000)
+
+
+if __name__ == '__main__':
+    unittest.main()
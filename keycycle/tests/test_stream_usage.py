@@ -0,0 +1,220 @@
+"""
+Tests for incremental token accounting of streams without usage payloads.
+"""
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from conftest import make_manager
+from keycycle.adapters.generic_adapter import create_rotating_client
+from keycycle.config.dataclasses import RateLimits
+from keycycle.key_rotation.rotating_mixin import RotatingCredentialsMixin
+from keycycle.usage.stream_usage import (
+    StreamUsageAccumulator,
+    default_chunk_text_extractor,
+    estimate_request_tokens,
+    estimate_tokens_from_text,
+)
+
+KEY = "sk-stream-usage-AAAAAAAA"
+LIMITS = RateLimits(10**6, 10**7, 10**8)
+MODEL = "m"
+
+
+def _openai_chunk(text):
+    delta = SimpleNamespace(content=text)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+
+class TestEstimation(unittest.TestCase):
+    """Test the text-based estimators."""
+
+    def test_estimate_rounds_up(self):
+        self.assertEqual(estimate_tokens_from_text(""), 0)
+        self.assertEqual(estimate_tokens_from_text("abc"), 1)
+        self.assertEqual(estimate_tokens_from_text("abcdefghi"), 3)
+
+    def test_chunk_text_shapes(self):
+        self.assertEqual(default_chunk_text_extractor(_openai_chunk("hi")), "hi")
+        self.assertEqual(default_chunk_text_extractor({"choices": [{"text": "yo"}]}), "yo")
+        self.assertEqual(default_chunk_text_extractor({"delta": {"text": "ab"}}), "ab")
+        self.assertEqual(default_chunk_text_extractor({"text": "gem"}), "gem")
+        self.assertEqual(default_chunk_text_extractor({"usage": {"total_tokens": 3}}), "")
+
+    def test_request_tokens(self):
+        kwargs = {"messages": [{"role": "user", "content": "a" * 40}], "model": "m"}
+        self.assertEqual(estimate_request_tokens((), kwargs), 10)
+
+
+class TestAccumulator(unittest.TestCase):
+    """Test StreamUsageAccumulator top-ups and totals."""
+
+    def test_top_up_in_steps(self):
+        top_ups = []
+        acc = StreamUsageAccumulator(reserved_tokens=10, top_up=top_ups.append, top_up_step=8)
+        acc.add("a" * 40)  # 10 tokens: within the reservation
+        self.assertEqual(top_ups, [])
+        acc.add("a" * 4)  # 11 tokens: one step of 8
+        self.assertEqual(top_ups, [8])
+        acc.add("a" * 80)  # 31 tokens: the whole shortfall of 13
+        self.assertEqual(top_ups, [8, 13])
+        self.assertEqual(acc.reserved_tokens, 31)
+
+    def test_reported_usage_wins(self):
+        acc = StreamUsageAccumulator(prompt_tokens=5)
+        acc.add("a" * 400)
+        acc.add({"usage": {}}, reported_tokens=42)
+        self.assertEqual(acc.total_tokens, 42)
+
+
+class StreamClient:
+    """Sync fake SDK whose stream never reports usage."""
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    def stream(self, **kwargs):
+        return iter([_openai_chunk("x" * 400) for _ in range(10)])
+
+
+class TestAdapterStreamUsage(unittest.TestCase):
+    """Test that generic adapter streams count tokens as they arrive."""
+
+    def setUp(self):
+        self.manager = make_manager("stream-usage-test", [KEY])
+        self.client = create_rotating_client(
+            StreamClient,
+            manager=self.manager,
+            limit_resolver=lambda m, k: LIMITS,
+            default_model=MODEL,
+            is_async=False,
+            estimated_tokens=100,
+        )
+        self.bucket = self.manager.keys[0].buckets[MODEL]
+
+    def test_reservation_grows_mid_stream(self):
+        stream = self.client.stream(messages=[{"role": "user", "content": "a" * 400}])
+        pending = []
+        for _ in stream:
+            pending.append(self.bucket.pending_tokens)
+
+        # 100-token prompt plus 100 tokens per chunk outgrows the 100 reserved
+        self.assertGreater(pending[-1], 100)
+        self.assertGreaterEqual(pending[-1], 100 + 100 * 10)
+        self.assertEqual(self.bucket.pending_tokens, 0)
+        self.assertEqual(self.bucket.total_tokens, 1100)
+
+    def test_custom_estimator(self):
+        client = create_rotating_client(
+            StreamClient,
+            manager=self.manager,
+            limit_resolver=lambda m, k: LIMITS,
+            default_model=MODEL,
+            is_async=False,
+            estimated_tokens=100,
+            token_estimator=lambda text: 1,
+        )
+        list(client.stream())
+        self.assertEqual(self.bucket.total_tokens, 10)
+        self.assertEqual(self.bucket.pending_tokens, 0)
+
+
+class TestOpenAIStreamUsageInjection(unittest.TestCase):
+    """Test stream_options injection and usage-chunk stripping in the OpenAI adapter."""
+
+    def _client(self, **kwargs):
+        from keycycle.adapters.openai_adapter import RotatingOpenAIClient
+
+        self.manager = make_manager("stream-usage-test", [KEY])
+        self.sent = []
+        client = RotatingOpenAIClient(
+            manager=self.manager,
+            limit_resolver=lambda m, k: LIMITS,
+            default_model=MODEL,
+            estimated_tokens=100,
+            provider="openai",
+            **kwargs,
+        )
+
+        def fake_create(**call_kwargs):
+            self.sent.append(call_kwargs)
+            chunks = [_openai_chunk("hello"), _openai_chunk(" world")]
+            if (call_kwargs.get("stream_options") or {}).get("include_usage"):
+                chunks.append(SimpleNamespace(choices=[], usage=SimpleNamespace(total_tokens=17)))
+            return iter(chunks)
+
+        client._get_target = lambda api_key, path: fake_create
+        return client
+
+    def _tokens(self):
+        return self.manager.keys[0].buckets[MODEL].total_tokens
+
+    def test_injected_usage_chunk_is_hidden(self):
+        client = self._client()
+        chunks = list(client.chat.completions.create(stream=True, messages=[]))
+
+        self.assertEqual(self.sent[0]["stream_options"], {"include_usage": True})
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(self._tokens(), 17)
+
+    def test_requested_usage_chunk_is_kept(self):
+        client = self._client()
+        chunks = list(client.chat.completions.create(
+            stream=True, messages=[], stream_options={"include_usage": True}
+        ))
+
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(self._tokens(), 17)
+
+    def test_other_stream_options_are_preserved(self):
+        client = self._client()
+        list(client.chat.completions.create(
+            stream=True, messages=[], stream_options={"include_obfuscation": False}
+        ))
+
+        self.assertEqual(
+            self.sent[0]["stream_options"], {"include_obfuscation": False, "include_usage": True}
+        )
+
+    def test_injection_disabled_falls_back_to_estimate(self):
+        client = self._client(inject_stream_usage=False)
+        chunks = list(client.chat.completions.create(stream=True, messages=[]))
+
+        self.assertNotIn("stream_options", self.sent[0])
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(self._tokens(), 4)  # "hello" + " world" at 4 chars per token
+
+
+class FakeModel:
+    """Stands in for an agno model class whose stream has no usage."""
+
+    def invoke_stream(self, *args, **kwargs):
+        for _ in range(5):
+            yield SimpleNamespace(content="y" * 80, response_usage=None)
+
+
+class RotatingFakeModel(RotatingCredentialsMixin, FakeModel):
+    pass
+
+
+class TestMixinStreamUsage(unittest.TestCase):
+    """Test that the agno mixin records estimated stream usage."""
+
+    def test_estimate_replaces_flat_fallback(self):
+        manager = make_manager("stream-usage-test", [KEY])
+        wrapper = MagicMock()
+        wrapper.manager = manager
+        wrapper.get_key_usage.side_effect = lambda model_id, estimated_tokens, **kw: (
+            manager.get_key(model_id, LIMITS, estimated_tokens)
+        )
+        model = RotatingFakeModel(model_id=MODEL, wrapper=wrapper, rotating_estimated_tokens=50)
+
+        list(model.invoke_stream())
+
+        bucket = manager.keys[0].buckets[MODEL]
+        self.assertEqual(bucket.total_tokens, 100)
+        self.assertEqual(bucket.pending_tokens, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Tests for streaming history out of the database while hydrating.
+"""
+import atexit
+import os
+import random
+import tempfile
+import time
+import unittest
+import uuid
+from unittest.mock import patch
+
+from keycycle.backends.base import InMemoryStateBackend
+from keycycle.config.dataclasses import KeyUsage
+from keycycle.config.enums import RateLimitStrategy
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+from keycycle.usage.db_logic import UsageDatabase
+from keycycle.usage.token_estimator import ReservationEstimator
+
+KEYS = ["sk-stream-key-AAAAAAAA", "sk-stream-key-BBBBBBBB"]
+
+
+class TestStreamingHydration(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = UsageDatabase(db_url="sqlite:///" + os.path.join(tmp.name, "usage.db"))
+        self.addCleanup(self.db.engine.dispose)
+
+    def _fill(self, count):
+        rng = random.Random(5)
+        now = time.time()
+        self.db.save_usage_rows([
+            {
+                "provider": "p", "model": rng.choice(["a", "b"]), "api_key_suffix": rng.choice(["AAAAAAAA", "BBBBBBBB"]),
+                "timestamp": now - rng.uniform(0, 7200), "tokens": rng.randint(1, 50),
+                "writer_id": "w", "record_id": uuid.uuid4().hex,
+            }
+            for _ in range(count)
+        ])
+
+    def _manager(self, backend=None) -> RotatingKeyManager:
+        manager = RotatingKeyManager(
+            api_keys=KEYS, provider_name="p", strategy=RateLimitStrategy.PER_MODEL, db=self.db,
+            state_backend=backend,
+        )
+        atexit.unregister(manager.stop)
+        self.addCleanup(manager.usage_logger.stop)
+        self.addCleanup(manager._stop_event.set)
+        return manager
+
+    def test_chunked_history_is_an_iterator_over_the_same_rows(self):
+        self._fill(20)
+        streamed = self.db.load_provider_history("p", 86400, chunk_size=3)
+        self.assertNotIsInstance(streamed, list)
+        self.assertEqual([tuple(r) for r in streamed], [tuple(r) for r in self.db.load_provider_history("p", 86400)])
+
+    def test_small_chunks_give_the_same_windows(self):
+        self._fill(500)
+        whole = self._manager()
+
+        sizes = []
+        original = KeyUsage.record_history
+
+        def spy(key, history):
+            sizes.append(sum(len(entries) for entries in history.values()))
+            return original(key, history)
+
+        with patch("keycycle.key_rotation.rotation_manager.HISTORY_CHUNK_ROWS", 7), \
+                patch.object(KeyUsage, "record_history", spy):
+            chunked = self._manager()
+        self.assertLessEqual(max(sizes), 7)
+        for index in range(len(KEYS)):
+            self.assertEqual(chunked.get_key_stats(index).total, whole.get_key_stats(index).total)
+
+    def test_empty_history_does_not_claim_hydration(self):
+        backend = InMemoryStateBackend()
+        with patch.object(backend, "claim_hydration", wraps=backend.claim_hydration) as claim:
+            self._manager(backend)
+        claim.assert_not_called()
+
+
+class TestChunkedSeeding(unittest.TestCase):
+    def test_chunks_match_one_call(self):
+        values = [random.Random(9).randint(1, 900) for _ in range(1000)]
+        whole, chunked = ReservationEstimator(), ReservationEstimator()
+        whole.seed_many("m", values)
+        for start in range(0, len(values), 37):
+            chunked.seed_many("m", values[start:start + 37])
+        w, c = whole.snapshot()["m"], chunked.snapshot()["m"]
+        self.assertEqual(w["samples"], c["samples"])
+        self.assertAlmostEqual(w["typical_tokens"], c["typical_tokens"], delta=w["typical_tokens"] * 1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
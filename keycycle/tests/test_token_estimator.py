@@ -0,0 +1,120 @@
+"""
+Tests for learned per-model token reservations.
+"""
+import atexit
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from keycycle.adapters.generic_adapter import create_rotating_client
+from keycycle.config.dataclasses import RateLimits
+from keycycle.config.enums import RateLimitStrategy
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+from keycycle.usage.token_estimator import ReservationEstimator, TokenEstimate
+
+KEY = "sk-estimate-key-AAAAAAAA"
+LIMITS = RateLimits(10**6, 10**7, 10**8)
+MODEL = "m"
+
+
+def _make_manager(history=None) -> RotatingKeyManager:
+    db = MagicMock()
+    db.load_provider_history.return_value = history or []
+    manager = RotatingKeyManager(
+        api_keys=[KEY],
+        provider_name="estimate-test",
+        strategy=RateLimitStrategy.PER_MODEL,
+        db=db,
+    )
+    atexit.unregister(manager.stop)
+    return manager
+
+
+def _messages(chars: int) -> dict:
+    return {"messages": [{"role": "user", "content": "a" * chars}]}
+
+
+class TestReservationEstimator(unittest.TestCase):
+    """Test predictions before and after learning."""
+
+    def test_unknown_shape_uses_default(self):
+        estimator = ReservationEstimator(default_tokens=700)
+        self.assertEqual(estimator.estimate(MODEL, (), {"input_id": 3}).tokens, 700)
+        self.assertEqual(estimator.estimate(MODEL, default_tokens=50).tokens, 50)
+
+    def test_max_tokens_bounds_the_first_reservation(self):
+        estimator = ReservationEstimator(default_tokens=1000)
+        estimate = estimator.estimate(MODEL, (), {**_messages(400), "max_tokens": 50})
+        self.assertEqual(estimate, TokenEstimate(150, 150, True))
+
+    def test_ratio_is_learned(self):
+        estimator = ReservationEstimator(min_samples=3, headroom=1.0)
+        kwargs = {**_messages(400), "max_tokens": 100}
+        for _ in range(3):
+            estimate = estimator.estimate(MODEL, (), kwargs)
+            estimator.observe(MODEL, estimate, 120)  # 60% of prompt + max_tokens
+
+        self.assertEqual(estimator.estimate(MODEL, (), kwargs).tokens, 120)
+        # A prompt twice as long reserves twice as much
+        self.assertEqual(estimator.estimate(MODEL, (), {**_messages(800), "max_tokens": 200}).tokens, 240)
+
+    def test_typical_usage_replaces_default(self):
+        estimator = ReservationEstimator(default_tokens=1000, min_samples=2, headroom=1.0)
+        estimator.seed(MODEL, 200)
+        estimator.seed(MODEL, 200)
+        self.assertEqual(estimator.estimate(MODEL).tokens, 200)
+        self.assertEqual(estimator.estimate("other").tokens, 1000)
+
+    def test_zero_usage_is_ignored(self):
+        estimator = ReservationEstimator(min_samples=1)
+        estimator.observe(MODEL, None, 0)
+        self.assertEqual(estimator.snapshot(), {})
+
+
+class TestManagerLearning(unittest.TestCase):
+    """Test seeding from history and learning in record_usage."""
+
+    def test_hydrate_seeds_typical_usage(self):
+        now = time.time()
+        history = [("AAAAAAAA", MODEL, now, 300)] * 10
+        manager = _make_manager(history)
+        self.assertAlmostEqual(manager.estimator.snapshot()[MODEL]["typical_tokens"], 300)
+
+    def test_adaptive_client_packs_reservations(self):
+        manager = _make_manager()
+
+        class Client:
+            def __init__(self, api_key):
+                self.api_key = api_key
+
+            def create(self, **kwargs):
+                return {"usage": {"total_tokens": 30}}
+
+        client = create_rotating_client(
+            Client,
+            manager=manager,
+            limit_resolver=lambda m, k: LIMITS,
+            default_model=MODEL,
+            estimated_tokens=1000,
+            adaptive_estimates=True,
+        )
+        reserved = []
+        original = manager.get_key
+
+        def spy(model_id, limits, estimated_tokens, **kw):
+            reserved.append(estimated_tokens)
+            return original(model_id, limits, estimated_tokens, **kw)
+
+        manager.get_key = spy
+        for _ in range(10):
+            client.create(**_messages(100))
+
+        # 25 predicted tokens, 30 actual: reservations converge near 30, not 1000
+        self.assertEqual(reserved[0], 1000)
+        self.assertLess(reserved[-1], 40)
+        self.assertGreaterEqual(reserved[-1], 30)
+        self.assertEqual(manager.keys[0].buckets[MODEL].pending_tokens, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
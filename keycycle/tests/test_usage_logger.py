@@ -0,0 +1,151 @@
+"""
+Tests for AsyncUsageLogger batching, queue bounds and counters.
+"""
+import atexit
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from keycycle.config.enums import QueueOverflow
+from keycycle.usage.usage_logger import AsyncUsageLogger, UsageLogConfig
+
+KEY = "sk-logger-key-AAAAAAAA"
+
+
+class FakeDb:
+    """Records every batch; blocks writes while `gate` is clear and fails them while `down` is set."""
+
+    def __init__(self):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.down = threading.Event()
+
+    def save_usage_rows(self, batch):
+        self.gate.wait(5)
+        if self.down.is_set():
+            raise ConnectionError("database unavailable")
+        self.batches.append(list(batch))
+
+    def save_usage_rows_once(self, batch):
+        self.save_usage_rows(batch)
+        return len(batch)
+
+    @property
+    def rows(self):
+        return sum(len(b) for b in self.batches)
+
+
+class TestUsageLogger(unittest.TestCase):
+    def _logger(self, **config) -> AsyncUsageLogger:
+        self.db = FakeDb()
+        logger = AsyncUsageLogger(self.db, writer_id="w", config=UsageLogConfig(**config))
+        atexit.unregister(logger.stop)
+        self.addCleanup(logger.stop)
+        self.addCleanup(self.db.gate.set)
+        return logger
+
+    def _wait_for(self, condition, timeout=5.0):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def test_size_trigger_batches_rows(self):
+        logger = self._logger(max_batch_size=10, max_latency=60)
+        self.db.gate.clear()
+        for _ in range(25):
+            logger.log("p", "m", KEY, 5)
+        self.db.gate.set()
+        self._wait_for(lambda: self.db.rows >= 20)
+        self.assertTrue(all(len(b) <= 10 for b in self.db.batches))
+        # The remaining five wait for more rows or the latency deadline
+        logger.stop()
+        self.assertEqual(self.db.rows, 25)
+        self.assertEqual(self.db.batches[0][0]["api_key_suffix"], "AAAAAAAA")
+        self.assertEqual(self.db.batches[0][0]["writer_id"], "w")
+
+    def test_latency_trigger_flushes_partial_batch(self):
+        logger = self._logger(max_batch_size=1000, max_latency=0.05)
+        for _ in range(3):
+            logger.log("p", "m", KEY, 5)
+        self._wait_for(lambda: self.db.rows == 3)
+        self.assertEqual(len(self.db.batches), 1)
+
+    def test_byte_trigger(self):
+        logger = self._logger(max_batch_size=1000, max_latency=60, max_batch_bytes=1)
+        logger.log("p", "m", KEY, 5)
+        logger.log("p", "m", KEY, 5)
+        self._wait_for(lambda: self.db.rows == 2)
+        self.assertEqual([len(b) for b in self.db.batches], [1, 1])
+
+    def test_drop_oldest_keeps_queue_bounded(self):
+        logger = self._logger(max_batch_size=1, max_latency=0, max_queue_size=5)
+        self.db.gate.clear()
+        logger.log("p", "m", KEY, 0)
+        self._wait_for(lambda: logger.queue.empty())  # writer now blocked on row 0
+        for tokens in range(1, 21):
+            logger.log("p", "m", KEY, tokens)
+        self.assertEqual(logger.queue.qsize(), 5)
+        self.db.gate.set()
+        logger.stop()
+
+        self.assertEqual([b[0]["tokens"] for b in self.db.batches], [0, 16, 17, 18, 19, 20])
+        stats = logger.stats()
+        self.assertEqual((stats.enqueued, stats.written, stats.dropped), (21, 6, 15))
+        self.assertEqual(stats.flushes, 6)
+        self.assertEqual(stats.rows_per_flush, 1.0)
+
+    def test_block_applies_backpressure(self):
+        logger = self._logger(max_batch_size=1, max_latency=0, max_queue_size=2, overflow="block")
+        self.assertIs(logger.config.overflow, QueueOverflow.BLOCK)
+        self.db.gate.clear()
+        logger.log("p", "m", KEY, 0)
+        self._wait_for(lambda: logger.queue.empty())
+        logger.log("p", "m", KEY, 1)
+        logger.log("p", "m", KEY, 2)
+
+        done = threading.Event()
+        threading.Thread(target=lambda: (logger.log("p", "m", KEY, 3), done.set()), daemon=True).start()
+        self.assertFalse(done.wait(0.2))
+        self.db.gate.set()
+        self.assertTrue(done.wait(5))
+        logger.stop()
+        self.assertEqual(self.db.rows, 4)
+        self.assertEqual(logger.stats().dropped, 0)
+
+    def test_failed_batch_is_retried(self):
+        logger = self._logger(max_batch_size=10, max_latency=0)
+        self.db.down.set()
+        logger.log("p", "m", KEY, 5)
+        self._wait_for(lambda: logger.stats().failed_flushes >= 1)
+        self.db.down.clear()
+        logger.stop()  # wakes the retry wait; the retry succeeds
+        stats = logger.stats()
+        self.assertEqual((stats.written, stats.dropped), (1, 0))
+
+    def test_batch_is_dropped_after_max_attempts(self):
+        logger = self._logger(max_batch_size=10, max_latency=0, max_attempts=2)
+        self.db.down.set()
+        with patch("keycycle.usage.usage_logger.USAGE_LOG_RETRY_SECONDS", 0.01):
+            logger.log("p", "m", KEY, 5)
+            self._wait_for(lambda: logger.stats().dropped == 1)
+        self.assertEqual(logger.stats().failed_flushes, 2)
+        # The writer moves on to later rows
+        self.db.down.clear()
+        logger.log("p", "m", KEY, 5)
+        logger.stop()
+        self.assertEqual(logger.stats().written, 1)
+
+    def test_invalid_config(self):
+        with self.assertRaises(ValueError):
+            UsageLogConfig(max_queue_size=0)
+        with self.assertRaises(ValueError):
+            UsageLogConfig(overflow="spill")
+        with self.assertRaises(ValueError):
+            UsageLogConfig(max_attempts=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+Tests for the per-minute usage_rollups table and hydrating from it.
+"""
+import sqlite3
+import time
+import unittest
+import uuid
+
+from sqlalchemy import delete, select
+
+from conftest import UsageDbTestCase, make_manager
+from keycycle.usage.db_logic import UsageDatabase
+
+KEYS = ["sk-rollup-key-AAAAAAAA", "sk-rollup-key-BBBBBBBB"]
+MODEL = "m"
+
+
+def _row(ts, tokens=10, suffix="AAAAAAAA", provider="p"):
+    return {
+        "provider": provider, "model": MODEL, "api_key_suffix": suffix, "timestamp": ts,
+        "tokens": tokens, "writer_id": "w", "record_id": uuid.uuid4().hex,
+    }
+
+
+class _DbTestCase(UsageDbTestCase):
+    def _rollups(self, db):
+        t = db.usage_rollups
+        with db.engine.connect() as conn:
+            return conn.execute(select(t.c.minute, t.c.requests, t.c.tokens).order_by(t.c.minute)).all()
+
+
+class TestRollupWrites(_DbTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db = UsageDatabase(db_url=self.url)
+        self.addCleanup(self.db.engine.dispose)
+
+    def test_batches_add_to_minute_rows(self):
+        minute = 1_700_000_040
+        self.db.save_usage_rows([_row(minute + 1), _row(minute + 59, tokens=5), _row(minute + 60)])
+        self.db.save_usage_rows([_row(minute + 30, tokens=1)])
+        self.assertEqual(self._rollups(self.db), [(minute, 3, 16), (minute + 60, 1, 10)])
+
+    def test_replayed_rows_are_rolled_up_once(self):
+        rows = [_row(1_700_000_040), _row(1_700_000_041)]
+        self.assertEqual(self.db.save_usage_rows_once(rows), 2)
+        self.assertEqual(self.db.save_usage_rows_once(rows), 0)
+        self.assertEqual(self._rollups(self.db), [(1_700_000_040, 2, 20)])
+
+    def test_prune_keeps_rollups_longer_than_raw_rows(self):
+        old = time.time() - 2 * 86400
+        self.db.save_usage_rows([_row(old)])
+        self.db.prune_old_records(days_retention=3, raw_days_retention=1)
+        with self.db.engine.connect() as conn:
+            self.assertEqual(conn.execute(select(self.db.usage_logs.c.id)).all(), [])
+        self.assertEqual(len(self._rollups(self.db)), 1)
+
+
+class TestRollupBackfill(_DbTestCase):
+    def test_existing_rows_are_backfilled(self):
+        now = time.time()
+        minute = int(now // 60) * 60 - 600
+        conn = sqlite3.connect(self.path)
+        conn.execute(
+            "CREATE TABLE usage_logs (id INTEGER PRIMARY KEY, provider VARCHAR(100), model VARCHAR(100), "
+            "api_key_suffix VARCHAR(50), timestamp FLOAT, tokens INTEGER)"
+        )
+        for ts, tokens in ((minute + 5, 3), (minute + 50, 4), (now - 2 * 86400, 100)):
+            conn.execute("INSERT INTO usage_logs (provider, model, api_key_suffix, timestamp, tokens) "
+                         "VALUES ('p', 'm', 'AAAAAAAA', ?, ?)", (ts, tokens))
+        conn.commit()
+        conn.close()
+
+        db = UsageDatabase(db_url=self.url)
+        self.assertEqual(self._rollups(db), [(minute, 2, 7)])
+        db.engine.dispose()
+        # Opening again does not backfill a second time
+        db = UsageDatabase(db_url=self.url)
+        self.assertEqual(self._rollups(db), [(minute, 2, 7)])
+        db.engine.dispose()
+
+
+class TestRollupHydration(_DbTestCase):
+    def test_hydrates_from_rollups_and_recent_rows(self):
+        db = UsageDatabase(db_url=self.url)
+        now = time.time()
+        db.save_usage_rows(
+            [_row(now - 7200, tokens=100)]
+            + [_row(now - 1800, tokens=10) for _ in range(3)]
+            + [_row(now - 10, tokens=1) for _ in range(2)]
+            + [_row(now - 1800, suffix="BBBBBBBB")]
+        )
+        # Raw rows older than a few minutes are no longer needed
+        with db.engine.begin() as conn:
+            conn.execute(delete(db.usage_logs).where(db.usage_logs.c.timestamp < now - 300))
+
+        manager = make_manager("p", KEYS, db=db)
+        self.addCleanup(manager.usage_logger.stop)
+        self.addCleanup(manager._stop_event.set)
+
+        stats = manager.get_key_stats(0).total
+        self.assertEqual((stats.rpm, stats.rph, stats.rpd), (2, 5, 6))
+        self.assertEqual((stats.tpm, stats.tph, stats.tpd), (2, 32, 132))
+        self.assertEqual(manager.get_key_stats(1).total.rpd, 1)
+
+    def test_row_on_the_rollup_boundary_is_counted(self):
+        db = UsageDatabase(db_url=self.url)
+        # The first second not covered by rollups when hydrating now
+        boundary = int((time.time() - 60) // 60) * 60
+        db.save_usage_rows([_row(boundary, tokens=7)])
+
+        manager = make_manager("p", KEYS, db=db)
+        self.addCleanup(manager.usage_logger.stop)
+        self.addCleanup(manager._stop_event.set)
+
+        stats = manager.get_key_stats(0).total
+        self.assertEqual((stats.rpd, stats.tpd), (1, 7))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+"""
+Tests for the local usage spool used while the database is unreachable.
+"""
+import atexit
+import json
+import os
+import tempfile
+import time
+import unittest
+import uuid
+from unittest.mock import patch
+
+from sqlalchemy import func, select
+
+from keycycle.usage.db_logic import UsageDatabase
+from keycycle.usage.usage_logger import AsyncUsageLogger, UsageLogConfig
+from keycycle.usage.usage_spool import HAS_FCNTL, UsageSpool
+
+KEY = "sk-spool-key-AAAAAAAA"
+
+
+def _rows(count, tokens=5):
+    return [
+        {"provider": "p", "model": "m", "api_key_suffix": "AAAAAAAA", "timestamp": time.time(),
+         "tokens": tokens, "writer_id": "w", "record_id": uuid.uuid4().hex}
+        for _ in range(count)
+    ]
+
+
+class TestUsageSpool(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_records_survive_reopen(self):
+        spool = UsageSpool.claim(self.tmp.name)
+        first, second = _rows(2), _rows(3)
+        spool.append(first)
+        spool.append(second)
+        spool.close()
+
+        spool = UsageSpool.claim(self.tmp.name)
+        self.assertTrue(spool.pending)
+        self.assertEqual([rows for _, rows in spool.records()], [first, second])
+        spool.clear()
+        self.assertFalse(spool.pending)
+        spool.close()
+
+    def test_torn_record_is_cut_off(self):
+        spool = UsageSpool.claim(self.tmp.name)
+        kept = _rows(1)
+        spool.append(kept)
+        path = spool.path
+        spool.close()
+        with open(path, "ab") as f:
+            f.write(b"\x40\x00\x00\x00\x00\x00\x00\x00{\"half")
+
+        spool = UsageSpool.claim(self.tmp.name)
+        self.assertEqual([rows for _, rows in spool.records()], [kept])
+        more = _rows(1)
+        spool.append(more)
+        self.assertEqual([rows for _, rows in spool.records()], [kept, more])
+        spool.close()
+
+    @unittest.skipUnless(HAS_FCNTL, "needs flock")
+    def test_live_spool_is_not_shared(self):
+        first = UsageSpool.claim(self.tmp.name)
+        second = UsageSpool.claim(self.tmp.name)
+        self.assertNotEqual(first.path, second.path)
+        first.close()
+        third = UsageSpool.claim(self.tmp.name)
+        self.assertEqual(third.path, first.path)
+        second.close()
+        third.close()
+
+
+class TestSpooledLogger(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.spool_dir = os.path.join(self.tmp.name, "spool")
+        self.db = UsageDatabase(db_url="sqlite:///" + os.path.join(self.tmp.name, "usage.db"))
+        self.addCleanup(self.db.engine.dispose)
+
+    def _count(self):
+        with self.db.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(self.db.usage_logs)).scalar()
+
+    def _logger(self, **config) -> AsyncUsageLogger:
+        logger = AsyncUsageLogger(
+            self.db, writer_id="w", config=UsageLogConfig(max_latency=0, spool_dir=self.spool_dir, **config)
+        )
+        atexit.unregister(logger.stop)
+        self.addCleanup(logger.stop)
+        return logger
+
+    def test_outage_rows_are_spooled_and_replayed(self):
+        logger = self._logger()
+        logger._next_replay = float("inf")
+        original = logger._write
+
+        def failing(batch):
+            raise ConnectionError("database unavailable")
+        logger._write = failing
+        logger.log("p", "m", KEY, 1)
+        deadline = time.time() + 5
+        while logger.stats().spooled < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        # Later rows follow the spooled batch even once writes would succeed again
+        logger._write = original
+        logger.log("p", "m", KEY, 2)
+        while logger.stats().spooled < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self._count(), 0)
+
+        logger._next_replay = 0
+        logger.stop()
+        stats = logger.stats()
+        self.assertEqual((stats.spooled, stats.replayed, stats.written, stats.dropped), (2, 2, 2, 0))
+        with self.db.engine.connect() as conn:
+            tokens = conn.execute(select(self.db.usage_logs.c.tokens).order_by(self.db.usage_logs.c.id)).scalars()
+            self.assertEqual(list(tokens), [1, 2])
+
+    def test_replay_after_restart_is_idempotent(self):
+        rows = _rows(4)
+        spool = UsageSpool.claim(self.spool_dir)
+        spool.append(rows[:2])
+        spool.append(rows[2:])
+        spool.close()
+        # The first batch had in fact been stored before the process died
+        self.assertEqual(self.db.save_usage_rows_once(rows[:2]), 2)
+
+        logger = self._logger()
+        logger.stop()
+        self.assertEqual(self._count(), 4)
+        self.assertEqual(logger.stats().replayed, 4)
+        self.assertEqual(os.path.getsize(os.path.join(self.spool_dir, "usage-0.spool")), 0)
+
+    def test_rejected_batch_is_set_aside(self):
+        poison, later = _rows(1), _rows(2)
+        spool = UsageSpool.claim(self.spool_dir)
+        spool.append(poison)
+        spool.append(later)
+        spool.close()
+        save = self.db.save_usage_rows_once
+
+        def rejecting(rows):
+            if rows == poison:
+                raise ValueError("row rejected by the database")
+            return save(rows)
+
+        with patch.object(self.db, "save_usage_rows_once", side_effect=rejecting), \
+                patch("keycycle.usage.usage_logger.USAGE_LOG_RETRY_SECONDS", 0.01):
+            logger = self._logger(max_attempts=2)
+            deadline = time.time() + 5
+            while logger.stats().replayed < 2 and time.time() < deadline:
+                time.sleep(0.01)
+            logger.stop()
+        self.assertEqual(self._count(), 2)
+        self.assertEqual((logger.stats().replayed, logger.stats().dropped), (2, 1))
+        with open(os.path.join(self.spool_dir, "usage-0.spool.rejected")) as f:
+            self.assertEqual([json.loads(line) for line in f], [poison])
+
+    def test_outage_does_not_set_batches_aside(self):
+        spool = UsageSpool.claim(self.spool_dir)
+        spool.append(_rows(1))
+        spool.close()
+        with patch.object(self.db, "save_usage_rows_once", side_effect=ConnectionError("database unavailable")), \
+                patch("keycycle.usage.usage_logger.USAGE_LOG_RETRY_SECONDS", 0.01):
+            logger = self._logger(max_attempts=1)
+            time.sleep(0.1)
+            logger.stop()
+        self.assertEqual(logger.stats().dropped, 0)
+        self.assertFalse(os.path.exists(os.path.join(self.spool_dir, "usage-0.spool.rejected")))
+        self.assertGreater(os.path.getsize(os.path.join(self.spool_dir, "usage-0.spool")), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
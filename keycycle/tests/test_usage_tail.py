@@ -0,0 +1,166 @@
+"""
+Tests for tailing usage_logs rows written by other processes.
+"""
+import sqlite3
+import time
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import insert, inspect, text
+from sqlalchemy.exc import OperationalError
+
+from conftest import UsageDbTestCase, make_manager
+from keycycle.backends.base import InMemoryStateBackend
+from keycycle.key_rotation.rotation_manager import RotatingKeyManager
+from keycycle.usage.db_logic import UsageDatabase
+from keycycle.usage.usage_tail import UsageTail
+
+KEYS = ["sk-tail-key-AAAAAAAA", "sk-tail-key-BBBBBBBB"]
+MODEL = "m"
+
+
+class _DbTestCase(UsageDbTestCase):
+    def _insert(self, db, writer, ts, tokens=10, suffix="AAAAAAAA", provider="p"):
+        with db.engine.begin() as conn:
+            conn.execute(insert(db.usage_logs).values(
+                provider=provider, model=MODEL, api_key_suffix=suffix,
+                timestamp=ts, tokens=tokens, writer_id=writer, written_at=time.time(),
+            ))
+
+
+class TestSchemaUpgrade(_DbTestCase):
+    """Test that an existing usage_logs table gains the writer column."""
+
+    def test_old_table_is_upgraded(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute(
+            "CREATE TABLE usage_logs (id INTEGER PRIMARY KEY, provider VARCHAR(100), model VARCHAR(100), "
+            "api_key_suffix VARCHAR(50), timestamp FLOAT, tokens INTEGER)"
+        )
+        conn.execute("INSERT INTO usage_logs VALUES (1, 'p', 'm', 'AAAAAAAA', %f, 5)" % time.time())
+        conn.commit()
+        conn.close()
+
+        db = UsageDatabase(db_url=self.url)
+        inspector = inspect(db.engine)
+        self.assertLessEqual({"writer_id", "written_at"}, {c["name"] for c in inspector.get_columns("usage_logs")})
+        self.assertLessEqual(
+            {"idx_provider_tail", "idx_provider_written"}, {i["name"] for i in inspector.get_indexes("usage_logs")}
+        )
+        # Rows from before the upgrade have no writer and count as someone else's
+        self.assertEqual(len(db.load_provider_tail("p", 0, exclude_writer="me")), 1)
+        db.engine.dispose()
+
+    def test_failed_upgrade_is_not_ignored(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute(
+            "CREATE TABLE usage_logs (id INTEGER PRIMARY KEY, provider VARCHAR(100), model VARCHAR(100), "
+            "api_key_suffix VARCHAR(50), timestamp FLOAT, tokens INTEGER)"
+        )
+        conn.commit()
+        conn.close()
+
+        def refused(sql):
+            # As if the ALTER were refused, e.g. for lack of privileges
+            return text("ALTER TABLE no_such_table ADD COLUMN x INTEGER")
+
+        with patch("keycycle.usage.db_logic.text", side_effect=refused), self.assertRaises(OperationalError):
+            UsageDatabase(db_url=self.url)
+
+
+class TestUsageTail(_DbTestCase):
+    """Test paging, deduplication and writer filtering."""
+
+    def setUp(self):
+        super().setUp()
+        self.db = UsageDatabase(db_url=self.url)
+
+    def tearDown(self):
+        self.db.engine.dispose()
+
+    def test_returns_each_foreign_row_once(self):
+        now = time.time()
+        self._insert(self.db, "peer", now - 5)
+        tail = UsageTail(self.db, "p", writer_id="me")
+        tail.prime()
+
+        self._insert(self.db, "me", now + 1)
+        self._insert(self.db, "peer", now + 1, tokens=20)
+        self._insert(self.db, "peer", now + 1, provider="other")
+        rows = tail.poll()
+        self.assertEqual([(r[1], r[4]) for r in rows], [("AAAAAAAA", 20)])
+        self.assertEqual(tail.poll(), [])
+
+    def test_late_commits_inside_the_overlap_are_caught(self):
+        now = time.time()
+        tail = UsageTail(self.db, "p", writer_id="me", overlap=30)
+        tail.prime()
+        self._insert(self.db, "peer", now + 2)
+        self.assertEqual(len(tail.poll()), 1)
+
+        # A row stamped earlier but committed after the newer one
+        self._insert(self.db, "slow-peer", now + 1, tokens=7)
+        self.assertEqual([r[4] for r in tail.poll()], [7])
+
+    def test_rows_written_long_after_their_timestamp_are_caught(self):
+        tail = UsageTail(self.db, "p", writer_id="me", overlap=30)
+        tail.prime()
+        # A spooled batch replayed after an hour-long outage
+        self.db.save_usage_rows_once([{
+            "provider": "p", "model": MODEL, "api_key_suffix": "AAAAAAAA", "timestamp": time.time() - 3600,
+            "tokens": 9, "writer_id": "peer", "record_id": "replayed-1",
+        }])
+        self.assertEqual([r[4] for r in tail.poll()], [9])
+
+
+class TestManagerTail(_DbTestCase):
+    """Test folding peer usage into a manager's windows."""
+
+    def _manager(self, **kwargs) -> RotatingKeyManager:
+        manager = make_manager("tail-test", KEYS, db=UsageDatabase(db_url=self.url), **kwargs)
+        self.addCleanup(manager.usage_logger.stop)
+        self.addCleanup(manager._stop_event.set)
+        return manager
+
+    def test_peer_usage_reaches_local_windows(self):
+        watcher = self._manager(tail_interval=3600)
+        peer = self._manager()
+
+        key = peer.keys[0]
+        for _ in range(3):
+            peer.record_usage(key, MODEL, 40, estimated_tokens=0)
+        watcher.record_usage(watcher.keys[1], MODEL, 5, estimated_tokens=0)
+        peer.usage_logger.stop()
+        watcher.usage_logger.stop()
+
+        self.assertEqual(watcher.fold_peer_usage(), 3)
+        self.assertEqual(watcher.fold_peer_usage(), 0)
+        self.assertEqual(watcher.get_key_stats(0).total.rpm, 3)
+        self.assertEqual(watcher.get_key_stats(0).total.tpm, 120)
+        # Its own row was not counted a second time
+        self.assertEqual(watcher.get_key_stats(1).total.rpm, 1)
+
+    def test_fold_without_a_tail_is_a_no_op(self):
+        self.assertEqual(self._manager().fold_peer_usage(), 0)
+
+    def test_tail_thread_polls(self):
+        watcher = self._manager(tail_interval=0.05)
+        peer = self._manager()
+        peer.record_usage(peer.keys[0], MODEL, 10, estimated_tokens=0)
+        peer.usage_logger.stop()
+
+        deadline = time.time() + 5
+        while watcher.get_key_stats(0).total.rpm == 0 and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(watcher.get_key_stats(0).total.rpm, 1)
+
+    def test_rejected_for_shared_backends(self):
+        class Shared(InMemoryStateBackend):
+            local_windows = False
+
+        with self.assertRaises(ValueError):
+            self._manager(tail_interval=1, state_backend=Shared())
+
+
+if __name__ == '__main__':
+    unittest.main()